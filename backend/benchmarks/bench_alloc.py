@@ -0,0 +1,158 @@
+"""
+Benchmark de alocação por tick no caminho por trade.
+
+Mede, por regime, o tempo e a memória alocada por tick em:
+    - orchestrator:single  VolumeEngineOrchestrator (engines padrão do servidor)
+    - orchestrator:shared  SharedEngineOrchestrator com dois pipelines
+    - feed                 BinanceDataFeed._process_trade completo (tick,
+                           engines, histórico e payload de cada pipeline)
+
+A memória é o pico alocado durante o tick, medido com tracemalloc numa
+passada separada (o tracemalloc deixa tudo várias vezes mais lento, então
+não entra na medição de tempo). Os payloads e resultados são descartados
+logo após cada tick, como no servidor, então o pico é o que o tick aloca
+de passagem: objetos que o alocador e o GC precisam criar e destruir.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_alloc
+    python -m benchmarks.bench_alloc --compare bench_alloc_antes.json
+"""
+import argparse
+import tracemalloc
+from typing import Callable, Dict, Any, List
+import numpy as np
+from binance_ws import BinanceDataFeed
+from engine_orchestrator import VolumeEngineOrchestrator
+from shared_engines import EnginePipeline, SharedEngineOrchestrator
+from benchmarks.bench_engines import ORCHESTRATOR_CONFIGS
+from benchmarks.harness import measure, write_results, load_results, print_comparison
+from benchmarks.synthetic import REGIMES, generate_trades, to_messages, to_ticks
+
+DEFAULT_WEIGHTS = ORCHESTRATOR_CONFIGS["server_default"]
+SECOND_WEIGHTS = ORCHESTRATOR_CONFIGS["balanced"]
+
+
+def _shared() -> SharedEngineOrchestrator:
+    orchestrator = SharedEngineOrchestrator()
+    for weights in (DEFAULT_WEIGHTS, SECOND_WEIGHTS):
+        orchestrator.add_pipeline(EnginePipeline(list(weights), weights))
+    return orchestrator
+
+
+def _feed() -> BinanceDataFeed:
+    feed = BinanceDataFeed("btcusdt", orchestrator=_shared())
+    feed.log_interval = 0
+    return feed
+
+
+async def _discard(payload):
+    pass
+
+
+def _run_sync(coroutine):
+    # _process_trade com callback que não espera nada termina no primeiro send
+    try:
+        coroutine.send(None)
+    except StopIteration:
+        pass
+
+
+def _cases(trades: np.ndarray) -> Dict[str, Callable[[], Callable[[int], Any]]]:
+    ticks = to_ticks(trades)
+    messages = to_messages(trades)
+
+    def single():
+        calculate = VolumeEngineOrchestrator(list(DEFAULT_WEIGHTS), DEFAULT_WEIGHTS).calculate_enhanced_volume
+        return lambda i: calculate(ticks[i])
+
+    def shared():
+        calculate = _shared().calculate_enhanced_volumes
+        return lambda i: calculate(ticks[i])
+
+    def feed():
+        process = _feed()._process_trade
+        return lambda i: _run_sync(process(messages[i], _discard))
+
+    return {"orchestrator:single": single, "orchestrator:shared": shared, "feed": feed}
+
+
+def measure_alloc(setup: Callable[[], Callable[[int], Any]], n: int) -> Dict[str, float]:
+    """Pico de bytes alocados por chamada (tracemalloc)."""
+    call = setup()
+    samples = np.empty(n, dtype=np.float64)
+    tracemalloc.start()
+    try:
+        for i in range(n):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call(i)
+            samples[i] = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return {"mean": float(samples.mean()), "p50": float(np.percentile(samples, 50)),
+            "p99": float(np.percentile(samples, 99))}
+
+
+def run(n: int, seed: int, regimes: List[str]) -> List[Dict[str, Any]]:
+    results = []
+    for regime in regimes:
+        trades = generate_trades(regime, n, seed=seed)
+        for target, setup in _cases(trades).items():
+            measured = measure(setup, n)
+            results.append({
+                "target": target,
+                "regime": regime,
+                "mode": "tick",
+                "ticks_per_call": 1,
+                "ticks_per_sec": measured["calls_per_sec"],
+                "latency_ns": measured["latency_ns"],
+                "alloc_bytes": measure_alloc(setup, n),
+            })
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<22} {'regime':<12} {'ticks/s':>10} {'p50':>9} {'p99':>9} {'bytes/tick':>11} {'p99':>8}")
+    for r in results:
+        lat = r["latency_ns"]
+        alloc = r["alloc_bytes"]
+        print(f"{r['target']:<22} {r['regime']:<12} {r['ticks_per_sec']:>10,.0f} "
+              f"{lat['p50'] / 1000:>7.2f}µs {lat['p99'] / 1000:>7.2f}µs {alloc['mean']:>11,.0f} {alloc['p99']:>8,.0f}")
+
+
+def print_alloc_comparison(current: List[Dict[str, Any]], baseline: List[Dict[str, Any]]):
+    before = {(r["target"], r["regime"]): r for r in baseline if "alloc_bytes" in r}
+    for r in current:
+        old = before.get((r["target"], r["regime"]))
+        if old:
+            change = (r["alloc_bytes"]["mean"] / old["alloc_bytes"]["mean"] - 1) * 100
+            print(f"  {r['target']:<22} {r['regime']:<12} bytes/tick {old['alloc_bytes']['mean']:>8,.0f} → "
+                  f"{r['alloc_bytes']['mean']:>8,.0f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de alocação por tick")
+    parser.add_argument("--ticks", type=int, default=20000, help="trades sintéticos por regime")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regimes", default=",".join(REGIMES), help="regimes separados por vírgula")
+    parser.add_argument("--output", default="bench_alloc.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    regimes = args.regimes.split(",")
+    results = run(args.ticks, args.seed, regimes)
+    print_results(results)
+
+    params = {"ticks": args.ticks, "seed": args.seed, "regimes": regimes}
+    write_results(args.output, "alloc", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        baseline = load_results(args.compare)["results"]
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, baseline)
+        print_alloc_comparison(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark do book L2 local (order_book.py).
+
+Os eventos vêm do FakeBook do fake_binance.py (o mesmo stand-in dos
+testes ao vivo), seguindo o preço dos trades sintéticos de cada regime:
+um snapshot com --levels níveis por lado e depois um diff @depth por passo
+(recentrando o book no preço e mexendo em ~5% das quantidades). Mede:
+    - diff: BookFeed.handle de um diff já decodificado (escada + sync)
+    - decode+diff: json.loads + handle, o caminho de cada mensagem no socket
+    - ticker: json.loads + handle de um bookTicker
+    - top / imbalance: leituras do topo e do desequilíbrio em --depth níveis
+      (o que os engines fazem por trade)
+
+No fim, a carga de um símbolo com @depth@100ms (10 diffs/s) e
+--ticker-rate bookTickers/s vira fração de um núcleo e símbolos por núcleo.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_book
+    python -m benchmarks.bench_book --levels 5000 --ticker-rate 500
+"""
+import argparse
+import json
+from typing import Dict, Any, List
+from fake_binance import FakeBook
+from order_book import BookFeed
+from benchmarks.harness import measure, write_results, load_results, print_comparison
+from benchmarks.synthetic import REGIMES, generate_trades
+
+SYMBOL = "btcusdt"
+
+
+def _result(target: str, regime: str, measured: Dict[str, Any], levels_per_call: float = None) -> Dict[str, Any]:
+    result = {
+        "target": target,
+        "regime": regime,
+        "mode": "event",
+        "ticks_per_call": 1,
+        "ticks_per_sec": measured["calls_per_sec"],
+        "latency_ns": measured["latency_ns"],
+    }
+    if levels_per_call is not None:
+        result["levels_per_event"] = levels_per_call
+    return result
+
+
+def build_events(regime: str, n: int, seed: int, levels: int):
+    """(snapshot, diffs, bookTickers) do FakeBook seguindo o preço do regime."""
+    prices = generate_trades(regime, n + 1, seed=seed)["price"].tolist()
+    book = FakeBook(seed, levels)
+    book.step(prices[0])
+    snapshot = book.snapshot(levels)
+    diffs = []
+    tickers = []
+    for i, price in enumerate(prices[1:]):
+        first_id, last_id, bids, asks = book.step(price)
+        diffs.append({"e": "depthUpdate", "E": i, "s": SYMBOL.upper(), "U": first_id, "u": last_id,
+                      "b": bids, "a": asks})
+        bid, bid_qty, ask, ask_qty = book.top()
+        tickers.append({"u": last_id, "s": SYMBOL.upper(), "b": bid, "B": bid_qty, "a": ask, "A": ask_qty})
+    return snapshot, diffs, tickers
+
+
+def _synced_feed(snapshot: Dict[str, Any]) -> BookFeed:
+    feed = BookFeed([SYMBOL], "ws://localhost:0")
+    feed.books[SYMBOL].apply_snapshot(snapshot)
+    return feed
+
+
+def run(n: int, seed: int, regimes: List[str], levels: int, depth: int) -> List[Dict[str, Any]]:
+    results = []
+    for regime in regimes:
+        snapshot, diffs, tickers = build_events(regime, n, seed, levels)
+        encoded_diffs = [json.dumps({"stream": f"{SYMBOL}@depth@100ms", "data": diff}) for diff in diffs]
+        encoded_tickers = [json.dumps({"stream": f"{SYMBOL}@bookTicker", "data": ticker}) for ticker in tickers]
+        levels_per_event = sum(len(diff["b"]) + len(diff["a"]) for diff in diffs) / len(diffs)
+
+        def diff():
+            handle = _synced_feed(snapshot).handle
+            return lambda i: handle(diffs[i])
+
+        def decode_diff():
+            handle = _synced_feed(snapshot).handle
+            return lambda i: handle(json.loads(encoded_diffs[i]))
+
+        def ticker():
+            handle = _synced_feed(snapshot).handle
+            return lambda i: handle(json.loads(encoded_tickers[i]))
+
+        # Leituras sobre o book já no fim da sessão
+        final = _synced_feed(snapshot)
+        for event in diffs:
+            final.handle(event)
+        final.handle(tickers[-1])
+        book = final.books[SYMBOL]
+
+        results.append(_result("book:diff", regime, measure(diff, n), levels_per_event))
+        results.append(_result("book:decode+diff", regime, measure(decode_diff, n), levels_per_event))
+        results.append(_result("book:ticker", regime, measure(ticker, n)))
+        results.append(_result("book:top", regime, measure(lambda: lambda i: book.top(), n)))
+        results.append(_result(f"book:imbalance{depth}", regime, measure(lambda: lambda i: book.imbalance(depth), n)))
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<20} {'regime':<12} {'eventos/s':>12} {'p50':>9} {'p99':>9} {'níveis/evento':>14}")
+    for r in results:
+        lat = r["latency_ns"]
+        levels = f"{r['levels_per_event']:.0f}" if "levels_per_event" in r else ""
+        print(f"{r['target']:<20} {r['regime']:<12} {r['ticks_per_sec']:>12,.0f} "
+              f"{lat['p50'] / 1000:>7.2f}µs {lat['p99'] / 1000:>7.2f}µs {levels:>14}")
+
+
+def print_capacity(results: List[Dict[str, Any]], depth_rate: float, ticker_rate: float):
+    """Fração de um núcleo por símbolo com depth_rate diffs/s e ticker_rate bookTickers/s."""
+    by_key = {(r["target"], r["regime"]): r for r in results}
+    print(f"\n🧮 Carga por símbolo ({depth_rate:g} diffs/s + {ticker_rate:g} bookTickers/s, com json.loads):")
+    for regime in dict.fromkeys(r["regime"] for r in results):
+        seconds = (depth_rate * by_key[("book:decode+diff", regime)]["latency_ns"]["mean"]
+                   + ticker_rate * by_key[("book:ticker", regime)]["latency_ns"]["mean"]) / 1e9
+        print(f"  {regime:<12} {seconds * 100:.2f}% de um núcleo → ~{1 / seconds:,.0f} símbolos por núcleo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do book L2 local")
+    parser.add_argument("--events", type=int, default=5000, help="diffs sintéticos por regime")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regimes", default=",".join(REGIMES), help="regimes separados por vírgula")
+    parser.add_argument("--levels", type=int, default=1000, help="níveis por lado (limit do snapshot)")
+    parser.add_argument("--depth", type=int, default=20, help="níveis do desequilíbrio medido")
+    parser.add_argument("--depth-rate", type=float, default=10.0, help="diffs/s por símbolo (@depth@100ms)")
+    parser.add_argument("--ticker-rate", type=float, default=200.0, help="bookTickers/s por símbolo")
+    parser.add_argument("--output", default="bench_book.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    regimes = args.regimes.split(",")
+    results = run(args.events, args.seed, regimes, args.levels, args.depth)
+    print_results(results)
+    print_capacity(results, args.depth_rate, args.ticker_rate)
+
+    params = {"events": args.events, "seed": args.seed, "regimes": regimes, "levels": args.levels,
+              "depth": args.depth}
+    write_results(args.output, "book", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
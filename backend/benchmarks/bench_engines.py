@@ -0,0 +1,146 @@
+"""
+Micro-benchmark dos volume engines e do orquestrador (100% offline).
+
+Para cada regime sintético (calm, bursty, flash_crash) mede:
+    - cada engine do ENGINE_REGISTRY, chamada por tick (a mesma que o
+      orquestrador usa: infer_side para side_inference, senão
+      calculate_volume_weight) e pela API vetorizada
+    - configurações típicas do orquestrador (presets do frontend, padrão
+      do servidor e todos os engines)
+
+e grava ticks/s e latência p50/p99/p999 em JSON.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_engines
+    python -m benchmarks.bench_engines --ticks 50000 --output bench/engines.json
+    python -m benchmarks.bench_engines --compare bench/engines-anterior.json
+"""
+import argparse
+from typing import Dict, Any, List
+from engine_orchestrator import ENGINE_REGISTRY, VolumeEngineOrchestrator
+from benchmarks.harness import measure, write_results, load_results, print_comparison
+from benchmarks.synthetic import REGIMES, generate_trades, to_ticks, to_columns
+
+ORCHESTRATOR_CONFIGS = {
+    "server_default": {"tick_velocity": 1.0, "side_inference": 1.0, "micro_cluster": 1.5},
+    "scalping": {"tick_velocity": 1.5, "side_inference": 1.2},
+    "balanced": {"tick_velocity": 1.0, "side_inference": 1.0, "spread_weight": 0.8},
+    "absorption": {"tick_velocity": 1.0, "side_inference": 1.0, "micro_cluster": 1.8},
+    "all": {name: 1.0 for name in ENGINE_REGISTRY},
+}
+
+
+def bench_engine_tick(name: str, ticks) -> Dict[str, Any]:
+    def setup():
+        engine = ENGINE_REGISTRY[name]()
+        method = engine.infer_side if name == "side_inference" else engine.calculate_volume_weight
+        # O tick também é o contexto (ver volume_engines.base.Tick)
+        return lambda i: method(ticks[i], ticks[i])
+
+    return measure(setup, len(ticks))
+
+
+def bench_engine_batch(name: str, columns, batch_size: int) -> Dict[str, Any]:
+    prices, volumes, timestamps, sides = columns
+    starts = range(0, len(prices), batch_size)
+    bounds = [(start, min(start + batch_size, len(prices))) for start in starts]
+
+    def setup():
+        engine = ENGINE_REGISTRY[name]()
+        method = engine.infer_side_batch if name == "side_inference" else engine.calculate_volume_weight_batch
+
+        def call(i):
+            a, b = bounds[i]
+            method(prices[a:b], volumes[a:b], timestamps[a:b], sides[a:b])
+        return call
+
+    return measure(setup, len(bounds))
+
+
+def bench_orchestrator(weights: Dict[str, float], ticks) -> Dict[str, Any]:
+    def setup():
+        orchestrator = VolumeEngineOrchestrator(engine_names=list(weights), weights=weights)
+        return lambda i: orchestrator.calculate_enhanced_volume(ticks[i])
+
+    return measure(setup, len(ticks))
+
+
+def bench_orchestrator_batch(weights: Dict[str, float], columns, batch_size: int) -> Dict[str, Any]:
+    prices, volumes, timestamps, sides = columns
+    bounds = [(start, min(start + batch_size, len(prices))) for start in range(0, len(prices), batch_size)]
+
+    def setup():
+        orchestrator = VolumeEngineOrchestrator(engine_names=list(weights), weights=weights)
+
+        def call(i):
+            a, b = bounds[i]
+            orchestrator.calculate_enhanced_volume_batch(prices[a:b], volumes[a:b], timestamps[a:b], sides[a:b])
+        return call
+
+    return measure(setup, len(bounds))
+
+
+def _result(target: str, regime: str, mode: str, measured: Dict[str, Any], ticks_per_call: int) -> Dict[str, Any]:
+    return {
+        "target": target,
+        "regime": regime,
+        "mode": mode,
+        "ticks_per_call": ticks_per_call,
+        "ticks_per_sec": measured["calls_per_sec"] * ticks_per_call,
+        "latency_ns": measured["latency_ns"],
+    }
+
+
+def run(n: int, seed: int, regimes: List[str], batch_size: int) -> List[Dict[str, Any]]:
+    results = []
+    for regime in regimes:
+        trades = generate_trades(regime, n, seed=seed)
+        ticks = to_ticks(trades)
+        columns = to_columns(trades)
+
+        for name in ENGINE_REGISTRY:
+            results.append(_result(f"engine:{name}", regime, "tick", bench_engine_tick(name, ticks), 1))
+            results.append(_result(f"engine:{name}", regime, "batch",
+                                   bench_engine_batch(name, columns, batch_size), batch_size))
+
+        for config, weights in ORCHESTRATOR_CONFIGS.items():
+            results.append(_result(f"orchestrator:{config}", regime, "tick", bench_orchestrator(weights, ticks), 1))
+            results.append(_result(f"orchestrator:{config}", regime, "batch",
+                                   bench_orchestrator_batch(weights, columns, batch_size), batch_size))
+
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<32} {'regime':<12} {'modo':<6} {'ticks/s':>12} {'p50':>9} {'p99':>9} {'p999':>9}")
+    for r in results:
+        lat = r["latency_ns"]
+        print(f"{r['target']:<32} {r['regime']:<12} {r['mode']:<6} {r['ticks_per_sec']:>12,.0f} "
+              f"{lat['p50'] / 1000:>7.1f}µs {lat['p99'] / 1000:>7.1f}µs {lat['p999'] / 1000:>7.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos volume engines e do orquestrador")
+    parser.add_argument("--ticks", type=int, default=20000, help="trades sintéticos por regime")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regimes", default=",".join(REGIMES), help="regimes separados por vírgula")
+    parser.add_argument("--batch-size", type=int, default=1000, help="tamanho do lote na API vetorizada")
+    parser.add_argument("--output", default="bench_engines.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    regimes = args.regimes.split(",")
+    results = run(args.ticks, args.seed, regimes, args.batch_size)
+    print_results(results)
+
+    params = {"ticks": args.ticks, "seed": args.seed, "regimes": regimes, "batch_size": args.batch_size}
+    write_results(args.output, "engines", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
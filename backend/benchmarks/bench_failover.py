@@ -0,0 +1,142 @@
+"""
+Benchmark das conexões redundantes com a Binance (upstream.py).
+
+Dois stand-ins locais (fake_binance.py) fazem o papel de dois endpoints da
+Binance com a mesma sequência de trades; o feed (BinanceMultiFeed) conecta
+com --connections 1 (só no primeiro) ou 2 (um em cada). Cenários:
+    stalls    as conexões travam de vez em quando (--stall-prob, --stall-ms),
+              como uma perda de pacote com retransmissão; a latência é do
+              T do trade até o callback do feed
+    failover  o primeiro servidor cai no meio da execução e volta
+              --downtime segundos depois; conta os trades que não chegaram
+              (buracos de trade_id) e a latência no período
+
+Tudo roda num único loop do asyncio (servidores e feed), então os números
+valem para comparar 1 e 2 conexões, não como latência absoluta.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_failover
+    python -m benchmarks.bench_failover --seconds 20 --stall-prob 0.005
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, Any, List
+import numpy as np
+from binance_ws import BinanceMultiFeed
+from fake_binance import FakeBinanceServer
+from benchmarks.harness import latency_summary, write_results, load_results, print_comparison
+
+SYMBOLS = ["btcusdt", "ethusdt"]
+
+
+async def _run(connections: int, scenario: str, seconds: float, rate: float, stall_prob: float,
+               stall_ms: float, downtime: float) -> Dict[str, Any]:
+    stalls = stall_prob if scenario == "stalls" else 0.0
+    primary = FakeBinanceServer(rate=rate, stall_prob=stalls, stall_ms=stall_ms)
+    mirror = FakeBinanceServer(rate=rate, stall_prob=stalls, stall_ms=stall_ms)
+    await primary.start()
+    await mirror.start()
+
+    feed = BinanceMultiFeed(SYMBOLS, base_url=primary.url, connections=connections, mirror_urls=[mirror.url])
+    for symbol_feed in feed.feeds.values():
+        symbol_feed.log_interval = 0
+    latencies = []
+
+    async def on_trade(payload):
+        latencies.append(time.time() * 1000 - payload["timestamp"])
+
+    async def keep_connected():
+        # Como o binance_forwarder: com uma conexão, a reconexão é de fora
+        while True:
+            try:
+                await feed.connect(on_trade)
+            except Exception:
+                await asyncio.sleep(feed.pipeline.links[0].disconnected(RuntimeError("queda")))
+
+    task = asyncio.create_task(keep_connected())
+    started = time.perf_counter()
+    if scenario == "failover":
+        await asyncio.sleep(seconds / 3)
+        port = primary.port
+        await primary.stop()
+        await asyncio.sleep(downtime)
+        primary = FakeBinanceServer(port=port, rate=rate)
+        await primary.start()
+        await asyncio.sleep(max(seconds - seconds / 3 - downtime, 0))
+    else:
+        await asyncio.sleep(seconds)
+    # Buracos ainda em aberto no fim contam como perdidos
+    feed.pipeline.dedup.expire(float("inf"))
+    elapsed = time.perf_counter() - started
+    feed.stop()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await primary.stop()
+    await mirror.stop()
+
+    dedup = feed.pipeline.dedup.stats()
+    return {
+        "target": f"connections:{connections}",
+        "regime": scenario,
+        "mode": "e2e",
+        "ticks_per_call": 1,
+        "ticks_per_sec": len(latencies) / elapsed,
+        # ms → ns, como os outros benchmarks
+        "latency_ns": latency_summary(np.asarray(latencies) * 1e6),
+        "max_ms": float(max(latencies)),
+        "missed": dedup["missed"],
+        "duplicates": dedup["duplicates"],
+    }
+
+
+async def run(scenarios: List[str], seconds: float, rate: float, stall_prob: float, stall_ms: float,
+              downtime: float) -> List[Dict[str, Any]]:
+    results = []
+    for scenario in scenarios:
+        for connections in (1, 2):
+            results.append(await _run(connections, scenario, seconds, rate, stall_prob, stall_ms, downtime))
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<14} {'cenário':<10} {'trades/s':>9} {'p50':>8} {'p99':>8} {'p999':>8} {'máx':>8} "
+          f"{'perdidos':>9} {'cópias':>8}")
+    for r in results:
+        lat = r["latency_ns"]
+        print(f"{r['target']:<14} {r['regime']:<10} {r['ticks_per_sec']:>9,.0f} "
+              f"{lat['p50'] / 1e6:>6.1f}ms {lat['p99'] / 1e6:>6.1f}ms {lat['p999'] / 1e6:>6.1f}ms "
+              f"{r['max_ms']:>6.0f}ms {r['missed']:>9,} {r['duplicates']:>8,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de conexões redundantes com a Binance")
+    parser.add_argument("--scenarios", default="stalls,failover", help="cenários separados por vírgula")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duração de cada execução")
+    parser.add_argument("--rate", type=float, default=200.0, help="trades/s por símbolo")
+    parser.add_argument("--stall-prob", type=float, default=0.002, help="chance de trava por mensagem (stalls)")
+    parser.add_argument("--stall-ms", type=float, default=200.0, help="duração de cada trava")
+    parser.add_argument("--downtime", type=float, default=2.0, help="segundos com o primeiro servidor fora (failover)")
+    parser.add_argument("--output", default="bench_failover.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    results = asyncio.run(run(scenarios, args.seconds, args.rate, args.stall_prob, args.stall_ms, args.downtime))
+    print_results(results)
+
+    params = {"seconds": args.seconds, "rate": args.rate, "stall_prob": args.stall_prob,
+              "stall_ms": args.stall_ms, "downtime": args.downtime}
+    write_results(args.output, "failover", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark do agregador de footprint / perfil de volume (footprint.py).
+
+Os payloads são os mesmos que o servidor entrega (BinanceDataFeed com os
+engines padrão, como em bench_wire). Mede, por regime:
+    - add: um trade no footprint (o custo por trade no caminho quente)
+    - delta: montagem de um delta a cada --delta-every trades (como o
+      envio periódico do servidor), custo dividido pelos trades do período
+    - snapshot: snapshot completo ao fim da sessão sintética
+
+O pico de trades do BTCUSDT fica na casa de alguns milhares por segundo;
+a coluna trades/s mostra a folga em um núcleo.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_footprint
+    python -m benchmarks.bench_footprint --ticks 100000 --tick-size 5
+"""
+import argparse
+import json
+from typing import Dict, Any, List
+from footprint import FootprintAggregator, FOOTPRINT_BAR_MS, FOOTPRINT_LEVELS
+from benchmarks.bench_engines import ORCHESTRATOR_CONFIGS
+from benchmarks.bench_wire import build_payloads
+from benchmarks.harness import measure, write_results, load_results, print_comparison
+from benchmarks.synthetic import REGIMES, generate_trades
+
+
+def _result(target: str, regime: str, mode: str, measured: Dict[str, Any], trades_per_call: int) -> Dict[str, Any]:
+    return {
+        "target": target,
+        "regime": regime,
+        "mode": mode,
+        "ticks_per_call": trades_per_call,
+        "ticks_per_sec": measured["calls_per_sec"] * trades_per_call,
+        "latency_ns": measured["latency_ns"],
+    }
+
+
+def run(n: int, seed: int, regimes: List[str], tick_size: float, bar_ms: int, levels: int,
+        delta_every: int) -> List[Dict[str, Any]]:
+    results = []
+    for regime in regimes:
+        payloads = build_payloads(generate_trades(regime, n, seed=seed), ORCHESTRATOR_CONFIGS["server_default"])
+
+        def aggregator():
+            return FootprintAggregator("btcusdt", tick_size=tick_size, bar_ms=bar_ms, levels=levels)
+
+        def setup_add():
+            add = aggregator().add_payload
+            return lambda i: add(payloads[i])
+
+        results.append(_result("footprint", regime, "add", measure(setup_add, len(payloads)), 1))
+
+        periods = [payloads[start:start + delta_every] for start in range(0, len(payloads), delta_every)]
+
+        def setup_delta():
+            footprint = aggregator()
+
+            def call(i):
+                for payload in periods[i]:
+                    footprint.add_payload(payload)
+                json.dumps(footprint.delta())
+            return call
+
+        results.append(_result("footprint", regime, f"add+delta{delta_every}",
+                               measure(setup_delta, len(periods)), delta_every))
+
+        footprint = aggregator()
+        for payload in payloads:
+            footprint.add_payload(payload)
+        measured = measure(lambda: (lambda i: json.dumps(footprint.snapshot())), 20)
+        results.append(_result("footprint", regime, "snapshot", measured, 1))
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<10} {'regime':<12} {'modo':<16} {'trades/s':>14} {'p50':>10} {'p99':>10}")
+    for r in results:
+        lat = r["latency_ns"]
+        print(f"{r['target']:<10} {r['regime']:<12} {r['mode']:<16} {r['ticks_per_sec']:>14,.0f} "
+              f"{lat['p50'] / 1000:>8.1f}µs {lat['p99'] / 1000:>8.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do footprint / perfil de volume")
+    parser.add_argument("--ticks", type=int, default=50000, help="trades sintéticos por regime")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regimes", default=",".join(REGIMES), help="regimes separados por vírgula")
+    parser.add_argument("--tick-size", type=float, default=None, help="tamanho do nível de preço (padrão: automático)")
+    parser.add_argument("--bar-ms", type=int, default=FOOTPRINT_BAR_MS)
+    parser.add_argument("--levels", type=int, default=FOOTPRINT_LEVELS)
+    parser.add_argument("--delta-every", type=int, default=250, help="trades entre dois deltas")
+    parser.add_argument("--output", default="bench_footprint.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    regimes = args.regimes.split(",")
+    results = run(args.ticks, args.seed, regimes, args.tick_size, args.bar_ms, args.levels, args.delta_every)
+    print_results(results)
+
+    params = {"ticks": args.ticks, "seed": args.seed, "regimes": regimes, "tick_size": args.tick_size,
+              "bar_ms": args.bar_ms, "levels": args.levels, "delta_every": args.delta_every}
+    write_results(args.output, "footprint", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
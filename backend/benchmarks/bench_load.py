@@ -0,0 +1,532 @@
+"""
+Teste de carga ponta a ponta do websocket_server.py.
+
+Para cada combinação de --rates × --clients, sobe um fake_binance.py
+(rate trades/s por símbolo) e um websocket_server.py apontado para ele,
+cada um no seu processo, e abre os clientes WebSocket em --client-procs
+processos. Uma fração --slow-share dos clientes lê devagar (espera
+--slow-read-ms depois de cada mensagem, com um buffer de recepção de
+--slow-rcvbuf bytes), como um navegador travado: a fila deles no
+servidor enche e a política de overflow entra em ação. Antes disso o
+atraso se acumula no buffer de envio do kernel (até tcp_wmem, 4 MB no
+Linux, de mensagens já comprimidas pelo permessage-deflate): o cliente
+lento aparece primeiro como latência e só depois como descarte; use um
+--warmup longo ou --no-deflate para chegar lá antes.
+
+Com todos conectados, espera --warmup segundos e mede por --seconds:
+    latência de fan-out  do T do trade (relógio do fake, em ms) até a
+                         chegada no cliente, separada para clientes
+                         normais e lentos
+    MB/s                 mensagens recebidas (tamanho descomprimido),
+                         somando todos os clientes
+    perdidos             trades que o cliente não recebeu (buracos no
+                         trade_count do símbolo; não contados com --filter)
+    atrasados            trades que chegaram com mais de --late-ms
+    descartes no         soma dos descartes das filas de todos os clientes
+    servidor             (get_stats) e a maior fila; um cliente lento só vê
+                         o buraco quando alcança o trecho descartado, então
+                         para ele este é o número que vale
+    desconectados        clientes derrubados pelo servidor durante a medição
+    CPU e memória        do servidor e dos processos filhos (--workers),
+                         lidos de /proc (só Linux)
+
+Uma célula está saturada (⚠️) quando clientes normais perdem trades ou o
+p99 deles passa de --late-ms; a tabela de células é a curva de capacidade.
+
+Servidor, fake e clientes dividem a máquina: com poucos núcleos os
+clientes disputam CPU com o servidor, então compare execuções da mesma
+máquina (--compare) em vez de ler os números como absolutos.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --clients 100,500,1000,2000 --rates 50,200,500 --slow-share 0.05
+    python -m benchmarks.bench_load --server-args "--workers 2 --overflow-policy conflate"
+    python -m benchmarks.bench_load --clients 1000 --filter "is_absorption == true"
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing as mp
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+from array import array
+from typing import Dict, Any, List
+import numpy as np
+import websockets
+from benchmarks.harness import latency_summary, write_results, load_results, print_comparison
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Conexões abertas ao mesmo tempo por processo de clientes (o backlog do
+# listen do servidor é pequeno)
+CONNECT_CONCURRENCY = 50
+READY_TIMEOUT = 30.0
+RSS_SAMPLE_SECONDS = 0.5
+
+
+# ============================================
+# Clientes (em processos próprios)
+# ============================================
+class _ClientStats:
+    """Contadores de um grupo de clientes (normais ou lentos) de um processo."""
+
+    def __init__(self):
+        self.latencies_ms = array("f")
+        self.received = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.late = 0
+        self.disconnected = 0
+        self.connect_failed = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latencies_ms": self.latencies_ms,
+            "received": self.received,
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+            "late": self.late,
+            "disconnected": self.disconnected,
+            "connect_failed": self.connect_failed,
+        }
+
+
+async def _listen(websocket, read_delay: float, window: List[float], late_ms: float, count_gaps: bool,
+                  stats: _ClientStats):
+    """Lê os trades de um cliente; só conta o que chega dentro da janela (ms).
+    Com filtro os buracos no trade_count são esperados (count_gaps=False)."""
+    last_count = {}
+    try:
+        async for message in websocket:
+            now = time.time() * 1000
+            if read_delay:
+                await asyncio.sleep(read_delay)
+            in_window = window[0] <= now < window[1]
+            if in_window:
+                stats.bytes += len(message)
+            data = json.loads(message)
+            if data.get("type") != "trade":
+                continue
+            symbol = data["symbol"]
+            count = data["trade_count"]
+            previous = last_count.get(symbol)
+            last_count[symbol] = count
+            if not in_window:
+                continue
+            latency = now - data["timestamp"]
+            stats.latencies_ms.append(latency)
+            stats.received += 1
+            if latency > late_ms:
+                stats.late += 1
+            if count_gaps and previous is not None and count > previous + 1:
+                stats.dropped += count - previous - 1
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    if time.time() * 1000 < window[1]:
+        stats.disconnected += 1
+
+
+async def _run_clients(url: str, symbols: List[str], fast: int, slow: int, slow_read_ms: float,
+                       slow_rcvbuf: int, late_ms: float, compression: str, trade_filter: List[str], conn):
+    groups = {"fast": _ClientStats(), "slow": _ClientStats()}
+    window = [math.inf, math.inf]
+    gate = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    address = urlsplit(url)
+
+    async def connect(kind: str):
+        async with gate:
+            try:
+                sock = None
+                if kind == "slow" and slow_rcvbuf:
+                    # Buffer pequeno: o atraso chega logo à fila do servidor
+                    # em vez de se acumular nos buffers do kernel
+                    sock = socket.socket()
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, slow_rcvbuf)
+                    sock.setblocking(False)
+                    await asyncio.get_running_loop().sock_connect(sock, (address.hostname, address.port))
+                websocket = await websockets.connect(url, sock=sock, max_size=None, open_timeout=READY_TIMEOUT,
+                                                     close_timeout=1, compression=compression)
+                if trade_filter:
+                    await websocket.send(json.dumps({"type": "set_filter", "filter": trade_filter}))
+                await websocket.send(json.dumps({"type": "subscribe", "symbols": symbols}))
+                return websocket
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+                groups[kind].connect_failed += 1
+                return None
+
+    kinds = ["fast"] * fast + ["slow"] * slow
+    sockets = await asyncio.gather(*(connect(kind) for kind in kinds))
+    tasks = [
+        asyncio.create_task(_listen(websocket, slow_read_ms / 1000 if kind == "slow" else 0.0,
+                                    window, late_ms, not trade_filter, groups[kind]))
+        for websocket, kind in zip(sockets, kinds) if websocket is not None
+    ]
+    conn.send(len(tasks))
+
+    # O processo principal define a janela de medição quando todos os
+    # processos de clientes terminaram de conectar
+    window[:] = await asyncio.to_thread(conn.recv)
+    await asyncio.sleep(max(window[1] / 1000 - time.time(), 0))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    conn.send({kind: stats.to_dict() for kind, stats in groups.items()})
+    # Só desconecta depois que o processo principal leu o get_stats do servidor
+    await asyncio.to_thread(conn.recv)
+    await asyncio.gather(*(websocket.close() for websocket in sockets if websocket is not None),
+                         return_exceptions=True)
+
+
+def client_process(url: str, symbols: List[str], fast: int, slow: int, slow_read_ms: float,
+                   slow_rcvbuf: int, late_ms: float, compression: str, trade_filter: List[str], conn):
+    _raise_fd_limit()
+    asyncio.run(_run_clients(url, symbols, fast, slow, slow_read_ms, slow_rcvbuf, late_ms, compression,
+                             trade_filter, conn))
+
+
+async def _query_stats(url: str) -> Dict[str, Any]:
+    async with websockets.connect(url, max_size=None, open_timeout=READY_TIMEOUT) as websocket:
+        await websocket.send(json.dumps({"type": "get_stats"}))
+        async for message in websocket:
+            data = json.loads(message)
+            if data.get("type") == "stats":
+                return data
+
+
+def server_stats(url: str) -> Dict[str, Any]:
+    """Resposta do get_stats do servidor (filas e descartes de cada cliente);
+    None se o servidor, saturado, não respondeu."""
+    try:
+        return asyncio.run(asyncio.wait_for(_query_stats(url), READY_TIMEOUT * 2))
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+        print(f"   ⚠️ get_stats sem resposta: {e}")
+        return None
+
+
+# ============================================
+# Processos do servidor e do fake
+# ============================================
+def _raise_fd_limit():
+    """Milhares de sockets passam do limite padrão de arquivos abertos."""
+    try:
+        import resource
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def start_process(args: List[str], log) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = READY_TIMEOUT):
+    """Espera o processo responder HTTP em url."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[1]} terminou ao iniciar (código {process.returncode})")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} não respondeu em {timeout:g}s")
+
+
+def stop_process(process: subprocess.Popen):
+    """Encerra o processo e os filhos dele (workers do --workers)."""
+    children = process_tree(process.pid)[1:]
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid e todos os descendentes (só o próprio pid fora do Linux)."""
+    if not os.path.isdir("/proc"):
+        return [pid]
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, ()))
+    return tree
+
+
+def cpu_seconds(pids: List[int]) -> float:
+    """utime + stime somados (None fora do Linux)."""
+    if not os.path.isdir("/proc"):
+        return None
+    ticks = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])
+        except (OSError, IndexError, ValueError):
+            continue
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+def rss_bytes(pids: List[int]) -> int:
+    """Memória residente somada (None fora do Linux)."""
+    if not os.path.isdir("/proc"):
+        return None
+    pages = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                pages += int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+# ============================================
+# Uma célula da curva: rate × clientes
+# ============================================
+def _split(total: int, parts: int) -> List[int]:
+    return [total // parts + (i < total % parts) for i in range(parts)]
+
+
+def _recv(conn, process, timeout: float):
+    if not conn.poll(timeout):
+        raise RuntimeError(f"processo de clientes {process.pid} não respondeu em {timeout:g}s")
+    return conn.recv()
+
+
+def _merge(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged = {key: sum(part[key] for part in parts) for key in parts[0] if key != "latencies_ms"}
+    merged["latencies_ms"] = np.concatenate([np.frombuffer(part["latencies_ms"], dtype=np.float32)
+                                             for part in parts])
+    return merged
+
+
+def _summary(latencies_ms: np.ndarray) -> Dict[str, float]:
+    if not len(latencies_ms):
+        return {"p50": 0.0, "p99": 0.0, "p999": 0.0, "mean": 0.0}
+    return latency_summary(latencies_ms.astype(np.float64) * 1e6)
+
+
+def run_cell(rate: float, clients: int, args) -> Dict[str, Any]:
+    symbols = args.symbols.split(",")
+    slow = round(clients * args.slow_share)
+    procs = max(1, min(args.client_procs, clients))
+    fake_port, server_port = _free_port(), _free_port()
+    log = open(args.server_log, "a") if args.server_log else subprocess.DEVNULL
+
+    fake = server = None
+    workers = []
+    try:
+        fake = start_process(["fake_binance.py", "--port", str(fake_port), "--rate", str(rate),
+                              "--regime", args.regime], log)
+        wait_ready(f"http://localhost:{fake_port}/api/v3/depth?symbol={symbols[0].upper()}&limit=1", fake)
+        server = start_process(["websocket_server.py", "--port", str(server_port),
+                                "--binance-url", f"ws://localhost:{fake_port}", "--symbols", args.symbols,
+                                *shlex.split(args.server_args)], log)
+        wait_ready(f"http://localhost:{server_port}/metrics", server)
+
+        ctx = mp.get_context("spawn")
+        for fast_count, slow_count in zip(_split(clients - slow, procs), _split(slow, procs)):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=client_process, daemon=True,
+                                  args=(f"ws://localhost:{server_port}", symbols, fast_count, slow_count,
+                                        args.slow_read_ms, args.slow_rcvbuf, args.late_ms,
+                                        None if args.no_deflate else "deflate", args.filter, child))
+            process.start()
+            workers.append((process, parent))
+        connected = sum(_recv(parent, process, READY_TIMEOUT * 4) for process, parent in workers)
+
+        start = time.time() + args.warmup
+        end = start + args.seconds
+        for _, parent in workers:
+            parent.send((start * 1000, end * 1000))
+        time.sleep(max(start - time.time(), 0))
+        pids = process_tree(server.pid)
+        cpu_start = cpu_seconds(pids)
+        rss_peak = rss_bytes(pids)
+        while time.time() < end:
+            time.sleep(min(RSS_SAMPLE_SECONDS, max(end - time.time(), 0)))
+            rss = rss_bytes(pids)
+            rss_peak = max(rss_peak, rss) if rss is not None else None
+        cpu_end = cpu_seconds(pids)
+        if server.poll() is not None:
+            raise RuntimeError(f"servidor caiu durante a medição (código {server.returncode})")
+
+        parts = [_recv(parent, process, args.seconds + READY_TIMEOUT) for process, parent in workers]
+        stats = server_stats(f"ws://localhost:{server_port}")
+        for _, parent in workers:
+            parent.send(None)
+    finally:
+        for process, _ in workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for process in (server, fake):
+            if process is not None:
+                stop_process(process)
+        if args.server_log:
+            log.close()
+
+    fast_stats = _merge([part["fast"] for part in parts])
+    slow_stats = _merge([part["slow"] for part in parts])
+    return {
+        "target": "server",
+        "regime": f"{rate:g}/s",
+        "mode": f"{clients}c",
+        "rate": rate,
+        "clients": clients,
+        "slow_clients": slow,
+        "connected": connected,
+        "connect_failed": fast_stats["connect_failed"] + slow_stats["connect_failed"],
+        "ticks_per_call": 1,
+        # Mensagens de trade entregues por segundo, somando todos os clientes
+        "ticks_per_sec": (fast_stats["received"] + slow_stats["received"]) / args.seconds,
+        # Bytes das mensagens (já descomprimidas) recebidas por segundo, todos os clientes
+        "bytes_per_sec": (fast_stats["bytes"] + slow_stats["bytes"]) / args.seconds,
+        "latency_ns": _summary(fast_stats["latencies_ms"]),
+        "slow_latency_ns": _summary(slow_stats["latencies_ms"]),
+        "received": fast_stats["received"],
+        "dropped": fast_stats["dropped"],
+        "late": fast_stats["late"],
+        "slow_received": slow_stats["received"],
+        "slow_dropped": slow_stats["dropped"],
+        "slow_late": slow_stats["late"],
+        "disconnected": fast_stats["disconnected"] + slow_stats["disconnected"],
+        # Desde a conexão, somando todos os clientes (o get_stats não separa lentos)
+        "server_dropped": sum(channel["dropped"] for channel in stats["clients"]) if stats else None,
+        "server_max_queue": max((channel["max_queue_depth"] for channel in stats["clients"]), default=0)
+        if stats else None,
+        "cpu_percent": (cpu_end - cpu_start) / args.seconds * 100 if cpu_start is not None else None,
+        "rss_mb": rss_peak / 2 ** 20 if rss_peak is not None else None,
+    }
+
+
+def saturated(result: Dict[str, Any], late_ms: float) -> bool:
+    return bool(result["dropped"]) or result["latency_ns"]["p99"] > late_ms * 1e6
+
+
+# ============================================
+# Relatório
+# ============================================
+def _ratio(part: int, received: int) -> str:
+    total = part + received
+    return f"{part / total:.1%}" if total else "-"
+
+
+def _count(value: int) -> str:
+    return f"{value:,}" if value is not None else "n/d"
+
+
+def print_header():
+    print(f"   {'trades/s':>8} {'clientes':>8} {'lentos':>6} {'entregues/s':>12} {'p50':>9} {'p99':>9} "
+          f"{'p99.9':>9} {'MB/s':>7} {'perdidos':>8} {'atrasados':>9} {'lentos p99':>11} "
+          f"{'desc. servidor':>14} {'fila máx.':>9} {'quedas':>6} {'CPU':>6} {'RSS':>8}")
+
+
+def print_result(result: Dict[str, Any], late_ms: float):
+    lat = result["latency_ns"]
+    cpu = f"{result['cpu_percent']:.0f}%" if result["cpu_percent"] is not None else "n/d"
+    rss = f"{result['rss_mb']:.0f}MB" if result["rss_mb"] is not None else "n/d"
+    slow_p99 = f"{result['slow_latency_ns']['p99'] / 1e6:.1f}ms" if result["slow_clients"] else "-"
+    flag = "⚠️" if saturated(result, late_ms) else "  "
+    print(f"{flag} {result['rate']:>8g} {result['clients']:>8} {result['slow_clients']:>6} "
+          f"{result['ticks_per_sec']:>12,.0f} {lat['p50'] / 1e6:>7.1f}ms {lat['p99'] / 1e6:>7.1f}ms "
+          f"{lat['p999'] / 1e6:>7.1f}ms {result['bytes_per_sec'] / 2 ** 20:>7.2f} "
+          f"{_ratio(result['dropped'], result['received']):>8} "
+          f"{_ratio(result['late'], result['received']):>9} {slow_p99:>11} "
+          f"{_count(result['server_dropped']):>14} {_count(result['server_max_queue']):>9} "
+          f"{result['disconnected']:>6} {cpu:>6} {rss:>8}")
+    if result["connect_failed"]:
+        print(f"   ⚠️ {result['connect_failed']} clientes não conectaram")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga ponta a ponta do servidor WebSocket")
+    parser.add_argument("--clients", default="100,500,1000", help="números de clientes separados por vírgula")
+    parser.add_argument("--rates", default="50,200", help="trades/s por símbolo no fake, separados por vírgula")
+    parser.add_argument("--symbols", default="btcusdt", help="pares separados por vírgula (todos os clientes "
+                                                            "se inscrevem em todos)")
+    parser.add_argument("--regime", default="bursty", help="calm, bursty ou flash_crash")
+    parser.add_argument("--slow-share", type=float, default=0.05, help="fração de clientes lentos")
+    parser.add_argument("--slow-read-ms", type=float, default=50.0,
+                        help="espera dos clientes lentos depois de cada mensagem")
+    parser.add_argument("--slow-rcvbuf", type=int, default=16384,
+                        help="SO_RCVBUF dos clientes lentos em bytes (0 = padrão do sistema)")
+    parser.add_argument("--no-deflate", action="store_true",
+                        help="clientes sem permessage-deflate (os navegadores negociam compressão)")
+    parser.add_argument("--filter", action="append", default=[], metavar="CONDIÇÃO",
+                        help="filtro de trades de todos os clientes (set_filter, ver trade_filter.py); "
+                             "repetir para um E, ex.: --filter \"is_absorption == true\"")
+    parser.add_argument("--late-ms", type=float, default=250.0, help="latência a partir da qual um trade "
+                                                                     "conta como atrasado")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duração da medição de cada célula")
+    parser.add_argument("--warmup", type=float, default=3.0, help="espera entre conectar e medir")
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="processos que abrem os clientes")
+    parser.add_argument("--server-args", default="", help="argumentos extras do websocket_server.py "
+                                                         "(ex.: \"--workers 2 --queue-size 200\")")
+    parser.add_argument("--server-log", default=None, help="arquivo para a saída do servidor e do fake")
+    parser.add_argument("--output", default="bench_load.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+    _raise_fd_limit()
+
+    rates = [float(rate) for rate in args.rates.split(",")]
+    client_counts = [int(count) for count in args.clients.split(",")]
+    print(f"🔥 {len(rates) * len(client_counts)} células, {args.seconds:g}s cada "
+          f"({args.slow_share:.0%} de clientes lentos, {args.client_procs} processos de clientes)\n")
+    print_header()
+    results = []
+    for rate in rates:
+        for clients in client_counts:
+            result = run_cell(rate, clients, args)
+            print_result(result, args.late_ms)
+            results.append(result)
+
+    params = {key: getattr(args, key) for key in ("clients", "rates", "symbols", "regime", "slow_share",
+                                                  "slow_read_ms", "slow_rcvbuf", "no_deflate", "filter", "late_ms", "seconds", "warmup",
+                                                  "client_procs", "server_args")}
+    write_results(args.output, "load", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
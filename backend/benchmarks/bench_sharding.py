@@ -0,0 +1,280 @@
+"""
+Benchmark do modo multiprocesso (sharding.py).
+
+O processo do benchmark faz o papel da ingestão (empurra registros RAW
+nos rings dos workers, em lotes de --batch trades de vários símbolos) e do
+fan-out (lê os rings de saída e remonta os payloads com o mesmo
+ShardedFeed._deliver do servidor). Os workers são os mesmos processos de
+engines do servidor.
+
+Para cada número de workers:
+    - max: empurra tudo o mais rápido que os rings aceitam (vazão)
+    - rate{R}: lotes no ritmo de R trades/s; a latência é do push do lote
+      até o payload do trade sair do ring de saída
+
+"inline" é a referência de um processo: os mesmos lotes passando por um
+BinanceDataFeed por símbolo (latência = processar o lote inteiro).
+
+Um símbolo nunca se divide entre workers: o ganho só aparece com vários
+símbolos (--symbols) e vários núcleos livres.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_sharding
+    python -m benchmarks.bench_sharding --symbols 8 --workers 1,2,4,8 --rate 50000
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import time
+from typing import Dict, Any, List
+import numpy as np
+from binance_ws import BinanceDataFeed
+from shared_engines import EnginePipeline, SharedEngineOrchestrator
+from sharding import (ShardedFeed, engine_worker, shard_of, _pipeline_config,
+                      RAW_DTYPE, OUT_DTYPE, RAW_RING_SIZE, OUT_RING_SIZE, MAX_BATCH)
+from shm_ring import ShmRing
+from benchmarks.bench_engines import ORCHESTRATOR_CONFIGS
+from benchmarks.harness import latency_summary, write_results, load_results, print_comparison
+from benchmarks.synthetic import generate_trades
+
+SYMBOL_NAMES = ["btcusdt", "ethusdt", "solusdt", "bnbusdt", "xrpusdt", "dogeusdt", "adausdt", "avaxusdt"]
+
+
+def _result(target: str, regime: str, mode: str, trades: int, seconds: float, latencies_ns) -> Dict[str, Any]:
+    return {
+        "target": target,
+        "regime": regime,
+        "mode": mode,
+        "ticks_per_call": 1,
+        "ticks_per_sec": trades / seconds,
+        "latency_ns": latency_summary(np.asarray(latencies_ns, dtype=np.float64)),
+    }
+
+
+def _symbols(count: int) -> List[str]:
+    return [SYMBOL_NAMES[i] if i < len(SYMBOL_NAMES) else f"sym{i}usdt" for i in range(count)]
+
+
+def _pipelines(count: int) -> List[EnginePipeline]:
+    configs = list(ORCHESTRATOR_CONFIGS.values())[:count]
+    return [EnginePipeline(list(weights), weights) for weights in configs]
+
+
+def build_batches(symbols: List[str], regime: str, n: int, seed: int, batch: int) -> List[np.ndarray]:
+    """Lotes RAW como a ingestão os produz: trades dos símbolos intercalados."""
+    per_symbol = []
+    for i in range(len(symbols)):
+        trades = generate_trades(regime, n, seed=seed + i)
+        rows = np.zeros(n, dtype=RAW_DTYPE)
+        rows["trade_id"] = trades["trade_id"]
+        rows["trade_time"] = trades["trade_time"]
+        rows["event_time"] = trades["trade_time"]
+        rows["price"] = trades["price"]
+        rows["quantity"] = trades["quantity"]
+        rows["symbol"] = i
+        rows["is_maker"] = trades["is_maker"]
+        per_symbol.append(rows)
+    # Intercala: o k-ésimo trade de cada símbolo, símbolo a símbolo
+    stream = np.stack(per_symbol, axis=1).reshape(-1)
+    return [stream[start:start + batch] for start in range(0, len(stream), batch)]
+
+
+def to_messages_raw(rows: np.ndarray) -> List[Dict[str, Any]]:
+    """Mensagens @trade a partir de registros RAW (como EngineWorker.process)."""
+    return [
+        {"t": trade_id, "T": trade_time, "E": event_time, "p": price, "q": qty, "m": bool(is_maker)}
+        for trade_id, trade_time, event_time, price, qty, is_maker in zip(
+            rows["trade_id"].tolist(), rows["trade_time"].tolist(), rows["event_time"].tolist(),
+            rows["price"].tolist(), rows["quantity"].tolist(), rows["is_maker"].tolist(),
+        )
+    ]
+
+
+def run_inline(symbols: List[str], pipelines: List[EnginePipeline], batches: List[np.ndarray]) -> tuple:
+    feeds = []
+    for symbol in symbols:
+        orchestrator = SharedEngineOrchestrator()
+        for pipeline in pipelines:
+            orchestrator.add_pipeline(pipeline)
+        feed = BinanceDataFeed(symbol, orchestrator=orchestrator)
+        feed.log_interval = 0
+        feeds.append(feed)
+    messages = [
+        [(i, to_messages_raw(batch[batch["symbol"] == i])) for i in range(len(symbols))]
+        for batch in batches
+    ]
+
+    async def collect(payload):
+        pass
+
+    async def run():
+        latencies = []
+        start = time.perf_counter()
+        for batch in messages:
+            t0 = time.perf_counter_ns()
+            for i, symbol_messages in batch:
+                if symbol_messages:
+                    await feeds[i]._process_batch(symbol_messages, collect)
+            latencies.append(time.perf_counter_ns() - t0)
+        return time.perf_counter() - start, latencies
+
+    return asyncio.run(run())
+
+
+def start_workers(feed: ShardedFeed, max_batch: int):
+    """O que ShardedFeed.start() faz, sem o processo de ingestão."""
+    ctx = feed._ctx
+    feed._stop = ctx.Event()
+    feed._events = ctx.Queue()
+    feed._raw_rings = [ShmRing.create(RAW_DTYPE, RAW_RING_SIZE) for _ in range(feed.workers)]
+    feed._out_rings = [ShmRing.create(OUT_DTYPE, OUT_RING_SIZE) for _ in range(feed.workers)]
+    feed._controls = [ctx.Queue() for _ in range(feed.workers)]
+    for shard in range(feed.workers):
+        pipelines = [
+            (orchestrator.symbol_index, feed.pipeline_number(pipeline), _pipeline_config(pipeline))
+            for orchestrator in feed.orchestrators.values()
+            if shard_of(orchestrator.symbol_index, feed.workers) == shard
+            for pipeline in orchestrator.pipelines.values()
+        ]
+        feed._processes.append(ctx.Process(
+            target=engine_worker, name=f"engine-worker-{shard}", daemon=True,
+            args=(shard, feed.symbols, feed._raw_rings[shard].name, feed._out_rings[shard].name, pipelines,
+                  feed._controls[shard], feed._events, feed._stop, feed.history_size, max_batch),
+        ))
+    for process in feed._processes:
+        process.start()
+    feed.running = True
+    ready = 0
+    while ready < feed.workers:
+        event = feed._events.get(timeout=60)
+        if event[0] == "ready":
+            ready += 1
+
+
+def run_sharded(symbols: List[str], pipelines: List[EnginePipeline], batches: List[np.ndarray],
+                workers: int, rate: float, max_batch: int) -> tuple:
+    feed = ShardedFeed(symbols, workers)
+    for orchestrator in feed.orchestrators.values():
+        for pipeline in pipelines:
+            orchestrator.add_pipeline(pipeline)
+    start_workers(feed, max_batch)
+
+    # Trade (símbolo, trade_count) → lote em que entrou
+    batch_of = [[] for _ in symbols]
+    for index, batch in enumerate(batches):
+        for i in batch["symbol"].tolist():
+            batch_of[i].append(index)
+    first_pipeline = feed.pipeline_number(pipelines[0])
+    total = sum(len(batch) for batch in batches)
+    push_ns = np.zeros(len(batches), dtype=np.int64)
+    latencies = []
+    delivered = 0
+
+    async def count(payload):
+        pass
+
+    async def run():
+        nonlocal delivered
+        pending = [None] * feed.workers
+        next_batch = 0
+        start = time.perf_counter()
+        while delivered < total:
+            now = time.perf_counter()
+            if next_batch < len(batches) and all(rows is None for rows in pending) and \
+                    (not rate or now - start >= next_batch * len(batches[0]) / rate):
+                batch = batches[next_batch]
+                push_ns[next_batch] = time.perf_counter_ns()
+                shards = batch["symbol"] % feed.workers
+                for shard in range(feed.workers):
+                    rows = batch[shards == shard]
+                    if len(rows):
+                        pending[shard] = rows
+                next_batch += 1
+            for shard, rows in enumerate(pending):
+                if rows is not None:
+                    rows = rows[feed._raw_rings[shard].push(rows):]
+                    pending[shard] = rows if len(rows) else None
+            for shard, ring in enumerate(feed._out_rings):
+                rows = ring.pop(MAX_BATCH)
+                if not len(rows):
+                    continue
+                popped = time.perf_counter_ns()
+                feed._handle_events()
+                await feed._deliver(shard, rows, count)
+                mine = rows[rows["pipeline"] == first_pipeline]
+                for i, trade_count in zip(mine["symbol"].tolist(), mine["trade_count"].tolist()):
+                    latencies.append(popped - push_ns[batch_of[i][trade_count - 1]])
+                delivered += len(mine)
+            await asyncio.sleep(0)
+        return time.perf_counter() - start
+
+    try:
+        seconds = asyncio.run(run())
+    finally:
+        feed.stop()
+    return seconds, latencies
+
+
+def run(symbol_count: int, n: int, seed: int, regime: str, batch: int, pipeline_count: int,
+        workers_list: List[int], rate: float, max_batch: int) -> List[Dict[str, Any]]:
+    symbols = _symbols(symbol_count)
+    pipelines = _pipelines(pipeline_count)
+    batches = build_batches(symbols, regime, n, seed, batch)
+    total = sum(len(b) for b in batches)
+    results = []
+
+    seconds, latencies = run_inline(symbols, pipelines, batches)
+    results.append(_result("inline", regime, "max", total, seconds, latencies))
+
+    for workers in workers_list:
+        target = f"workers:{min(workers, symbol_count)}"
+        seconds, latencies = run_sharded(symbols, pipelines, batches, workers, 0, max_batch)
+        results.append(_result(target, regime, "max", total, seconds, latencies))
+        if rate:
+            seconds, latencies = run_sharded(symbols, pipelines, batches, workers, rate, max_batch)
+            results.append(_result(target, regime, f"rate{int(rate)}", total, seconds, latencies))
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<12} {'regime':<12} {'modo':<12} {'trades/s':>12} {'p50':>10} {'p99':>10} {'p999':>10}")
+    for r in results:
+        lat = r["latency_ns"]
+        print(f"{r['target']:<12} {r['regime']:<12} {r['mode']:<12} {r['ticks_per_sec']:>12,.0f} "
+              f"{lat['p50'] / 1e6:>8.2f}ms {lat['p99'] / 1e6:>8.2f}ms {lat['p999'] / 1e6:>8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do modo multiprocesso (workers de engines)")
+    parser.add_argument("--symbols", type=int, default=4, help="símbolos simultâneos")
+    parser.add_argument("--ticks", type=int, default=20000, help="trades sintéticos por símbolo")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regime", default="bursty")
+    parser.add_argument("--batch", type=int, default=100, help="trades por lote da ingestão")
+    parser.add_argument("--pipelines", type=int, default=2, help="pipelines de engines por símbolo")
+    parser.add_argument("--workers", default="1,2,4", help="números de workers separados por vírgula")
+    parser.add_argument("--rate", type=float, default=20000, help="trades/s no modo com ritmo (0 = só vazão)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="registros por leitura do ring RAW")
+    parser.add_argument("--output", default="bench_sharding.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    workers_list = [int(w) for w in args.workers.split(",")]
+    print(f"🧵 {mp.cpu_count()} núcleos; {args.symbols} símbolos x {args.ticks} trades")
+    results = run(args.symbols, args.ticks, args.seed, args.regime, args.batch, args.pipelines,
+                  workers_list, args.rate, args.max_batch)
+    print_results(results)
+
+    params = {"symbols": args.symbols, "ticks": args.ticks, "seed": args.seed, "regime": args.regime,
+              "batch": args.batch, "pipelines": args.pipelines, "workers": workers_list, "rate": args.rate,
+              "max_batch": args.max_batch}
+    write_results(args.output, "sharding", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Benchmark do frontend servido pelo loop do WebSocket (static_assets.py).
+
+Mede:
+    - handler: custo de montar uma resposta. "disk" é o que o antigo
+      SimpleHTTPRequestHandler fazia por requisição (abrir e ler o
+      index.html); "memory" é a resposta em memória com gzip e
+      "revalidate" o 304 de um reload com ETag
+    - wave: --reloads GETs de --concurrency clientes contra um servidor
+      de verdade, no ritmo de --rate reloads/s, enquanto o loop do asyncio
+      roda um "trade" a cada 1ms.
+      A latência é o atraso desse tick (o quanto os reloads atrapalham a
+      entrega dos trades); "thread" é o antigo HTTPServer numa thread,
+      "loop" o process_request na porta do WebSocket
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_static
+    python -m benchmarks.bench_static --reloads 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import functools
+import http.client
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from typing import Dict, Any, List
+import numpy as np
+import websockets
+from static_assets import StaticAssets, find_frontend_dir, http_response
+from benchmarks.harness import measure, latency_summary, write_results, load_results, print_comparison
+
+TICK_SECONDS = 0.001
+PATH = "/index.html"
+
+
+def _result(target: str, mode: str, calls_per_sec: float, latency_ns: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "target": target,
+        "regime": "index.html",
+        "mode": mode,
+        "ticks_per_call": 1,
+        "ticks_per_sec": calls_per_sec,
+        "latency_ns": latency_ns,
+    }
+
+
+def run_handlers(frontend_dir: str) -> List[Dict[str, Any]]:
+    assets = StaticAssets(frontend_dir)
+    path = os.path.join(frontend_dir, "index.html")
+    gzip_headers = {"Accept-Encoding": "gzip, deflate, br"}
+    etag = assets.response("/", gzip_headers)[1][0][1]
+    revalidate_headers = {**gzip_headers, "If-None-Match": etag}
+
+    def read_disk(i):
+        with open(path, "rb") as f:
+            return f.read()
+
+    cases = [
+        ("disk", lambda: read_disk),
+        ("memory", lambda: (lambda i: assets.response("/", gzip_headers))),
+        ("revalidate", lambda: (lambda i: assets.response("/", revalidate_headers))),
+    ]
+    results = []
+    for mode, setup in cases:
+        measured = measure(setup, 20000)
+        results.append(_result("handler", mode, measured["calls_per_sec"], measured["latency_ns"]))
+    return results
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _get(port: int, path: str, headers: Dict[str, str]):
+    """GET cru (urllib trata 304 como erro); devolve a resposta já lida."""
+    connection = http.client.HTTPConnection("localhost", port, timeout=10)
+    try:
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response
+    finally:
+        connection.close()
+
+
+async def _wave(port: int, reloads: int, concurrency: int, rate: float, headers: Dict[str, str]) -> tuple:
+    """Dispara os reloads e mede o atraso de um tick de 1ms no loop."""
+    lateness = []
+    done = asyncio.Event()
+
+    async def ticker():
+        expected = time.perf_counter() + TICK_SECONDS
+        while not done.is_set():
+            await asyncio.sleep(TICK_SECONDS)
+            now = time.perf_counter()
+            lateness.append(max(0.0, now - expected) * 1e9)
+            expected = now + TICK_SECONDS
+
+    def fire():
+        with ThreadPoolExecutor(concurrency) as pool:
+            futures = []
+            for i in range(reloads):
+                if rate:
+                    delay = start + i / rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(pool.submit(_get, port, PATH, headers))
+            for future in futures:
+                future.result()
+
+    task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.to_thread(fire)
+    seconds = time.perf_counter() - start
+    done.set()
+    await task
+    return reloads / seconds, latency_summary(np.asarray(lateness))
+
+
+async def run_waves(frontend_dir: str, reloads: int, concurrency: int, rate: float, port: int) -> List[Dict[str, Any]]:
+    results = []
+    for mode, headers in (("reload", {"Accept-Encoding": "gzip"}), ("revalidate", None)):
+        # Antes: HTTPServer de uma thread, arquivo lido a cada requisição
+        httpd = HTTPServer(("localhost", port), functools.partial(_QuietHandler, directory=frontend_dir))
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        if headers is None:
+            last_modified = _get(port, PATH, {}).getheader("Last-Modified")
+            headers = {"Accept-Encoding": "gzip", "If-Modified-Since": last_modified}
+        rate, lateness = await _wave(port, reloads, concurrency, rate, headers)
+        httpd.shutdown()
+        httpd.server_close()
+        results.append(_result("wave:thread", mode, rate, lateness))
+
+        # Agora: na porta do WebSocket, do loop, em memória
+        assets = StaticAssets(frontend_dir)
+
+        def process_request(connection, request):
+            return http_response(*assets.response(request.path, request.headers))
+
+        async with websockets.serve(None, "localhost", port, process_request=process_request):
+            if mode == "revalidate":
+                headers = {"Accept-Encoding": "gzip",
+                           "If-None-Match": assets.response("/", {"Accept-Encoding": "gzip"})[1][0][1]}
+            rate, lateness = await _wave(port, reloads, concurrency, rate, headers)
+        results.append(_result("wave:loop", mode, rate, lateness))
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<12} {'modo':<12} {'req/s':>12} {'p50':>10} {'p99':>10} {'p999':>10}")
+    for r in results:
+        lat = r["latency_ns"]
+        print(f"{r['target']:<12} {r['mode']:<12} {r['ticks_per_sec']:>12,.0f} "
+              f"{lat['p50'] / 1000:>8.1f}µs {lat['p99'] / 1000:>8.1f}µs {lat['p999'] / 1000:>8.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do frontend servido em memória")
+    parser.add_argument("--reloads", type=int, default=1000, help="requisições por onda de reloads")
+    parser.add_argument("--concurrency", type=int, default=20, help="clientes simultâneos")
+    parser.add_argument("--rate", type=float, default=400,
+                        help="reloads/s (mesma carga nos dois servidores; 0 = o mais rápido possível)")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--output", default="bench_static.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    frontend_dir = find_frontend_dir()
+    if frontend_dir is None:
+        raise SystemExit("Diretório frontend não encontrado")
+    results = run_handlers(frontend_dir)
+    results += asyncio.run(run_waves(frontend_dir, args.reloads, args.concurrency, args.rate, args.port))
+    print("(wave: p50/p99 = atraso do tick de 1ms do loop durante os reloads)")
+    print_results(results)
+
+    params = {"reloads": args.reloads, "concurrency": args.concurrency, "rate": args.rate}
+    write_results(args.output, "static", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
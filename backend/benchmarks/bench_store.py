@@ -0,0 +1,149 @@
+"""
+Benchmark do armazenamento colunar de trades (tick_store.py).
+
+Mede:
+    - append: um trade no caminho quente (o que o feed paga por trade)
+    - extend{N}: lotes de N trades (caminho vetorizado do feed)
+    - query: leitura via memmap de um dia inteiro e de uma hora
+    - bars: barras de 1 minuto de um dia inteiro (o que GET /history faz)
+
+A escrita em disco roda na thread do TickStore; append/extend só medem o
+custo no loop. O dia sintético tem --day-trades trades espalhados em 24h
+(o BTCUSDT passa de 1 milhão de trades num dia agitado).
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_store
+    python -m benchmarks.bench_store --day-trades 3000000
+"""
+import argparse
+import tempfile
+from typing import Dict, Any, List
+import numpy as np
+from tick_store import TickStore, DAY_MS
+from benchmarks.harness import measure, write_results, load_results, print_comparison
+from benchmarks.synthetic import REGIMES, START_TIME_MS, generate_trades
+
+
+def _result(target: str, regime: str, mode: str, measured: Dict[str, Any], trades_per_call: int) -> Dict[str, Any]:
+    return {
+        "target": target,
+        "regime": regime,
+        "mode": mode,
+        "ticks_per_call": trades_per_call,
+        "ticks_per_sec": measured["calls_per_sec"] * trades_per_call,
+        "latency_ns": measured["latency_ns"],
+    }
+
+
+def _rows(trades: np.ndarray) -> List[tuple]:
+    """Argumentos de append() na mesma conversão de BinanceDataFeed._process_trade."""
+    rows = []
+    for record in trades:
+        price = float(record["price"])
+        qty = float(record["quantity"])
+        side = "sell" if record["is_maker"] else "buy"
+        rows.append((int(record["trade_id"]), int(record["trade_time"]), price, qty, side, side, price * qty, False))
+    return rows
+
+
+def run_writes(root: str, n: int, seed: int, regimes: List[str], batch: int) -> List[Dict[str, Any]]:
+    results = []
+    stores = []
+
+    def store():
+        stores.append(TickStore(root))
+        return stores[-1]
+
+    for regime in regimes:
+        trades = generate_trades(regime, n, seed=seed)
+        rows = _rows(trades)
+
+        def setup_append():
+            append = store().append
+            return lambda i: append("btcusdt", *rows[i])
+
+        results.append(_result("store", regime, "append", measure(setup_append, len(rows)), 1))
+
+        columns = [np.array(values) for values in zip(*rows)]
+        batches = [[values[start:start + batch] for values in columns] for start in range(0, len(rows), batch)]
+
+        def setup_extend():
+            extend = store().extend
+            return lambda i: extend("btcusdt", *batches[i])
+
+        results.append(_result("store", regime, f"extend{batch}", measure(setup_extend, len(batches)), batch))
+
+    for s in stores:
+        s.close()
+    return results
+
+
+def run_reads(root: str, day_trades: int, seed: int) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    day = START_TIME_MS // DAY_MS * DAY_MS
+    timestamps = day + np.sort(rng.integers(0, DAY_MS, day_trades))
+    prices = 60000.0 + rng.normal(0, 2, day_trades).cumsum()
+    qtys = rng.exponential(0.05, day_trades)
+    sides = rng.integers(1, 3, day_trades).astype(np.int8)
+
+    writer = TickStore(root)
+    chunk = 100_000
+    for start in range(0, day_trades, chunk):
+        end = start + chunk
+        writer.extend("btcusdt", np.arange(start, min(end, day_trades)), timestamps[start:end], prices[start:end],
+                      qtys[start:end], sides[start:end], sides[start:end], (prices * qtys)[start:end],
+                      np.zeros(len(timestamps[start:end]), dtype=bool))
+    writer.close(timeout=120)
+
+    store = TickStore(root)
+    hour = day + 12 * 3_600_000
+    hour_trades = len(store.query("btcusdt", hour, hour + 3_600_000, ("timestamp",))["timestamp"])
+    cases = [
+        ("query_day", day_trades, lambda: store.query("btcusdt", day, day + DAY_MS)),
+        ("query_hour", hour_trades, lambda: store.query("btcusdt", hour, hour + 3_600_000)),
+        ("bars_day_1m", day_trades, lambda: store.bars("btcusdt", day, day + DAY_MS, 60_000)),
+    ]
+    results = []
+    for mode, trades, call in cases:
+        results.append(_result("store", "day", mode, measure(lambda: (lambda i: call()), 20), trades))
+    store.close()
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<8} {'regime':<12} {'modo':<14} {'trades/s':>16} {'p50':>12} {'p99':>12}")
+    for r in results:
+        lat = r["latency_ns"]
+        print(f"{r['target']:<8} {r['regime']:<12} {r['mode']:<14} {r['ticks_per_sec']:>16,.0f} "
+              f"{lat['p50'] / 1000:>10.1f}µs {lat['p99'] / 1000:>10.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do armazenamento colunar de trades")
+    parser.add_argument("--ticks", type=int, default=50000, help="trades sintéticos por regime (escrita)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regimes", default=",".join(REGIMES), help="regimes separados por vírgula")
+    parser.add_argument("--batch", type=int, default=512, help="trades por chamada de extend")
+    parser.add_argument("--day-trades", type=int, default=1_000_000, help="trades do dia sintético (leitura)")
+    parser.add_argument("--output", default="bench_store.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    regimes = args.regimes.split(",")
+    with tempfile.TemporaryDirectory() as write_root, tempfile.TemporaryDirectory() as read_root:
+        results = run_writes(write_root, args.ticks, args.seed, regimes, args.batch)
+        results += run_reads(read_root, args.day_trades, args.seed)
+    print_results(results)
+
+    params = {"ticks": args.ticks, "seed": args.seed, "regimes": regimes, "batch": args.batch,
+              "day_trades": args.day_trades}
+    write_results(args.output, "store", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark do formato de fio: JSON (json.dumps, o caminho atual) contra o
+protocolo binário colunar (wire_format.py).
+
+Os payloads são os mesmos que o servidor envia: trades sintéticos passam
+por BinanceDataFeed._process_trade com os engines padrão do servidor. Mede
+bytes por trade e tempo de codificação por trade para:
+    - trade a trade (cadência "tempo real")
+    - frames conflacionados de N trades (--frame-sizes)
+
+e confere que o decodificador de referência reconstrói os payloads.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_wire
+    python -m benchmarks.bench_wire --ticks 50000 --frame-sizes 10,100,1000
+"""
+import argparse
+import asyncio
+import json
+from typing import Dict, Any, List
+from binance_ws import BinanceDataFeed
+from conflation import TradeConflator
+from engine_orchestrator import VolumeEngineOrchestrator
+from wire_format import WireEncoder, WireDecoder
+from benchmarks.bench_engines import ORCHESTRATOR_CONFIGS
+from benchmarks.harness import measure, write_results, load_results, print_comparison
+from benchmarks.synthetic import REGIMES, generate_trades, to_messages
+
+
+def build_payloads(trades, weights: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Payloads exatamente como o servidor os monta para os clientes."""
+    feed = BinanceDataFeed(symbol="btcusdt",
+                           orchestrator=VolumeEngineOrchestrator(engine_names=list(weights), weights=weights))
+    feed.log_interval = 0
+    payloads = []
+
+    async def collect(payload):
+        payloads.append(payload)
+
+    async def run():
+        for message in to_messages(trades):
+            await feed._process_trade(message, collect)
+
+    asyncio.run(run())
+    return payloads
+
+
+def build_frames(payloads: List[Dict[str, Any]], frame_size: int) -> List[Dict[str, Any]]:
+    conflator = TradeConflator("btcusdt", 250)
+    frames = []
+    for start in range(0, len(payloads), frame_size):
+        for payload in payloads[start:start + frame_size]:
+            conflator.add(payload)
+        frames.append(conflator.flush())
+    return frames
+
+
+def check_roundtrip(encoder: WireEncoder, payloads, frames):
+    decoder = WireDecoder()
+    data = [encoder.encode_trade(p) for p in payloads[:1000]] + [encoder.encode_frame(f) for f in frames[:10]]
+    decoder.decode(encoder.table_message())
+    decoded = [decoder.decode(d) for d in data]
+    expected = payloads[:1000] + frames[:10]
+    if decoded != expected:
+        raise AssertionError("Protocolo binário não reconstrói os payloads originais")
+
+
+def _result(target: str, regime: str, mode: str, measured: Dict[str, Any],
+            trades_per_call: int, total_bytes: int, total_trades: int) -> Dict[str, Any]:
+    return {
+        "target": target,
+        "regime": regime,
+        "mode": mode,
+        "ticks_per_call": trades_per_call,
+        "ticks_per_sec": measured["calls_per_sec"] * trades_per_call,
+        "ns_per_trade": 1e9 / (measured["calls_per_sec"] * trades_per_call),
+        "bytes_per_trade": total_bytes / total_trades,
+        "latency_ns": measured["latency_ns"],
+    }
+
+
+def run(n: int, seed: int, regimes: List[str], frame_sizes: List[int], config: str) -> List[Dict[str, Any]]:
+    results = []
+    for regime in regimes:
+        payloads = build_payloads(generate_trades(regime, n, seed=seed), ORCHESTRATOR_CONFIGS[config])
+        encoder = WireEncoder()
+
+        encoders = {
+            "json": json.dumps,
+            "binary": encoder.encode_trade,
+        }
+        for name, encode in encoders.items():
+            total_bytes = sum(len(encode(p)) for p in payloads)
+            measured = measure(lambda: (lambda i: encode(payloads[i])), len(payloads))
+            results.append(_result(f"wire:{name}", regime, "trade", measured, 1, total_bytes, len(payloads)))
+
+        for frame_size in frame_sizes:
+            frames = build_frames(payloads, frame_size)
+            check_roundtrip(encoder, payloads, frames)
+            for name, encode in (("json", json.dumps), ("binary", encoder.encode_frame)):
+                total_bytes = sum(len(encode(f)) for f in frames)
+                measured = measure(lambda: (lambda i: encode(frames[i])), len(frames))
+                results.append(_result(f"wire:{name}", regime, f"frame{frame_size}", measured,
+                                       frame_size, total_bytes, len(payloads)))
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    print(f"{'alvo':<14} {'regime':<12} {'modo':<10} {'bytes/trade':>12} {'ns/trade':>10} {'trades/s':>12}")
+    for r in results:
+        print(f"{r['target']:<14} {r['regime']:<12} {r['mode']:<10} {r['bytes_per_trade']:>12.1f} "
+              f"{r['ns_per_trade']:>10.0f} {r['ticks_per_sec']:>12,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do formato de fio (JSON x binário)")
+    parser.add_argument("--ticks", type=int, default=20000, help="trades sintéticos por regime")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regimes", default=",".join(REGIMES), help="regimes separados por vírgula")
+    parser.add_argument("--frame-sizes", default="10,100,1000", help="trades por frame conflacionado")
+    parser.add_argument("--config", default="server_default", choices=list(ORCHESTRATOR_CONFIGS),
+                        help="engines usados para montar os payloads")
+    parser.add_argument("--output", default="bench_wire.json", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    regimes = args.regimes.split(",")
+    frame_sizes = [int(size) for size in args.frame_sizes.split(",")]
+    results = run(args.ticks, args.seed, regimes, frame_sizes, args.config)
+    print_results(results)
+
+    params = {"ticks": args.ticks, "seed": args.seed, "regimes": regimes,
+              "frame_sizes": frame_sizes, "config": args.config}
+    write_results(args.output, "wire", params, results)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.compare:
+        print(f"\n📊 Comparação com {args.compare}:")
+        print_comparison(results, load_results(args.compare)["results"])
+
+
+if __name__ == "__main__":
+    main()
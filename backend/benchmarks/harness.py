@@ -0,0 +1,110 @@
+"""
+Utilitários comuns dos benchmarks: medição de latência por chamada,
+percentis e gravação dos resultados em JSON (com metadados do commit)
+para comparação entre versões.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Callable, Dict, Any, List
+import numpy as np
+
+
+def latency_summary(samples_ns: np.ndarray) -> Dict[str, float]:
+    """p50/p99/p999 e média, em nanossegundos."""
+    p50, p99, p999 = np.percentile(samples_ns, [50, 99, 99.9])
+    return {
+        "p50": float(p50),
+        "p99": float(p99),
+        "p999": float(p999),
+        "mean": float(samples_ns.mean()),
+    }
+
+
+def measure(setup: Callable[[], Callable[[int], Any]], n: int) -> Dict[str, Any]:
+    """Mede call(i) para i em [0, n), com call = setup().
+
+    Faz uma passada sem cronômetro por chamada (vazão em chamadas/s) e
+    outra medindo cada chamada (latência). Cada passada recebe um call novo
+    de setup(), para que o estado dos engines (janelas, tempo do evento)
+    comece do zero nas duas."""
+    perf_counter_ns = time.perf_counter_ns
+
+    call = setup()
+    started = perf_counter_ns()
+    for i in range(n):
+        call(i)
+    elapsed_ns = perf_counter_ns() - started
+
+    call = setup()
+    samples = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        t0 = perf_counter_ns()
+        call(i)
+        samples[i] = perf_counter_ns() - t0
+
+    return {
+        "calls": n,
+        "calls_per_sec": n / (elapsed_ns / 1e9) if elapsed_ns else float("inf"),
+        "latency_ns": latency_summary(samples),
+    }
+
+
+def run_metadata() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: str, suite: str, params: Dict[str, Any], results: List[Dict[str, Any]]):
+    document = {
+        "suite": suite,
+        "meta": run_metadata(),
+        "params": params,
+        "results": results,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    return "/".join(str(result[k]) for k in ("target", "regime", "mode") if k in result)
+
+
+def print_comparison(current: List[Dict[str, Any]], baseline: List[Dict[str, Any]]):
+    """Imprime a variação de vazão e p99 em relação a um resultado anterior."""
+    previous = {result_key(r): r for r in baseline}
+    for result in current:
+        key = result_key(result)
+        if key not in previous:
+            continue
+        old = previous[key]
+        speedup = result["ticks_per_sec"] / old["ticks_per_sec"] if old["ticks_per_sec"] else float("nan")
+        p99_ratio = result["latency_ns"]["p99"] / old["latency_ns"]["p99"] if old["latency_ns"]["p99"] else float("nan")
+        flag = "⚠️" if speedup < 0.9 else "  "
+        print(f"{flag} {key:<50} vazão x{speedup:5.2f}   p99 x{p99_ratio:5.2f}")
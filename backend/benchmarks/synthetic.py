@@ -0,0 +1,90 @@
+"""
+Gerador sintético de trades (determinístico, com seed) para benchmarks.
+
+Regimes:
+    calm        - fluxo calmo (~20 trades/s), passos de preço pequenos
+    bursty      - períodos calmos intercalados com rajadas de milhares de trades/s
+    flash_crash - mercado calmo, queda brusca com venda agressiva e recuperação parcial
+
+Os trades saem no mesmo layout de registro do TradeRecorder (RECORD_DTYPE),
+então podem ser gravados, reproduzidos ou convertidos em ticks/mensagens.
+"""
+from typing import Dict, Any, List
+import numpy as np
+from trade_recorder import RECORD_DTYPE, record_to_message, records_to_columns
+from volume_engines.base import Tick
+
+REGIMES = ("calm", "bursty", "flash_crash")
+START_TIME_MS = 1_700_000_000_000
+
+
+def generate_trades(regime: str, n: int, seed: int = 42, start_price: float = 60000.0) -> np.ndarray:
+    """Gera n trades no regime pedido. Mesmo (regime, n, seed) → mesmo resultado."""
+    if regime not in REGIMES:
+        raise ValueError(f"Regime desconhecido: {regime} (use {', '.join(REGIMES)})")
+
+    rng = np.random.default_rng(seed)
+
+    if regime == "calm":
+        rate = np.full(n, 20.0)
+        volatility = np.full(n, 0.5)
+        sell_bias = np.full(n, 0.5)
+        drift = np.zeros(n)
+    elif regime == "bursty":
+        # Alterna blocos calmos e rajadas com volatilidade agrupada
+        bursts = np.repeat(rng.random(n // 500 + 1) < 0.3, 500)[:n]
+        rate = np.where(bursts, 3000.0, 30.0)
+        volatility = np.where(bursts, 4.0, 0.5)
+        sell_bias = np.full(n, 0.5)
+        drift = np.zeros(n)
+    else:
+        # 40% calmo, 20% queda (~5%), 40% recuperação parcial
+        crash_start, crash_end = int(n * 0.4), int(n * 0.6)
+        phase = np.zeros(n, dtype=np.int8)
+        phase[crash_start:crash_end] = 1
+        phase[crash_end:] = 2
+        crash_len = max(crash_end - crash_start, 1)
+        rate = np.select([phase == 1, phase == 2], [5000.0, 500.0], 20.0)
+        volatility = np.select([phase == 1, phase == 2], [6.0, 2.0], 0.5)
+        sell_bias = np.select([phase == 1, phase == 2], [0.85, 0.4], 0.5)
+        drift = np.select([phase == 1, phase == 2], [-0.05 * start_price / crash_len, 0.02 * start_price / max(n - crash_end, 1)], 0.0)
+
+    intervals_ms = rng.exponential(1000.0 / rate)
+    trade_time = START_TIME_MS + np.cumsum(intervals_ms).astype(np.int64)
+
+    steps = drift + rng.normal(0.0, volatility)
+    price = np.round(np.maximum(start_price + np.cumsum(steps), 1.0), 2)
+
+    trades = np.empty(n, dtype=RECORD_DTYPE)
+    trades["trade_id"] = np.arange(1, n + 1)
+    trades["trade_time"] = trade_time
+    trades["event_time"] = trade_time + rng.integers(1, 5, n)
+    trades["price"] = price
+    trades["quantity"] = np.round(rng.lognormal(-4.0, 1.2, n), 5)
+    trades["is_maker"] = rng.random(n) < sell_bias
+    return trades
+
+
+def to_messages(trades: np.ndarray, symbol: str = "btcusdt") -> List[Dict[str, Any]]:
+    """Mensagens @trade no formato da Binance (para BinanceDataFeed._process_trade)."""
+    return [record_to_message(record, symbol) for record in trades]
+
+
+def to_ticks(trades: np.ndarray) -> List[Tick]:
+    """Ticks como os monta BinanceDataFeed._process_trade."""
+    ticks = []
+    last_price = 0.0
+    for i, record in enumerate(trades):
+        price = float(record["price"])
+        side_real = "sell" if record["is_maker"] else "buy"
+        tick = Tick(price, int(record["trade_time"]), price * float(record["quantity"]), side_real,
+                    int(record["trade_id"]), last_price)
+        tick.tick_count = i + 1
+        ticks.append(tick)
+        last_price = price
+    return ticks
+
+
+def to_columns(trades: np.ndarray):
+    """Colunas (preço, volume em USDT, timestamp, side) para a API vetorizada."""
+    return records_to_columns(trades)
@@ -1,35 +1,125 @@
 import asyncio
 import websockets
-import json
 import time
+from typing import Callable, Dict, List
 from engine_orchestrator import VolumeEngineOrchestrator
+from ingest import IngestPipeline
+from tick_history import TickHistory
+from tick_store import TickStore
+from trade_recorder import TradeRecorder
+from upstream import TradeDedup, connection_urls
+from volume_engines.base import Tick, decode_sides, encode_sides
+from order_book import OrderBook
+
+BINANCE_WS_BASE = "wss://stream.binance.com:9443"
+
+# Lotes a partir deste tamanho (fila acumulada) usam a API vetorizada do orquestrador
+BATCH_MIN_SIZE = 32
+
+# Ticks brutos guardados por símbolo para aquecer engines trocados ao vivo
+HISTORY_SIZE = 5000
 
 class BinanceDataFeed:
-    def __init__(self, symbol: str = "btcusdt", orchestrator: VolumeEngineOrchestrator = None):
+    def __init__(self, symbol: str = "btcusdt", orchestrator: VolumeEngineOrchestrator = None,
+                 recorder: TradeRecorder = None, base_url: str = BINANCE_WS_BASE, decoder: str = "fast",
+                 history_size: int = HISTORY_SIZE, store: TickStore = None, connections: int = 1,
+                 mirror_urls: List[str] = (), on_gap: Callable[[str, int, int], None] = None,
+                 on_reconnect: Callable[[str], None] = None):
         self.symbol = symbol.lower()
         self.orchestrator = orchestrator
-        self.ws_url = f"wss://stream.binance.com:9443/ws/{self.symbol}@trade"
+        self.recorder = recorder
+        # Trades processados (com o volume do pipeline store.pipeline) para histórico
+        self.store = store
+        self.ws_url = f"{base_url}/ws/{self.symbol}@trade"
+        # Conexões simultâneas ao stream (>1 = hot standby, ver ingest.run_redundant),
+        # alternando entre base_url e os espelhos
+        self.ws_urls = connection_urls([f"{url}/ws/{self.symbol}@trade" for url in (base_url, *mirror_urls)],
+                                       connections)
+        self.connections = connections
+        self.on_reconnect = on_reconnect
+        self.pipeline = IngestPipeline(decoder, dedup=TradeDedup(on_gap=on_gap))
+        self.history = TickHistory(history_size)
+        # Book L2 do símbolo (BookFeed), quando os streams de book estão ligados
+        self.book = None
         self.running = False
         self.trade_count = 0
         self.last_price = 0.0
+        self.log_interval = 50
     
     async def connect(self, on_data_callback=None):
-        """Conecta à Binance e processa trades. NÃO reconecta sozinho
-        (reconexão é feita pelo websocket_server)."""
+        """Conecta à Binance e processa trades. Com uma conexão, NÃO
+        reconecta sozinho (reconexão é feita pelo websocket_server); com
+        connections > 1, cada conexão reconecta sozinha e só termina com stop()."""
         self.running = True
         print(f"🔌 Conectando à Binance: {self.symbol.upper()}")
         
+        if self.connections > 1:
+            print(f"🔁 {self.connections} conexões redundantes (primeira cópia de cada trade vence)\n")
+            await self.pipeline.run_redundant(self.ws_urls, lambda batch: self._process_batch(batch, on_data_callback),
+                                              self.on_reconnect)
+            return
+        
         async with websockets.connect(self.ws_url) as websocket:
             print(f"✅ Conectado! Recebendo trades...\n")
             
-            while self.running:
-                message = await websocket.recv()
-                data = json.loads(message)
+            # Recepção e processamento em estágios separados (ver ingest.py)
+            await self.pipeline.run(websocket, lambda batch: self._process_batch(batch, on_data_callback))
+    
+    async def _process_batch(self, batch: List[dict], on_data_callback=None):
+        """Processa um lote já decodificado. Lotes pequenos seguem trade a
+        trade por _process_trade; a partir de BATCH_MIN_SIZE os engines rodam
+        pela API vetorizada do orquestrador (mesmos fatores; o arredondamento
+        de volume e contribuições só difere em empates decimais, por uma
+        unidade da última casa)."""
+        if not self.orchestrator or len(batch) < BATCH_MIN_SIZE:
+            for data in batch:
                 await self._process_trade(data, on_data_callback)
+            return
+        
+        if self.recorder:
+            for data in batch:
+                self.recorder.write(data)
+        
+        prices = [float(data['p']) for data in batch]
+        volumes = [price * float(data['q']) for price, data in zip(prices, batch)]
+        timestamps = [int(data['T']) for data in batch]
+        sides_real = ["buy" if not data['m'] else "sell" for data in batch]
+        
+        results = self.orchestrator.calculate_enhanced_volume_batches(prices, volumes, timestamps, sides_real)
+        self.history.extend(prices, volumes, timestamps, sides_real)
+        if self.store:
+            self._store_batch(batch, prices, volumes, timestamps, sides_real, results.get(self.store.pipeline))
+        # Um resultado por pipeline (um só, sem id, com VolumeEngineOrchestrator)
+        columns = {
+            pipeline: (
+                enhanced["volume"].tolist(),
+                decode_sides(enhanced["side"]),
+                enhanced["is_absorption"].tolist(),
+                {key: values.tolist() for key, values in enhanced["engine_contributions"].items()},
+            )
+            for pipeline, enhanced in results.items()
+        }
+        
+        for i in range(len(batch)):
+            self.trade_count += 1
+            if on_data_callback:
+                for pipeline, (enhanced_volumes, enhanced_sides, absorptions, contributions) in columns.items():
+                    await on_data_callback(self._payload(
+                        prices[i], volumes[i], sides_real[i], timestamps[i],
+                        enhanced_volumes[i], enhanced_sides[i], absorptions[i],
+                        {key: values[i] for key, values in contributions.items()},
+                        pipeline,
+                    ))
+            self._log(prices[i], volumes[i], sides_real[i])
+        
+        self.last_price = prices[-1]
     
     async def _process_trade(self, data: dict, on_data_callback=None):
         self.trade_count += 1
         
+        if self.recorder:
+            self.recorder.write(data)
+        
         price = float(data['p'])
         volume_btc = float(data['q'])
         volume_usdt = price * volume_btc
@@ -41,49 +131,167 @@ class BinanceDataFeed:
         # is_maker=True  → vendedor agressivo (SELL)
         side_real = "buy" if not is_maker else "sell"
         
-        tick = {
-            "price": price,
-            "bid": price - 0.05,
-            "ask": price + 0.05,
-            "last_bid": self.last_price - 0.05 if self.last_price else price - 0.05,
-            "last_ask": self.last_price + 0.05 if self.last_price else price + 0.05,
-            "timestamp": timestamp,
-            "volume_real": volume_usdt,
-            "side_real": side_real,
-            "trade_id": data['t'],
-        }
+        tick = Tick(price, timestamp, volume_usdt, side_real, data['t'], self.last_price)
+        tick.book = self.book
         
         self.last_price = price
         
-        # Processa com engines
-        enhanced = None
+        # Processa com engines (um resultado por pipeline de engines)
+        results = {None: None}
         if self.orchestrator:
-            enhanced = self.orchestrator.calculate_enhanced_volume(tick)
+            results = self.orchestrator.calculate_enhanced_volumes(tick)
+        self.history.push(price, volume_usdt, timestamp, side_real)
+        if self.store:
+            stored = results.get(self.store.pipeline)
+            if stored:
+                self.store.append(self.symbol, data['t'], timestamp, price, volume_btc, stored["side"], side_real,
+                                  stored["volume"], stored.get("is_absorption", False))
+            else:
+                self.store.append(self.symbol, data['t'], timestamp, price, volume_btc, side_real, side_real,
+                                  volume_usdt, False)
         
         # Envia para o frontend via callback
         if on_data_callback:
-            payload = {
-                "type": "trade",
-                "symbol": self.symbol.upper(),
-                "price": price,
-                "volume_raw": volume_usdt,
-                "volume": enhanced["volume"] if enhanced else volume_usdt,
-                "side": enhanced["side"] if enhanced else side_real,
-                "side_real": side_real,
-                "timestamp": timestamp,
-                "is_absorption": enhanced.get("is_absorption", False) if enhanced else False,
-                "engine_contributions": enhanced.get("engine_contributions", {}) if enhanced else {},
-                "trade_count": self.trade_count,
-            }
-            await on_data_callback(payload)
-        
-        # Log no console (a cada 50 trades para não poluir)
-        if self.trade_count % 50 == 0:
+            for pipeline, enhanced in results.items():
+                if enhanced:
+                    payload = self._payload(
+                        price, volume_usdt, side_real, timestamp,
+                        enhanced["volume"], enhanced["side"],
+                        enhanced.get("is_absorption", False), enhanced.get("engine_contributions", {}),
+                        pipeline,
+                    )
+                else:
+                    payload = self._payload(price, volume_usdt, side_real, timestamp, volume_usdt, side_real, False, {})
+                await on_data_callback(payload)
+        
+        self._log(price, volume_usdt, side_real)
+    
+    def _store_batch(self, batch: List[dict], prices, volumes, timestamps, sides_real, enhanced):
+        sides_real = encode_sides(sides_real)
+        if enhanced is None:
+            sides, absorptions = sides_real, [0] * len(batch)
+        else:
+            volumes, sides, absorptions = enhanced["volume"], enhanced["side"], enhanced["is_absorption"]
+        qtys = [float(data['q']) for data in batch]
+        self.store.extend(self.symbol, [data['t'] for data in batch], timestamps, prices, qtys,
+                          sides, sides_real, volumes, absorptions)
+    
+    def _payload(self, price, volume_usdt, side_real, timestamp, volume, side, is_absorption, engine_contributions,
+                 pipeline: str = None) -> dict:
+        payload = {
+            "type": "trade",
+            "symbol": self.symbol.upper(),
+            "price": price,
+            "volume_raw": volume_usdt,
+            "volume": volume,
+            "side": side,
+            "side_real": side_real,
+            "timestamp": timestamp,
+            "is_absorption": is_absorption,
+            "engine_contributions": engine_contributions,
+            "trade_count": self.trade_count,
+        }
+        # Com SharedEngineOrchestrator cada pipeline de clientes tem seu payload
+        if pipeline is not None:
+            payload["pipeline"] = pipeline
+        return payload
+    
+    def _log(self, price, volume_usdt, side_real):
+        # Log no console (a cada 50 trades para não poluir; 0 desliga)
+        if self.log_interval and self.trade_count % self.log_interval == 0:
             side_icon = "🟢" if side_real == "buy" else "🔴"
             print(f"{side_icon} #{self.trade_count} | ${price:.2f} | Vol: ${volume_usdt:.0f} | {side_real.upper()}")
     
+    def attach_book(self, book: OrderBook):
+        """Liga o book L2 do símbolo: bid/ask reais nos ticks e o book nos
+        engines que o leem (book_imbalance)."""
+        self.book = book
+        if self.orchestrator:
+            self.orchestrator.attach_book(book)
+    
+    def stop(self):
+        self.running = False
+        self.pipeline.stop()
+        if self.recorder:
+            self.recorder.flush()
+        print("\n⏹️  Conexão encerrada")
+
+
+class BinanceMultiFeed:
+    """Vários símbolos em um único socket (combined streams da Binance).
+
+    Cada símbolo tem seu próprio BinanceDataFeed (contagem, último preço,
+    gravação) e seu próprio VolumeEngineOrchestrator; este feed só abre a
+    conexão e despacha cada mensagem para o feed do símbolo."""
+    
+    def __init__(self, symbols: List[str],
+                 orchestrator_factory: Callable[[str], VolumeEngineOrchestrator] = None,
+                 recorder_factory: Callable[[str], TradeRecorder] = None,
+                 base_url: str = BINANCE_WS_BASE, decoder: str = "fast",
+                 history_size: int = HISTORY_SIZE, store: TickStore = None, connections: int = 1,
+                 mirror_urls: List[str] = (), on_gap: Callable[[str, int, int], None] = None,
+                 on_reconnect: Callable[[str], None] = None):
+        if not symbols:
+            raise ValueError("BinanceMultiFeed precisa de pelo menos um símbolo")
+        
+        self.symbols = [symbol.lower() for symbol in symbols]
+        self.feeds: Dict[str, BinanceDataFeed] = {}
+        for symbol in self.symbols:
+            self.feeds[symbol] = BinanceDataFeed(
+                symbol=symbol,
+                orchestrator=orchestrator_factory(symbol) if orchestrator_factory else None,
+                recorder=recorder_factory(symbol) if recorder_factory else None,
+                base_url=base_url,
+                history_size=history_size,
+                store=store,
+            )
+        
+        streams = "/".join(f"{symbol}@trade" for symbol in self.symbols)
+        self.ws_url = f"{base_url}/stream?streams={streams}"
+        self.ws_urls = connection_urls([f"{url}/stream?streams={streams}" for url in (base_url, *mirror_urls)],
+                                       connections)
+        self.connections = connections
+        self.on_reconnect = on_reconnect
+        self.running = False
+        self.pipeline = IngestPipeline(decoder, dedup=TradeDedup(on_gap=on_gap))
+    
+    @property
+    def trade_count(self) -> int:
+        return sum(feed.trade_count for feed in self.feeds.values())
+    
+    async def connect(self, on_data_callback=None):
+        """Conecta ao combined stream e processa trades de todos os símbolos.
+        Assim como BinanceDataFeed.connect, só reconecta sozinho com connections > 1."""
+        self.running = True
+        print(f"🔌 Conectando à Binance: {', '.join(s.upper() for s in self.symbols)}")
+        
+        if self.connections > 1:
+            print(f"🔁 {self.connections} conexões redundantes (primeira cópia de cada trade vence)\n")
+            await self.pipeline.run_redundant(self.ws_urls, lambda batch: self._dispatch(batch, on_data_callback),
+                                              self.on_reconnect)
+            return
+        
+        async with websockets.connect(self.ws_url) as websocket:
+            print(f"✅ Conectado! Recebendo trades de {len(self.symbols)} símbolos...\n")
+            
+            await self.pipeline.run(websocket, lambda batch: self._dispatch(batch, on_data_callback))
+    
+    async def _dispatch(self, batch: List[dict], on_data_callback=None):
+        """Separa o lote por símbolo (mantendo a ordem de cada um) e entrega a cada feed."""
+        by_symbol: Dict[str, List[dict]] = {}
+        for data in batch:
+            by_symbol.setdefault(data.get("s", "").lower(), []).append(data)
+        for symbol, trades in by_symbol.items():
+            feed = self.feeds.get(symbol)
+            if feed:
+                await feed._process_batch(trades, on_data_callback)
+    
     def stop(self):
         self.running = False
+        self.pipeline.stop()
+        for feed in self.feeds.values():
+            if feed.recorder:
+                feed.recorder.flush()
         print("\n⏹️  Conexão encerrada")
 
 
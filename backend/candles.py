@@ -0,0 +1,253 @@
+"""
+Candles de vários timeframes ao mesmo tempo (1s, 1m, 5m e 1h por padrão),
+alimentados pelo payload de cada trade (a saída do orquestrador).
+
+Cada barra tem OHLC, volume bruto (volume_raw, o USDT da Binance) e
+enriquecido (volume), compra e venda enriquecidas, delta (compra − venda),
+CVD (delta acumulado desde o primeiro trade do agregador, no último trade
+da barra), número de trades e de absorções.
+
+Só o timeframe menor é atualizado a cada trade. Quando uma barra dele
+fecha, ela é somada à barra aberta de cada timeframe maior (todos são
+múltiplos do menor); a barra parcial de um timeframe maior é essa soma
+mais a barra menor em andamento, montada só na hora de enviar. Um trade
+custa o mesmo com um ou dez timeframes, e cada timeframe maior custa uma
+soma por barra fechada do menor.
+
+Barras sem trades não existem (o cliente liga a anterior à seguinte), e
+uma barra só fecha quando chega o primeiro trade depois dela.
+
+Mensagens (uma por timeframe):
+
+    candles (snapshot, ao se inscrever):
+        {"type": "candles", "symbol", "pipeline", "timeframe", "bar_ms",
+         "bars": [barras fechadas..., barra parcial]}
+
+    candle_update (periódico, só se algo mudou):
+        {"type": "candle_update", "symbol", "pipeline", "timeframe",
+         "bar_ms", "closed": [barras fechadas desde o último update],
+         "bar": barra parcial}
+
+    barra: {"start", "open", "high", "low", "close", "volume_raw",
+            "volume", "buy_volume", "sell_volume", "delta", "cvd",
+            "trade_count", "absorption_count"}
+
+As barras são identificadas por start: reaplicar uma barra (snapshot e
+update que se sobrepõem) só a substitui.
+"""
+import math
+from collections import deque
+from typing import Dict, Any, Iterable, List, Optional
+
+CANDLE_TIMEFRAMES = {"1s": 1000, "1m": 60_000, "5m": 300_000, "1h": 3_600_000}
+CANDLE_MAX_BARS = 500
+
+
+class Candle:
+    __slots__ = ("start", "open", "high", "low", "close", "volume_raw", "volume",
+                 "buy_volume", "sell_volume", "cvd", "trade_count", "absorption_count")
+
+    def __init__(self, start: int, price: float, cvd: float):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume_raw = 0.0
+        self.volume = 0.0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.cvd = cvd
+        self.trade_count = 0
+        self.absorption_count = 0
+
+    def merge(self, other: "Candle"):
+        """Soma uma barra posterior (do mesmo período) a esta."""
+        if other.high > self.high:
+            self.high = other.high
+        if other.low < self.low:
+            self.low = other.low
+        self.close = other.close
+        self.volume_raw += other.volume_raw
+        self.volume += other.volume
+        self.buy_volume += other.buy_volume
+        self.sell_volume += other.sell_volume
+        self.cvd = other.cvd
+        self.trade_count += other.trade_count
+        self.absorption_count += other.absorption_count
+
+    def copy(self, start: int) -> "Candle":
+        candle = Candle(start, self.open, self.cvd)
+        candle.merge(self)
+        return candle
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "start": self.start,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume_raw": round(self.volume_raw, 2),
+            "volume": round(self.volume, 2),
+            "buy_volume": round(self.buy_volume, 2),
+            "sell_volume": round(self.sell_volume, 2),
+            "delta": round(self.buy_volume - self.sell_volume, 2),
+            "cvd": round(self.cvd, 2),
+            "trade_count": self.trade_count,
+            "absorption_count": self.absorption_count,
+        }
+
+
+class _Series:
+    """Barras de um timeframe: a aberta, as fechadas e as ainda não enviadas."""
+
+    __slots__ = ("name", "bar_ms", "bar", "bars", "closed", "sent")
+
+    def __init__(self, name: str, bar_ms: int, max_bars: int):
+        self.name = name
+        self.bar_ms = bar_ms
+        self.bar: Optional[Candle] = None
+        self.bars = deque(maxlen=max_bars)
+        self.closed = deque(maxlen=max_bars)
+        # trade_count do agregador no último update enviado
+        self.sent = -1
+
+    def close_bar(self):
+        self.bars.append(self.bar)
+        self.closed.append(self.bar)
+        self.bar = None
+
+
+class CandleAggregator:
+    """Candles de um símbolo (e pipeline) em vários timeframes."""
+
+    def __init__(self, symbol: str, pipeline: str = None, timeframes: Iterable[str] = CANDLE_TIMEFRAMES,
+                 max_bars: int = CANDLE_MAX_BARS):
+        names = sorted(timeframes, key=lambda name: _bar_ms(name))
+        if not names:
+            raise ValueError("CandleAggregator precisa de pelo menos um timeframe")
+        base_ms = _bar_ms(names[0])
+        for name in names[1:]:
+            if _bar_ms(name) % base_ms:
+                raise ValueError(f"Timeframe {name} não é múltiplo de {names[0]}")
+        self.symbol = symbol.upper()
+        self.pipeline = pipeline
+        self.series: Dict[str, _Series] = {name: _Series(name, _bar_ms(name), max_bars) for name in names}
+        self._base = self.series[names[0]]
+        self._coarse = [self.series[name] for name in names[1:]]
+        self.bar_end = -math.inf
+        self.cvd = 0.0
+        self.trade_count = 0
+
+    @property
+    def timeframes(self) -> List[str]:
+        return list(self.series)
+
+    def add_payload(self, payload: Dict[str, Any]):
+        self.add(payload["price"], payload["volume_raw"], payload["volume"], payload["side"],
+                 payload.get("is_absorption", False), payload["timestamp"])
+
+    def add(self, price: float, volume_raw: float, volume: float, side: str, is_absorption: bool, timestamp: int):
+        if timestamp >= self.bar_end:
+            self._roll(price, timestamp)
+        bar = self._base.bar
+        if price > bar.high:
+            bar.high = price
+        elif price < bar.low:
+            bar.low = price
+        bar.close = price
+        bar.volume_raw += volume_raw
+        bar.volume += volume
+        if side == "buy":
+            bar.buy_volume += volume
+            self.cvd += volume
+        elif side == "sell":
+            bar.sell_volume += volume
+            self.cvd -= volume
+        bar.cvd = self.cvd
+        bar.trade_count += 1
+        if is_absorption:
+            bar.absorption_count += 1
+        self.trade_count += 1
+
+    def _roll(self, price: float, timestamp: int):
+        """Fecha a barra menor, soma-a nos timeframes maiores e fecha os
+        que o novo trade já deixou para trás."""
+        base = self._base
+        closing = base.bar
+        if closing is not None:
+            base.close_bar()
+            for series in self._coarse:
+                if series.bar is None:
+                    series.bar = closing.copy(closing.start - closing.start % series.bar_ms)
+                else:
+                    series.bar.merge(closing)
+        start = timestamp - timestamp % base.bar_ms
+        for series in self._coarse:
+            if series.bar is not None and start >= series.bar.start + series.bar_ms:
+                series.close_bar()
+        base.bar = Candle(start, price, self.cvd)
+        self.bar_end = start + base.bar_ms
+
+    def partial(self, timeframe: str) -> Optional[Candle]:
+        """Barra em andamento do timeframe (a menor já somada, nos maiores)."""
+        series = self.series[timeframe]
+        current = self._base.bar
+        if series is self._base or current is None:
+            return current
+        if series.bar is None:
+            return current.copy(current.start - current.start % series.bar_ms)
+        bar = series.bar.copy(series.bar.start)
+        bar.merge(current)
+        return bar
+
+    def update(self, timeframe: str) -> Optional[Dict[str, Any]]:
+        """Barras fechadas e parcial desde o último update (None se nada mudou)."""
+        series = self.series[timeframe]
+        if series.sent == self.trade_count and not series.closed:
+            return None
+        partial = self.partial(timeframe)
+        message = {
+            **self._header("candle_update", series),
+            "closed": [bar.to_dict() for bar in series.closed],
+            "bar": partial.to_dict() if partial else None,
+        }
+        series.closed.clear()
+        series.sent = self.trade_count
+        return message
+
+    def skip(self, timeframe: str):
+        """Descarta o que ainda não foi enviado (ninguém acompanha o timeframe)."""
+        series = self.series[timeframe]
+        series.closed.clear()
+        series.sent = self.trade_count
+
+    def snapshot(self, timeframe: str) -> Dict[str, Any]:
+        series = self.series[timeframe]
+        bars = [bar.to_dict() for bar in series.bars]
+        partial = self.partial(timeframe)
+        if partial:
+            bars.append(partial.to_dict())
+        return {**self._header("candles", series), "bars": bars}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "pipeline": self.pipeline,
+            "trades": self.trade_count,
+            "cvd": round(self.cvd, 2),
+            "bars": {name: len(series.bars) for name, series in self.series.items()},
+        }
+
+    def _header(self, kind: str, series: _Series) -> Dict[str, Any]:
+        return {
+            "type": kind,
+            "symbol": self.symbol,
+            "pipeline": self.pipeline,
+            "timeframe": series.name,
+            "bar_ms": series.bar_ms,
+        }
+
+
+def _bar_ms(timeframe: str) -> int:
+    if timeframe not in CANDLE_TIMEFRAMES:
+        raise ValueError(f"Timeframe desconhecido: {timeframe} (use {', '.join(CANDLE_TIMEFRAMES)})")
+    return CANDLE_TIMEFRAMES[timeframe]
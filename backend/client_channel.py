@@ -0,0 +1,177 @@
+"""
+Fila de saída por cliente WebSocket.
+
+Cada cliente recebe uma fila limitada e uma tarefa própria que envia as
+mensagens; quem publica (broadcast) só enfileira e nunca espera o socket.
+Assim um navegador lento não atrasa os outros clientes nem o loop que lê
+da Binance.
+
+Quando a fila enche, a política do canal decide:
+    drop_oldest - descarta a mensagem mais antiga da fila
+    conflate    - descarta tudo o que estava pendente e fica só com a mais recente
+    disconnect  - desconecta o cliente lento
+
+Mensagens de controle (engine_list, erros, confirmações) nunca são
+descartadas nem contam para o limite.
+
+Atualizações periódicas de estado (deltas de footprint, updates de candles)
+também não são descartadas, mas ficam no máximo uma pendente por chave
+(símbolo, timeframe...): se a anterior ainda não saiu, as duas viram um
+único snapshot com o estado completo, montado na hora do envio. A fila de
+um cliente lento cresce com o número de chaves, não com o tempo.
+
+Trades e frames levam o timestamp da Binance (T, em ms): o envio no socket
+registra a latência ponta a ponta em metrics.E2E_LATENCY_SECONDS.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Hashable, Union
+from websockets.exceptions import ConnectionClosed
+from metrics import E2E_LATENCY_SECONDS
+
+OVERFLOW_POLICIES = ("drop_oldest", "conflate", "disconnect")
+
+_LATENCY = {kind: E2E_LATENCY_SECONDS.labels(kind) for kind in ("trade", "frame")}
+
+
+class ClientChannel:
+    def __init__(self, websocket, maxsize: int = 1000, policy: str = "drop_oldest"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de overflow desconhecida: {policy} (use {', '.join(OVERFLOW_POLICIES)})")
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+
+        # (mensagem, descartável, timestamp da Binance em ms, tipo, chave)
+        self.queue = deque()
+        self.droppable = 0
+        self.closed = False
+        # Atualização pendente de cada chave: [mensagem, ..., chave, resync]
+        self.updates: Dict[Hashable, list] = {}
+
+        self.sent = 0
+        self.dropped = 0
+        self.resynced = 0
+        self.max_depth = 0
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._sender())
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def offer(self, message: Union[str, bytes], timestamp: float = None, kind: str = "trade") -> bool:
+        """Enfileira uma mensagem descartável (trade ou frame). Nunca bloqueia.
+        Devolve False se a mensagem (ou o cliente) foi descartada."""
+        if self.closed:
+            return False
+
+        if self.droppable >= self.maxsize:
+            if self.policy == "disconnect":
+                self.dropped += 1
+                self._disconnect()
+                return False
+            if self.policy == "conflate":
+                self._drop_pending()
+            else:
+                self._drop_oldest()
+
+        self.queue.append((message, True, timestamp, kind, None))
+        self.droppable += 1
+        self._enqueued()
+        return True
+
+    def send_control(self, message: Union[str, bytes]):
+        """Enfileira uma mensagem de controle (nunca descartada)."""
+        if self.closed:
+            return
+        self.queue.append((message, False, None, None, None))
+        self._enqueued()
+
+    def send_update(self, key: Hashable, message: Union[str, bytes], resync: Callable[[], Union[str, bytes]]):
+        """Enfileira uma atualização de estado da chave (nunca descartada).
+        Se já há uma pendente, ela é substituída por resync() (o snapshot
+        completo), chamado só na hora do envio."""
+        if self.closed:
+            return
+        pending = self.updates.get(key)
+        if pending is not None:
+            pending[0] = None
+            pending[5] = resync
+            self.resynced += 1
+            return
+        item = [message, False, None, None, key, resync]
+        self.updates[key] = item
+        self.queue.append(item)
+        self._enqueued()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "resynced": self.resynced,
+            "policy": self.policy,
+        }
+
+    async def close(self):
+        self.closed = True
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def _enqueued(self):
+        if len(self.queue) > self.max_depth:
+            self.max_depth = len(self.queue)
+        self._wakeup.set()
+
+    def _drop_oldest(self):
+        for i, item in enumerate(self.queue):
+            if item[1]:
+                del self.queue[i]
+                self.droppable -= 1
+                self.dropped += 1
+                return
+
+    def _drop_pending(self):
+        kept = deque(item for item in self.queue if not item[1])
+        self.dropped += self.droppable
+        self.droppable = 0
+        self.queue = kept
+
+    def _disconnect(self):
+        self.closed = True
+        self.queue.clear()
+        self.updates.clear()
+        self.droppable = 0
+        self._task.cancel()
+        asyncio.create_task(self.websocket.close(1008, "cliente lento"))
+
+    async def _sender(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self.queue:
+                    item = self.queue.popleft()
+                    message, droppable, timestamp, kind, key = item[:5]
+                    if droppable:
+                        self.droppable -= 1
+                    if key is not None:
+                        del self.updates[key]
+                        if message is None:
+                            message = item[5]()
+                    await self.websocket.send(message)
+                    self.sent += 1
+                    if timestamp:
+                        _LATENCY[kind].observe(time.time() - timestamp / 1000)
+        except ConnectionClosed:
+            self.closed = True
+        except Exception as e:
+            print(f"⚠️ Erro ao enviar para cliente: {e}")
+            self.closed = True
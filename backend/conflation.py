@@ -0,0 +1,75 @@
+"""
+Conflação de trades em frames.
+
+Em vez de uma mensagem JSON por trade, o servidor junta os trades
+enriquecidos de um símbolo e envia um único frame a cada N ms, com
+agregados do intervalo para que nada importante se perca no agrupamento:
+
+    {"type": "frame", "symbol": "BTCUSDT", "interval_ms": 250,
+     "trades": [...payloads de trade...],
+     "aggregates": {"trade_count", "buy_volume", "sell_volume",
+                    "absorption_count", "open_price", "high_price",
+                    "low_price", "last_price", "first_timestamp",
+                    "last_timestamp"}}
+"""
+from typing import Dict, Any, List, Optional
+
+# 0 = sem conflação (um trade por mensagem, como antes)
+CONFLATION_INTERVALS = (0, 50, 100, 250, 500, 1000)
+
+
+class TradeConflator:
+    """Acumula os trades de um símbolo até o próximo flush()."""
+
+    def __init__(self, symbol: str, interval_ms: int):
+        self.symbol = symbol.upper()
+        self.interval_ms = interval_ms
+        self._reset()
+
+    def _reset(self):
+        self.trades: List[Dict[str, Any]] = []
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.absorption_count = 0
+        self.high_price = None
+        self.low_price = None
+
+    def add(self, payload: Dict[str, Any]):
+        price = payload["price"]
+        if payload["side"] == "buy":
+            self.buy_volume += payload["volume"]
+        elif payload["side"] == "sell":
+            self.sell_volume += payload["volume"]
+        if payload.get("is_absorption"):
+            self.absorption_count += 1
+        if self.high_price is None or price > self.high_price:
+            self.high_price = price
+        if self.low_price is None or price < self.low_price:
+            self.low_price = price
+        self.trades.append(payload)
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """Devolve o frame do intervalo (None se não houve trades) e zera."""
+        if not self.trades:
+            return None
+        trades = self.trades
+        frame = {
+            "type": "frame",
+            "symbol": self.symbol,
+            "interval_ms": self.interval_ms,
+            "trades": trades,
+            "aggregates": {
+                "trade_count": len(trades),
+                "buy_volume": round(self.buy_volume, 2),
+                "sell_volume": round(self.sell_volume, 2),
+                "absorption_count": self.absorption_count,
+                "open_price": trades[0]["price"],
+                "high_price": self.high_price,
+                "low_price": self.low_price,
+                "last_price": trades[-1]["price"],
+                "first_timestamp": trades[0]["timestamp"],
+                "last_timestamp": trades[-1]["timestamp"],
+            },
+        }
+        self._reset()
+        return frame
@@ -1,11 +1,15 @@
-from typing import List, Dict, Any
-from volume_engines.base import VolumeEngine
+import time
+from typing import List, Dict, Any, Optional
+import numpy as np
+from metrics import ENGINE_SECONDS, ENGINE_SAMPLE_EVERY
+from volume_engines.base import VolumeEngine, Tick, as_batch
 from volume_engines import (
     TickVelocityEngine,
     SpreadWeightEngine,
     SideInferenceEngine,
     MicroClusterEngine,
     ATRNormalizeEngine,
+    BookImbalanceEngine,
 )
 
 ENGINE_REGISTRY = {
@@ -14,8 +18,22 @@ ENGINE_REGISTRY = {
     "side_inference": SideInferenceEngine,
     "micro_cluster": MicroClusterEngine,
     "atr_normalize": ATRNormalizeEngine,
+    "book_imbalance": BookImbalanceEngine,
 }
 
+class ContributionKeys(dict):
+    """Chaves "<engine>@<sub-fator>" de engine_contributions, montadas na
+    primeira vez que cada sub-fator aparece (e não a cada tick)."""
+    
+    def __init__(self, engine_name: str):
+        super().__init__()
+        self.engine_name = engine_name
+    
+    def __missing__(self, key: str) -> str:
+        value = self[key] = f"{self.engine_name}@{key}"
+        return value
+
+
 class VolumeEngineOrchestrator:
     def __init__(self, engine_names: List[str], weights: Dict[str, float] = None):
         self.engines: List[VolumeEngine] = []
@@ -26,56 +44,139 @@ class VolumeEngineOrchestrator:
                 raise ValueError(f"Engine desconhecido: {name}")
             self.engines.append(ENGINE_REGISTRY[name]())
         
+        # Séries do histograma de tempo por engine (ver metrics.py)
+        self._tick_timers = {name: ENGINE_SECONDS.labels(name, "tick") for name in engine_names}
+        self._batch_timers = {name: ENGINE_SECONDS.labels(name, "batch") for name in engine_names}
+        
         self.weights = weights or {name: 1.0 / len(engine_names) for name in engine_names}
+        self.last_price = 0.0
+        self.book = None
+        
+        # Plano fixo (por tick e em lote): o engine de side resolvido uma vez
+        # e, para os demais, (engine, nome, peso, chaves dos sub-fatores)
+        self._side_engine = next((engine for engine in self.engines if engine.name == "side_inference"), None)
+        default_weight = 1.0 / len(self.engines) if self.engines else 1.0
+        self._plan = [
+            (engine, engine.name, self.weights.get(engine.name, default_weight), ContributionKeys(engine.name))
+            for engine in self.engines
+            if engine.name != "side_inference"
+        ]
     
-    def calculate_enhanced_volume(self, tick: Dict[str, Any]) -> Dict[str, Any]:
+    def calculate_enhanced_volume(self, tick: Tick) -> Dict[str, Any]:
+        if not isinstance(tick, Tick):
+            tick = Tick.from_dict(tick)
         self.tick_count += 1
+        tick.tick_count = self.tick_count
+        tick.last_price = self.last_price
         
-        context = {
-            "tick_count": self.tick_count,
-            "real_side": tick.get("side_real", "neutral"),
-            "real_volume": tick.get("volume_real", 1.0),
-            "price": tick.get("price", 0.0),
-            "last_price": getattr(self, 'last_price', 0.0),
-        }
+        perf_counter = time.perf_counter
+        # Tempo por engine só em 1 a cada ENGINE_SAMPLE_EVERY ticks (ver metrics.py)
+        timers = self._tick_timers if self.tick_count % ENGINE_SAMPLE_EVERY == 0 else None
         
-        side = tick.get("side_real", "neutral")
-        for engine in self.engines:
-            if engine.name == "side_inference":
-                side = engine.infer_side(tick, context)
-                break
+        side = tick.side_real
+        side_engine = self._side_engine
+        if side_engine is not None:
+            if timers:
+                started = perf_counter()
+            side = side_engine.infer_side(tick, tick)
+            if timers:
+                timers[side_engine.name].observe(perf_counter() - started)
         
-        weight_factors = []
+        factor_sum = 0.0
         engine_contributions = {}
         
-        for engine in self.engines:
-            if engine.name == "side_inference":
-                continue
-            
-            weight = self.weights.get(engine.name, 1.0 / len(self.engines))
-            factor = engine.calculate_volume_weight(tick, context)
+        for engine, name, weight, sub_keys in self._plan:
+            if timers:
+                started = perf_counter()
+            factor = engine.calculate_volume_weight(tick, tick)
+            if timers:
+                timers[name].observe(perf_counter() - started)
             weighted_factor = factor * weight
-            weight_factors.append(weighted_factor)
-            engine_contributions[engine.name] = round(weighted_factor, 3)
+            factor_sum += weighted_factor
+            engine_contributions[name] = round(weighted_factor, 3)
+            for key, sub_factor in engine.get_sub_factors().items():
+                engine_contributions[sub_keys[key]] = round(sub_factor * weight, 3)
         
-        avg_factor = sum(weight_factors) / len(weight_factors) if weight_factors else 1.0
+        avg_factor = factor_sum / len(self._plan) if self._plan else 1.0
+        enhanced_volume = tick.volume_real * avg_factor
         
-        base_volume = tick.get("volume_real", 100.0)
-        enhanced_volume = base_volume * avg_factor
-        
-        self.last_price = tick.get("price", 0.0)
+        self.last_price = tick.price
         
         return {
             "volume": round(enhanced_volume, 2),
             "side": side,
             "engine_contributions": engine_contributions,
             "is_absorption": engine_contributions.get("micro_cluster", 0) > 1.5,
-            "timestamp": tick.get("timestamp", 0),
-            "price": tick.get("price", 0.0),
+            "timestamp": tick.timestamp,
+            "price": tick.price,
         }
     
+    def calculate_enhanced_volume_batch(self, prices, volumes, timestamps, sides) -> Dict[str, Any]:
+        """Versão vetorizada de calculate_enhanced_volume para um lote de ticks.
+
+        Recebe colunas (preço, volume_real, timestamp em ms, side real) e
+        devolve as mesmas chaves do caminho por tick, mas como arrays NumPy;
+        "side" vem em códigos int8 (ver volume_engines.base.SIDE_NAMES)."""
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        n = len(prices)
+        self.tick_count += n
+        perf_counter = time.perf_counter
+        timers = self._batch_timers
+        
+        # Mesmo plano do caminho por tick (engine de side, pesos e chaves)
+        side = sides
+        side_engine = self._side_engine
+        if side_engine is not None:
+            started = perf_counter()
+            side = side_engine.infer_side_batch(prices, volumes, timestamps, sides)
+            timers[side_engine.name].observe(perf_counter() - started)
+        
+        factor_sum = None
+        engine_contributions = {}
+        
+        for engine, name, weight, sub_keys in self._plan:
+            started = perf_counter()
+            factor = engine.calculate_volume_weight_batch(prices, volumes, timestamps, sides)
+            timers[name].observe(perf_counter() - started)
+            weighted_factor = factor * weight
+            factor_sum = weighted_factor if factor_sum is None else factor_sum + weighted_factor
+            engine_contributions[name] = np.round(weighted_factor, 3)
+            for key, sub_factor in engine.get_sub_factors_batch().items():
+                engine_contributions[sub_keys[key]] = np.round(sub_factor * weight, 3)
+        
+        avg_factor = factor_sum / len(self._plan) if self._plan else np.ones(n)
+        enhanced_volume = volumes * avg_factor
+        
+        if n:
+            self.last_price = float(prices[-1])
+        
+        micro_cluster = engine_contributions.get("micro_cluster")
+        return {
+            "volume": np.round(enhanced_volume, 2),
+            "side": side,
+            "engine_contributions": engine_contributions,
+            "is_absorption": micro_cluster > 1.5 if micro_cluster is not None else np.zeros(n, dtype=bool),
+            "timestamp": timestamps,
+            "price": prices,
+        }
+    
+    def calculate_enhanced_volumes(self, tick: Tick) -> Dict[Optional[str], Dict[str, Any]]:
+        """Interface plural do SharedEngineOrchestrator (shared_engines.py):
+        aqui há um único pipeline, sem identificador."""
+        return {None: self.calculate_enhanced_volume(tick)}
+    
+    def calculate_enhanced_volume_batches(self, prices, volumes, timestamps, sides) -> Dict[Optional[str], Dict[str, Any]]:
+        return {None: self.calculate_enhanced_volume_batch(prices, volumes, timestamps, sides)}
+    
+    def attach_book(self, book):
+        """Liga o OrderBook do símbolo (order_book.py) aos engines que leem o book."""
+        self.book = book
+        for engine in self.engines:
+            if engine.uses_book:
+                engine.book = book
+    
     def get_active_engines(self) -> List[Dict[str, str]]:
         return [
             {"id": engine.name, "description": engine.description}
             for engine in self.engines
-        ]
\ No newline at end of file
+        ]
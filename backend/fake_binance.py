@@ -0,0 +1,362 @@
+"""
+ImbalanceEngine - Stand-in local do stream de trades da Binance
+
+Servidor WebSocket que imita os endpoints públicos de trade da Binance
+com trades sintéticos (benchmarks/synthetic.py), para testar o backend
+sem rede:
+    /ws/<symbol>@trade                      (stream individual)
+    /stream?streams=<a>@trade/<b>@trade     (combined stream)
+    <symbol>@depth@100ms, <symbol>@bookTicker
+                                            (book, nos mesmos caminhos)
+    GET /api/v3/depth?symbol=X&limit=N      (snapshot REST do book, HTTP
+                                            na mesma porta)
+
+Os trades de cada símbolo são produzidos uma única vez pelo servidor e
+replicados para todas as conexões inscritas (mesmos trade_ids), com T e E
+no relógio atual para que a latência medida seja real.
+
+O trade_id segue o relógio (segundos desde a época × rate) e o conteúdo do
+trade depende só do id, então dois servidores, ou um servidor derrubado e
+subido de novo, produzem a mesma sequência, como dois endpoints da mesma
+exchange, e o tempo fora do ar vira um buraco de ids. Com --stall-prob,
+cada conexão trava de vez em quando por --stall-ms (os trades ficam
+retidos e saem juntos depois), imitando perda de pacote/retransmissão.
+
+O book de cada símbolo (FakeBook) acompanha o preço dos trades: a cada
+--depth-ms o servidor recentra os níveis em volta do último preço, mexe
+em algumas quantidades e publica o diff (U/u como na Binance) e o
+bookTicker. Com --depth-drop-prob, diffs somem no caminho (para todos os
+clientes), forçando o cliente a ressincronizar pelo snapshot.
+
+Uso:
+    python fake_binance.py --port 9443 --rate 200
+    python websocket_server.py --binance-url ws://localhost:9443 --symbols btcusdt,ethusdt
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from typing import Dict, Any, List, Set, Tuple
+from urllib.parse import urlparse, parse_qs
+import websockets
+from benchmarks.synthetic import generate_trades
+from static_assets import http_response
+
+START_PRICES = {"btcusdt": 60000.0, "ethusdt": 3000.0, "bnbusdt": 550.0, "solusdt": 150.0}
+BOOK_TICK = 0.01
+BOOK_LEVELS = 200
+
+
+def _request_path(websocket) -> str:
+    # websockets >= 13 expõe websocket.request.path; versões antigas, websocket.path
+    request = getattr(websocket, "request", None)
+    return request.path if request is not None else websocket.path
+
+
+def parse_streams(path: str) -> Tuple[List[Tuple[str, str]], bool]:
+    """Devolve ([(símbolo, stream)], combined) a partir do caminho pedido
+    pelo cliente; stream é "trade", "depth" ou "bookTicker"."""
+    url = urlparse(path)
+    if url.path.startswith("/ws/"):
+        streams = [url.path[len("/ws/"):]]
+        combined = False
+    elif url.path == "/stream":
+        streams = parse_qs(url.query).get("streams", [""])[0].split("/")
+        combined = True
+    else:
+        return [], False
+    parsed = []
+    for stream in streams:
+        symbol, _, kind = stream.partition("@")
+        kind = kind.split("@")[0]
+        if kind in ("trade", "depth", "bookTicker"):
+            parsed.append((symbol.lower(), kind))
+    return parsed, combined
+
+
+class FakeBook:
+    """Book sintético de um símbolo em níveis inteiros de BOOK_TICK, com
+    update ids sequenciais como os da Binance."""
+
+    def __init__(self, seed: int, levels: int = BOOK_LEVELS):
+        self.levels = levels
+        self.bids: Dict[int, float] = {}
+        self.asks: Dict[int, float] = {}
+        self.update_id = 1_000_000
+        self._random = random.Random(seed)
+
+    def _qty(self) -> float:
+        return round(self._random.expovariate(1.0) * 2.0 + 0.001, 5)
+
+    def step(self, price: float) -> Tuple[int, int, List[List[str]], List[List[str]]]:
+        """Recentra o book em `price` e mexe em algumas quantidades.
+        Devolve o diff (U, u, bids, asks) no formato da Binance."""
+        best_bid = math.floor(price / BOOK_TICK) - 1
+        changes = []
+        for side, first, direction in ((self.bids, best_bid, -1), (self.asks, best_bid + 2, 1)):
+            wanted = {first + direction * i for i in range(self.levels)}
+            side_changes = [(level, 0.0) for level in side if level not in wanted]
+            for level in wanted:
+                if level not in side or self._random.random() < 0.05:
+                    side_changes.append((level, self._qty()))
+            for level, qty in side_changes:
+                if qty:
+                    side[level] = qty
+                else:
+                    del side[level]
+            changes.append([[f"{level * BOOK_TICK:.2f}", f"{qty:.5f}"] for level, qty in side_changes])
+        first_id = self.update_id + 1
+        self.update_id += max(len(changes[0]) + len(changes[1]), 1)
+        return first_id, self.update_id, changes[0], changes[1]
+
+    def top(self) -> Tuple[str, str, str, str]:
+        bid = max(self.bids)
+        ask = min(self.asks)
+        return (f"{bid * BOOK_TICK:.2f}", f"{self.bids[bid]:.5f}", f"{ask * BOOK_TICK:.2f}", f"{self.asks[ask]:.5f}")
+
+    def snapshot(self, limit: int) -> Dict[str, Any]:
+        return {
+            "lastUpdateId": self.update_id,
+            "bids": [[f"{level * BOOK_TICK:.2f}", f"{self.bids[level]:.5f}"]
+                     for level in sorted(self.bids, reverse=True)[:limit]],
+            "asks": [[f"{level * BOOK_TICK:.2f}", f"{self.asks[level]:.5f}"] for level in sorted(self.asks)[:limit]],
+        }
+
+
+class FakeBinanceServer:
+    def __init__(self, host: str = "localhost", port: int = 0, rate: float = 50.0,
+                 regime: str = "bursty", seed: int = 42, pool_size: int = 100_000,
+                 stall_prob: float = 0.0, stall_ms: float = 200.0, depth_ms: float = 100.0,
+                 depth_drop_prob: float = 0.0, book_levels: int = BOOK_LEVELS):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.regime = regime
+        self.seed = seed
+        self.pool_size = pool_size
+        self.stall_prob = stall_prob
+        self.stall_ms = stall_ms
+        self.depth_ms = depth_ms
+        self.depth_drop_prob = depth_drop_prob
+        self.book_levels = book_levels
+
+        self.subscribers: Dict[str, Set[Tuple[object, bool]]] = {}
+        # Símbolo → {(cliente, combined, "depth" ou "bookTicker")}
+        self.book_subscribers: Dict[str, Set[Tuple[object, bool, str]]] = {}
+        self.books: Dict[str, FakeBook] = {}
+        self.depth_sent = 0
+        self.depth_dropped = 0
+        self.trade_ids: Dict[str, int] = {}
+        self.sent = 0
+        self.stalls = 0
+        # Conexão travada → (fim da trava em ms, mensagens retidas)
+        self._stalled: Dict[object, Tuple[float, List[str]]] = {}
+        # Travas independentes por servidor (o seed fixa só o conteúdo dos trades)
+        self._random = random.Random()
+        self._pools = {}
+        self._producers: Dict[str, asyncio.Task] = {}
+        self._book_producers: Dict[str, asyncio.Task] = {}
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handler, self.host, self.port,
+                                              process_request=self._process_request)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Derruba o servidor e todas as conexões abertas."""
+        for task in [*self._producers.values(), *self._book_producers.values()]:
+            task.cancel()
+        self._producers.clear()
+        self._book_producers.clear()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def drop_connections(self):
+        """Fecha as conexões atuais sem parar o servidor (simula queda do socket)."""
+        clients = {client for subscribers in self.subscribers.values() for client, _ in subscribers}
+        clients |= {client for subscribers in self.book_subscribers.values() for client, _, _ in subscribers}
+        for client in clients:
+            await client.close()
+
+    async def _process_request(self, connection, request):
+        """Snapshot REST do book (GET /api/v3/depth); o resto segue para o WebSocket."""
+        if "Upgrade" in request.headers:
+            return None
+        path, _, query = request.path.partition("?")
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        symbol = params.get("symbol", "").lower()
+        if path != "/api/v3/depth" or not symbol:
+            return http_response(404, [("Content-Type", "text/plain")], b"Not Found")
+        body = json.dumps(self._book(symbol).snapshot(int(params.get("limit", 1000)))).encode()
+        return http_response(200, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))], body)
+
+    async def _handler(self, websocket):
+        streams, combined = parse_streams(_request_path(websocket))
+        if not streams:
+            await websocket.close(1008, "stream inválido")
+            return
+
+        for symbol, kind in streams:
+            if kind == "trade":
+                self.subscribers.setdefault(symbol, set()).add((websocket, combined))
+                if symbol not in self._producers:
+                    self._producers[symbol] = asyncio.create_task(self._produce(symbol))
+            else:
+                self.book_subscribers.setdefault(symbol, set()).add((websocket, combined, kind))
+                if symbol not in self._book_producers:
+                    self._book_producers[symbol] = asyncio.create_task(self._produce_book(symbol))
+        try:
+            await websocket.wait_closed()
+        finally:
+            for symbol, kind in streams:
+                if kind == "trade":
+                    self.subscribers[symbol].discard((websocket, combined))
+                else:
+                    self.book_subscribers[symbol].discard((websocket, combined, kind))
+            self._stalled.pop(websocket, None)
+
+    def _pool(self, symbol: str):
+        if symbol not in self._pools:
+            seed = self.seed + sum(map(ord, symbol))
+            trades = generate_trades(self.regime, self.pool_size, seed=seed,
+                                     start_price=START_PRICES.get(symbol, 100.0))
+            self._pools[symbol] = (trades["price"].tolist(), trades["quantity"].tolist(), trades["is_maker"].tolist())
+        return self._pools[symbol]
+
+    def _message(self, symbol: str, combined: bool, trade_id: int, now_ms: int) -> str:
+        prices, quantities, makers = self._pool(symbol)
+        i = trade_id % len(prices)
+        data = {
+            "e": "trade",
+            "E": now_ms,
+            "s": symbol.upper(),
+            "t": trade_id,
+            "p": f"{prices[i]:.2f}",
+            "q": f"{quantities[i]:.5f}",
+            "T": now_ms,
+            "m": bool(makers[i]),
+            "M": True,
+        }
+        if combined:
+            data = {"stream": f"{symbol}@trade", "data": data}
+        return json.dumps(data)
+
+    def _book(self, symbol: str) -> FakeBook:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = FakeBook(self.seed + sum(map(ord, symbol)), self.book_levels)
+            book.step(self._current_price(symbol))
+        return book
+
+    def _current_price(self, symbol: str) -> float:
+        prices = self._pool(symbol)[0]
+        return prices[int(time.time() * self.rate) % len(prices)]
+
+    async def _produce_book(self, symbol: str):
+        """A cada depth_ms: recentra o book no preço atual e publica o diff
+        (@depth) e o topo (@bookTicker) para os inscritos."""
+        book = self._book(symbol)
+        while True:
+            await asyncio.sleep(self.depth_ms / 1000)
+            now_ms = int(time.time() * 1000)
+            first_id, last_id, bids, asks = book.step(self._current_price(symbol))
+            dropped = self.depth_drop_prob and self._random.random() < self.depth_drop_prob
+            self.depth_dropped += bool(dropped)
+            bid, bid_qty, ask, ask_qty = book.top()
+            depth = {"e": "depthUpdate", "E": now_ms, "s": symbol.upper(), "U": first_id, "u": last_id,
+                     "b": bids, "a": asks}
+            ticker = {"u": last_id, "s": symbol.upper(), "b": bid, "B": bid_qty, "a": ask, "A": ask_qty}
+            for client, combined, kind in list(self.book_subscribers.get(symbol, ())):
+                if kind == "depth" and dropped:
+                    continue
+                data = depth if kind == "depth" else ticker
+                if combined:
+                    data = {"stream": f"{symbol}@{kind}" + ("@100ms" if kind == "depth" else ""), "data": data}
+                try:
+                    await client.send(json.dumps(data))
+                    self.depth_sent += kind == "depth"
+                except websockets.exceptions.ConnectionClosed:
+                    self.book_subscribers[symbol].discard((client, combined, kind))
+
+    async def _produce(self, symbol: str):
+        """Gera trades do símbolo a `rate` trades/s e replica para os inscritos."""
+        trade_id = self.trade_ids.get(symbol) or int(time.time() * self.rate)
+        while True:
+            await asyncio.sleep(0.005)
+            now = time.time()
+            now_ms = int(now * 1000)
+            for trade_id in range(trade_id + 1, int(now * self.rate) + 1):
+                self.trade_ids[symbol] = trade_id
+                encoded = {}
+                for client, combined in list(self.subscribers.get(symbol, ())):
+                    if combined not in encoded:
+                        encoded[combined] = self._message(symbol, combined, trade_id, now_ms)
+                    try:
+                        await self._send(client, encoded[combined], now_ms)
+                    except websockets.exceptions.ConnectionClosed:
+                        self.subscribers[symbol].discard((client, combined))
+            await self._release_stalls(now_ms)
+
+    async def _send(self, client, message: str, now_ms: int):
+        stalled = self._stalled.get(client)
+        if stalled is None and self.stall_prob and self._random.random() < self.stall_prob:
+            stalled = self._stalled[client] = (now_ms + self.stall_ms, [])
+            self.stalls += 1
+        if stalled is not None:
+            stalled[1].append(message)
+            return
+        await client.send(message)
+        self.sent += 1
+
+    async def _release_stalls(self, now_ms: int):
+        for client, (until, held) in list(self._stalled.items()):
+            if until > now_ms:
+                continue
+            del self._stalled[client]
+            try:
+                for message in held:
+                    await client.send(message)
+                    self.sent += 1
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+
+async def _serve_forever(args):
+    server = FakeBinanceServer(host=args.host, port=args.port, rate=args.rate,
+                               regime=args.regime, seed=args.seed,
+                               stall_prob=args.stall_prob, stall_ms=args.stall_ms,
+                               depth_ms=args.depth_ms, depth_drop_prob=args.depth_drop_prob,
+                               book_levels=args.book_levels)
+    await server.start()
+    print(f"🧪 Fake Binance em {server.url} ({args.rate:g} trades/s por símbolo, regime {args.regime})")
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in local do stream de trades da Binance")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9443)
+    parser.add_argument("--rate", type=float, default=50.0, help="trades/s por símbolo")
+    parser.add_argument("--regime", default="bursty", help="calm, bursty ou flash_crash")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stall-prob", type=float, default=0.0,
+                        help="chance, por mensagem, de a conexão travar (0 = nunca)")
+    parser.add_argument("--stall-ms", type=float, default=200.0, help="duração de cada trava")
+    parser.add_argument("--depth-ms", type=float, default=100.0, help="intervalo dos diffs de book")
+    parser.add_argument("--depth-drop-prob", type=float, default=0.0,
+                        help="chance de um diff de book se perder (0 = nunca)")
+    parser.add_argument("--book-levels", type=int, default=BOOK_LEVELS, help="níveis de cada lado do book")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        print("\n👋 Fake Binance encerrado")
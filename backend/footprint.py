@@ -0,0 +1,289 @@
+"""
+Footprint e perfil de volume por nível de preço.
+
+Para cada símbolo (e pipeline de engines) acumula o volume enriquecido de
+compra e de venda por nível de preço (tick_size) em cada barra de bar_ms,
+mais o perfil de volume da sessão (dia UTC por padrão).
+
+Os níveis ficam em arrays indexados pelo preço: índice = preço / tick_size
+menos a base da janela. Cada trade é O(1) (somas em duas posições de
+array), e a memória é fixa: `levels` níveis por array, `max_bars` barras
+fechadas. Se o preço sair da janela, ela é recentrada no preço atual; os
+níveis que ficam de fora são descartados, e o próximo delta() devolve um
+snapshot completo no lugar do delta (um delta não tem como dizer ao
+cliente que um nível sumiu).
+
+Mensagens (só o necessário muda a cada envio):
+
+    footprint (snapshot, sob pedido):
+        {"type": "footprint", "symbol", "pipeline", "tick_size", "bar_ms",
+         "session_start", "bars": [barra, ...] (fechadas + atual),
+         "profile": {"price": [...], "buy": [...], "sell": [...]}, "poc"}
+
+    footprint_delta (periódico; depois de uma recentragem, um footprint):
+        {"type": "footprint_delta", "symbol", "pipeline", "tick_size",
+         "bar_ms", "session_start", "closed": [barras fechadas desde o
+         último delta], "bar": níveis da barra atual que mudaram,
+         "profile": níveis do perfil que mudaram}
+
+    barra: {"start", "open", "high", "low", "close",
+            "price": [...], "buy": [...], "sell": [...]}
+
+Os valores dos níveis num delta são absolutos (não incrementos): aplicar
+o mesmo delta duas vezes, ou um delta que se sobrepõe ao snapshot, dá o
+mesmo resultado.
+"""
+import math
+from array import array
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+FOOTPRINT_BAR_MS = 60_000
+FOOTPRINT_MAX_BARS = 120
+FOOTPRINT_LEVELS = 4096
+SESSION_MS = 86_400_000
+# Tick automático: ~preço / TICK_DIVISOR, arredondado para 1, 2 ou 5 x 10^k
+TICK_DIVISOR = 5000
+
+
+def default_tick_size(price: float) -> float:
+    """Ex.: BTC a 60000 → 10, ETH a 3000 → 0.5."""
+    raw = price / TICK_DIVISOR
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for step in (1, 2, 5, 10):
+        if raw <= step * magnitude * 1.5:
+            return round(step * magnitude, 12)
+    return round(10 * magnitude, 12)
+
+
+def _zeros(typecode: str, n: int) -> array:
+    return array(typecode, bytes(array(typecode).itemsize * n))
+
+
+class FootprintAggregator:
+    """Footprint por barra e perfil da sessão de um símbolo."""
+
+    def __init__(self, symbol: str, pipeline: str = None, tick_size: float = None,
+                 bar_ms: int = FOOTPRINT_BAR_MS, max_bars: int = FOOTPRINT_MAX_BARS,
+                 levels: int = FOOTPRINT_LEVELS, session_ms: int = SESSION_MS):
+        if levels < 2:
+            raise ValueError(f"Número de níveis inválido: {levels}")
+        self.symbol = symbol.upper()
+        self.pipeline = pipeline
+        self.tick_size = tick_size
+        self.bar_ms = bar_ms
+        self.levels = levels
+        self.session_ms = session_ms
+
+        # Nível (preço / tick_size) do índice 0; definido no primeiro trade
+        self.base = None
+        self.profile_buy = _zeros("d", levels)
+        self.profile_sell = _zeros("d", levels)
+        self.bar_buy = _zeros("d", levels)
+        self.bar_sell = _zeros("d", levels)
+
+        # Índices tocados na barra atual, mudados desde o último delta (barra
+        # e perfil): flag por nível + lista, para nunca varrer os arrays
+        self.bar_touched = bytearray(levels)
+        self.bar_indexes: List[int] = []
+        self.bar_dirty = bytearray(levels)
+        self.bar_dirty_indexes: List[int] = []
+        self.profile_dirty = bytearray(levels)
+        self.profile_dirty_indexes: List[int] = []
+
+        self.bars = deque(maxlen=max_bars)
+        self.closed = deque(maxlen=max_bars)
+
+        self.session_start = None
+        self.bar_start = None
+        self.bar_end = -math.inf
+        self.open = self.high = self.low = self.close = None
+        self.trade_count = 0
+        self.recenters = 0
+        # Recentragem desde o último delta: o próximo envio é um snapshot
+        self._reset = False
+
+    def add_payload(self, payload: Dict[str, Any]):
+        self.add(payload["price"], payload["volume"], payload["side"], payload["timestamp"])
+
+    def add(self, price: float, volume: float, side: str, timestamp: int):
+        if timestamp >= self.bar_end:
+            self._roll(price, timestamp)
+
+        index = int(price * self._inverse_tick + 0.5) - self.base
+        if not 0 <= index < self.levels:
+            index = self._recenter(price)
+
+        if side == "buy":
+            self.bar_buy[index] += volume
+            self.profile_buy[index] += volume
+        elif side == "sell":
+            self.bar_sell[index] += volume
+            self.profile_sell[index] += volume
+
+        if not self.bar_touched[index]:
+            self.bar_touched[index] = 1
+            self.bar_indexes.append(index)
+        if not self.bar_dirty[index]:
+            self.bar_dirty[index] = 1
+            self.bar_dirty_indexes.append(index)
+        if not self.profile_dirty[index]:
+            self.profile_dirty[index] = 1
+            self.profile_dirty_indexes.append(index)
+
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.trade_count += 1
+
+    def delta(self) -> Optional[Dict[str, Any]]:
+        """Mudanças desde o último delta (None se nada mudou); depois de
+        uma recentragem, o snapshot completo."""
+        if self._reset:
+            self._reset = False
+            _clear(self.bar_dirty, self.bar_dirty_indexes)
+            _clear(self.profile_dirty, self.profile_dirty_indexes)
+            self.closed.clear()
+            return self.snapshot()
+        if not self.bar_dirty_indexes and not self.profile_dirty_indexes and not self.closed:
+            return None
+        message = {
+            **self._header("footprint_delta"),
+            "closed": list(self.closed),
+            "bar": self._bar(sorted(self.bar_dirty_indexes)) if self.bar_start is not None else None,
+            "profile": self._levels(sorted(self.profile_dirty_indexes), self.profile_buy, self.profile_sell),
+        }
+        _clear(self.bar_dirty, self.bar_dirty_indexes)
+        _clear(self.profile_dirty, self.profile_dirty_indexes)
+        self.closed.clear()
+        return message
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado completo: barras fechadas, barra atual e perfil da sessão."""
+        bars = list(self.bars)
+        if self.bar_start is not None:
+            bars.append(self._bar(sorted(self.bar_indexes)))
+        indexes = [i for i in range(self.levels) if self.profile_buy[i] or self.profile_sell[i]]
+        profile = self._levels(indexes, self.profile_buy, self.profile_sell)
+        totals = [b + s for b, s in zip(profile["buy"], profile["sell"])]
+        return {
+            **self._header("footprint"),
+            "bars": bars,
+            "profile": profile,
+            # Point of control: nível com maior volume na sessão
+            "poc": profile["price"][totals.index(max(totals))] if totals else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "pipeline": self.pipeline,
+            "tick_size": self.tick_size,
+            "trades": self.trade_count,
+            "bars": len(self.bars),
+            "bar_levels": len(self.bar_indexes),
+            "recenters": self.recenters,
+        }
+
+    def _header(self, kind: str) -> Dict[str, Any]:
+        return {
+            "type": kind,
+            "symbol": self.symbol,
+            "pipeline": self.pipeline,
+            "tick_size": self.tick_size,
+            "bar_ms": self.bar_ms,
+            "session_start": self.session_start,
+        }
+
+    def _price(self, index: int) -> float:
+        return round((self.base + index) * self.tick_size, 10)
+
+    def _levels(self, indexes: List[int], buy: array, sell: array) -> Dict[str, list]:
+        return {
+            "price": [self._price(i) for i in indexes],
+            "buy": [round(buy[i], 2) for i in indexes],
+            "sell": [round(sell[i], 2) for i in indexes],
+        }
+
+    def _bar(self, indexes: List[int]) -> Dict[str, Any]:
+        return {
+            "start": self.bar_start,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            **self._levels(indexes, self.bar_buy, self.bar_sell),
+        }
+
+    def _roll(self, price: float, timestamp: int):
+        """Fecha a barra atual (se houver) e abre a barra do timestamp;
+        troca de sessão zera o perfil."""
+        if self.tick_size is None:
+            self.tick_size = default_tick_size(price)
+        self._inverse_tick = 1.0 / self.tick_size
+        if self.base is None:
+            self.base = int(price * self._inverse_tick + 0.5) - self.levels // 2
+
+        if self.bar_start is not None:
+            bar = self._bar(sorted(self.bar_indexes))
+            self.bars.append(bar)
+            self.closed.append(bar)
+            for i in self.bar_indexes:
+                self.bar_buy[i] = 0.0
+                self.bar_sell[i] = 0.0
+            _clear(self.bar_touched, self.bar_indexes)
+            _clear(self.bar_dirty, self.bar_dirty_indexes)
+
+        session_start = timestamp - timestamp % self.session_ms
+        if session_start != self.session_start:
+            if self.session_start is not None:
+                # Zera o perfil; os níveis zerados vão no próximo delta
+                for i in range(self.levels):
+                    if self.profile_buy[i] or self.profile_sell[i]:
+                        self.profile_buy[i] = self.profile_sell[i] = 0.0
+                        if not self.profile_dirty[i]:
+                            self.profile_dirty[i] = 1
+                            self.profile_dirty_indexes.append(i)
+            self.session_start = session_start
+
+        self.bar_start = timestamp - timestamp % self.bar_ms
+        self.bar_end = self.bar_start + self.bar_ms
+        self.open = self.high = self.low = self.close = price
+
+    def _recenter(self, price: float) -> int:
+        """Move a janela de níveis para centralizar o preço atual. Níveis
+        que saem da janela (e seu volume) são descartados; os clientes
+        recebem um snapshot no próximo delta()."""
+        base = int(price * self._inverse_tick + 0.5) - self.levels // 2
+        shift = base - self.base
+        self.base = base
+        self.recenters += 1
+        self._reset = True
+        for values in (self.profile_buy, self.profile_sell, self.bar_buy, self.bar_sell):
+            _shift(values, shift, _zeros("d", min(abs(shift), self.levels)))
+        for flags in (self.bar_touched, self.bar_dirty, self.profile_dirty):
+            _shift(flags, shift, bytearray(min(abs(shift), self.levels)))
+        for indexes in (self.bar_indexes, self.bar_dirty_indexes, self.profile_dirty_indexes):
+            indexes[:] = [i - shift for i in indexes if 0 <= i - shift < self.levels]
+        return self.levels // 2
+
+
+def _clear(flags: bytearray, indexes: List[int]):
+    for i in indexes:
+        flags[i] = 0
+    indexes.clear()
+
+
+def _shift(values, shift: int, zeros):
+    """values[i] passa a ser values[i + shift]; o que entra na janela é zero."""
+    n = len(values)
+    if abs(shift) >= n:
+        values[:] = zeros
+    elif shift > 0:
+        values[:n - shift] = values[shift:]
+        values[n - shift:] = zeros
+    elif shift < 0:
+        values[-shift:] = values[:n + shift]
+        values[:-shift] = zeros
@@ -0,0 +1,236 @@
+"""
+Pipeline de ingestão em estágios para o stream da Binance.
+
+    recepção  → só lê frames brutos do socket e enfileira (nunca espera o
+                processamento, então o socket da Binance é sempre drenado)
+    decodif./ → drena a fila em lotes, decodifica o lote e entrega ao feed
+    cálculo     (engines + broadcast)
+
+Decodificadores (plugáveis, recebem o lote inteiro de frames):
+    fast - junta o lote num único array JSON e faz um só json.loads (o
+           parser em C é chamado uma vez por lote, não por mensagem); se
+           alguma mensagem estiver malformada, cai para o caminho "json"
+    json - um json.loads por mensagem (referência)
+
+Extrair só os campos usados (p, q, m, T, t) com find/regex em Python puro
+sai mais caro que o json.loads em C, então o ganho vem de amortizar a
+chamada do parser por lote.
+
+stats() mostra o atraso de cada estágio em mensagens (fila) e em ms entre
+o tempo da exchange e o momento em que o estágio tocou o trade.
+
+Redundância (run_redundant): várias conexões ao mesmo stream alimentam a
+mesma fila de recepção, cada uma reconectando sozinha com backoff (ver
+upstream.py); com um TradeDedup, o estágio de decodificação descarta as
+cópias e entrega só a que chegou primeiro.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Any, List
+import websockets
+from upstream import TradeDedup, UpstreamLink
+
+def _unwrap(data: Any) -> Any:
+    # Combined stream: {"stream": "btcusdt@trade", "data": {...}}
+    return data.get("data", data) if isinstance(data, dict) else data
+
+
+def decode_json(messages: List[str]) -> List[Any]:
+    decoded = []
+    for message in messages:
+        try:
+            decoded.append(_unwrap(json.loads(message)))
+        except ValueError:
+            decoded.append(None)
+    return decoded
+
+
+def decode_fast(messages: List[str]) -> List[Any]:
+    try:
+        decoded = json.loads("[" + ",".join(messages) + "]")
+    except ValueError:
+        return decode_json(messages)
+    if len(decoded) != len(messages):
+        # Frame com mais de um valor JSON (ex.: "1,2") desalinharia o lote
+        return decode_json(messages)
+    return [_unwrap(data) for data in decoded]
+
+
+DECODERS: Dict[str, Callable[[List[str]], List[Any]]] = {
+    "fast": decode_fast,
+    "json": decode_json,
+}
+
+
+def _now_ms() -> float:
+    return time.time() * 1000
+
+
+class IngestPipeline:
+    """Separa a leitura do socket do processamento dos trades."""
+
+    def __init__(self, decoder: str = "fast", max_batch: int = 500, dedup: TradeDedup = None):
+        if decoder not in DECODERS:
+            raise ValueError(f"Decodificador desconhecido: {decoder} (use {', '.join(DECODERS)})")
+        self.decoder = decoder
+        self.decode = DECODERS[decoder]
+        self.max_batch = max_batch
+        self.dedup = dedup
+
+        # (frame bruto, instante de recepção em ms, índice da conexão)
+        self.queue = deque()
+        self.links: List[UpstreamLink] = []
+        self._wakeup = asyncio.Event()
+        self._receivers: List[asyncio.Task] = []
+
+        self.received = 0
+        self.processed = 0
+        self.batches = 0
+        self.skipped = 0
+        self.max_backlog = 0
+        self.receive_lag_ms = 0.0
+        self.max_receive_lag_ms = 0.0
+        self.process_lag_ms = 0.0
+        self.max_process_lag_ms = 0.0
+        self.queue_wait_ms = 0.0
+
+    @property
+    def backlog(self) -> int:
+        return len(self.queue)
+
+    async def run(self, websocket, handle_batch: Callable[[List[Dict[str, Any]]], Awaitable[None]]):
+        """Roda os dois estágios até a conexão cair ou stop(). A exceção do
+        socket é propagada depois que a fila já recebida for processada."""
+        if len(self.links) != 1:
+            self.links = [UpstreamLink()]
+        self.links[0].connected()
+        self._start([self._receive(websocket, 0)])
+        try:
+            await self._drain(handle_batch)
+        finally:
+            self.links[0].up = False
+
+    async def run_redundant(self, urls: List[str], handle_batch: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+                            on_reconnect: Callable[[str], None] = None):
+        """Uma conexão por URL (repita a URL para mais de uma conexão com o
+        mesmo endpoint), todas entregando na mesma fila (hot standby). Uma
+        conexão que cai reconecta sozinha com backoff exponencial e jitter
+        enquanto as outras seguem recebendo; on_reconnect(mensagem) é
+        chamado a cada queda. Só termina com stop()."""
+        self.links = [UpstreamLink(url) for url in urls]
+        self._start([self._keep_connected(i, on_reconnect) for i in range(len(urls))])
+        await self._drain(handle_batch)
+
+    def _start(self, receivers):
+        self._wakeup = asyncio.Event()
+        self._receivers = [asyncio.create_task(receiver) for receiver in receivers]
+        for receiver in self._receivers:
+            receiver.add_done_callback(lambda _: self._wakeup.set())
+
+    async def _drain(self, handle_batch):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self.queue:
+                    await self._process(handle_batch)
+                    # Devolve o loop à recepção entre lotes
+                    await asyncio.sleep(0)
+                if all(receiver.done() for receiver in self._receivers):
+                    for receiver in self._receivers:
+                        if not receiver.cancelled():
+                            receiver.result()
+                    return
+        finally:
+            self.stop()
+
+    def stop(self):
+        for receiver in self._receivers:
+            if not receiver.done():
+                receiver.cancel()
+
+    async def _keep_connected(self, index: int, on_reconnect: Callable[[str], None] = None):
+        link = self.links[index]
+        while True:
+            try:
+                async with websockets.connect(link.url) as websocket:
+                    link.connected()
+                    await self._receive(websocket, index)
+            except Exception as e:
+                delay = link.disconnected(e)
+                if on_reconnect:
+                    on_reconnect(f"conexão {index + 1}: {e} (nova tentativa em {delay:.1f}s)")
+                await asyncio.sleep(delay)
+
+    async def _receive(self, websocket, index: int):
+        queue = self.queue
+        link = self.links[index]
+        while True:
+            message = await websocket.recv()
+            queue.append((message, _now_ms(), index))
+            self.received += 1
+            link.received += 1
+            if len(queue) > self.max_backlog:
+                self.max_backlog = len(queue)
+            self._wakeup.set()
+
+    async def _process(self, handle_batch):
+        queue = self.queue
+        count = min(len(queue), self.max_batch)
+        raw = [queue.popleft() for _ in range(count)]
+        batch = []
+        dedup = self.dedup
+        links = self.links
+        for data, (_, received_at, index) in zip(self.decode([message for message, _, _ in raw]), raw):
+            if isinstance(data, dict) and "T" in data:
+                # Cópia de um trade que outra conexão já entregou
+                if dedup is not None and not dedup.accept(data.get("s", ""), data.get("t"), received_at):
+                    continue
+                links[index].first += 1
+                batch.append(data)
+            else:
+                # Mensagem que não é trade (resposta de SUBSCRIBE, JSON inválido)
+                self.skipped += 1
+        if dedup is not None:
+            dedup.expire(_now_ms())
+        if not batch:
+            return
+
+        await handle_batch(batch)
+
+        now = _now_ms()
+        last = batch[-1]
+        received_at = raw[-1][1]
+        self.processed += len(batch)
+        self.batches += 1
+        self.receive_lag_ms = received_at - last.get("E", last["T"])
+        self.process_lag_ms = now - last["T"]
+        self.queue_wait_ms = now - raw[0][1]
+        if self.receive_lag_ms > self.max_receive_lag_ms:
+            self.max_receive_lag_ms = self.receive_lag_ms
+        if self.process_lag_ms > self.max_process_lag_ms:
+            self.max_process_lag_ms = self.process_lag_ms
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "decoder": self.decoder,
+            "receive": {
+                "messages": self.received,
+                "lag_ms": round(self.receive_lag_ms, 1),
+                "max_lag_ms": round(self.max_receive_lag_ms, 1),
+            },
+            "process": {
+                "messages": self.processed,
+                "batches": self.batches,
+                "skipped": self.skipped,
+                "backlog": self.backlog,
+                "max_backlog": self.max_backlog,
+                "lag_ms": round(self.process_lag_ms, 1),
+                "max_lag_ms": round(self.max_process_lag_ms, 1),
+                "queue_wait_ms": round(self.queue_wait_ms, 1),
+            },
+            "connections": [link.stats() for link in self.links],
+            "dedup": self.dedup.stats() if self.dedup else None,
+        }
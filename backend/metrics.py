@@ -0,0 +1,191 @@
+"""
+Métricas do caminho quente no formato texto do Prometheus (GET /metrics).
+
+Só histogramas com buckets fixos e contadores: observe() é uma busca
+binária na lista de limites e dois incrementos, sem lock e sem alocação,
+então as métricas ficam sempre ligadas, mesmo com carga cheia. Cronometrar
+cada engine em cada tick custaria uma fração relevante do próprio engine
+(poucos µs), então o caminho por tick só mede 1 a cada ENGINE_SAMPLE_EVERY
+ticks; lotes são sempre medidos.
+
+A leitura (render) roda no próprio loop do asyncio (GET /metrics na porta
+do WebSocket), entre dois trades, então um scrape nunca vê uma série pela
+metade.
+
+Métricas:
+    imbalance_engine_seconds{engine,path}  tempo de cada engine por chamada
+                                           (path="tick", amostrado, ou "batch")
+    imbalance_encode_seconds{format,kind}  serialização de trades/frames
+    imbalance_broadcast_seconds            broadcast_trade completo
+    imbalance_e2e_latency_seconds{kind}    do T da Binance até o send no
+                                           socket do cliente
+    imbalance_snapshot_build_seconds       montagem do snapshot de late-join
+    imbalance_binance_reconnects_total     reconexões com a Binance
+    imbalance_binance_missed_trades_total{symbol}
+                                           trades que nenhuma conexão entregou
+                                           (buracos na sequência de trade_id)
+    imbalance_book_resyncs_total{symbol}   books L2 refeitos do snapshot por
+                                           um diff de profundidade perdido
+    imbalance_connected_clients            clientes WebSocket conectados
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Segundos: de 1µs (um engine por tick) a 10s
+DURATION_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Latência ponta a ponta inclui a rede até a Binance e a cadência de conflação
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# Amostragem do tempo por engine no caminho por tick
+ENGINE_SAMPLE_EVERY = 16
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_INF = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Uma série de histograma (um conjunto de valores de labels)."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        # Um contador por bucket (não acumulado) + o bucket +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class MetricFamily:
+    """Métrica com nome, ajuda e labels; labels(...) devolve a série.
+    No caminho quente guarde a série, em vez de chamar labels() por evento."""
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple[str, ...], object] = {}
+        if not self.label_names:
+            # Sem labels a série existe desde o início (aparece zerada no scrape)
+            self.labels()
+
+    def labels(self, *values: str):
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} espera os labels {self.label_names}, recebeu {values}")
+        series = self.series.get(values)
+        if series is None:
+            series = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+            self.series[values] = series
+        return series
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, series in list(self.series.items()):
+            if self.kind == "counter":
+                lines.append(f"{self.name}{_labels(self.label_names, values)} {series.value}")
+                continue
+            counts = list(series.counts)
+            total = series.sum
+            cumulative = 0
+            for bound, count in zip(series.bounds, counts):
+                cumulative += count
+                le = _labels(self.label_names, values, f'le="{bound!r}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, values, _INF)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Valor lido na hora do scrape (nada a atualizar no caminho quente)."""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Métrica já registrada: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DURATION_BUCKETS) -> MetricFamily:
+        return self._register(MetricFamily(name, help_text, "histogram", label_names, buckets))
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._register(MetricFamily(name, help_text, "counter", label_names))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help_text, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ENGINE_SECONDS = REGISTRY.histogram(
+    "imbalance_engine_seconds", "Tempo de cada engine por chamada (tick amostrado ou lote).", ("engine", "path"))
+ENCODE_SECONDS = REGISTRY.histogram(
+    "imbalance_encode_seconds", "Serialização de um trade ou frame.", ("format", "kind"))
+BROADCAST_SECONDS = REGISTRY.histogram(
+    "imbalance_broadcast_seconds", "Tempo de broadcast_trade (roteamento, codificação e enfileiramento).")
+E2E_LATENCY_SECONDS = REGISTRY.histogram(
+    "imbalance_e2e_latency_seconds", "Do timestamp T da Binance até o envio no socket do cliente.",
+    ("kind",), LATENCY_BUCKETS)
+SNAPSHOT_BUILD_SECONDS = REGISTRY.histogram(
+    "imbalance_snapshot_build_seconds", "Montagem e codificação de um snapshot (uma por cache, não por cliente).")
+BINANCE_RECONNECTS = REGISTRY.counter(
+    "imbalance_binance_reconnects_total", "Reconexões com o stream da Binance.")
+BINANCE_MISSED_TRADES = REGISTRY.counter(
+    "imbalance_binance_missed_trades_total", "Trades que não chegaram por nenhuma conexão (buracos de trade_id).",
+    ("symbol",))
+BOOK_RESYNCS = REGISTRY.counter(
+    "imbalance_book_resyncs_total", "Books L2 ressincronizados por um diff de profundidade perdido.", ("symbol",))
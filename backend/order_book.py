@@ -0,0 +1,358 @@
+"""
+Book de ofertas L2 local por símbolo, montado com os streams de book da
+Binance (o stream @trade não tem bid/ask):
+    <símbolo>@depth@100ms  diffs de profundidade; U/u = primeiro e último
+                           update id do evento, quantidade 0 remove o nível
+    <símbolo>@bookTicker   melhor bid/ask a cada mudança (u = update id)
+e o snapshot REST (GET /api/v3/depth) para sincronizar.
+
+Sincronização (o procedimento documentado pela Binance):
+    1. abre o stream e guarda os diffs que chegam;
+    2. pede o snapshot (lastUpdateId);
+    3. descarta os diffs com u <= lastUpdateId; o primeiro aplicado precisa
+       ter U <= lastUpdateId + 1 <= u (senão o snapshot é velho: pede outro);
+    4. daí em diante cada diff precisa começar em U = u anterior + 1; um
+       buraco (diff perdido) zera o book e volta ao passo 2.
+
+Escada de preços (PriceLadder): lista ordenada de chaves com o melhor
+nível no fim (preço nos bids, −preço nos asks) e um dict preço →
+quantidade. Atualizar um nível é uma busca binária (bisect, O(log n));
+a inserção/remoção move só os níveis depois dele na lista, e como quase
+toda mudança é perto do topo (o fim da lista), isso é quase nada. O topo
+é keys[-1] (O(1)) e a soma dos N melhores níveis lê só o fim da lista.
+
+O topo do book vem do bookTicker quando ele é mais novo que o último diff
+(chega a cada mudança, não a cada 100ms); a escada responde o resto
+(profundidade, desequilíbrio).
+"""
+import asyncio
+import json
+import urllib.request
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import websockets
+from metrics import BOOK_RESYNCS
+from upstream import UpstreamLink
+
+BINANCE_REST_BASE = "https://api.binance.com"
+DEPTH_INTERVAL = "100ms"
+BOOK_SNAPSHOT_LIMIT = 1000
+# Diffs guardados enquanto o snapshot não chega (~100s de @depth@100ms)
+MAX_BUFFERED = 1000
+# Espera antes de pedir outro snapshot depois de uma falha
+SNAPSHOT_RETRY_DELAY = 1.0
+
+
+class PriceLadder:
+    """Um lado do book com o melhor nível no fim da lista de chaves."""
+
+    __slots__ = ("sign", "keys", "qty")
+
+    def __init__(self, sign: int):
+        # +1 nos bids (maior preço é o melhor), −1 nos asks (menor preço)
+        self.sign = sign
+        self.keys: List[float] = []
+        self.qty: Dict[float, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def set(self, price: float, qty: float):
+        """Quantidade de um nível; 0 remove o nível."""
+        levels = self.qty
+        if qty == 0.0:
+            if levels.pop(price, None) is not None:
+                keys = self.keys
+                del keys[bisect_left(keys, price * self.sign)]
+        else:
+            if price not in levels:
+                insort(self.keys, price * self.sign)
+            levels[price] = qty
+
+    def clear(self):
+        self.keys.clear()
+        self.qty.clear()
+
+    def best(self) -> Optional[Tuple[float, float]]:
+        if not self.keys:
+            return None
+        price = self.keys[-1] * self.sign
+        return price, self.qty[price]
+
+    def depth(self, levels: int) -> float:
+        """Quantidade somada dos `levels` melhores níveis."""
+        sign = self.sign
+        qty = self.qty
+        return sum(qty[key * sign] for key in self.keys[-levels:])
+
+    def levels(self, count: int) -> List[Tuple[float, float]]:
+        """Os `count` melhores níveis, do melhor para o pior."""
+        sign = self.sign
+        return [(key * sign, self.qty[key * sign]) for key in reversed(self.keys[-count:])]
+
+
+class OrderBook:
+    """Book L2 de um símbolo: escada de bids e asks, topo do bookTicker e
+    o estado da sincronização com o snapshot."""
+
+    def __init__(self, symbol: str, max_buffered: int = MAX_BUFFERED):
+        self.symbol = symbol.lower()
+        self.bids = PriceLadder(1)
+        self.asks = PriceLadder(-1)
+        # None = ainda não sincronizado com um snapshot
+        self.last_update_id: Optional[int] = None
+        self._buffer = deque(maxlen=max_buffered)
+
+        # Último bookTicker: (update id, bid, qtd, ask, qtd)
+        self.ticker: Optional[Tuple[int, float, float, float, float]] = None
+
+        self.diffs = 0
+        self.levels_applied = 0
+        self.tickers = 0
+        self.snapshots = 0
+        self.resyncs = 0
+
+    @property
+    def synced(self) -> bool:
+        return self.last_update_id is not None
+
+    def reset(self):
+        """Volta ao estado inicial (nova conexão)."""
+        self._unsync()
+        self.ticker = None
+
+    def _unsync(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+        self._buffer.clear()
+
+    def apply_snapshot(self, snapshot: Dict[str, Any]) -> bool:
+        """Carrega o snapshot REST e aplica os diffs guardados. False se o
+        snapshot é mais velho que o primeiro diff guardado (pedir outro)."""
+        last_update_id = int(snapshot["lastUpdateId"])
+        pending = [event for event in self._buffer if event["u"] > last_update_id]
+        if pending and pending[0]["U"] > last_update_id + 1:
+            return False
+
+        self.bids.clear()
+        self.asks.clear()
+        for price, qty in snapshot["bids"]:
+            self.bids.set(float(price), float(qty))
+        for price, qty in snapshot["asks"]:
+            self.asks.set(float(price), float(qty))
+        self.last_update_id = last_update_id
+        self._buffer.clear()
+        self.snapshots += 1
+        for event in pending:
+            if not self.apply_diff(event):
+                return False
+        return True
+
+    def apply_diff(self, event: Dict[str, Any]) -> bool:
+        """Aplica um evento depthUpdate. False se o book precisa de um
+        snapshot (ainda não sincronizado ou um diff se perdeu)."""
+        if self.last_update_id is None:
+            self._buffer.append(event)
+            return False
+        last_update_id = event["u"]
+        if last_update_id <= self.last_update_id:
+            return True
+        if event["U"] > self.last_update_id + 1:
+            # Diff perdido: a escada não é mais confiável (o bookTicker continua valendo)
+            self._unsync()
+            self._buffer.append(event)
+            self.resyncs += 1
+            return False
+
+        bids = self.bids
+        asks = self.asks
+        for price, qty in event["b"]:
+            bids.set(float(price), float(qty))
+        for price, qty in event["a"]:
+            asks.set(float(price), float(qty))
+        self.levels_applied += len(event["b"]) + len(event["a"])
+        self.last_update_id = last_update_id
+        self.diffs += 1
+        return True
+
+    def apply_ticker(self, data: Dict[str, Any]):
+        """Aplica um evento bookTicker (ignora um mais velho que o atual)."""
+        update_id = data["u"]
+        ticker = self.ticker
+        if ticker is None or update_id > ticker[0]:
+            self.ticker = (update_id, float(data["b"]), float(data["B"]), float(data["a"]), float(data["A"]))
+            self.tickers += 1
+
+    def top(self) -> Optional[Tuple[float, float, float, float]]:
+        """(bid, qtd, ask, qtd) mais recente: o bookTicker, se for mais novo
+        que o último diff aplicado, senão o topo da escada."""
+        ticker = self.ticker
+        if ticker is not None and (self.last_update_id is None or ticker[0] >= self.last_update_id):
+            return ticker[1:]
+        if not self.bids.keys or not self.asks.keys:
+            return None
+        bid, bid_qty = self.bids.best()
+        ask, ask_qty = self.asks.best()
+        return bid, bid_qty, ask, ask_qty
+
+    @property
+    def best_bid(self) -> Optional[float]:
+        top = self.top()
+        return top[0] if top else None
+
+    @property
+    def best_ask(self) -> Optional[float]:
+        top = self.top()
+        return top[2] if top else None
+
+    def imbalance(self, levels: int) -> Optional[float]:
+        """(bids − asks) / (bids + asks) nos `levels` melhores níveis de
+        cada lado, entre −1 (só asks) e 1 (só bids); None sem book."""
+        if self.last_update_id is None:
+            return None
+        bid_qty = self.bids.depth(levels)
+        ask_qty = self.asks.depth(levels)
+        total = bid_qty + ask_qty
+        if total <= 0.0:
+            return None
+        return (bid_qty - ask_qty) / total
+
+    def stats(self) -> Dict[str, Any]:
+        top = self.top()
+        return {
+            "symbol": self.symbol.upper(),
+            "synced": self.synced,
+            "last_update_id": self.last_update_id,
+            "bid_levels": len(self.bids),
+            "ask_levels": len(self.asks),
+            "bid": top[0] if top else None,
+            "ask": top[2] if top else None,
+            "spread": round(top[2] - top[0], 8) if top else None,
+            "imbalance_5": self.imbalance(5),
+            "diffs": self.diffs,
+            "levels_applied": self.levels_applied,
+            "tickers": self.tickers,
+            "snapshots": self.snapshots,
+            "resyncs": self.resyncs,
+            "buffered": len(self._buffer),
+        }
+
+
+def rest_base_url(ws_url: str) -> str:
+    """URL REST equivalente a uma URL de stream: a da Binance para o stream
+    oficial; para um stand-in local (ws://host:porta), o mesmo host e porta."""
+    if "stream.binance.com" in ws_url:
+        return BINANCE_REST_BASE
+    if ws_url.startswith("wss://"):
+        return "https://" + ws_url[len("wss://"):]
+    if ws_url.startswith("ws://"):
+        return "http://" + ws_url[len("ws://"):]
+    return ws_url
+
+
+def fetch_snapshot(rest_url: str, symbol: str, limit: int = BOOK_SNAPSHOT_LIMIT,
+                   timeout: float = 10.0) -> Dict[str, Any]:
+    """GET /api/v3/depth (bloqueante; o BookFeed chama numa thread)."""
+    url = f"{rest_url}/api/v3/depth?symbol={symbol.upper()}&limit={limit}"
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.load(response)
+
+
+class BookFeed:
+    """Books de vários símbolos num único socket (combined stream com
+    @bookTicker e @depth de cada um). Reconecta sozinho com backoff até
+    stop(); os snapshots são pedidos em paralelo (uma thread por pedido),
+    sem travar o loop."""
+
+    def __init__(self, symbols: List[str], base_url: str, rest_url: str = None,
+                 depth_interval: str = DEPTH_INTERVAL, snapshot_limit: int = BOOK_SNAPSHOT_LIMIT,
+                 on_reconnect: Callable[[str], None] = None):
+        if not symbols:
+            raise ValueError("BookFeed precisa de pelo menos um símbolo")
+        self.symbols = [symbol.lower() for symbol in symbols]
+        self.books: Dict[str, OrderBook] = {symbol: OrderBook(symbol) for symbol in self.symbols}
+        self.rest_url = rest_url or rest_base_url(base_url)
+        self.snapshot_limit = snapshot_limit
+        streams = "/".join(f"{symbol}@bookTicker/{symbol}@depth@{depth_interval}" for symbol in self.symbols)
+        self.ws_url = f"{base_url}/stream?streams={streams}"
+        self.link = UpstreamLink(self.ws_url)
+        self.on_reconnect = on_reconnect
+        self.running = False
+        self.messages = 0
+        self.snapshot_errors = 0
+        self._fetching: Dict[str, asyncio.Task] = {}
+
+    async def run(self):
+        """Mantém o socket de book aberto (reconectando) até stop()."""
+        self.running = True
+        while self.running:
+            try:
+                # Diffs de @depth com muitos níveis passam do limite padrão de 1 MiB no snapshot de abertura
+                async with websockets.connect(self.ws_url, max_size=None) as websocket:
+                    self.link.connected()
+                    for book in self.books.values():
+                        book.reset()
+                    async for message in websocket:
+                        self.handle(json.loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self.running:
+                    break
+                delay = self.link.disconnected(e)
+                if self.on_reconnect:
+                    self.on_reconnect(f"book: {e} (nova tentativa em {delay:.1f}s)")
+                await asyncio.sleep(delay)
+
+    def handle(self, message: Dict[str, Any]):
+        """Aplica uma mensagem do combined stream ao book do símbolo."""
+        data = message.get("data", message)
+        book = self.books.get(data.get("s", "").lower())
+        if book is None:
+            return
+        self.messages += 1
+        self.link.received += 1
+        if data.get("e") == "depthUpdate":
+            resyncs = book.resyncs
+            if not book.apply_diff(data):
+                if book.resyncs != resyncs:
+                    BOOK_RESYNCS.labels(book.symbol).inc()
+                self._request_snapshot(book)
+        elif "b" in data and "a" in data:
+            book.apply_ticker(data)
+
+    def _request_snapshot(self, book: OrderBook):
+        if book.symbol not in self._fetching:
+            self._fetching[book.symbol] = asyncio.create_task(self._load_snapshot(book))
+
+    async def _load_snapshot(self, book: OrderBook):
+        try:
+            while self.running and not book.synced:
+                try:
+                    snapshot = await asyncio.to_thread(fetch_snapshot, self.rest_url, book.symbol,
+                                                       self.snapshot_limit)
+                except Exception as e:
+                    self.snapshot_errors += 1
+                    print(f"⚠️ Snapshot do book de {book.symbol.upper()} falhou: {e}")
+                    await asyncio.sleep(SNAPSHOT_RETRY_DELAY)
+                    continue
+                if not book.apply_snapshot(snapshot):
+                    # Snapshot mais velho que os diffs guardados (ou diff perdido entre eles): pede outro
+                    await asyncio.sleep(0.1)
+        finally:
+            self._fetching.pop(book.symbol, None)
+
+    def stop(self):
+        self.running = False
+        for task in list(self._fetching.values()):
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "snapshot_errors": self.snapshot_errors,
+            "connection": self.link.stats(),
+            "books": [book.stats() for book in self.books.values()],
+        }
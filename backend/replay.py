@@ -0,0 +1,112 @@
+"""
+ImbalanceEngine - Replay de sessões gravadas
+
+Reproduz uma gravação do TradeRecorder pelo mesmo caminho do feed ao vivo
+(BinanceDataFeed._process_trade → VolumeEngineOrchestrator). Como todos os
+engines usam o timestamp do trade (tempo do evento), o resultado é
+determinístico em qualquer velocidade.
+
+Uso:
+    python replay.py gravacao.bin                 # o mais rápido possível
+    python replay.py gravacao.bin --speed 10      # 10x o tempo real
+    python replay.py gravacao.bin --batch 10000   # API vetorizada (sem payloads)
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict, Any, Iterator, Optional
+from binance_ws import BinanceDataFeed
+from engine_orchestrator import VolumeEngineOrchestrator
+from trade_recorder import read_recording, record_to_message, records_to_columns
+
+DEFAULT_ENGINES = ["tick_velocity", "side_inference", "micro_cluster"]
+DEFAULT_WEIGHTS = {"tick_velocity": 1.0, "side_inference": 1.0, "micro_cluster": 1.5}
+
+
+async def replay(path: str, orchestrator: VolumeEngineOrchestrator, speed: Optional[float] = None,
+                 on_data_callback: Callable = None) -> BinanceDataFeed:
+    """Alimenta a gravação pelo BinanceDataFeed.
+
+    speed=None (ou 0) roda o mais rápido possível; speed=N respeita os
+    intervalos entre trades divididos por N. Devolve o feed usado (com
+    trade_count etc.)."""
+    symbol, records = read_recording(path)
+    feed = BinanceDataFeed(symbol=symbol, orchestrator=orchestrator)
+    feed.log_interval = 0
+    feed.running = True
+
+    if len(records) == 0:
+        return feed
+
+    loop = asyncio.get_running_loop()
+    first_trade_time = int(records[0]["trade_time"])
+    started = loop.time()
+
+    for i, record in enumerate(records):
+        if not feed.running:
+            break
+
+        if speed:
+            target = (int(record["trade_time"]) - first_trade_time) / 1000.0 / speed
+            delay = target - (loop.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif i % 1000 == 0:
+            # Cede o loop de vez em quando para não travar outras tarefas
+            await asyncio.sleep(0)
+
+        await feed._process_trade(record_to_message(record, symbol), on_data_callback)
+
+    return feed
+
+
+def replay_batches(path: str, orchestrator: VolumeEngineOrchestrator,
+                   batch_size: int = 10000) -> Iterator[Dict[str, Any]]:
+    """Reproduz a gravação pela API vetorizada do orquestrador, em lotes.
+
+    Mesmos resultados do caminho por tick, sem montar payloads: é o modo
+    para reprocessar sessões inteiras limitado apenas por CPU."""
+    _, records = read_recording(path)
+    for start in range(0, len(records), batch_size):
+        columns = records_to_columns(records[start:start + batch_size])
+        yield orchestrator.calculate_enhanced_volume_batch(*columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay de uma gravação de trades da Binance")
+    parser.add_argument("path", help="arquivo gravado pelo TradeRecorder")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="multiplicador de tempo real (omitido = o mais rápido possível)")
+    parser.add_argument("--engines", default=",".join(DEFAULT_ENGINES),
+                        help="engines separados por vírgula")
+    parser.add_argument("--batch", type=int, default=0,
+                        help="usa a API vetorizada com lotes deste tamanho")
+    args = parser.parse_args()
+
+    engine_names = args.engines.split(",")
+    weights = {name: DEFAULT_WEIGHTS.get(name, 1.0) for name in engine_names}
+    orchestrator = VolumeEngineOrchestrator(engine_names=engine_names, weights=weights)
+
+    started = time.perf_counter()
+    trades = 0
+    absorptions = 0
+
+    if args.batch:
+        for result in replay_batches(args.path, orchestrator, args.batch):
+            trades += len(result["volume"])
+            absorptions += int(result["is_absorption"].sum())
+    else:
+        async def count(payload):
+            nonlocal absorptions
+            absorptions += payload["is_absorption"]
+
+        feed = asyncio.run(replay(args.path, orchestrator, args.speed, count))
+        trades = feed.trade_count
+
+    elapsed = time.perf_counter() - started
+    print(f"▶️  {trades} trades em {elapsed:.2f}s ({trades / max(elapsed, 1e-9):,.0f} trades/s)")
+    print(f"⚠️  Absorções: {absorptions}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,652 @@
+"""
+Modo multiprocesso: ingestão, engines e fan-out em processos separados.
+
+    ingestão (1 processo)   socket(s) da Binance → IngestPipeline (dedup por
+                            trade_id) → registros RAW no ring do worker
+                            dono de cada símbolo
+    workers (N processos)   o símbolo i fica no worker i % N. Cada símbolo
+                            tem o mesmo BinanceDataFeed + SharedEngine-
+                            Orchestrator do modo de um processo, lendo do
+                            ring em vez do socket; os payloads viram
+                            registros OUT no ring de saída do worker. Com
+                            book=True, cada worker abre o socket de book
+                            (BookFeed) só dos seus símbolos
+    fan-out (processo       lê os rings de saída, remonta os payloads e
+    principal)              chama broadcast_trade (clientes, snapshot,
+                            footprint, conflação) e atende o HTTP
+
+Trades só passam pelos rings de memória compartilhada (shm_ring.py), em
+lotes de registros de largura fixa. O que é raro vai por
+multiprocessing.Queue (pickle): controle do principal para cada worker
+(ativar/desativar pipelines de engines) e eventos dos filhos para o
+principal (layout de engine_contributions, trocas de engines, estatísticas,
+reconexões e buracos de trade_id).
+
+engine_contributions vai em MAX_CONTRIBUTIONS floats por registro, o
+máximo que um pipeline aceito pela validação pode gerar (um por engine de
+fator mais os sub-fatores de cada um), então os payloads são os mesmos do
+modo de um processo; a lista de chaves de cada layout é enviada uma vez,
+como evento, antes do primeiro registro que a usa.
+
+Workers: `python websocket_server.py --workers N` (0 = tudo num processo,
+o padrão). Um símbolo roda sempre num único worker (a ordem dos trades é
+o estado dos engines), então mais workers que símbolos não ajuda; o
+ganho vem de vários símbolos, ou vários pipelines de engines, dividindo
+os núcleos. As métricas de tempo por engine (metrics.py) ficam nos
+workers e não aparecem no /metrics do processo principal.
+
+Ninguém bloqueia nos rings: ring cheio faz o produtor esperar em passos
+de IDLE_SLEEP (a fila da IngestPipeline continua drenando o socket), e
+ring vazio faz o consumidor dormir IDLE_SLEEP, o que soma até ~1ms de
+latência por etapa quando o fluxo está parado.
+"""
+import asyncio
+import multiprocessing as mp
+import queue
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import numpy as np
+from binance_ws import BinanceDataFeed, BINANCE_WS_BASE, HISTORY_SIZE
+from engine_orchestrator import ENGINE_REGISTRY
+from ingest import IngestPipeline
+from order_book import BookFeed
+from shared_engines import EnginePipeline, SharedEngineOrchestrator
+from shm_ring import ShmRing
+from trade_recorder import TradeRecorder
+from upstream import TradeDedup, connection_urls
+from volume_engines.base import SIDE_CODES, SIDE_NAMES, SIDE_NEUTRAL
+
+# Uma chave por engine de fator mais o máximo de sub-fatores de cada um
+MAX_CONTRIBUTIONS = sum(1 + engine.max_sub_factors for name, engine in ENGINE_REGISTRY.items()
+                        if name != "side_inference")
+RAW_RING_SIZE = 1 << 16
+OUT_RING_SIZE = 1 << 17
+# Registros tirados de um ring por vez (como o max_batch da IngestPipeline)
+MAX_BATCH = 500
+IDLE_SLEEP = 0.0005
+STATS_INTERVAL = 1.0
+# Espera máxima pelo evento de layout de um registro já lido
+LAYOUT_TIMEOUT = 1.0
+# Espera por processo filho ao parar, antes do terminate()
+JOIN_TIMEOUT = 5.0
+
+RAW_DTYPE = np.dtype([
+    ("trade_id", "<i8"),
+    ("trade_time", "<i8"),
+    ("event_time", "<i8"),
+    ("price", "<f8"),
+    ("quantity", "<f8"),
+    ("symbol", "<u2"),
+    ("is_maker", "u1"),
+])
+
+OUT_DTYPE = np.dtype([
+    ("trade_id", "<i8"),
+    ("timestamp", "<i8"),
+    ("trade_count", "<i8"),
+    ("price", "<f8"),
+    ("qty", "<f8"),
+    ("volume_raw", "<f8"),
+    ("volume", "<f8"),
+    ("contributions", "<f8", (MAX_CONTRIBUTIONS,)),
+    ("symbol", "<u2"),
+    ("pipeline", "<u2"),
+    ("layout", "<u2"),
+    ("side", "i1"),
+    ("side_real", "i1"),
+    ("is_absorption", "u1"),
+])
+
+
+def shard_of(symbol_index: int, workers: int) -> int:
+    return symbol_index % workers
+
+
+async def push_all(ring: ShmRing, rows: np.ndarray, stop=None):
+    """Empurra todos os registros, esperando espaço no ring se preciso."""
+    while len(rows):
+        rows = rows[ring.push(rows):]
+        if len(rows):
+            if stop is not None and stop.is_set():
+                return
+            await asyncio.sleep(IDLE_SLEEP)
+
+
+def _pipeline_config(pipeline: EnginePipeline) -> Tuple[List[str], Dict[str, float], Dict[str, dict]]:
+    return pipeline.engine_names, pipeline.weights, pipeline.params
+
+
+# ============================================
+# Processo de ingestão
+# ============================================
+def ingest_process(symbols: List[str], raw_names: List[str], base_url: str, decoder: str,
+                   record_paths: Dict[str, str], events, stop, connections: int = 1, mirror_urls: List[str] = ()):
+    asyncio.run(_ingest(symbols, raw_names, base_url, decoder, record_paths, events, stop, connections, mirror_urls))
+
+
+async def _ingest(symbols, raw_names, base_url, decoder, record_paths, events, stop, connections, mirror_urls):
+    rings = [ShmRing.attach(name, RAW_DTYPE, RAW_RING_SIZE) for name in raw_names]
+    index = {symbol: i for i, symbol in enumerate(symbols)}
+    recorders = {symbol: TradeRecorder(path, symbol=symbol) for symbol, path in (record_paths or {}).items()}
+    pipeline = IngestPipeline(decoder, dedup=TradeDedup(
+        on_gap=lambda symbol, first, last: events.put(("gap", symbol, first, last))))
+    streams = "/".join(f"{symbol}@trade" for symbol in symbols)
+    urls = connection_urls([f"{url}/stream?streams={streams}" for url in (base_url, *mirror_urls)], connections)
+
+    async def handle(batch: List[dict]):
+        shard_rows = [[] for _ in rings]
+        for data in batch:
+            symbol = data.get("s", "").lower()
+            i = index.get(symbol)
+            if i is None:
+                continue
+            recorder = recorders.get(symbol)
+            if recorder:
+                recorder.write(data)
+            shard_rows[shard_of(i, len(rings))].append((
+                int(data["t"]), int(data["T"]), int(data.get("E", data["T"])),
+                float(data["p"]), float(data["q"]), i, 1 if data["m"] else 0,
+            ))
+        for ring, rows in zip(rings, shard_rows):
+            if rows:
+                await push_all(ring, np.array(rows, dtype=RAW_DTYPE), stop)
+
+    async def report():
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            events.put(("ingest", pipeline.stats()))
+
+    async def watch_stop():
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        pipeline.stop()
+
+    tasks = [asyncio.create_task(report()), asyncio.create_task(watch_stop())]
+    try:
+        # Cada conexão reconecta sozinha (backoff com jitter) até o stop
+        await pipeline.run_redundant(urls, handle, lambda message: events.put(("reconnect", message)))
+    finally:
+        for task in tasks:
+            task.cancel()
+        for recorder in recorders.values():
+            recorder.close()
+        for ring in rings:
+            ring.close()
+
+
+# ============================================
+# Workers de engines
+# ============================================
+def engine_worker(shard: int, symbols: List[str], raw_name: str, out_name: str,
+                  pipelines: List[Tuple[int, int, tuple]], control, events, stop,
+                  history_size: int = HISTORY_SIZE, max_batch: int = MAX_BATCH,
+                  book_url: str = None, book_symbols: List[str] = ()):
+    worker = EngineWorker(shard, symbols, raw_name, out_name, control, events, stop, history_size, max_batch,
+                          book_url, book_symbols)
+    for message in pipelines:
+        worker.add_pipeline(*message)
+    events.put(("ready", shard))
+    try:
+        asyncio.run(worker.run())
+    finally:
+        worker.close()
+
+
+class EngineWorker:
+    """Os símbolos de um shard: um BinanceDataFeed por símbolo, alimentado
+    pelo ring RAW, com os payloads gravados no ring OUT."""
+
+    def __init__(self, shard: int, symbols: List[str], raw_name: str, out_name: str, control, events, stop,
+                 history_size: int = HISTORY_SIZE, max_batch: int = MAX_BATCH, book_url: str = None,
+                 book_symbols: List[str] = ()):
+        self.shard = shard
+        self.raw = ShmRing.attach(raw_name, RAW_DTYPE, RAW_RING_SIZE)
+        self.out = ShmRing.attach(out_name, OUT_DTYPE, OUT_RING_SIZE)
+        self.control = control
+        self.events = events
+        self.stop = stop
+        self.max_batch = max_batch
+
+        # Índice do símbolo → feed (criado no primeiro pipeline ou trade do símbolo)
+        self.feeds: Dict[int, BinanceDataFeed] = {}
+        self.symbols = symbols
+        self.history_size = history_size
+        self.pipeline_index: Dict[str, int] = {}
+        self.layouts: Dict[tuple, int] = {}
+        self.trades = 0
+        # Books L2 dos símbolos deste shard (ver order_book.py)
+        self.book_feed = None
+        if book_url and book_symbols:
+            self.book_feed = BookFeed(book_symbols, book_url,
+                                      on_reconnect=lambda message: events.put(("reconnect", message)))
+
+        self._rows = []
+        self._symbol = 0
+        self._trade_ids: List[int] = []
+        self._qtys: List[float] = []
+        self._first_count = 0
+        self._padding = (0.0,) * MAX_CONTRIBUTIONS
+
+    def _feed(self, symbol_index: int) -> BinanceDataFeed:
+        feed = self.feeds.get(symbol_index)
+        if feed is None:
+            feed = BinanceDataFeed(self.symbols[symbol_index], orchestrator=SharedEngineOrchestrator(),
+                                   history_size=self.history_size)
+            feed.log_interval = 0
+            if self.book_feed:
+                feed.attach_book(self.book_feed.books.get(feed.symbol))
+            self.feeds[symbol_index] = feed
+        return feed
+
+    def add_pipeline(self, symbol_index: int, pipeline_index: int, config: tuple):
+        pipeline = EnginePipeline(*config)
+        self.pipeline_index[pipeline.id] = pipeline_index
+        feed = self._feed(symbol_index)
+        swap = feed.orchestrator.add_pipeline(pipeline, history=feed.history)
+        return {"symbol": feed.symbol, "shard": self.shard, **swap}
+
+    def remove_pipeline(self, symbol_index: int, pipeline_id: str):
+        self._feed(symbol_index).orchestrator.remove_pipeline(pipeline_id)
+
+    def _handle_control(self):
+        while True:
+            try:
+                message = self.control.get_nowait()
+            except queue.Empty:
+                return
+            if message[0] == "add":
+                self.events.put(("swap", self.add_pipeline(*message[1:])))
+            elif message[0] == "remove":
+                self.remove_pipeline(*message[1:])
+
+    async def run(self):
+        last_report = time.monotonic()
+        book_task = asyncio.create_task(self.book_feed.run()) if self.book_feed else None
+        try:
+            while not self.stop.is_set():
+                self._handle_control()
+                records = self.raw.pop(self.max_batch)
+                if len(records):
+                    await self.process(records)
+                else:
+                    await asyncio.sleep(IDLE_SLEEP)
+                now = time.monotonic()
+                if now - last_report >= STATS_INTERVAL:
+                    last_report = now
+                    self.events.put(("worker", self.shard, self.stats()))
+        finally:
+            if book_task:
+                self.book_feed.stop()
+                book_task.cancel()
+
+    async def process(self, records: np.ndarray):
+        """Processa um lote do ring RAW, símbolo a símbolo, na ordem de chegada."""
+        symbol_column = records["symbol"]
+        symbol_indexes = np.unique(symbol_column).tolist()
+        for symbol_index in symbol_indexes:
+            rows = records if len(symbol_indexes) == 1 else records[symbol_column == symbol_index]
+            feed = self._feed(symbol_index)
+            self._symbol = symbol_index
+            self._trade_ids = rows["trade_id"].tolist()
+            self._qtys = rows["quantity"].tolist()
+            self._first_count = feed.trade_count
+            messages = [
+                {"t": trade_id, "T": trade_time, "E": event_time, "p": price, "q": qty, "m": bool(is_maker)}
+                for trade_id, trade_time, event_time, price, qty, is_maker in zip(
+                    self._trade_ids, rows["trade_time"].tolist(), rows["event_time"].tolist(),
+                    rows["price"].tolist(), self._qtys, rows["is_maker"].tolist(),
+                )
+            ]
+            await feed._process_batch(messages, self._collect)
+            self.trades += len(messages)
+        if self._rows:
+            rows, self._rows = np.array(self._rows, dtype=OUT_DTYPE), []
+            await push_all(self.out, rows, self.stop)
+
+    async def _collect(self, payload: Dict[str, Any]):
+        i = payload["trade_count"] - self._first_count - 1
+        contributions = payload["engine_contributions"]
+        keys = tuple(contributions)
+        layout = self.layouts.get(keys)
+        if layout is None:
+            # O layout chega ao principal antes de qualquer registro que o usa
+            layout = self.layouts[keys] = len(self.layouts)
+            self.events.put(("layout", self.shard, layout, keys))
+        values = tuple(contributions.values())
+        self._rows.append((
+            self._trade_ids[i], payload["timestamp"], payload["trade_count"], payload["price"], self._qtys[i],
+            payload["volume_raw"], payload["volume"], values + self._padding[len(values):],
+            self._symbol, self.pipeline_index.get(payload.get("pipeline"), 0), layout,
+            SIDE_CODES.get(payload["side"], SIDE_NEUTRAL), SIDE_CODES.get(payload["side_real"], SIDE_NEUTRAL),
+            1 if payload["is_absorption"] else 0,
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shard": self.shard,
+            "symbols": [self.symbols[i] for i in sorted(self.feeds)],
+            "trades": self.trades,
+            "raw_backlog": len(self.raw),
+            "out_backlog": len(self.out),
+            "engines": sum(len(feed.orchestrator.engines) for feed in self.feeds.values()),
+            "books_synced": sum(book.synced for book in self.book_feed.books.values()) if self.book_feed else None,
+        }
+
+    def close(self):
+        self.raw.close()
+        self.out.close()
+
+
+# ============================================
+# Processo principal (fan-out)
+# ============================================
+class RemoteOrchestrator:
+    """Orquestrador de um símbolo que roda num worker.
+
+    Mesma interface que o websocket_server usa do SharedEngineOrchestrator
+    (add_pipeline, remove_pipeline, engines, pipelines): as mudanças viram
+    mensagens de controle para o worker, que aquece os engines novos com o
+    histórico dele. O número de engines é contado aqui, pelas chaves."""
+
+    def __init__(self, feed: "ShardedFeed", symbol_index: int):
+        self.feed = feed
+        self.symbol_index = symbol_index
+        self.engines: Dict[tuple, None] = {}
+        self.pipelines: Dict[str, EnginePipeline] = {}
+        self._refs: Dict[tuple, int] = {}
+
+    def add_pipeline(self, pipeline: EnginePipeline, history=None) -> Dict[str, Any]:
+        if pipeline.id in self.pipelines:
+            return {"pipeline": pipeline.id, "new_engines": 0, "warmup_ticks": 0, "swap_ms": 0.0}
+        new_engines = 0
+        for key in set(pipeline.keys):
+            if key not in self.engines:
+                self.engines[key] = None
+                self._refs[key] = 0
+                new_engines += 1
+            self._refs[key] += 1
+        self.pipelines[pipeline.id] = pipeline
+        self.feed.send_control(self.symbol_index, (
+            "add", self.symbol_index, self.feed.pipeline_number(pipeline), _pipeline_config(pipeline)
+        ))
+        # O aquecimento acontece no worker; o resultado chega como evento (swap_log)
+        return {"pipeline": pipeline.id, "new_engines": new_engines, "warmup_ticks": None, "swap_ms": None,
+                "shard": shard_of(self.symbol_index, self.feed.workers)}
+
+    def remove_pipeline(self, pipeline_id: str):
+        pipeline = self.pipelines.pop(pipeline_id, None)
+        if pipeline is None:
+            return
+        for key in set(pipeline.keys):
+            self._refs[key] -= 1
+            if self._refs[key] == 0:
+                del self._refs[key]
+                del self.engines[key]
+        self.feed.send_control(self.symbol_index, ("remove", self.symbol_index, pipeline_id))
+
+
+class ShardStats:
+    """Estatísticas que chegam dos processos filhos (mesmo papel de
+    IngestPipeline.stats() no modo de um processo)."""
+
+    def __init__(self):
+        self.ingest: Optional[Dict[str, Any]] = None
+        self.workers: Dict[int, Dict[str, Any]] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**(self.ingest or {}), "workers": [self.workers[shard] for shard in sorted(self.workers)]}
+
+
+class ShardedFeed:
+    """Ingestão e engines em processos filhos; no principal, só o fan-out.
+
+    Usado pelo websocket_server no lugar do BinanceMultiFeed (mesmo
+    connect(on_data_callback) e trade_count). orchestrators[símbolo] são
+    RemoteOrchestrator; os payloads entregues ao callback são iguais aos
+    do modo de um processo."""
+
+    def __init__(self, symbols: List[str], workers: int, base_url: str = BINANCE_WS_BASE, decoder: str = "fast",
+                 history_size: int = HISTORY_SIZE, record_paths: Dict[str, str] = None, store=None,
+                 on_swap: Callable[[Dict[str, Any]], None] = None, on_reconnect: Callable[[str], None] = None,
+                 connections: int = 1, mirror_urls: List[str] = (), on_gap: Callable[[str, int, int], None] = None,
+                 book: bool = False):
+        if not symbols:
+            raise ValueError("ShardedFeed precisa de pelo menos um símbolo")
+        if workers < 1:
+            raise ValueError(f"Número de workers inválido: {workers}")
+        self.symbols = [symbol.lower() for symbol in symbols]
+        # Um símbolo roda num worker só: workers além do número de símbolos ficariam ociosos
+        self.workers = min(workers, len(self.symbols))
+        self.base_url = base_url
+        self.decoder = decoder
+        self.history_size = history_size
+        self.record_paths = record_paths or {}
+        self.store = store
+        self.on_swap = on_swap
+        self.on_reconnect = on_reconnect
+        self.connections = connections
+        self.mirror_urls = list(mirror_urls)
+        self.on_gap = on_gap
+        self.book = book
+
+        self.orchestrators = {symbol: RemoteOrchestrator(self, i) for i, symbol in enumerate(self.symbols)}
+        # Sem feeds locais: o histórico para aquecer engines fica nos workers
+        self.feeds: Dict[str, BinanceDataFeed] = {}
+        self.pipeline = ShardStats()
+        self.running = False
+
+        self.pipeline_ids: List[str] = []
+        self._pipeline_numbers: Dict[str, int] = {}
+        self.layouts: Dict[Tuple[int, int], Tuple[str, ...]] = {}
+        self.trade_counts = [0] * len(self.symbols)
+        self._symbol_names = [symbol.upper() for symbol in self.symbols]
+
+        self._ctx = mp.get_context("spawn")
+        self._processes: List = []
+        self._controls: List = []
+        self._events = None
+        self._stop = None
+        self._raw_rings: List[ShmRing] = []
+        self._out_rings: List[ShmRing] = []
+
+    @property
+    def trade_count(self) -> int:
+        return sum(self.trade_counts)
+
+    def pipeline_number(self, pipeline: EnginePipeline) -> int:
+        """Número do pipeline nos registros OUT (os ids são strings)."""
+        number = self._pipeline_numbers.get(pipeline.id)
+        if number is None:
+            number = self._pipeline_numbers[pipeline.id] = len(self.pipeline_ids)
+            self.pipeline_ids.append(pipeline.id)
+        return number
+
+    def send_control(self, symbol_index: int, message: tuple):
+        # Antes de start() não há workers: eles recebem os pipelines ativos ao iniciar
+        if self._controls:
+            self._controls[shard_of(symbol_index, self.workers)].put(message)
+
+    def start(self):
+        """Cria os rings e sobe a ingestão e os workers."""
+        self._stop = self._ctx.Event()
+        self._events = self._ctx.Queue()
+        self._raw_rings = [ShmRing.create(RAW_DTYPE, RAW_RING_SIZE) for _ in range(self.workers)]
+        self._out_rings = [ShmRing.create(OUT_DTYPE, OUT_RING_SIZE) for _ in range(self.workers)]
+        self._controls = [self._ctx.Queue() for _ in range(self.workers)]
+        self.layouts.clear()
+
+        for shard in range(self.workers):
+            pipelines = [
+                (orchestrator.symbol_index, self.pipeline_number(pipeline), _pipeline_config(pipeline))
+                for orchestrator in self.orchestrators.values()
+                if shard_of(orchestrator.symbol_index, self.workers) == shard
+                for pipeline in orchestrator.pipelines.values()
+            ]
+            book_symbols = [symbol for i, symbol in enumerate(self.symbols)
+                            if self.book and shard_of(i, self.workers) == shard]
+            self._processes.append(self._ctx.Process(
+                target=engine_worker, name=f"engine-worker-{shard}", daemon=True,
+                args=(shard, self.symbols, self._raw_rings[shard].name, self._out_rings[shard].name, pipelines,
+                      self._controls[shard], self._events, self._stop, self.history_size, MAX_BATCH,
+                      self.base_url, book_symbols),
+            ))
+        self._processes.append(self._ctx.Process(
+            target=ingest_process, name="ingest", daemon=True,
+            args=(self.symbols, [ring.name for ring in self._raw_rings], self.base_url, self.decoder,
+                  self.record_paths, self._events, self._stop, self.connections, self.mirror_urls),
+        ))
+        for process in self._processes:
+            process.start()
+        self.running = True
+
+    async def connect(self, on_data_callback=None):
+        """Sobe os processos e entrega os payloads dos workers ao callback.
+        Só termina com stop() ou se um processo filho morrer (levanta
+        RuntimeError; a próxima chamada sobe tudo de novo)."""
+        if self._processes:
+            await self.shutdown()
+        self.start()
+        print(f"🧵 {self.workers} workers de engines + ingestão em processos separados")
+        last_check = time.monotonic()
+        try:
+            while self.running:
+                self._handle_events()
+                idle = True
+                for shard, ring in enumerate(self._out_rings):
+                    rows = ring.pop(MAX_BATCH)
+                    if len(rows):
+                        idle = False
+                        await self._deliver(shard, rows, on_data_callback)
+                if idle:
+                    await asyncio.sleep(IDLE_SLEEP)
+                    now = time.monotonic()
+                    if now - last_check >= STATS_INTERVAL:
+                        last_check = now
+                        dead = [process.name for process in self._processes if not process.is_alive()]
+                        if dead:
+                            raise RuntimeError(f"Processo(s) encerrado(s): {', '.join(dead)}")
+        finally:
+            if self.running:
+                await self.shutdown()
+
+    def _handle_events(self):
+        """Processa os eventos dos filhos que já chegaram (sem bloquear)."""
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                return
+            kind = event[0]
+            if kind == "layout":
+                _, shard, layout, keys = event
+                self.layouts[(shard, layout)] = keys
+            elif kind == "swap" and self.on_swap:
+                self.on_swap(event[1])
+            elif kind == "reconnect" and self.on_reconnect:
+                self.on_reconnect(event[1])
+            elif kind == "gap" and self.on_gap:
+                self.on_gap(*event[1:])
+            elif kind == "ingest":
+                self.pipeline.ingest = event[1]
+            elif kind == "worker":
+                self.pipeline.workers[event[1]] = event[2]
+
+    async def _wait_layout(self, key: Tuple[int, int]):
+        """Espera o evento de layout de um registro já lido do ring: o
+        worker o põe na fila antes do registro, mas a Queue entrega por uma
+        thread própria e ele pode chegar depois. Espera em passos de
+        IDLE_SLEEP, sem bloquear o loop (e os clientes)."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LAYOUT_TIMEOUT
+        while True:
+            self._handle_events()
+            if key in self.layouts:
+                return
+            if loop.time() >= deadline:
+                raise RuntimeError(f"Layout {key} não recebido do worker")
+            await asyncio.sleep(IDLE_SLEEP)
+
+    async def _deliver(self, shard: int, rows: np.ndarray, on_data_callback):
+        if self.store is not None:
+            self._store(rows)
+
+        symbol_names = self._symbol_names
+        pipeline_ids = self.pipeline_ids
+        layouts = self.layouts
+        columns = zip(
+            rows["symbol"].tolist(), rows["pipeline"].tolist(), rows["layout"].tolist(),
+            rows["price"].tolist(), rows["volume_raw"].tolist(), rows["volume"].tolist(),
+            rows["side"].tolist(), rows["side_real"].tolist(), rows["timestamp"].tolist(),
+            rows["is_absorption"].tolist(), rows["contributions"].tolist(), rows["trade_count"].tolist(),
+        )
+        for (symbol, pipeline, layout, price, volume_raw, volume, side, side_real, timestamp,
+             is_absorption, contributions, trade_count) in columns:
+            keys = layouts.get((shard, layout))
+            if keys is None:
+                await self._wait_layout((shard, layout))
+                keys = layouts[(shard, layout)]
+            self.trade_counts[symbol] = trade_count
+            if on_data_callback:
+                await on_data_callback({
+                    "type": "trade",
+                    "symbol": symbol_names[symbol],
+                    "price": price,
+                    "volume_raw": volume_raw,
+                    "volume": volume,
+                    "side": SIDE_NAMES[side],
+                    "side_real": SIDE_NAMES[side_real],
+                    "timestamp": timestamp,
+                    "is_absorption": bool(is_absorption),
+                    "engine_contributions": dict(zip(keys, contributions)),
+                    "trade_count": trade_count,
+                    "pipeline": pipeline_ids[pipeline],
+                })
+
+    def _store(self, rows: np.ndarray):
+        """Trades do pipeline do TickStore (a mesma gravação do BinanceDataFeed)."""
+        number = self._pipeline_numbers.get(self.store.pipeline)
+        if number is None:
+            return
+        rows = rows[rows["pipeline"] == number]
+        for symbol_index in np.unique(rows["symbol"]).tolist():
+            symbol_rows = rows[rows["symbol"] == symbol_index]
+            self.store.extend(self.symbols[symbol_index], symbol_rows["trade_id"], symbol_rows["timestamp"],
+                              symbol_rows["price"], symbol_rows["qty"], symbol_rows["side"],
+                              symbol_rows["side_real"], symbol_rows["volume"], symbol_rows["is_absorption"])
+
+    def stop(self):
+        """Para os filhos e remove os rings (bloqueia até JOIN_TIMEOUT por
+        processo; dentro do loop, use shutdown())."""
+        _join(*self._detach())
+
+    async def shutdown(self):
+        """stop() com a espera pelos filhos numa thread, fora do loop."""
+        processes, rings = self._detach()
+        if processes:
+            await asyncio.get_running_loop().run_in_executor(None, _join, processes, rings)
+
+    def _detach(self) -> Tuple[list, List[ShmRing]]:
+        """Sinaliza o stop e solta processos e rings (quem chama espera por eles)."""
+        self.running = False
+        if not self._processes:
+            return [], []
+        if self._stop is not None:
+            self._stop.set()
+        processes, rings = self._processes, self._raw_rings + self._out_rings
+        self._processes = []
+        self._controls = []
+        self._raw_rings = []
+        self._out_rings = []
+        return processes, rings
+
+
+def _join(processes: list, rings: List[ShmRing]):
+    if not processes:
+        return
+    for process in processes:
+        process.join(timeout=JOIN_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
+    for ring in rings:
+        ring.close()
+    print("\n⏹️  Workers encerrados")
@@ -0,0 +1,312 @@
+"""
+Engines compartilhados entre clientes com combinações próprias.
+
+Cada cliente escolhe seus engines e pesos (um EnginePipeline), mas cada
+engine distinto (mesma classe e mesmos parâmetros) roda uma única vez por
+tick no SharedEngineOrchestrator do símbolo; cada pipeline só faz a
+combinação ponderada a partir dessas saídas. O custo por tick cresce com o
+número de engines distintos, não com o número de clientes.
+
+Os engines só dependem da sequência de ticks (o contexto que eles leem é
+o side real do tick), então compartilhar uma instância dá exatamente o
+mesmo resultado de um VolumeEngineOrchestrator privado por cliente.
+"""
+import hashlib
+import json
+import math
+import time
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from engine_orchestrator import ENGINE_REGISTRY, ContributionKeys
+from metrics import ENGINE_SECONDS, ENGINE_SAMPLE_EVERY
+from volume_engines.base import VolumeEngine, Tick, as_batch
+
+# (nome do engine, parâmetros ordenados)
+EngineKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+
+def engine_key(name: str, params: Dict[str, Any] = None) -> EngineKey:
+    if name not in ENGINE_REGISTRY:
+        raise ValueError(f"Engine desconhecido: {name}")
+    # Listas (ex.: window_ms do micro_cluster) viram tuplas para a chave ser hashable
+    return name, tuple(sorted(
+        (param, tuple(value) if isinstance(value, list) else value) for param, value in (params or {}).items()
+    ))
+
+
+class EnginePipeline:
+    """Engines e pesos de um cliente: a mesma combinação que o
+    VolumeEngineOrchestrator faz, mas sobre saídas já calculadas."""
+
+    def __init__(self, engine_names: List[str], weights: Dict[str, float] = None,
+                 params: Dict[str, Dict[str, Any]] = None):
+        if not isinstance(engine_names, list) or not all(isinstance(name, str) for name in engine_names):
+            raise ValueError("engines deve ser uma lista de nomes de engines")
+        params = params or {}
+        if not isinstance(params, dict):
+            raise ValueError("params deve ser um objeto {engine: {parâmetro: valor}}")
+        for name, engine_params in params.items():
+            if engine_params is not None and not isinstance(engine_params, dict):
+                raise ValueError(f"Parâmetros de {name} devem ser um objeto")
+        self.engine_names = list(engine_names)
+        self.keys = [engine_key(name, params.get(name)) for name in self.engine_names]
+        self.weights = _validate_weights(weights, self.engine_names)
+        self.params = {name: params[name] for name in self.engine_names if params.get(name)}
+
+        # Validação dos parâmetros: cria uma instância descartável de cada engine
+        for name, engine_params in self.params.items():
+            try:
+                ENGINE_REGISTRY[name](**engine_params)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Parâmetros inválidos para {name}: {e}")
+
+        # Identificador estável da configuração: clientes com a mesma
+        # configuração compartilham o pipeline e o payload
+        config = json.dumps([self.engine_names, self.weights, self.params], sort_keys=True)
+        self.id = "p" + hashlib.sha1(config.encode()).hexdigest()[:10]
+
+        self._side_key = next((key for key in self.keys if key[0] == "side_inference"), None)
+        self._factor_keys = [key for key in self.keys if key[0] != "side_inference"]
+        self._default_weight = 1.0 / len(self.keys) if self.keys else 1.0
+        # Caminho em lote: (chave, nome, peso, chaves dos sub-fatores), como no PipelinePlan
+        self._batch_plan = [
+            (key, key[0], self.weights.get(key[0], self._default_weight), ContributionKeys(key[0]))
+            for key in self._factor_keys
+        ]
+
+    def describe(self) -> Dict[str, Any]:
+        return {"engines": self.engine_names, "weights": self.weights, "params": self.params}
+
+    def compile(self, index: Dict[EngineKey, int]) -> "PipelinePlan":
+        """Plano do caminho por tick sobre as saídas de um orquestrador
+        (`index`: posição de cada engine na lista de saídas dele)."""
+        return PipelinePlan(
+            index[self._side_key] if self._side_key else None,
+            [(key[0], index[key], self.weights.get(key[0], self._default_weight), ContributionKeys(key[0]))
+             for key in self._factor_keys],
+        )
+
+    def combine_batch(self, prices, volumes, timestamps, sides, outputs: Dict[EngineKey, Any]) -> Dict[str, Any]:
+        n = len(prices)
+        side = outputs[self._side_key] if self._side_key else sides
+
+        factor_sum = None
+        engine_contributions = {}
+        for key, name, weight, sub_keys in self._batch_plan:
+            factor, sub_factors = outputs[key]
+            weighted_factor = factor * weight
+            factor_sum = weighted_factor if factor_sum is None else factor_sum + weighted_factor
+            engine_contributions[name] = np.round(weighted_factor, 3)
+            for sub_key, sub_factor in sub_factors.items():
+                engine_contributions[sub_keys[sub_key]] = np.round(sub_factor * weight, 3)
+
+        avg_factor = factor_sum / len(self._batch_plan) if self._batch_plan else np.ones(n)
+        micro_cluster = engine_contributions.get("micro_cluster")
+        return {
+            "volume": np.round(volumes * avg_factor, 2),
+            "side": side,
+            "engine_contributions": engine_contributions,
+            "is_absorption": micro_cluster > 1.5 if micro_cluster is not None else np.zeros(n, dtype=bool),
+            "timestamp": timestamps,
+            "price": prices,
+        }
+
+
+def _validate_weights(weights, engine_names: List[str]) -> Dict[str, float]:
+    """Pesos por engine: números finitos, só de engines selecionados (os
+    que faltam usam o peso padrão). Sem pesos, todos iguais."""
+    if weights is None:
+        return {name: 1.0 / len(engine_names) for name in engine_names}
+    if not isinstance(weights, dict):
+        raise ValueError("weights deve ser um objeto {engine: peso}")
+    validated = {}
+    for name, weight in weights.items():
+        if name not in engine_names:
+            raise ValueError(f"Peso para engine não selecionado: {name}")
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not math.isfinite(weight):
+            raise ValueError(f"Peso inválido para {name}: {weight!r} (use um número finito)")
+        validated[name] = float(weight)
+    return validated
+
+
+class PipelinePlan:
+    """Combinação ponderada de um pipeline com tudo resolvido de antemão:
+    posição do engine de side e, por engine de fator, (nome, posição, peso,
+    chaves dos sub-fatores). combine() só lê listas e monta o resultado."""
+
+    __slots__ = ("side_index", "entries")
+
+    def __init__(self, side_index: Optional[int], entries: List[tuple]):
+        self.side_index = side_index
+        self.entries = entries
+
+    def combine(self, tick: Tick, outputs: List[Any], sub_factors: List[Dict[str, float]]) -> Dict[str, Any]:
+        side = outputs[self.side_index] if self.side_index is not None else tick.side_real
+
+        factor_sum = 0.0
+        engine_contributions = {}
+        for name, index, weight, sub_keys in self.entries:
+            weighted_factor = outputs[index] * weight
+            factor_sum += weighted_factor
+            engine_contributions[name] = round(weighted_factor, 3)
+            for sub_key, sub_factor in sub_factors[index].items():
+                engine_contributions[sub_keys[sub_key]] = round(sub_factor * weight, 3)
+
+        avg_factor = factor_sum / len(self.entries) if self.entries else 1.0
+        enhanced_volume = tick.volume_real * avg_factor
+
+        return {
+            "volume": round(enhanced_volume, 2),
+            "side": side,
+            "engine_contributions": engine_contributions,
+            "is_absorption": engine_contributions.get("micro_cluster", 0) > 1.5,
+            "timestamp": tick.timestamp,
+            "price": tick.price,
+        }
+
+
+class SharedEngineOrchestrator:
+    """Engines de um símbolo compartilhados pelos pipelines dos clientes.
+
+    Mesma interface plural do VolumeEngineOrchestrator usada pelo
+    BinanceDataFeed (calculate_enhanced_volumes e a versão em lote), com um
+    resultado por pipeline ativo."""
+
+    def __init__(self):
+        self.engines: Dict[EngineKey, VolumeEngine] = {}
+        self.pipelines: Dict[str, EnginePipeline] = {}
+        self.tick_count = 0
+        self.last_price = 0.0
+        self.book = None
+        self._refs: Dict[EngineKey, int] = {}
+        # Séries do histograma de tempo por engine (ver metrics.py); engines
+        # do mesmo tipo com parâmetros diferentes dividem a série
+        self._tick_timers: Dict[EngineKey, Any] = {}
+        self._batch_timers: Dict[EngineKey, Any] = {}
+        self._compile()
+
+    def _compile(self):
+        """Plano do caminho por tick, refeito só quando os pipelines mudam:
+        engines numa lista de posição fixa (as saídas vão para listas
+        reaproveitadas a cada tick) e cada pipeline compilado sobre elas."""
+        self._plan, self._outputs, self._sub_factors, self._pipeline_plans = _build_plan(self.engines, self.pipelines)
+
+    def add_pipeline(self, pipeline: EnginePipeline, history=None) -> Dict[str, Any]:
+        """Ativa um pipeline. Engines que ainda não rodam são criados e
+        aquecidos com o histórico recente (TickHistory) antes de entrarem.
+        Devolve quantos engines novos, ticks de aquecimento e o tempo gasto."""
+        started = time.perf_counter()
+        if pipeline.id in self.pipelines:
+            return {"pipeline": pipeline.id, "new_engines": 0, "warmup_ticks": 0, "swap_ms": 0.0}
+
+        columns = history.columns() if history is not None and len(history) else None
+        created: Dict[EngineKey, VolumeEngine] = {}
+        for key in set(pipeline.keys):
+            if key not in self.engines:
+                engine = ENGINE_REGISTRY[key[0]](**dict(key[1]))
+                if engine.uses_book:
+                    engine.book = self.book
+                if columns is not None:
+                    if key[0] == "side_inference":
+                        engine.infer_side_batch(*columns)
+                    else:
+                        engine.calculate_volume_weight_batch(*columns)
+                created[key] = engine
+
+        # Compila antes de mexer no estado: se algo falhar, o orquestrador
+        # continua com o plano anterior, inteiro
+        compiled = _build_plan({**self.engines, **created}, {**self.pipelines, pipeline.id: pipeline})
+        for key, engine in created.items():
+            self.engines[key] = engine
+            self._refs[key] = 0
+            self._tick_timers[key] = ENGINE_SECONDS.labels(key[0], "tick")
+            self._batch_timers[key] = ENGINE_SECONDS.labels(key[0], "batch")
+        for key in set(pipeline.keys):
+            self._refs[key] += 1
+        self.pipelines[pipeline.id] = pipeline
+        self._plan, self._outputs, self._sub_factors, self._pipeline_plans = compiled
+        new_engines = len(created)
+
+        return {
+            "pipeline": pipeline.id,
+            "new_engines": new_engines,
+            "warmup_ticks": len(columns[0]) if columns is not None and new_engines else 0,
+            "swap_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def attach_book(self, book):
+        """Liga o OrderBook do símbolo aos engines que leem o book (os de
+        pipelines ativados depois recebem o mesmo book ao serem criados)."""
+        self.book = book
+        for engine in self.engines.values():
+            if engine.uses_book:
+                engine.book = book
+
+    def remove_pipeline(self, pipeline_id: str):
+        """Desativa um pipeline; engines que ficam sem pipeline deixam de rodar."""
+        pipeline = self.pipelines.pop(pipeline_id, None)
+        if pipeline is None:
+            return
+        for key in set(pipeline.keys):
+            self._refs[key] -= 1
+            if self._refs[key] == 0:
+                del self._refs[key]
+                del self.engines[key]
+                del self._tick_timers[key]
+                del self._batch_timers[key]
+        self._compile()
+
+    def calculate_enhanced_volumes(self, tick: Tick) -> Dict[Optional[str], Dict[str, Any]]:
+        if not isinstance(tick, Tick):
+            tick = Tick.from_dict(tick)
+        self.tick_count += 1
+        tick.tick_count = self.tick_count
+        tick.last_price = self.last_price
+
+        perf_counter = time.perf_counter
+        timers = self._tick_timers if self.tick_count % ENGINE_SAMPLE_EVERY == 0 else None
+        outputs = self._outputs
+        sub_factors = self._sub_factors
+        for i, key, engine, is_side in self._plan:
+            if timers:
+                started = perf_counter()
+            if is_side:
+                outputs[i] = engine.infer_side(tick, tick)
+            else:
+                outputs[i] = engine.calculate_volume_weight(tick, tick)
+                sub_factors[i] = engine.get_sub_factors()
+            if timers:
+                timers[key].observe(perf_counter() - started)
+
+        self.last_price = tick.price
+        return {pipeline_id: plan.combine(tick, outputs, sub_factors) for pipeline_id, plan in self._pipeline_plans}
+
+    def calculate_enhanced_volume_batches(self, prices, volumes, timestamps, sides) -> Dict[Optional[str], Dict[str, Any]]:
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        self.tick_count += len(prices)
+
+        perf_counter = time.perf_counter
+        outputs = {}
+        for key, engine in self.engines.items():
+            started = perf_counter()
+            if key[0] == "side_inference":
+                outputs[key] = engine.infer_side_batch(prices, volumes, timestamps, sides)
+            else:
+                factor = engine.calculate_volume_weight_batch(prices, volumes, timestamps, sides)
+                outputs[key] = (factor, engine.get_sub_factors_batch())
+            self._batch_timers[key].observe(perf_counter() - started)
+
+        if len(prices):
+            self.last_price = float(prices[-1])
+        return {
+            pipeline_id: pipeline.combine_batch(prices, volumes, timestamps, sides, outputs)
+            for pipeline_id, pipeline in self.pipelines.items()
+        }
+
+
+def _build_plan(engines: Dict[EngineKey, VolumeEngine], pipelines: Dict[str, EnginePipeline]) -> tuple:
+    """(plano por engine, lista de saídas, lista de sub-fatores, planos dos pipelines)"""
+    index = {key: i for i, key in enumerate(engines)}
+    plan = [(i, key, engine, key[0] == "side_inference") for i, (key, engine) in enumerate(engines.items())]
+    pipeline_plans = [(pipeline_id, pipeline.compile(index)) for pipeline_id, pipeline in pipelines.items()]
+    return plan, [None] * len(index), [None] * len(index), pipeline_plans
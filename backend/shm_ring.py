@@ -0,0 +1,119 @@
+"""
+Ring buffer de registros de largura fixa em memória compartilhada.
+
+Um produtor e um consumidor (cada um no seu processo). Os registros são
+um dtype estruturado do numpy; push() e pop() copiam lotes inteiros com
+uma ou duas atribuições de fatia, sem pickle e sem lock:
+
+    [0:8)    posição de escrita (só o produtor escreve)
+    [64:72)  posição de leitura (só o consumidor escreve)
+    [128:)   capacity registros
+
+As posições só crescem; o índice no ring é posição % capacity. O produtor
+copia os registros e só depois publica a posição de escrita (e o
+consumidor copia antes de publicar a de leitura), então cada lado só vê
+registros completos. Isso conta com a ordem das escritas na memória (x86
+e a ordem de programa dentro de um memcpy seguido de store na mesma
+thread).
+
+Ninguém espera no ring: push() devolve quantos registros couberam e pop()
+o que havia; quem chama decide como esperar (ver sharding.py).
+"""
+from multiprocessing import shared_memory
+from typing import Optional
+import numpy as np
+
+_HEADER_SIZE = 128
+_WRITE = 0
+_READ = 8
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Abre um segmento existente sem que o resource_tracker o apague na
+    saída deste processo (quem cria é quem remove)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: sem o parâmetro track. Os processos filhos
+        # (spawn) usam o resource_tracker do pai, onde o segmento já está
+        # registrado por quem o criou; registrar de novo não muda nada e
+        # o unlink() do dono continua sendo o único.
+        return shared_memory.SharedMemory(name=name)
+
+
+class ShmRing:
+    """Ring SPSC de registros `dtype` num segmento de memória compartilhada."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, dtype: np.dtype, capacity: int, owner: bool):
+        self.shm = shm
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.owner = owner
+        self._positions = np.ndarray(16, dtype=np.uint64, buffer=shm.buf)
+        self.records = np.ndarray(capacity, dtype=self.dtype, buffer=shm.buf, offset=_HEADER_SIZE)
+
+    @classmethod
+    def create(cls, dtype, capacity: int, name: str = None) -> "ShmRing":
+        if capacity < 1:
+            raise ValueError(f"Capacidade de ring inválida: {capacity}")
+        size = _HEADER_SIZE + capacity * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+        return cls(shm, dtype, capacity, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, dtype, capacity: int) -> "ShmRing":
+        return cls(_attach(name), dtype, capacity, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def __len__(self) -> int:
+        return int(self._positions[_WRITE]) - int(self._positions[_READ])
+
+    def free(self) -> int:
+        return self.capacity - len(self)
+
+    def push(self, rows: np.ndarray) -> int:
+        """Copia o máximo de `rows` que couber; devolve quantos entraram."""
+        write = int(self._positions[_WRITE])
+        n = min(len(rows), self.capacity - (write - int(self._positions[_READ])))
+        if n <= 0:
+            return 0
+        start = write % self.capacity
+        first = min(n, self.capacity - start)
+        self.records[start:start + first] = rows[:first]
+        if n > first:
+            self.records[:n - first] = rows[first:n]
+        self._positions[_WRITE] = write + n
+        return n
+
+    def pop(self, max_rows: Optional[int] = None) -> np.ndarray:
+        """Cópia dos registros disponíveis (até max_rows), do mais antigo ao mais novo."""
+        read = int(self._positions[_READ])
+        n = int(self._positions[_WRITE]) - read
+        if max_rows is not None:
+            n = min(n, max_rows)
+        if n <= 0:
+            return self.records[:0].copy()
+        start = read % self.capacity
+        first = min(n, self.capacity - start)
+        if n > first:
+            rows = np.concatenate((self.records[start:], self.records[:n - first]))
+        else:
+            rows = self.records[start:start + n].copy()
+        self._positions[_READ] = read + n
+        return rows
+
+    def close(self):
+        """Solta o segmento (e o remove, se este processo o criou)."""
+        # As views precisam sair antes do close() do segmento
+        self.records = None
+        self._positions = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
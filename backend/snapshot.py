@@ -0,0 +1,258 @@
+"""
+Snapshot para clientes que conectam com o stream já rodando.
+
+O servidor guarda, por símbolo e pipeline de engines, os últimos trades já
+processados (os mesmos que foram para os clientes) num ring buffer. Quem
+conecta (ou se inscreve num símbolo) recebe uma única
+mensagem "snapshot" com os últimos minutos, em colunas, mais barras de
+SNAPSHOT_BAR_MS com os agregados de cada barra e do período inteiro:
+
+    {"type": "snapshot", "symbol", "pipeline", "window_ms", "bar_ms",
+     "side_names": ["neutral", "buy", "sell"],
+     "trades": {"timestamp": [...], "price", "volume", "volume_raw",
+                "side" (códigos de side_names), "is_absorption" (0/1)},
+     "bars": {"timestamp" (início da barra), "open", "high", "low", "close",
+              "buy_volume", "sell_volume", "trade_count", "absorption_count"},
+     "aggregates": {mesmas chaves dos agregados de um frame (conflation.py)}}
+
+engine_contributions não entram (o snapshot é para o gráfico e o log).
+As barras e os agregados cobrem a janela inteira, mas as colunas de
+trades só levam os últimos SNAPSHOT_SENT_TRADES (~50 bytes por trade em
+JSON): a mensagem fica bem abaixo do max_size padrão de 1 MiB dos
+clientes websockets, que fechariam a conexão (1009) com a janela toda.
+
+Muitos clientes reconectando juntos não disputam o loop com o feed ao
+vivo: a mensagem é montada uma vez e reaproveitada por SNAPSHOT_CACHE_MS,
+pedidos simultâneos esperam a mesma montagem, e a codificação devolve o
+loop entre colunas. A janela é medida pelo timestamp do trade mais novo,
+então o replay funciona igual.
+
+O buffer guarda uma tupla por trade (itemgetter do payload num deque
+limitado, ~260ns por trade, ~200 bytes por trade); escrever em colunas
+array a cada trade custava ~3x mais no caminho quente, e as colunas só
+são necessárias na montagem do snapshot.
+"""
+import asyncio
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+from operator import itemgetter
+from typing import Dict, Any, Optional
+import numpy as np
+from metrics import SNAPSHOT_BUILD_SECONDS
+from volume_engines.base import SIDE_BUY, SIDE_CODES, SIDE_NAMES, SIDE_NEUTRAL, SIDE_SELL
+
+SNAPSHOT_WINDOW_MS = 5 * 60 * 1000
+SNAPSHOT_MAX_TRADES = 30000
+# Trades individuais na mensagem (os mais recentes da janela)
+SNAPSHOT_SENT_TRADES = 5000
+SNAPSHOT_BAR_MS = 1000
+SNAPSHOT_CACHE_MS = 1000
+
+# Campos do payload guardados por trade (ordem das colunas do snapshot)
+_FIELDS = ("timestamp", "price", "volume", "volume_raw", "side", "is_absorption")
+_take = itemgetter(*_FIELDS)
+# Trades convertidos/codificados entre duas devoluções do loop
+_CHUNK = 4000
+
+
+class SnapshotBuffer:
+    """Ring buffer dos trades processados de um símbolo (e pipeline)."""
+
+    def __init__(self, symbol: str, pipeline: str = None, window_ms: int = SNAPSHOT_WINDOW_MS,
+                 max_trades: int = SNAPSHOT_MAX_TRADES, bar_ms: int = SNAPSHOT_BAR_MS,
+                 cache_ms: int = SNAPSHOT_CACHE_MS, sent_trades: int = SNAPSHOT_SENT_TRADES):
+        if max_trades < 1:
+            raise ValueError(f"Tamanho de snapshot inválido: {max_trades}")
+        if sent_trades < 0:
+            raise ValueError(f"Número de trades do snapshot inválido: {sent_trades}")
+        self.symbol = symbol
+        self.pipeline = pipeline
+        self.window_ms = window_ms
+        self.size = max_trades
+        self.sent_trades = sent_trades
+        self.bar_ms = bar_ms
+        self.cache_ms = cache_ms
+        self.trades = deque(maxlen=max_trades)
+        self._append = self.trades.append
+
+        self._cached: Optional[str] = None
+        self._cached_at = 0.0
+        self._pending: Optional[asyncio.Future] = None
+        self.builds = 0
+        self.last_build_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self.trades)
+
+    def add(self, payload: Dict[str, Any]):
+        """Guarda um payload de trade (caminho quente)."""
+        self._append(_take(payload))
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Trades dentro da janela, do mais antigo ao mais recente."""
+        return _columns(self._window())
+
+    def window_trades(self) -> list:
+        """Trades da janela como tuplas (campos de _FIELDS), do mais antigo
+        ao mais recente; usados para aquecer footprints e candles novos."""
+        return self._window()
+
+    def _window(self) -> list:
+        trades = list(self.trades)
+        if trades:
+            first = bisect_left(trades, trades[-1][0] - self.window_ms, key=_timestamp)
+            del trades[:first]
+        return trades
+
+    def build(self) -> Dict[str, Any]:
+        """Mensagem de snapshot como dicionário (referência; o servidor usa encoded())."""
+        columns = self.columns()
+        return {
+            **self._header(),
+            "trades": {name: values.tolist() for name, values in self._recent(columns).items()},
+            "bars": {name: values.tolist() for name, values in _bars(columns, self.bar_ms).items()},
+            "aggregates": _aggregates(columns),
+        }
+
+    async def encoded(self) -> Optional[str]:
+        """Snapshot já em JSON (None se ainda não há trades). Reaproveita a
+        última montagem por cache_ms; pedidos simultâneos esperam a mesma."""
+        if not self.trades:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._cached is not None and (loop.time() - self._cached_at) * 1000 < self.cache_ms:
+            return self._cached
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._encode())
+        return await asyncio.shield(self._pending)
+
+    async def _encode(self) -> str:
+        try:
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            # Cópia sem await: trades novos não mudam o snapshot no meio
+            trades = self._window()
+            chunks = []
+            for start in range(0, len(trades), _CHUNK):
+                chunks.append(_columns(trades[start:start + _CHUNK]))
+                await asyncio.sleep(0)
+            columns = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in _FIELDS}
+            bars = _bars(columns, self.bar_ms)
+            header = json.dumps({**self._header(), "aggregates": _aggregates(columns)})
+
+            parts = []
+            for section, values in (("trades", self._recent(columns)), ("bars", bars)):
+                encoded = []
+                for name, column in values.items():
+                    if column.dtype == np.float64 and name != "price":
+                        column = np.round(column, 2)
+                    pieces = []
+                    for start in range(0, len(column), _CHUNK):
+                        pieces.append(json.dumps(column[start:start + _CHUNK].tolist())[1:-1])
+                        # Devolve o loop entre pedaços (feed ao vivo e outros clientes)
+                        await asyncio.sleep(0)
+                    encoded.append(f'"{name}":[{",".join(pieces)}]')
+                parts.append(f'"{section}":{{{",".join(encoded)}}}')
+
+            self._cached = header[:-1] + "," + ",".join(parts) + "}"
+            self._cached_at = loop.time()
+            self.builds += 1
+            self.last_build_ms = (time.perf_counter() - started) * 1000
+            SNAPSHOT_BUILD_SECONDS.labels().observe(self.last_build_ms / 1000)
+            return self._cached
+        finally:
+            self._pending = None
+
+    def _recent(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Colunas só com os últimos sent_trades trades."""
+        start = max(len(columns["timestamp"]) - self.sent_trades, 0)
+        return {name: values[start:] for name, values in columns.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "pipeline": self.pipeline,
+            "trades": len(self.trades),
+            "builds": self.builds,
+            "last_build_ms": round(self.last_build_ms, 1),
+        }
+
+    def _header(self) -> Dict[str, Any]:
+        return {
+            "type": "snapshot",
+            "symbol": self.symbol.upper(),
+            "pipeline": self.pipeline,
+            "window_ms": self.window_ms,
+            "bar_ms": self.bar_ms,
+            "side_names": list(SIDE_NAMES),
+        }
+
+
+def _timestamp(trade: tuple) -> int:
+    return trade[0]
+
+
+def _columns(trades: list) -> Dict[str, np.ndarray]:
+    if trades:
+        timestamps, prices, volumes, volumes_raw, sides, absorptions = zip(*trades)
+    else:
+        timestamps, prices, volumes, volumes_raw, sides, absorptions = ((),) * 6
+    codes = SIDE_CODES
+    return {
+        "timestamp": np.array(timestamps, dtype=np.int64),
+        "price": np.array(prices, dtype=np.float64),
+        "volume": np.array(volumes, dtype=np.float64),
+        "volume_raw": np.array(volumes_raw, dtype=np.float64),
+        "side": np.array([codes.get(side, SIDE_NEUTRAL) for side in sides], dtype=np.int8),
+        "is_absorption": np.array(absorptions, dtype=np.int8),
+    }
+
+
+def _bars(columns: Dict[str, np.ndarray], bar_ms: int) -> Dict[str, np.ndarray]:
+    timestamps = columns["timestamp"]
+    if not len(timestamps):
+        return {name: np.empty(0) for name in (
+            "timestamp", "open", "high", "low", "close", "buy_volume", "sell_volume",
+            "trade_count", "absorption_count")}
+
+    prices = columns["price"]
+    volumes = columns["volume"]
+    sides = columns["side"]
+    buckets = timestamps // bar_ms
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.append(starts[1:], len(timestamps))
+    return {
+        "timestamp": buckets[starts] * bar_ms,
+        "open": prices[starts],
+        "high": np.maximum.reduceat(prices, starts),
+        "low": np.minimum.reduceat(prices, starts),
+        "close": prices[ends - 1],
+        "buy_volume": np.add.reduceat(np.where(sides == SIDE_BUY, volumes, 0.0), starts),
+        "sell_volume": np.add.reduceat(np.where(sides == SIDE_SELL, volumes, 0.0), starts),
+        "trade_count": ends - starts,
+        "absorption_count": np.add.reduceat(columns["is_absorption"].astype(np.int64), starts),
+    }
+
+
+def _aggregates(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Mesmas chaves dos agregados de TradeConflator.flush()."""
+    timestamps = columns["timestamp"]
+    if not len(timestamps):
+        return {}
+    prices = columns["price"]
+    volumes = columns["volume"]
+    sides = columns["side"]
+    return {
+        "trade_count": len(timestamps),
+        "buy_volume": round(float(volumes[sides == SIDE_BUY].sum()), 2),
+        "sell_volume": round(float(volumes[sides == SIDE_SELL].sum()), 2),
+        "absorption_count": int(columns["is_absorption"].sum()),
+        "open_price": float(prices[0]),
+        "high_price": float(prices.max()),
+        "low_price": float(prices.min()),
+        "last_price": float(prices[-1]),
+        "first_timestamp": int(timestamps[0]),
+        "last_timestamp": int(timestamps[-1]),
+    }
@@ -0,0 +1,163 @@
+"""
+Arquivos do frontend servidos pelo mesmo servidor asyncio do WebSocket.
+
+Tudo é lido uma vez, na subida: cada arquivo fica em memória já
+comprimido com gzip (quando compensa) e com um ETag do conteúdo. Uma
+requisição vira uma busca num dict e a escolha entre corpo cru, gzip ou
+304 sem corpo; nada de disco, thread ou os.chdir, então uma onda de
+reloads do dashboard custa quase nada ao loop que entrega os trades.
+
+Cache-Control é "no-cache": o navegador sempre revalida, e como o ETag
+não muda enquanto o servidor roda, o reload de um arquivo inalterado é
+um 304 de poucos bytes. Editou o index.html? Reinicie o servidor.
+
+O servidor do websockets fecha a conexão depois de uma resposta HTTP que
+não é o upgrade (sem keep-alive); com um index.html só, isso é uma
+conexão por reload.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+from websockets.datastructures import Headers
+from websockets.http11 import Response
+
+CACHE_CONTROL = "no-cache"
+# Abaixo disso o gzip quase não ganha nada
+GZIP_MIN_SIZE = 256
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+HttpReply = Tuple[int, List[Tuple[str, str]], bytes]
+
+
+def find_frontend_dir() -> Optional[str]:
+    """frontend/ ao lado de backend/ (ou dentro dele); None se não existir."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    for candidate in (os.path.join(here, "..", "frontend"), os.path.join(here, "frontend")):
+        if os.path.isdir(candidate):
+            return os.path.normpath(candidate)
+    return None
+
+
+class Asset:
+    __slots__ = ("content_type", "body", "gzip_body", "etag", "gzip_etag")
+
+    def __init__(self, content_type: str, body: bytes):
+        self.content_type = content_type
+        self.body = body
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        self.gzip_body = None
+        self.gzip_etag = None
+        if len(body) >= GZIP_MIN_SIZE and content_type.startswith(_COMPRESSIBLE):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.gzip_body = compressed
+                self.gzip_etag = f'"{digest}-gz"'
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """gzip tem q > 0 no Accept-Encoding? Uma entrada "gzip" explícita vale
+    mais que "*", em qualquer ordem; q inválido conta como 0."""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        if coding not in ("gzip", "*"):
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def _etag_matches(if_none_match: str, asset: Asset) -> bool:
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == asset.etag or tag == asset.gzip_etag:
+            return True
+    return False
+
+
+class StaticAssets:
+    """Arquivos de um diretório, em memória; "/" é o index.html."""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory
+        self.assets: Dict[str, Asset] = {}
+        self.requests = 0
+        self.not_modified = 0
+        if directory:
+            self.load(directory)
+
+    def load(self, directory: str):
+        assets = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                url = "/" + os.path.relpath(path, directory).replace(os.sep, "/")
+                content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                if content_type.startswith("text/") or content_type == "application/javascript":
+                    content_type += "; charset=utf-8"
+                with open(path, "rb") as f:
+                    assets[url] = Asset(content_type, f.read())
+        if "/index.html" in assets:
+            assets["/"] = assets["/index.html"]
+        self.directory = directory
+        self.assets = assets
+
+    def response(self, path: str, headers) -> HttpReply:
+        """(status, headers, corpo) para GET `path`; `headers` é qualquer
+        mapeamento com .get() (os headers da requisição)."""
+        self.requests += 1
+        asset = self.assets.get(path.partition("?")[0])
+        if asset is None:
+            body = b"Not found\n"
+            return 404, [("Content-Type", "text/plain; charset=utf-8"), ("Content-Length", str(len(body)))], body
+
+        use_gzip = asset.gzip_body is not None and _accepts_gzip(headers.get("Accept-Encoding", ""))
+        reply_headers = [
+            ("ETag", asset.gzip_etag if use_gzip else asset.etag),
+            ("Cache-Control", CACHE_CONTROL),
+        ]
+        if asset.gzip_body is not None:
+            reply_headers.append(("Vary", "Accept-Encoding"))
+
+        if_none_match = headers.get("If-None-Match")
+        if if_none_match and _etag_matches(if_none_match, asset):
+            self.not_modified += 1
+            return 304, reply_headers, b""
+
+        body = asset.gzip_body if use_gzip else asset.body
+        reply_headers.append(("Content-Type", asset.content_type))
+        if use_gzip:
+            reply_headers.append(("Content-Encoding", "gzip"))
+        reply_headers.append(("Content-Length", str(len(body))))
+        return 200, reply_headers, body
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "routes": len(self.assets),
+            "bytes": sum(len(asset.body) for asset in set(self.assets.values())),
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+        }
+
+
+def http_response(status: int, headers: List[Tuple[str, str]], body: bytes) -> Response:
+    """Resposta HTTP comum (não upgrade) para o process_request do websockets."""
+    headers = Headers(headers)
+    headers["Connection"] = "close"
+    return Response(status, HTTPStatus(status).phrase, headers, body)
@@ -0,0 +1,352 @@
+"""
+ImbalanceEngine - Varredura de parâmetros dos engines sobre trades gravados
+
+Roda cada combinação de uma grade de parâmetros (e pesos) sobre um
+dataset em disco e mede, por configuração:
+    side_agreement       fração dos trades em que o side final bate com o
+                         side real da Binance
+    absorption_rate      fração dos trades marcados como absorção
+    absorption_hit_rate  fração das absorções em que o preço, horizon_ms
+                         depois, seguiu na direção do movimento dos
+                         horizon_ms anteriores (o lado passivo segurou o
+                         fluxo agressor); baseline_hit_rate é a mesma
+                         medida sobre todos os trades, para comparação
+    volume_ratio         volume enriquecido / volume bruto
+
+Dataset: uma gravação do TradeRecorder (arquivo) ou o TickStore (a pasta
+de um dia ou a de um símbolo, com todos os dias em ordem). Cada worker
+abre o dataset por memmap, então os processos dividem as mesmas páginas
+do cache de arquivos em vez de receber uma cópia; só o lote em
+processamento é convertido para a API vetorizada.
+
+As configurações que diferem só nos pesos vão para o mesmo worker, num
+SharedEngineOrchestrator com um pipeline para cada: os engines rodam uma
+vez e cada pipeline só refaz a combinação ponderada.
+
+Grade (JSON, em linha ou num arquivo): "<engine>.<parâmetro>" ou
+"weights.<engine>" → lista de valores, por exemplo
+
+    {"micro_cluster.absorption_threshold": [1.5, 2.0, 3.0],
+     "micro_cluster.window_ms": [[100, 1000, 5000], [250]],
+     "tick_velocity.max_velocity": [25, 50, 100],
+     "weights.micro_cluster": [1.0, 1.5, 2.0]}
+
+Uso:
+    python sweep.py gravacao.bin --grid grade.json
+    python sweep.py store/BTCUSDT --grid '{"atr_normalize.atr_baseline": [100, 150, 200]}' \\
+        --engines tick_velocity,side_inference,micro_cluster,atr_normalize --workers 4
+"""
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Any, List, Tuple
+import numpy as np
+from replay import DEFAULT_ENGINES, DEFAULT_WEIGHTS
+from shared_engines import EnginePipeline, SharedEngineOrchestrator
+from tick_store import column_file, read_partition, COLUMNS
+from trade_recorder import read_recording, records_to_columns
+
+SWEEP_BATCH_SIZE = 65536
+HORIZON_MS = 1000
+METRICS = ("side_agreement", "absorption_rate", "absorption_hit_rate", "volume_ratio")
+
+
+# ============================================
+# Dataset
+# ============================================
+class Segment:
+    """Trecho contínuo do dataset (uma gravação ou um dia do TickStore):
+    timestamps e preços por memmap e read(início, fim) com as colunas
+    (preço, volume em USDT, timestamp, side real) da API vetorizada."""
+
+    def __init__(self, name: str, timestamps: np.ndarray, prices: np.ndarray,
+                 read: Callable[[int, int], tuple]):
+        self.name = name
+        self.timestamps = timestamps
+        self.prices = prices
+        self.read = read
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+def _recording_segment(path: str) -> Segment:
+    _, records = read_recording(path)
+    return Segment(path, records["trade_time"], records["price"],
+                   lambda start, stop: records_to_columns(records[start:stop]))
+
+
+def _partition_segment(path: str) -> Segment:
+    columns = read_partition(path)
+
+    def read(start: int, stop: int) -> tuple:
+        prices = columns["price"][start:stop].astype(np.float64)
+        return (prices, prices * columns["qty"][start:stop], columns["timestamp"][start:stop].astype(np.int64),
+                columns["side_real"][start:stop].astype(np.int8))
+
+    return Segment(path, columns["timestamp"], columns["price"], read)
+
+
+def _is_partition(path: str) -> bool:
+    name, dtype, _ = COLUMNS[0]
+    return os.path.exists(os.path.join(path, column_file(name, dtype)))
+
+
+def open_dataset(path: str) -> List[Segment]:
+    """Trechos do dataset, em ordem: a gravação, o dia do TickStore ou
+    todos os dias de um símbolo do TickStore."""
+    if os.path.isfile(path):
+        segments = [_recording_segment(path)]
+    elif _is_partition(path):
+        segments = [_partition_segment(path)]
+    elif os.path.isdir(path):
+        days = sorted(entry for entry in os.listdir(path) if _is_partition(os.path.join(path, entry)))
+        segments = [_partition_segment(os.path.join(path, day)) for day in days]
+    else:
+        raise ValueError(f"Dataset não encontrado: {path}")
+    segments = [segment for segment in segments if len(segment)]
+    if not segments:
+        raise ValueError(f"Dataset sem trades: {path}")
+    return segments
+
+
+def hit_counts(timestamps: np.ndarray, prices: np.ndarray, indices: np.ndarray,
+               horizon_ms: int) -> Tuple[int, int]:
+    """(acertos, avaliados) dos trades em `indices`: o movimento de preço
+    nos horizon_ms seguintes tem o sinal do movimento nos horizon_ms
+    anteriores. Trades sem movimento antes, ou sem horizon_ms de dados
+    antes ou depois, não são avaliados."""
+    if len(indices) == 0:
+        return 0, 0
+    times = timestamps[indices]
+    past = np.searchsorted(timestamps, times - horizon_ms, side="right") - 1
+    future = np.searchsorted(timestamps, times + horizon_ms, side="left")
+    valid = (past >= 0) & (future < len(timestamps))
+    price = prices[indices[valid]]
+    before = np.sign(price - prices[past[valid]])
+    after = np.sign(prices[future[valid]] - price)
+    moved = before != 0
+    return int(np.count_nonzero(after[moved] == before[moved])), int(np.count_nonzero(moved))
+
+
+# ============================================
+# Grade
+# ============================================
+def expand_grid(grid: Dict[str, List[Any]], engine_names: List[str],
+                weights: Dict[str, float] = None) -> List[Dict[str, Any]]:
+    """Uma configuração (engines, pesos, parâmetros e os valores da grade)
+    por combinação; parâmetros inválidos levantam ValueError aqui, antes
+    de qualquer worker subir."""
+    weights = dict(weights or {name: 1.0 for name in engine_names})
+    for key, values in grid.items():
+        target, _, param = key.partition(".")
+        engine = param if target == "weights" else target
+        if not param:
+            raise ValueError(f"Chave da grade inválida: {key} (use <engine>.<parâmetro> ou weights.<engine>)")
+        if engine not in engine_names:
+            raise ValueError(f"Engine {engine} da chave {key} não está em {', '.join(engine_names)}")
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"A grade precisa de uma lista de valores em {key}")
+
+    keys = list(grid)
+    configs = []
+    for combination in itertools.product(*(grid[key] for key in keys)):
+        config_weights = dict(weights)
+        params: Dict[str, Dict[str, Any]] = {}
+        for key, value in zip(keys, combination):
+            target, _, param = key.partition(".")
+            if target == "weights":
+                config_weights[param] = value
+            else:
+                params.setdefault(target, {})[param] = value
+        pipeline = EnginePipeline(engine_names, config_weights, params)
+        configs.append({**pipeline.describe(), "values": dict(zip(keys, combination))})
+    return configs
+
+
+def group_configs(configs: List[Dict[str, Any]], workers: int) -> List[List[Dict[str, Any]]]:
+    """Tarefas para o pool: configurações com os mesmos parâmetros (só os
+    pesos mudam) ficam juntas; grupos grandes são divididos enquanto houver
+    menos tarefas que workers."""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for config in configs:
+        groups.setdefault(json.dumps(config["params"], sort_keys=True), []).append(config)
+    tasks = list(groups.values())
+    while len(tasks) < workers:
+        largest = max(tasks, key=len)
+        if len(largest) < 2:
+            break
+        tasks.remove(largest)
+        half = len(largest) // 2
+        tasks += [largest[:half], largest[half:]]
+    return tasks
+
+
+# ============================================
+# Avaliação (roda em cada worker)
+# ============================================
+def evaluate(path: str, configs: List[Dict[str, Any]], batch_size: int = SWEEP_BATCH_SIZE,
+             horizon_ms: int = HORIZON_MS) -> List[Dict[str, Any]]:
+    """Passa o dataset uma vez por um orquestrador com um pipeline por
+    configuração e devolve as métricas de cada uma."""
+    started = time.perf_counter()
+    segments = open_dataset(path)
+    orchestrator = SharedEngineOrchestrator()
+    pipelines = [EnginePipeline(config["engines"], config["weights"], config["params"]) for config in configs]
+    for pipeline in pipelines:
+        orchestrator.add_pipeline(pipeline)
+
+    ticks = 0
+    raw_volume = 0.0
+    agree = {pipeline.id: 0 for pipeline in pipelines}
+    volume = {pipeline.id: 0.0 for pipeline in pipelines}
+    absorptions = {pipeline.id: 0 for pipeline in pipelines}
+    hits = {pipeline.id: [0, 0] for pipeline in pipelines}
+
+    for segment in segments:
+        found: Dict[str, List[np.ndarray]] = {pipeline.id: [] for pipeline in pipelines}
+        for start in range(0, len(segment), batch_size):
+            columns = segment.read(start, min(start + batch_size, len(segment)))
+            sides = columns[3]
+            ticks += len(sides)
+            raw_volume += float(columns[1].sum())
+            for pipeline_id, result in orchestrator.calculate_enhanced_volume_batches(*columns).items():
+                agree[pipeline_id] += int(np.count_nonzero(result["side"] == sides))
+                volume[pipeline_id] += float(result["volume"].sum())
+                found[pipeline_id].append(np.flatnonzero(result["is_absorption"]) + start)
+        for pipeline_id, indices in found.items():
+            indices = np.concatenate(indices)
+            absorptions[pipeline_id] += len(indices)
+            segment_hits, evaluated = hit_counts(segment.timestamps, segment.prices, indices, horizon_ms)
+            hits[pipeline_id][0] += segment_hits
+            hits[pipeline_id][1] += evaluated
+
+    elapsed = time.perf_counter() - started
+    results = []
+    for config, pipeline in zip(configs, pipelines):
+        absorption_hits, evaluated = hits[pipeline.id]
+        results.append({
+            **config,
+            "ticks": ticks,
+            "side_agreement": agree[pipeline.id] / ticks,
+            "absorptions": absorptions[pipeline.id],
+            "absorption_rate": absorptions[pipeline.id] / ticks,
+            "absorption_hit_rate": absorption_hits / evaluated if evaluated else None,
+            "volume_ratio": volume[pipeline.id] / raw_volume if raw_volume else None,
+            # O worker avalia o grupo inteiro numa passada; o tempo é dividido entre as configurações
+            "seconds": elapsed / len(configs),
+        })
+    return results
+
+
+def baseline_hit_rate(path: str, horizon_ms: int = HORIZON_MS) -> float:
+    hits = evaluated = 0
+    for segment in open_dataset(path):
+        segment_hits, segment_evaluated = hit_counts(segment.timestamps, segment.prices,
+                                                     np.arange(len(segment)), horizon_ms)
+        hits += segment_hits
+        evaluated += segment_evaluated
+    return hits / evaluated if evaluated else None
+
+
+def run_sweep(path: str, grid: Dict[str, List[Any]], engine_names: List[str] = DEFAULT_ENGINES,
+              weights: Dict[str, float] = None, workers: int = None, batch_size: int = SWEEP_BATCH_SIZE,
+              horizon_ms: int = HORIZON_MS, on_progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+    """Avalia todas as combinações da grade em paralelo (workers=1 roda
+    no próprio processo) e devolve as métricas de cada configuração."""
+    if weights is None:
+        weights = {name: DEFAULT_WEIGHTS.get(name, 1.0) for name in engine_names}
+    configs = expand_grid(grid, engine_names, weights)
+    open_dataset(path)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(configs)))
+    tasks = group_configs(configs, workers)
+
+    started = time.perf_counter()
+    results = []
+    if workers == 1:
+        for task in tasks:
+            results += evaluate(path, task, batch_size, horizon_ms)
+            if on_progress:
+                on_progress(len(results), len(configs))
+    else:
+        # spawn como no sharding.py: o worker não herda o estado do processo principal
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+            futures = [pool.submit(evaluate, path, task, batch_size, horizon_ms) for task in tasks]
+            for future in as_completed(futures):
+                results += future.result()
+                if on_progress:
+                    on_progress(len(results), len(configs))
+
+    return {
+        "dataset": path,
+        "grid": grid,
+        "workers": workers,
+        "tasks": len(tasks),
+        "horizon_ms": horizon_ms,
+        "ticks": results[0]["ticks"] if results else 0,
+        "baseline_hit_rate": baseline_hit_rate(path, horizon_ms),
+        "seconds": time.perf_counter() - started,
+        "results": results,
+    }
+
+
+def rank(results: List[Dict[str, Any]], metric: str) -> List[Dict[str, Any]]:
+    """Melhores primeiro; configurações sem valor na métrica vão para o fim."""
+    return sorted(results, key=lambda r: (r[metric] is not None, r[metric] or 0.0), reverse=True)
+
+
+def _percent(value) -> str:
+    return f"{value * 100:.2f}%" if value is not None else "--"
+
+
+def print_ranking(sweep: Dict[str, Any], metric: str, top: int):
+    print(f"{'#':>3} {'side ok':>8} {'absorção':>9} {'acerto':>8} {'vol/bruto':>9}  configuração")
+    for i, r in enumerate(rank(sweep["results"], metric)[:top], 1):
+        values = " ".join(f"{key}={json.dumps(value)}" for key, value in r["values"].items())
+        ratio = f"{r['volume_ratio']:.3f}" if r["volume_ratio"] is not None else "--"
+        print(f"{i:>3} {_percent(r['side_agreement']):>8} {_percent(r['absorption_rate']):>9} "
+              f"{_percent(r['absorption_hit_rate']):>8} {ratio:>9}  {values}")
+
+
+def _load_grid(value: str) -> Dict[str, List[Any]]:
+    if os.path.isfile(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Varredura de parâmetros dos engines sobre trades gravados")
+    parser.add_argument("path", help="gravação do TradeRecorder ou pasta do TickStore (dia ou símbolo)")
+    parser.add_argument("--grid", required=True, help="grade em JSON (ou arquivo com ela)")
+    parser.add_argument("--engines", default=",".join(DEFAULT_ENGINES), help="engines separados por vírgula")
+    parser.add_argument("--workers", type=int, default=None, help="processos (padrão: um por núcleo)")
+    parser.add_argument("--batch", type=int, default=SWEEP_BATCH_SIZE, help="trades por lote da API vetorizada")
+    parser.add_argument("--horizon-ms", type=int, default=HORIZON_MS, help="horizonte do acerto das absorções")
+    parser.add_argument("--sort", default="absorption_hit_rate", choices=METRICS, help="métrica do ranking")
+    parser.add_argument("--top", type=int, default=10, help="configurações no ranking")
+    parser.add_argument("--output", default=None, help="JSON com as métricas de todas as configurações")
+    args = parser.parse_args()
+
+    def progress(done: int, total: int):
+        print(f"⏳ {done}/{total} configurações", end="\r", flush=True)
+
+    sweep = run_sweep(args.path, _load_grid(args.grid), args.engines.split(","), workers=args.workers,
+                      batch_size=args.batch, horizon_ms=args.horizon_ms, on_progress=progress)
+    print(f"🔍 {len(sweep['results'])} configurações x {sweep['ticks']:,} trades em {sweep['seconds']:.1f}s "
+          f"({sweep['workers']} workers, {sweep['tasks']} tarefas)")
+    print(f"🎯 Acerto de referência (todos os trades): {_percent(sweep['baseline_hit_rate'])}\n")
+    print_ranking(sweep, args.sort, args.top)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(sweep, f, indent=2)
+        print(f"\n💾 Resultados salvos em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
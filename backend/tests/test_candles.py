@@ -0,0 +1,130 @@
+"""
+CandleAggregator: barras de cada timeframe montadas a partir da menor
+contra um agrupamento direto dos trades, updates incrementais e casos de
+borda (buracos sem trades, timeframes inválidos).
+"""
+import numpy as np
+import pytest
+from candles import CANDLE_MAX_BARS, CANDLE_TIMEFRAMES, CandleAggregator
+
+START = 1_700_000_000_000
+
+
+def _trades(n: int = 5000, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    # ~12 min de trades, com um buraco de 2 min no meio
+    timestamps = START + np.cumsum(rng.integers(0, 300, n))
+    timestamps[n // 2:] += 120_000
+    prices = 60000.0 + np.cumsum(rng.normal(0.0, 1.0, n))
+    volumes = rng.uniform(10.0, 5000.0, n)
+    sides = rng.choice(["buy", "sell", "neutral"], n, p=[0.45, 0.45, 0.1])
+    absorptions = rng.random(n) < 0.05
+    return [
+        {"timestamp": int(t), "price": float(p), "volume_raw": float(v), "volume": float(v) * 1.1,
+         "side": str(s), "is_absorption": bool(a)}
+        for t, p, v, s, a in zip(timestamps, prices, volumes, sides, absorptions)
+    ]
+
+
+def _reference(trades, bar_ms: int):
+    """Barras agrupando os trades direto pelo início do período."""
+    bars = {}
+    cvd = 0.0
+    for trade in trades:
+        start = trade["timestamp"] - trade["timestamp"] % bar_ms
+        bar = bars.get(start)
+        if bar is None:
+            bar = bars[start] = {"start": start, "open": trade["price"], "high": trade["price"],
+                                 "low": trade["price"], "buy_volume": 0.0, "sell_volume": 0.0,
+                                 "volume_raw": 0.0, "trade_count": 0, "absorption_count": 0}
+        bar["high"] = max(bar["high"], trade["price"])
+        bar["low"] = min(bar["low"], trade["price"])
+        bar["close"] = trade["price"]
+        bar["volume_raw"] += trade["volume_raw"]
+        if trade["side"] == "buy":
+            bar["buy_volume"] += trade["volume"]
+            cvd += trade["volume"]
+        elif trade["side"] == "sell":
+            bar["sell_volume"] += trade["volume"]
+            cvd -= trade["volume"]
+        bar["cvd"] = cvd
+        bar["trade_count"] += 1
+        bar["absorption_count"] += trade["is_absorption"]
+    return list(bars.values())
+
+
+def _assert_bars_equal(bars, expected):
+    assert [bar["start"] for bar in bars] == [bar["start"] for bar in expected]
+    for bar, reference in zip(bars, expected):
+        for key in ("open", "high", "low", "close", "trade_count", "absorption_count"):
+            assert bar[key] == reference[key], (bar["start"], key)
+        for key in ("buy_volume", "sell_volume", "volume_raw", "cvd"):
+            assert bar[key] == pytest.approx(reference[key], abs=0.01), (bar["start"], key)
+        assert bar["delta"] == pytest.approx(reference["buy_volume"] - reference["sell_volume"], abs=0.02)
+
+
+@pytest.mark.parametrize("timeframe", list(CANDLE_TIMEFRAMES))
+def test_roll_up_matches_direct_grouping(timeframe):
+    trades = _trades()
+    aggregator = CandleAggregator("btcusdt")
+    for trade in trades:
+        aggregator.add_payload(trade)
+
+    snapshot = aggregator.snapshot(timeframe)
+    assert snapshot["type"] == "candles" and snapshot["symbol"] == "BTCUSDT"
+    # Até CANDLE_MAX_BARS fechadas mais a parcial
+    expected = _reference(trades, CANDLE_TIMEFRAMES[timeframe])[-(CANDLE_MAX_BARS + 1):]
+    _assert_bars_equal(snapshot["bars"], expected)
+
+
+def test_updates_add_up_to_snapshot():
+    trades = _trades()
+    aggregator = CandleAggregator("btcusdt", timeframes=["1s", "1m"])
+    received = {}
+    for i, trade in enumerate(trades):
+        aggregator.add_payload(trade)
+        if i % 97 == 0:
+            update = aggregator.update("1m")
+            # Reaplicar barras pelo start (como o cliente): fechadas e depois a parcial
+            for bar in update["closed"] + [update["bar"]]:
+                received[bar["start"]] = bar
+    update = aggregator.update("1m")
+    for bar in update["closed"] + [update["bar"]]:
+        received[bar["start"]] = bar
+
+    assert list(received.values()) == aggregator.snapshot("1m")["bars"]
+    assert aggregator.update("1m") is None
+
+
+def test_no_bars_for_gaps():
+    aggregator = CandleAggregator("btcusdt", timeframes=["1s", "1m"])
+    aggregator.add(100.0, 1.0, 1.0, "buy", False, START)
+    aggregator.add(101.0, 1.0, 1.0, "sell", False, START + 10 * 60_000 + 5)
+    assert [bar["start"] for bar in aggregator.snapshot("1m")["bars"]] == [START - START % 60_000,
+                                                                          START - START % 60_000 + 600_000]
+    assert len(aggregator.snapshot("1s")["bars"]) == 2
+
+
+def test_skip_drops_unsent_bars():
+    aggregator = CandleAggregator("btcusdt", timeframes=["1s"])
+    for i in range(5):
+        aggregator.add(100.0 + i, 1.0, 1.0, "buy", False, START + i * 1000)
+    aggregator.skip("1s")
+    assert aggregator.update("1s") is None
+    aggregator.add(200.0, 1.0, 1.0, "buy", False, START + 5000)
+    update = aggregator.update("1s")
+    assert [bar["open"] for bar in update["closed"]] == [104.0]
+    assert update["bar"]["open"] == 200.0
+
+
+def test_max_bars():
+    aggregator = CandleAggregator("btcusdt", timeframes=["1s"], max_bars=3)
+    for i in range(10):
+        aggregator.add(100.0, 1.0, 1.0, "buy", False, START + i * 1000)
+    assert [bar["open"] for bar in aggregator.snapshot("1s")["bars"]] == [100.0] * 4
+
+
+@pytest.mark.parametrize("timeframes", [[], ["2m"], ["1m", "1s", "7s"]])
+def test_invalid_timeframes(timeframes):
+    with pytest.raises(ValueError):
+        CandleAggregator("btcusdt", timeframes=timeframes)
@@ -0,0 +1,124 @@
+"""
+ClientChannel: fila limitada de trades/frames com as políticas de
+overflow, controle nunca descartado e atualizações de estado conflacionadas
+por chave (no máximo uma pendente, trocada por um snapshot).
+"""
+import asyncio
+import pytest
+from client_channel import ClientChannel
+
+
+class FakeSocket:
+    """Socket que só envia depois de release() (simula um cliente lento)."""
+
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+        self._open = asyncio.Event()
+
+    def release(self):
+        self._open.set()
+
+    async def send(self, message):
+        await self._open.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=""):
+        self.close_code = code
+
+
+def _run(scenario):
+    async def main():
+        socket = FakeSocket()
+        return await scenario(socket)
+    return asyncio.run(main())
+
+
+async def _drain(channel, socket):
+    socket.release()
+    for _ in range(10):
+        await asyncio.sleep(0)
+    await channel.close()
+
+
+def test_drop_oldest():
+    async def scenario(socket):
+        channel = ClientChannel(socket, maxsize=3)
+        for i in range(6):
+            channel.offer(f"t{i}")
+        channel.send_control("ctl")
+        await _drain(channel, socket)
+        return socket.sent, channel.dropped
+
+    assert _run(scenario) == (["t3", "t4", "t5", "ctl"], 3)
+
+
+def test_conflate():
+    async def scenario(socket):
+        channel = ClientChannel(socket, maxsize=3, policy="conflate")
+        channel.send_control("ctl")
+        for i in range(5):
+            channel.offer(f"t{i}")
+        await _drain(channel, socket)
+        return socket.sent
+
+    assert _run(scenario) == ["ctl", "t3", "t4"]
+
+
+def test_disconnect():
+    async def scenario(socket):
+        channel = ClientChannel(socket, maxsize=2, policy="disconnect")
+        results = [channel.offer(f"t{i}") for i in range(3)]
+        await asyncio.sleep(0)
+        return results, channel.closed, socket.close_code
+
+    assert _run(scenario) == ([True, True, False], True, 1008)
+
+
+def test_updates_conflate_per_key():
+    async def scenario(socket):
+        channel = ClientChannel(socket, maxsize=10)
+        state = {"n": 0}
+        snapshots = []
+
+        def resync():
+            snapshots.append(state["n"])
+            return f"snapshot{state['n']}"
+
+        for n in range(1000):
+            state["n"] = n
+            channel.send_update(("footprint", "btcusdt"), f"delta{n}", resync)
+            channel.send_update(("candles", "btcusdt", "1m"), f"candle{n}", lambda: "candles")
+        channel.send_control("ctl")
+        depth = channel.depth
+        await _drain(channel, socket)
+        return depth, socket.sent, snapshots, channel.resynced
+
+    depth, sent, snapshots, resynced = _run(scenario)
+    assert depth == 3
+    # O snapshot é montado uma vez, na hora do envio, com o estado mais recente
+    assert sent == ["snapshot999", "candles", "ctl"]
+    assert snapshots == [999]
+    assert resynced == 2 * 999
+
+
+def test_update_after_send_is_queued_again():
+    async def scenario(socket):
+        channel = ClientChannel(socket)
+        channel.send_update("key", "first", lambda: "snapshot")
+        socket.release()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        channel.send_update("key", "second", lambda: "snapshot")
+        await _drain(channel, socket)
+        return socket.sent
+
+    assert _run(scenario) == ["first", "second"]
+
+
+def test_unknown_policy():
+    async def scenario(socket):
+        with pytest.raises(ValueError):
+            ClientChannel(socket, policy="block")
+
+    _run(scenario)
@@ -0,0 +1,119 @@
+"""
+TradeConflator (agregados por lado, absorções, reset a cada flush) e a
+cadência do conflation_loop do websocket_server.
+"""
+import asyncio
+import json
+import pytest
+import websocket_server as server
+from conflation import TradeConflator
+
+
+def _trade(price, volume, side, timestamp, is_absorption=False, symbol="BTCUSDT"):
+    return {"type": "trade", "symbol": symbol, "timestamp": timestamp, "price": price,
+            "volume": volume, "volume_raw": volume, "side": side, "is_absorption": is_absorption}
+
+
+def test_volume_aggregated_per_side():
+    conflator = TradeConflator("btcusdt", 250)
+    conflator.add(_trade(100.0, 1.5, "buy", 1))
+    conflator.add(_trade(101.0, 2.25, "sell", 2))
+    conflator.add(_trade(99.0, 0.5, "buy", 3))
+    conflator.add(_trade(100.5, 4.0, "neutral", 4))
+    frame = conflator.flush()
+    aggregates = frame["aggregates"]
+    assert frame["symbol"] == "BTCUSDT"
+    assert frame["interval_ms"] == 250
+    assert aggregates["trade_count"] == 4
+    assert aggregates["buy_volume"] == 2.0
+    assert aggregates["sell_volume"] == 2.25
+
+
+def test_prices_and_timestamps_of_interval():
+    conflator = TradeConflator("btcusdt", 100)
+    for price, timestamp in [(100.0, 10), (103.0, 11), (98.0, 12), (101.0, 13)]:
+        conflator.add(_trade(price, 1.0, "buy", timestamp))
+    aggregates = conflator.flush()["aggregates"]
+    assert (aggregates["open_price"], aggregates["high_price"],
+            aggregates["low_price"], aggregates["last_price"]) == (100.0, 103.0, 98.0, 101.0)
+    assert (aggregates["first_timestamp"], aggregates["last_timestamp"]) == (10, 13)
+
+
+def test_absorptions_carried_through():
+    conflator = TradeConflator("btcusdt", 100)
+    conflator.add(_trade(100.0, 1.0, "buy", 1, is_absorption=True))
+    conflator.add(_trade(100.0, 1.0, "sell", 2))
+    conflator.add(_trade(100.0, 1.0, "sell", 3, is_absorption=True))
+    frame = conflator.flush()
+    assert frame["aggregates"]["absorption_count"] == 2
+    assert [trade["is_absorption"] for trade in frame["trades"]] == [True, False, True]
+
+
+def test_flush_resets_interval():
+    conflator = TradeConflator("btcusdt", 100)
+    assert conflator.flush() is None
+    conflator.add(_trade(100.0, 3.0, "buy", 1, is_absorption=True))
+    conflator.flush()
+    assert conflator.flush() is None
+    conflator.add(_trade(90.0, 1.0, "sell", 2))
+    aggregates = conflator.flush()["aggregates"]
+    assert aggregates["trade_count"] == 1
+    assert (aggregates["buy_volume"], aggregates["sell_volume"]) == (0.0, 1.0)
+    assert aggregates["absorption_count"] == 0
+    assert (aggregates["high_price"], aggregates["low_price"]) == (90.0, 90.0)
+
+
+class OfferChannel:
+    def __init__(self):
+        self.closed = False
+        self.offered = []
+
+    def offer(self, message, timestamp=None, kind="trade"):
+        self.offered.append((asyncio.get_running_loop().time(), kind, json.loads(message)))
+        return True
+
+    def send_control(self, message):
+        pass
+
+
+@pytest.fixture
+def state(monkeypatch):
+    for name in ("client_channels", "client_symbols", "symbol_subscribers", "client_filters", "trade_filters",
+                 "snapshot_buffers", "footprints", "candles", "candle_clients", "client_pipelines",
+                 "client_intervals", "conflators", "conflation_tasks", "binary_clients"):
+        monkeypatch.setattr(server, name, {})
+    monkeypatch.setattr(server, "candle_only_clients", set())
+
+
+def test_conflation_loop_sends_one_frame_per_interval(state):
+    client = object()
+    channel = server.client_channels[client] = OfferChannel()
+    server.symbol_subscribers["btcusdt"] = {client}
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        server.set_conflation(client, 50)
+        task = server.conflation_tasks[50]
+        for i in range(6):
+            await server.broadcast_trade(_trade(100.0 + i, 1.0, "buy" if i % 2 else "sell", i,
+                                                is_absorption=(i == 3)))
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.06)
+        server.set_conflation(client, 0)
+        await asyncio.wait_for(task, 1)
+        return started
+
+    started = asyncio.run(scenario())
+    frames = [message for _, kind, message in channel.offered if kind == "frame"]
+    assert len(channel.offered) == len(frames)
+    assert 2 <= len(frames) <= 4
+    assert [trade["timestamp"] for frame in frames for trade in frame["trades"]] == list(range(6))
+    assert sum(frame["aggregates"]["absorption_count"] for frame in frames) == 1
+    assert sum(frame["aggregates"]["buy_volume"] for frame in frames) == 3.0
+    # Flushes presos à grade da cadência, não à chegada dos trades
+    times = [started] + [at for at, _, _ in channel.offered]
+    assert all(later - earlier >= 0.045 for earlier, later in zip(times, times[1:]))
+    # Sem clientes na cadência a tarefa termina e leva seus acumuladores
+    assert server.conflation_tasks == {}
+    assert server.conflators == {}
@@ -0,0 +1,111 @@
+"""
+VolumeEngineOrchestrator: calculate_enhanced_volume_batch contra o
+caminho por tick no mesmo fluxo sintético (volume, side, contribuições de
+cada engine e sub-fator, absorções), com todos os engines ligados.
+
+O lote arredonda com np.round e o caminho por tick com round(): np.round
+multiplica por 10**casas, arredonda meio-para-par e divide, enquanto
+round() arredonda o valor decimal exato do float. Os dois só divergem em
+empates decimais (x.xx5 em volume, x.xxx5 em contribuição), e então por
+uma unidade da última casa: round(2.675, 2) == 2.67 (o float é 2.67499...),
+np.round(2.675, 2) == 2.68. Fatores de engine quase nunca caem num empate,
+então os fluxos sintéticos batem exatamente, mas a comparação aceita essa
+unidade.
+"""
+import numpy as np
+import pytest
+from benchmarks.synthetic import generate_trades, to_columns, to_ticks
+from engine_orchestrator import ENGINE_REGISTRY, VolumeEngineOrchestrator
+from volume_engines.base import decode_sides
+
+N_TRADES = 4000
+WEIGHTS = {
+    "tick_velocity": 0.3,
+    "spread_weight": 0.2,
+    "side_inference": 0.1,
+    "micro_cluster": 0.25,
+    "atr_normalize": 0.15,
+}
+
+
+def _assert_rounded_equal(actual, expected, ndigits: int, label=None):
+    """Iguais até uma unidade da última casa (empates decimais, ver acima)."""
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=10 ** -ndigits * 1.001, err_msg=label or "")
+
+
+def _per_tick(orchestrator, ticks):
+    return [orchestrator.calculate_enhanced_volume(tick) for tick in ticks]
+
+
+def _batched(orchestrator, columns, batch_size: int):
+    results = []
+    for start in range(0, len(columns[0]), batch_size):
+        results.append(orchestrator.calculate_enhanced_volume_batch(
+            *(column[start:start + batch_size] for column in columns)))
+    return results
+
+
+@pytest.mark.parametrize("batch_size", (1, 50, 4000))
+@pytest.mark.parametrize("regime", ("bursty", "flash_crash"))
+def test_batch_matches_per_tick(regime, batch_size):
+    trades = generate_trades(regime, N_TRADES, seed=11)
+    expected = _per_tick(VolumeEngineOrchestrator(list(WEIGHTS), WEIGHTS), to_ticks(trades))
+    batches = _batched(VolumeEngineOrchestrator(list(WEIGHTS), WEIGHTS), to_columns(trades), batch_size)
+
+    volumes = np.concatenate([batch["volume"] for batch in batches])
+    sides = decode_sides(np.concatenate([batch["side"] for batch in batches]))
+    absorptions = np.concatenate([batch["is_absorption"] for batch in batches])
+    _assert_rounded_equal(volumes, [result["volume"] for result in expected], 2)
+    assert sides == [result["side"] for result in expected]
+    assert absorptions.tolist() == [result["is_absorption"] for result in expected]
+
+    keys = expected[0]["engine_contributions"].keys()
+    assert all(batch["engine_contributions"].keys() == keys for batch in batches)
+    for key in keys:
+        contributions = np.concatenate([batch["engine_contributions"][key] for batch in batches])
+        _assert_rounded_equal(contributions, [result["engine_contributions"][key] for result in expected], 3, key)
+
+
+def test_decimal_ties_differ_by_one_unit():
+    # Só side_inference: fator médio 1.0, o volume arredondado é o volume real
+    volumes = [2.675, 1234.565, 10.005, 600.0025]
+    orchestrator = VolumeEngineOrchestrator(["side_inference"])
+    expected = [orchestrator.calculate_enhanced_volume(
+        {"price": 100.0, "timestamp": i, "volume_real": volume, "side_real": "buy"})["volume"]
+        for i, volume in enumerate(volumes)]
+    batch = VolumeEngineOrchestrator(["side_inference"]).calculate_enhanced_volume_batch(
+        [100.0] * 4, volumes, [0, 1, 2, 3], ["buy"] * 4)
+    assert expected == [round(volume, 2) for volume in volumes]
+    assert batch["volume"].tolist() == np.round(volumes, 2).tolist()
+    assert batch["volume"].tolist() != expected
+    _assert_rounded_equal(batch["volume"], expected, 2)
+
+
+def test_default_weights_are_equal():
+    orchestrator = VolumeEngineOrchestrator(["tick_velocity", "spread_weight"])
+    assert orchestrator.weights == {"tick_velocity": 0.5, "spread_weight": 0.5}
+
+
+def test_batch_uses_plan_weights_and_keys():
+    # Engine sem peso usa o peso padrão do plano nos dois caminhos
+    weights = {"tick_velocity": 0.4, "micro_cluster": 0.6}
+    names = ["tick_velocity", "side_inference", "micro_cluster", "atr_normalize"]
+    trades = generate_trades("bursty", 600, seed=5)
+    expected = _per_tick(VolumeEngineOrchestrator(names, weights), to_ticks(trades))
+    orchestrator = VolumeEngineOrchestrator(names, weights)
+    batches = _batched(orchestrator, to_columns(trades), 200)
+    _assert_rounded_equal(np.concatenate([batch["engine_contributions"]["atr_normalize"] for batch in batches]),
+                          [result["engine_contributions"]["atr_normalize"] for result in expected], 3)
+    # Chaves dos sub-fatores montadas uma vez (o mesmo objeto em todos os lotes)
+    first, *others = [list(batch["engine_contributions"]) for batch in batches]
+    assert all(key is other for keys in others for key, other in zip(first, keys))
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        VolumeEngineOrchestrator(["tick_velocity", "nope"])
+
+
+def test_active_engines():
+    orchestrator = VolumeEngineOrchestrator(sorted(ENGINE_REGISTRY))
+    assert [engine["id"] for engine in orchestrator.get_active_engines()] == sorted(ENGINE_REGISTRY)
@@ -0,0 +1,113 @@
+"""
+FootprintAggregator: virada de barra, deltas só com os níveis que
+mudaram, troca de sessão e recentragem da janela (com snapshot no lugar
+do delta).
+"""
+from footprint import FootprintAggregator, default_tick_size
+
+START = 1_700_000_040_000  # início de um minuto
+
+
+def _footprint(**kwargs):
+    return FootprintAggregator("btcusdt", "p1", tick_size=10.0, bar_ms=60_000, **kwargs)
+
+
+def _levels(message):
+    return dict(zip(message["price"], zip(message["buy"], message["sell"])))
+
+
+def _apply(state, delta):
+    """Como um cliente: valores absolutos por nível."""
+    if delta["type"] == "footprint":
+        return _levels(delta["profile"])
+    state = dict(state)
+    state.update(_levels(delta["profile"]))
+    return {price: volumes for price, volumes in state.items() if volumes != (0, 0)}
+
+
+def test_default_tick_size():
+    assert default_tick_size(60000.0) == 10
+    assert default_tick_size(3000.0) == 0.5
+    assert default_tick_size(0.5) == 0.0001
+
+
+def test_levels_and_ohlc():
+    footprint = _footprint()
+    footprint.add(60001.0, 100.0, "buy", START)
+    footprint.add(60004.0, 50.0, "sell", START + 10)
+    footprint.add(60021.0, 30.0, "buy", START + 20)
+    footprint.add(59990.0, 20.0, "sell", START + 30)
+    bar = footprint.snapshot()["bars"][-1]
+    assert (bar["open"], bar["high"], bar["low"], bar["close"]) == (60001.0, 60021.0, 59990.0, 59990.0)
+    assert _levels(bar) == {59990.0: (0, 20.0), 60000.0: (100.0, 50.0), 60020.0: (30.0, 0)}
+
+
+def test_delta_carries_only_dirty_levels():
+    footprint = _footprint()
+    footprint.add(60000.0, 100.0, "buy", START)
+    footprint.add(60100.0, 10.0, "sell", START + 1)
+    first = footprint.delta()
+    assert _levels(first["bar"]) == {60000.0: (100.0, 0), 60100.0: (0, 10.0)}
+    assert footprint.delta() is None
+
+    footprint.add(60000.0, 5.0, "sell", START + 2)
+    second = footprint.delta()
+    # Valores absolutos do nível, só ele
+    assert _levels(second["bar"]) == {60000.0: (100.0, 5.0)}
+    assert _levels(second["profile"]) == {60000.0: (100.0, 5.0)}
+    assert second["closed"] == []
+
+
+def test_bar_rollover():
+    footprint = _footprint(max_bars=2)
+    footprint.add(60000.0, 100.0, "buy", START)
+    footprint.delta()
+    footprint.add(60050.0, 40.0, "sell", START + 60_000)
+    delta = footprint.delta()
+    assert [bar["start"] for bar in delta["closed"]] == [START]
+    assert _levels(delta["closed"][0]) == {60000.0: (100.0, 0)}
+    # A barra nova começa vazia: só o nível do trade novo
+    assert delta["bar"]["start"] == START + 60_000
+    assert _levels(delta["bar"]) == {60050.0: (0, 40.0)}
+    assert _levels(delta["profile"]) == {60050.0: (0, 40.0)}
+
+    for minute in (2, 3):
+        footprint.add(60000.0, 1.0, "buy", START + minute * 60_000)
+    snapshot = footprint.snapshot()
+    # max_bars fechadas + a atual
+    assert [bar["start"] for bar in snapshot["bars"]] == [START + 60_000, START + 120_000, START + 180_000]
+    assert snapshot["poc"] == 60000.0
+
+
+def test_session_reset_zeroes_profile():
+    footprint = FootprintAggregator("btcusdt", tick_size=10.0, session_ms=120_000)
+    footprint.add(60000.0, 100.0, "buy", 0)
+    footprint.delta()
+    footprint.add(60100.0, 10.0, "buy", 120_000)
+    delta = footprint.delta()
+    assert delta["session_start"] == 120_000
+    assert _levels(delta["profile"]) == {60000.0: (0, 0), 60100.0: (10.0, 0)}
+    assert _levels(footprint.snapshot()["profile"]) == {60100.0: (10.0, 0)}
+
+
+def test_recenter_sends_snapshot():
+    footprint = _footprint(levels=16)
+    footprint.add(60000.0, 100.0, "buy", START)
+    footprint.add(60050.0, 20.0, "sell", START + 1)
+    state = _apply({}, footprint.snapshot())
+    state = _apply(state, footprint.delta())
+
+    # 60000 sai da janela de 16 níveis recentrada em 60100; 60050 fica
+    footprint.add(60100.0, 5.0, "buy", START + 2)
+    assert footprint.recenters == 1
+    message = footprint.delta()
+    assert message["type"] == "footprint"
+    state = _apply(state, message)
+    assert state == _levels(footprint.snapshot()["profile"]) == {60050.0: (0, 20.0), 60100.0: (5.0, 0)}
+    assert _levels(message["bars"][-1]) == {60050.0: (0, 20.0), 60100.0: (5.0, 0)}
+
+    # Depois do snapshot, deltas normais de novo
+    footprint.add(60100.0, 5.0, "buy", START + 3)
+    delta = footprint.delta()
+    assert delta["type"] == "footprint_delta"
+    assert _levels(delta["profile"]) == {60100.0: (10.0, 0)}
@@ -0,0 +1,89 @@
+"""
+IngestPipeline: recepção e decodificação em lotes (até max_batch), os dois
+decodificadores, mensagens que não são trades e deduplicação.
+"""
+import asyncio
+import json
+import pytest
+from ingest import IngestPipeline, decode_fast, decode_json
+from upstream import TradeDedup
+
+
+class StreamEnded(Exception):
+    pass
+
+
+class FakeSocket:
+    """Socket que entrega mensagens prontas e depois cai."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    async def recv(self):
+        if not self.messages:
+            raise StreamEnded()
+        return self.messages.pop(0)
+
+
+def _trade(trade_id: int, symbol: str = "BTCUSDT", combined: bool = False) -> str:
+    data = {"e": "trade", "E": 1_700_000_000_000 + trade_id, "s": symbol, "t": trade_id, "p": "60000.0",
+            "q": "0.01", "T": 1_700_000_000_000 + trade_id, "m": trade_id % 2 == 0}
+    if combined:
+        data = {"stream": f"{symbol.lower()}@trade", "data": data}
+    return json.dumps(data)
+
+
+def _run(pipeline: IngestPipeline, messages):
+    batches = []
+
+    async def handle_batch(batch):
+        batches.append(batch)
+
+    with pytest.raises(StreamEnded):
+        asyncio.run(pipeline.run(FakeSocket(messages), handle_batch))
+    return batches
+
+
+@pytest.mark.parametrize("decoder", ["fast", "json"])
+def test_batches_in_order(decoder):
+    pipeline = IngestPipeline(decoder, max_batch=500)
+    batches = _run(pipeline, [_trade(i) for i in range(1200)])
+
+    assert [len(batch) for batch in batches] == [500, 500, 200]
+    assert [trade["t"] for batch in batches for trade in batch] == list(range(1200))
+    stats = pipeline.stats()
+    assert stats["receive"]["messages"] == 1200
+    assert stats["process"]["messages"] == 1200
+    assert stats["process"]["batches"] == 3
+    assert stats["process"]["backlog"] == 0
+
+
+def test_skips_non_trades_and_malformed_messages():
+    messages = [_trade(1), json.dumps({"result": None, "id": 1}), "{not json", _trade(2, combined=True), "1,2"]
+    pipeline = IngestPipeline("fast")
+    batches = _run(pipeline, messages)
+
+    assert [trade["t"] for batch in batches for trade in batch] == [1, 2]
+    assert pipeline.skipped == 3
+
+
+def test_decoders_agree():
+    messages = [_trade(i, combined=i % 3 == 0) for i in range(50)]
+    assert decode_fast(messages) == decode_json(messages)
+    assert decode_fast(messages + ["{broken"]) == decode_json(messages) + [None]
+
+
+def test_dedup_drops_copies():
+    dedup = TradeDedup()
+    messages = [_trade(i) for i in range(10)] + [_trade(i) for i in range(5, 12)]
+    pipeline = IngestPipeline("fast", dedup=dedup)
+    batches = _run(pipeline, messages)
+
+    assert [trade["t"] for batch in batches for trade in batch] == list(range(12))
+    assert dedup.duplicates == 5
+    assert pipeline.links[0].first == 12
+
+
+def test_unknown_decoder():
+    with pytest.raises(ValueError):
+        IngestPipeline("regex")
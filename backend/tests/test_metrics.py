@@ -0,0 +1,104 @@
+"""
+Formato texto do Prometheus gerado por metrics.py e a rota GET /metrics
+do websocket_server.
+"""
+import asyncio
+import pytest
+from websockets.datastructures import Headers
+from websockets.http11 import Request
+import websocket_server as server
+from metrics import CONTENT_TYPE, Registry
+
+
+def _samples(text: str) -> dict:
+    """Linhas de amostra → {nome{labels}: valor}, sem HELP/TYPE."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("test_seconds", "Tempo.", ("path",), buckets=(0.1, 1.0, 10.0))
+    series = histogram.labels("tick")
+    for value in (0.05, 0.1, 0.5, 2.0, 20.0, 30.0):
+        series.observe(value)
+    text = registry.render()
+    assert "# HELP test_seconds Tempo.\n# TYPE test_seconds histogram\n" in text
+    samples = _samples(text)
+    assert samples['test_seconds_bucket{path="tick",le="0.1"}'] == 2
+    assert samples['test_seconds_bucket{path="tick",le="1.0"}'] == 3
+    assert samples['test_seconds_bucket{path="tick",le="10.0"}'] == 4
+    assert samples['test_seconds_bucket{path="tick",le="+Inf"}'] == 6
+    assert samples['test_seconds_count{path="tick"}'] == 6
+    assert samples['test_seconds_sum{path="tick"}'] == pytest.approx(52.65)
+
+
+def test_unlabelled_series_rendered_from_start():
+    registry = Registry()
+    registry.histogram("test_build_seconds", "Montagem.", buckets=(1.0,))
+    registry.counter("test_reconnects_total", "Reconexões.")
+    samples = _samples(registry.render())
+    assert samples == {
+        'test_build_seconds_bucket{le="1.0"}': 0,
+        'test_build_seconds_bucket{le="+Inf"}': 0,
+        "test_build_seconds_sum": 0,
+        "test_build_seconds_count": 0,
+        "test_reconnects_total": 0,
+    }
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    counter = registry.counter("test_missed_total", "Perdidos.", ("symbol",))
+    counter.labels("btcusdt").inc(3)
+    counter.labels("btcusdt").inc()
+    counter.labels("ethusdt").inc()
+    clients = [object(), object()]
+    registry.gauge("test_clients", "Clientes.", lambda: len(clients))
+    text = registry.render()
+    assert "# TYPE test_missed_total counter\n" in text
+    assert "# TYPE test_clients gauge\n" in text
+    samples = _samples(text)
+    assert samples['test_missed_total{symbol="btcusdt"}'] == 4
+    assert samples['test_missed_total{symbol="ethusdt"}'] == 1
+    assert samples["test_clients"] == 2
+    clients.pop()
+    assert _samples(registry.render())["test_clients"] == 1
+
+
+def test_label_values_escaped():
+    registry = Registry()
+    registry.counter("test_total", "Escapes.", ("name",)).labels('a"b\\c\nd').inc()
+    assert 'test_total{name="a\\"b\\\\c\\nd"} 1\n' in registry.render()
+
+
+def test_labels_must_match_names():
+    registry = Registry()
+    family = registry.counter("test_total", "Labels.", ("symbol",))
+    with pytest.raises(ValueError):
+        family.labels()
+    with pytest.raises(ValueError):
+        registry.counter("test_total", "Repetida.")
+
+
+def test_metrics_route():
+    server.BINANCE_RECONNECTS.labels().inc()
+    response = asyncio.run(server.process_request(None, Request("/metrics?x=1", Headers())))
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == CONTENT_TYPE
+    assert response.headers["Content-Length"] == str(len(response.body))
+    text = response.body.decode()
+    assert text.endswith("\n")
+    samples = _samples(text)
+    assert samples["imbalance_binance_reconnects_total"] >= 1
+    assert samples["imbalance_connected_clients"] == len(server.connected_clients)
+    assert "imbalance_broadcast_seconds_count" in samples
+
+
+def test_upgrade_requests_skip_http_routes():
+    headers = Headers([("Upgrade", "websocket")])
+    assert asyncio.run(server.process_request(None, Request("/metrics", headers))) is None
@@ -0,0 +1,79 @@
+"""
+MicroClusterEngine multi-resolução: janelas independentes, sub-fatores por
+resolução, detecção de absorção e limites dos parâmetros.
+"""
+import pytest
+from engine_orchestrator import VolumeEngineOrchestrator
+from shared_engines import EnginePipeline, SharedEngineOrchestrator
+from volume_engines.base import Tick
+from volume_engines.micro_cluster import MAX_WINDOWS, MicroClusterEngine
+
+
+def _push(engine, timestamp_ms: int, price: float, volume: float, side: str) -> float:
+    tick = Tick(price, timestamp_ms, volume, side)
+    return engine.calculate_volume_weight(tick, tick)
+
+
+def test_labels():
+    assert MicroClusterEngine().labels == ["100ms"]
+    assert MicroClusterEngine(window_ms=[100, 1000, 5000]).labels == ["100ms", "1s", "5s"]
+    assert MicroClusterEngine(window_ms=250).labels == ["250ms"]
+    assert MicroClusterEngine(window_ms=[2000, 1500]).labels == ["2s", "1500ms"]
+
+
+def test_windows_close_independently():
+    engine = MicroClusterEngine(window_ms=[100, 1000])
+    start = 1_700_000_000_000
+    # Um trade a cada 60ms: a janela de 100ms fecha a cada 120ms, a de 1s em 1020ms
+    for ms in range(0, 1021, 60):
+        _push(engine, start + ms, 100.0, 10.0, "buy")
+    assert engine.last_clusters["100ms"]["timestamp"] == pytest.approx((start + 960) / 1000)
+    assert engine.last_clusters["1s"]["timestamp"] == pytest.approx((start + 1020) / 1000)
+    assert engine.trade_count == [1, 0]
+    assert engine.buy_volume == [10.0, 0.0]
+
+
+def test_buy_absorption_on_one_resolution():
+    # Preço sobe com venda agressiva dominante: absorção compradora (fator 1.8)
+    engine = MicroClusterEngine(window_ms=[100, 5000])
+    start = 1_700_000_000_000
+    _push(engine, start, 100.0, 1.0, "buy")
+    _push(engine, start + 60, 100.5, 50.0, "sell")
+    factor = _push(engine, start + 120, 101.0, 50.0, "sell")
+
+    assert factor == 1.8
+    assert engine.get_sub_factors() == {"100ms": 1.8, "5s": 1.0}
+    assert engine.last_cluster["absorption_type"] == "buy"
+    assert engine.last_clusters["5s"] is None
+    # Depois de uma absorção compradora o side inferido é o oposto
+    assert engine.infer_side(Tick(101.0, start + 130, 1.0, "buy"), None) == "sell"
+
+
+def test_default_is_single_100ms_window():
+    # Mesmo sinal do engine de janela única: absorção numa janela de 100ms
+    orchestrator = VolumeEngineOrchestrator(["micro_cluster"], {"micro_cluster": 1.0})
+    start = 1_700_000_000_000
+    results = [orchestrator.calculate_enhanced_volume(Tick(price, start + ms, volume, side))
+               for ms, price, volume, side in [(0, 100.0, 1.0, "buy"), (60, 100.5, 50.0, "sell"),
+                                               (120, 101.0, 50.0, "sell")]]
+    assert set(results[-1]["engine_contributions"]) == {"micro_cluster", "micro_cluster@100ms"}
+    assert results[-1]["engine_contributions"]["micro_cluster"] == 1.8
+    assert [result["is_absorption"] for result in results] == [False, False, True]
+
+
+def test_sub_factors_in_contributions():
+    pipeline = EnginePipeline(["micro_cluster"], {"micro_cluster": 1.0},
+                              {"micro_cluster": {"window_ms": [100, 1000, 5000]}})
+    orchestrator = SharedEngineOrchestrator()
+    orchestrator.add_pipeline(pipeline)
+    result = orchestrator.calculate_enhanced_volumes(Tick(100.0, 1_700_000_000_000, 10.0, "buy"))[pipeline.id]
+    assert set(result["engine_contributions"]) == {"micro_cluster", "micro_cluster@100ms",
+                                                   "micro_cluster@1s", "micro_cluster@5s"}
+
+
+def test_window_limits():
+    with pytest.raises(ValueError):
+        MicroClusterEngine(window_ms=[])
+    with pytest.raises(ValueError):
+        MicroClusterEngine(window_ms=list(range(100, 100 * (MAX_WINDOWS + 2), 100)))
+    assert len(MicroClusterEngine(window_ms=list(range(100, 100 * (MAX_WINDOWS + 1), 100))).labels) == MAX_WINDOWS
@@ -0,0 +1,181 @@
+"""
+Book L2 local: escada de preços dos dois lados, sincronização com o
+snapshot (diffs guardados, velhos descartados, primeiro diff cobrindo
+lastUpdateId + 1), buraco de update id pedindo outro snapshot, topo entre
+bookTicker e escada, e o BookFeed seguindo o FakeBook do stand-in local.
+"""
+import asyncio
+import pytest
+import order_book
+from fake_binance import FakeBook
+from order_book import BookFeed, OrderBook, PriceLadder
+
+SYMBOL = "btcusdt"
+
+
+def _diff(first_id, last_id, bids=(), asks=()):
+    return {"e": "depthUpdate", "s": SYMBOL.upper(), "U": first_id, "u": last_id,
+            "b": [[str(p), str(q)] for p, q in bids], "a": [[str(p), str(q)] for p, q in asks]}
+
+
+def _snapshot(last_update_id, bids, asks):
+    return {"lastUpdateId": last_update_id, "bids": [[str(p), str(q)] for p, q in bids],
+            "asks": [[str(p), str(q)] for p, q in asks]}
+
+
+def _ladder_levels(ladder: PriceLadder):
+    return ladder.levels(len(ladder))
+
+
+def _synced_book():
+    book = OrderBook(SYMBOL)
+    assert book.apply_snapshot(_snapshot(100, [(99.0, 1.0), (98.0, 2.0)], [(101.0, 1.5), (102.0, 3.0)]))
+    return book
+
+
+def test_bid_ladder():
+    bids = PriceLadder(1)
+    for price, qty in ((100.0, 1.0), (102.0, 2.0), (101.0, 3.0), (99.5, 0.5)):
+        bids.set(price, qty)
+    assert bids.best() == (102.0, 2.0)
+    assert bids.levels(3) == [(102.0, 2.0), (101.0, 3.0), (100.0, 1.0)]
+    assert bids.depth(2) == 5.0
+    bids.set(101.0, 4.0)
+    assert len(bids) == 4 and bids.depth(2) == 6.0
+    bids.set(102.0, 0.0)
+    assert bids.best() == (101.0, 4.0)
+    # Remover um nível que não existe não muda nada
+    bids.set(90.0, 0.0)
+    assert len(bids) == 3
+    assert bids.depth(10) == 5.5
+
+
+def test_ask_ladder():
+    asks = PriceLadder(-1)
+    for price, qty in ((101.0, 1.0), (100.5, 2.0), (103.0, 3.0)):
+        asks.set(price, qty)
+    assert asks.best() == (100.5, 2.0)
+    assert asks.levels(2) == [(100.5, 2.0), (101.0, 1.0)]
+    assert asks.depth(2) == 3.0
+    asks.set(100.5, 0.0)
+    asks.set(100.0, 0.25)
+    assert _ladder_levels(asks) == [(100.0, 0.25), (101.0, 1.0), (103.0, 3.0)]
+    asks.clear()
+    assert asks.best() is None and asks.depth(5) == 0
+
+
+def test_snapshot_applies_buffered_diffs():
+    book = OrderBook(SYMBOL)
+    # Diffs antes do snapshot ficam guardados
+    assert not book.apply_diff(_diff(95, 99, bids=[(97.0, 9.0)]))
+    assert not book.apply_diff(_diff(100, 103, bids=[(99.0, 0.0)], asks=[(101.0, 2.5)]))
+    assert not book.apply_diff(_diff(104, 106, bids=[(99.5, 4.0)]))
+    assert not book.synced
+
+    assert book.apply_snapshot(_snapshot(101, [(99.0, 1.0), (98.0, 2.0)], [(101.0, 1.5)]))
+    assert book.synced and book.last_update_id == 106
+    # O diff com u <= lastUpdateId foi descartado; o que cobre 102 foi aplicado
+    assert _ladder_levels(book.bids) == [(99.5, 4.0), (98.0, 2.0)]
+    assert _ladder_levels(book.asks) == [(101.0, 2.5)]
+    assert book.stats()["buffered"] == 0
+
+
+def test_snapshot_older_than_buffered_diffs():
+    book = OrderBook(SYMBOL)
+    book.apply_diff(_diff(110, 115, bids=[(99.0, 1.0)]))
+    # lastUpdateId + 1 = 101 < U = 110: faltam updates entre o snapshot e o diff
+    assert not book.apply_snapshot(_snapshot(100, [(99.0, 1.0)], [(101.0, 1.0)]))
+    assert not book.synced
+    assert book.apply_snapshot(_snapshot(112, [(99.0, 5.0)], [(101.0, 1.0)]))
+    assert book.last_update_id == 115 and book.bids.best() == (99.0, 1.0)
+
+
+def test_old_diff_after_sync_is_ignored():
+    book = _synced_book()
+    assert book.apply_diff(_diff(90, 100, bids=[(99.0, 7.0)]))
+    assert book.bids.best() == (99.0, 1.0) and book.diffs == 0
+
+
+def test_gap_unsyncs_and_keeps_diff():
+    book = _synced_book()
+    assert book.apply_diff(_diff(101, 104, bids=[(99.0, 2.0)]))
+    assert not book.apply_diff(_diff(106, 108, asks=[(101.0, 0.0)]))
+    assert not book.synced and book.resyncs == 1
+    assert len(book.bids) == 0 and book.imbalance(5) is None
+    # O diff que revelou o buraco fica guardado para o próximo snapshot
+    assert book.apply_snapshot(_snapshot(106, [(99.0, 3.0)], [(101.0, 1.0), (102.0, 1.0)]))
+    assert book.asks.best() == (102.0, 1.0) and book.last_update_id == 108
+
+
+def test_top_prefers_newer_source():
+    book = _synced_book()
+    assert book.top() == (99.0, 1.0, 101.0, 1.5)
+    book.apply_ticker({"u": 101, "s": SYMBOL.upper(), "b": "99.5", "B": "0.4", "a": "100.5", "A": "0.6"})
+    assert book.top() == (99.5, 0.4, 100.5, 0.6)
+    # Um diff mais novo que o bookTicker faz a escada valer de novo
+    book.apply_diff(_diff(101, 103, bids=[(99.8, 2.0)]))
+    assert book.top() == (99.8, 2.0, 101.0, 1.5)
+    # bookTicker mais velho que o atual é ignorado
+    book.apply_ticker({"u": 90, "s": SYMBOL.upper(), "b": "1", "B": "1", "a": "2", "A": "1"})
+    assert book.ticker[0] == 101
+
+
+def test_top_without_ladder_uses_ticker():
+    book = OrderBook(SYMBOL)
+    assert book.top() is None
+    book.apply_ticker({"u": 5, "s": SYMBOL.upper(), "b": "99.0", "B": "1.0", "a": "99.1", "A": "2.0"})
+    assert book.top() == (99.0, 1.0, 99.1, 2.0)
+    assert book.best_bid == 99.0 and book.best_ask == 99.1
+
+
+def test_imbalance():
+    book = _synced_book()
+    assert book.imbalance(1) == pytest.approx((1.0 - 1.5) / 2.5)
+    assert book.imbalance(2) == pytest.approx((3.0 - 4.5) / 7.5)
+
+
+def _step(fake: FakeBook, price: float):
+    """Diff do FakeBook no formato do combined stream."""
+    first_id, last_id, bids, asks = fake.step(price)
+    return {"stream": f"{SYMBOL}@depth@100ms",
+            "data": {"e": "depthUpdate", "E": last_id, "s": SYMBOL.upper(), "U": first_id, "u": last_id,
+                     "b": bids, "a": asks}}
+
+
+def _assert_matches(book: OrderBook, fake: FakeBook):
+    snapshot = fake.snapshot(fake.levels)
+    assert book.last_update_id == snapshot["lastUpdateId"]
+    assert _ladder_levels(book.bids) == [(float(p), float(q)) for p, q in snapshot["bids"]]
+    assert _ladder_levels(book.asks) == [(float(p), float(q)) for p, q in snapshot["asks"]]
+
+
+def test_book_feed_follows_stand_in_and_resyncs(monkeypatch):
+    fake = FakeBook(seed=7, levels=50)
+    fake.step(60000.0)
+    monkeypatch.setattr(order_book, "fetch_snapshot", lambda url, symbol, limit: fake.snapshot(limit))
+    prices = [60000.0 + 0.37 * i * (-1) ** i for i in range(60)]
+
+    async def run():
+        feed = BookFeed([SYMBOL], "ws://localhost:0", snapshot_limit=50)
+        feed.running = True
+        book = feed.books[SYMBOL]
+        # Primeiro diff: sem snapshot, o feed pede um
+        feed.handle(_step(fake, prices[0]))
+        while not book.synced:
+            await asyncio.sleep(0.001)
+        for price in prices[1:40]:
+            feed.handle(_step(fake, price))
+        _assert_matches(book, fake)
+
+        # Um diff perdido: o próximo revela o buraco e o feed pede outro snapshot
+        _step(fake, prices[40])
+        feed.handle(_step(fake, prices[41]))
+        assert book.resyncs == 1
+        while not book.synced:
+            await asyncio.sleep(0.001)
+        for price in prices[42:]:
+            feed.handle(_step(fake, price))
+        _assert_matches(book, fake)
+        feed.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 10))
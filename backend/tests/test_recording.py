@@ -0,0 +1,102 @@
+"""
+TradeRecorder → read_recording (ida e volta, registro final incompleto,
+anexar a outra gravação) e replay() por tick contra replay_batches().
+"""
+import asyncio
+import numpy as np
+import pytest
+from benchmarks.synthetic import generate_trades, to_messages
+from replay import DEFAULT_ENGINES, DEFAULT_WEIGHTS, replay, replay_batches
+from engine_orchestrator import VolumeEngineOrchestrator
+from trade_recorder import HEADER, RECORD, TradeRecorder, read_recording, record_to_message
+
+
+def _record(path, messages, symbol="btcusdt"):
+    with TradeRecorder(str(path), symbol) as recorder:
+        for message in messages:
+            recorder.write(message)
+
+
+def _orchestrator():
+    return VolumeEngineOrchestrator(engine_names=DEFAULT_ENGINES, weights=DEFAULT_WEIGHTS)
+
+
+@pytest.fixture
+def messages():
+    return to_messages(generate_trades("bursty", 3000, seed=11))
+
+
+def test_round_trip(tmp_path, messages):
+    path = tmp_path / "btc.bin"
+    _record(path, messages)
+    symbol, records = read_recording(str(path))
+    assert symbol == "btcusdt"
+    assert len(records) == len(messages)
+    for record, message in zip(records[::97], messages[::97]):
+        rebuilt = record_to_message(record, symbol)
+        assert rebuilt["s"] == "BTCUSDT"
+        for field in ("t", "T", "m"):
+            assert rebuilt[field] == message[field]
+        assert rebuilt["E"] == int(message.get("E", message["T"]))
+        assert rebuilt["p"] == float(message["p"])
+        assert rebuilt["q"] == float(message["q"])
+
+
+def test_torn_final_record_ignored_and_cut_on_append(tmp_path, messages):
+    path = tmp_path / "btc.bin"
+    _record(path, messages[:10])
+    with open(path, "ab") as f:
+        f.write(RECORD.pack(0, 0, 0, 0.0, 0.0, 0)[:RECORD.size // 2])
+    _, records = read_recording(str(path))
+    assert len(records) == 10
+
+    _record(path, messages[10:20])
+    assert (path.stat().st_size - HEADER.size) % RECORD.size == 0
+    _, records = read_recording(str(path))
+    assert records["trade_id"].tolist() == [message["t"] for message in messages[:20]]
+
+
+def test_append_keeps_symbol(tmp_path, messages):
+    path = tmp_path / "btc.bin"
+    _record(path, messages[:5])
+    with pytest.raises(ValueError):
+        TradeRecorder(str(path), "ethusdt")
+    _record(path, messages[5:8], symbol="BTCUSDT")
+    symbol, records = read_recording(str(path))
+    assert (symbol, len(records)) == ("btcusdt", 8)
+
+
+def test_invalid_header(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"NOPE" + bytes(HEADER.size))
+    with pytest.raises(ValueError):
+        read_recording(str(path))
+    path.write_bytes(b"IE")
+    with pytest.raises(ValueError):
+        read_recording(str(path))
+
+
+def test_replay_matches_replay_batches(tmp_path, messages):
+    path = tmp_path / "btc.bin"
+    _record(path, messages)
+    payloads = []
+
+    async def collect(payload):
+        payloads.append(payload)
+
+    feed = asyncio.run(replay(str(path), _orchestrator(), on_data_callback=collect))
+    assert feed.trade_count == len(messages)
+
+    batches = list(replay_batches(str(path), _orchestrator(), batch_size=700))
+    volumes = np.concatenate([batch["volume"] for batch in batches])
+    absorptions = np.concatenate([batch["is_absorption"] for batch in batches])
+    # np.round no lote, round() por tick: no máximo uma unidade da última casa (ver test_engine_orchestrator)
+    np.testing.assert_allclose(volumes, [payload["volume"] for payload in payloads], rtol=0, atol=0.01001)
+    assert absorptions.tolist() == [payload["is_absorption"] for payload in payloads]
+
+
+def test_replay_empty_recording(tmp_path):
+    path = tmp_path / "empty.bin"
+    _record(path, [])
+    assert asyncio.run(replay(str(path), _orchestrator())).trade_count == 0
+    assert list(replay_batches(str(path), _orchestrator())) == []
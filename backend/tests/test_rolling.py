@@ -0,0 +1,81 @@
+"""
+RollingWindow: média e variância incrementais contra o cálculo direto,
+recálculo periódico das somas (resync) e extend() igual a push() bit a bit.
+"""
+import numpy as np
+import pytest
+from volume_engines.rolling import RollingWindow
+
+
+def _prices(n: int, seed: int = 3) -> np.ndarray:
+    # Preços altos com passos pequenos: o caso de cancelamento numérico
+    rng = np.random.default_rng(seed)
+    return 60000.0 + np.cumsum(rng.normal(0.0, 2.5, n))
+
+
+def test_matches_direct_computation():
+    window = RollingWindow(20)
+    values = _prices(1000)
+    for i, value in enumerate(values):
+        window.push(value)
+        expected = values[max(0, i - 19):i + 1]
+        assert window.count == len(expected)
+        assert window.mean == pytest.approx(expected.mean(), abs=1e-9)
+        assert window.variance == pytest.approx(expected.var(), abs=1e-6)
+
+
+def test_resync_recomputes_sums_from_buffer():
+    window = RollingWindow(5, resync_interval=8)
+    values = _prices(8)
+    for value in values[:7]:
+        window.push(value)
+    assert window._pushes == 7
+    window.push(values[7])
+    # No 8º valor as somas são refeitas do buffer com origem no valor mais recente
+    assert window._pushes == 0
+    assert window.origin == values[7]
+    shifted = values[3:] - values[7]
+    assert window.total == float(shifted.sum())
+    assert window.total_sq == float(np.dot(shifted, shifted))
+
+
+def test_resync_interval_is_at_least_size():
+    assert RollingWindow(100, resync_interval=10).resync_interval == 100
+
+
+def test_resync_bounds_drift():
+    window = RollingWindow(14, resync_interval=64)
+    values = _prices(200_000, seed=9)
+    for value in values:
+        window.push(value)
+    assert window.variance == pytest.approx(values[-14:].var(), rel=1e-9)
+
+
+@pytest.mark.parametrize("size, resync_interval", [(1, 1), (5, 8), (20, 4096), (50, 60)])
+@pytest.mark.parametrize("chunk", [1, 3, 17, 1000])
+def test_extend_matches_push(size, resync_interval, chunk):
+    values = _prices(1000)
+    pushed = RollingWindow(size, resync_interval)
+    expected = []
+    for value in values:
+        pushed.push(value)
+        expected.append((pushed.count, pushed.mean, pushed.variance))
+
+    extended = RollingWindow(size, resync_interval)
+    counts, means, variances = [], [], []
+    for start in range(0, len(values), chunk):
+        c, m, v = extended.extend(values[start:start + chunk])
+        counts += c.tolist()
+        means += m.tolist()
+        variances += v.tolist()
+
+    assert list(zip(counts, means, variances)) == expected
+    assert (extended.total, extended.total_sq, extended.origin, extended.head) == \
+           (pushed.total, pushed.total_sq, pushed.origin, pushed.head)
+
+
+def test_empty_window():
+    window = RollingWindow(3)
+    assert (window.count, window.mean, window.variance, window.full) == (0, 0.0, 0.0, False)
+    with pytest.raises(ValueError):
+        RollingWindow(0)
@@ -0,0 +1,226 @@
+"""
+Modo multiprocesso: os payloads remontados pelo ShardedFeed a partir dos
+registros dos workers são iguais aos do modo de um processo, e esperar um
+layout atrasado ou parar os workers não trava o loop. O layout de cada
+registro vai para a fila de eventos antes do registro entrar no ring.
+"""
+import asyncio
+import queue
+import time
+import numpy as np
+import pytest
+from benchmarks.bench_sharding import build_batches, start_workers, to_messages_raw
+from binance_ws import BinanceDataFeed
+from shared_engines import EnginePipeline, SharedEngineOrchestrator
+from sharding import (LAYOUT_TIMEOUT, MAX_CONTRIBUTIONS, OUT_DTYPE, OUT_RING_SIZE, RAW_DTYPE,
+                      RAW_RING_SIZE, EngineWorker, ShardedFeed, _pipeline_config)
+from shm_ring import ShmRing
+from volume_engines.book_imbalance import MAX_DEPTHS
+from volume_engines.micro_cluster import MAX_WINDOWS
+
+SYMBOLS = ["btcusdt", "ethusdt"]
+
+
+def _wide_pipeline() -> EnginePipeline:
+    """Pipeline com o máximo de chaves em engine_contributions."""
+    return EnginePipeline(
+        ["side_inference", "tick_velocity", "spread_weight", "atr_normalize", "micro_cluster", "book_imbalance"],
+        params={
+            "micro_cluster": {"window_ms": [50 * (i + 1) for i in range(MAX_WINDOWS)]},
+            "book_imbalance": {"depths": list(range(1, MAX_DEPTHS + 1))},
+        },
+    )
+
+
+def _inline(pipelines, batches):
+    payloads = []
+
+    async def collect(payload):
+        payloads.append(payload)
+
+    async def run():
+        feeds = []
+        for symbol in SYMBOLS:
+            orchestrator = SharedEngineOrchestrator()
+            for pipeline in pipelines:
+                orchestrator.add_pipeline(pipeline)
+            feed = BinanceDataFeed(symbol, orchestrator=orchestrator)
+            feed.log_interval = 0
+            feeds.append(feed)
+        for batch in batches:
+            for i, feed in enumerate(feeds):
+                messages = to_messages_raw(batch[batch["symbol"] == i])
+                if messages:
+                    await feed._process_batch(messages, collect)
+
+    asyncio.run(run())
+    return payloads
+
+
+def _sharded(pipelines, batches, workers):
+    feed = ShardedFeed(SYMBOLS, workers)
+    for orchestrator in feed.orchestrators.values():
+        for pipeline in pipelines:
+            orchestrator.add_pipeline(pipeline)
+    payloads = []
+    total = sum(len(batch) for batch in batches) * len(pipelines)
+
+    async def collect(payload):
+        payloads.append(payload)
+
+    async def run():
+        for batch in batches:
+            shards = batch["symbol"] % feed.workers
+            for shard, ring in enumerate(feed._raw_rings):
+                rows = batch[shards == shard]
+                while len(rows):
+                    rows = rows[ring.push(rows):]
+                    await asyncio.sleep(0)
+        while len(payloads) < total:
+            idle = True
+            for shard, ring in enumerate(feed._out_rings):
+                rows = ring.pop()
+                if len(rows):
+                    idle = False
+                    await feed._deliver(shard, rows, collect)
+            if idle:
+                await asyncio.sleep(0.001)
+
+    start_workers(feed, 500)
+    try:
+        asyncio.run(asyncio.wait_for(run(), 60))
+    finally:
+        feed.stop()
+    return payloads
+
+
+def _by_trade(payloads):
+    return sorted(payloads, key=lambda p: (p["symbol"], p["pipeline"], p["trade_count"]))
+
+
+def test_wide_pipeline_fits_record():
+    pipeline = _wide_pipeline()
+    orchestrator = SharedEngineOrchestrator()
+    orchestrator.add_pipeline(pipeline)
+    result = orchestrator.calculate_enhanced_volume_batches([100.0], [1000.0], [0], ["buy"])[pipeline.id]
+    assert len(result["engine_contributions"]) == MAX_CONTRIBUTIONS > 12
+    assert OUT_DTYPE["contributions"].shape == (MAX_CONTRIBUTIONS,)
+
+
+def test_sharded_payloads_match_inline():
+    pipelines = [_wide_pipeline(), EnginePipeline(["micro_cluster", "side_inference"])]
+    batches = build_batches(SYMBOLS, "bursty", 1500, 3, 250)
+    inline = _inline(pipelines, batches)
+    sharded = _sharded(pipelines, batches, workers=2)
+    assert len(sharded) == len(inline) == 2 * 1500 * len(pipelines)
+    assert _by_trade(sharded) == _by_trade(inline)
+    assert max(len(p["engine_contributions"]) for p in sharded) == MAX_CONTRIBUTIONS
+
+
+class RecordingEvents:
+    """Fila de eventos que anota a posição de escrita do ring de saída
+    quando cada evento foi posto."""
+
+    def __init__(self, out: ShmRing):
+        self.out = out
+        self.events = []
+
+    def put(self, event):
+        self.events.append((event, int(self.out._positions[0])))
+
+
+def test_layout_event_before_records():
+    raw = ShmRing.create(RAW_DTYPE, RAW_RING_SIZE)
+    out = ShmRing.create(OUT_DTYPE, OUT_RING_SIZE)
+    events = RecordingEvents(out)
+    worker = EngineWorker(0, SYMBOLS, raw.name, out.name, queue.Queue(), events, None)
+    try:
+        worker.add_pipeline(0, 0, _pipeline_config(EnginePipeline(["micro_cluster"])))
+        worker.add_pipeline(1, 1, _pipeline_config(_wide_pipeline()))
+        position = 0
+        for batch in build_batches(SYMBOLS, "calm", 400, 5, 100):
+            asyncio.run(worker.process(batch))
+            layouts = {event[2]: written for event, written in events.events if event[0] == "layout"}
+            for layout in out.pop()["layout"].tolist():
+                # O evento já estava na fila quando o registro entrou no ring
+                assert layouts[layout] <= position
+                position += 1
+        assert sorted(layouts) == [0, 1]
+        assert position == len(SYMBOLS) * 400
+    finally:
+        worker.close()
+        raw.close()
+        out.close()
+
+
+def _out_row(layout: int) -> np.ndarray:
+    rows = np.zeros(1, dtype=OUT_DTYPE)
+    rows["layout"] = layout
+    rows["trade_count"] = 1
+    rows["contributions"][0, :2] = (1.5, 0.5)
+    return rows
+
+
+def _ticker(ticks):
+    """Corrotina que conta voltas do loop (trava se alguém bloquear)."""
+    async def run():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.005)
+    return asyncio.create_task(run())
+
+
+def test_late_layout_does_not_block_loop():
+    feed = ShardedFeed(SYMBOLS, 1)
+    feed.pipeline_ids.append("p0")
+    feed._events = queue.Queue()
+    payloads = []
+    ticks = []
+
+    async def collect(payload):
+        payloads.append(payload)
+
+    async def run():
+        ticker = _ticker(ticks)
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.1, feed._events.put, ("layout", 0, 0, ("micro_cluster", "tick_velocity")))
+        await feed._deliver(0, _out_row(0), collect)
+        ticker.cancel()
+
+    asyncio.run(run())
+    assert payloads[0]["engine_contributions"] == {"micro_cluster": 1.5, "tick_velocity": 0.5}
+    # O loop continuou girando enquanto o layout não chegava
+    assert len(ticks) >= 10
+
+
+def test_missing_layout_times_out():
+    feed = ShardedFeed(SYMBOLS, 1)
+    feed.pipeline_ids.append("p0")
+    feed._events = queue.Queue()
+
+    async def collect(payload):
+        pass
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        asyncio.run(feed._deliver(0, _out_row(3), collect))
+    assert time.monotonic() - started >= LAYOUT_TIMEOUT
+
+
+def test_shutdown_joins_off_loop():
+    feed = ShardedFeed(SYMBOLS, 2)
+    start_workers(feed, 500)
+    ticks = []
+
+    processes = list(feed._processes)
+
+    async def run():
+        ticker = _ticker(ticks)
+        await feed.shutdown()
+        ticker.cancel()
+
+    asyncio.run(run())
+    assert not feed._processes and not feed._out_rings and not feed.running
+    assert not any(process.is_alive() for process in processes)
+    # O loop girou enquanto os workers saíam (um join no loop não deixaria)
+    assert ticks
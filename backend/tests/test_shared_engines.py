@@ -0,0 +1,111 @@
+"""
+EnginePipeline e SharedEngineOrchestrator: validação de engines, pesos e
+parâmetros; engines compartilhados dão o mesmo resultado de orquestradores
+privados; add_pipeline é tudo ou nada.
+"""
+import pytest
+import shared_engines
+from benchmarks.synthetic import generate_trades, to_ticks
+from engine_orchestrator import VolumeEngineOrchestrator
+from shared_engines import EnginePipeline, SharedEngineOrchestrator
+from volume_engines.base import Tick
+
+SCALPING = {"tick_velocity": 0.5, "micro_cluster": 0.3, "side_inference": 0.2}
+BALANCED = {"tick_velocity": 0.25, "spread_weight": 0.25, "atr_normalize": 0.25, "micro_cluster": 0.25}
+
+
+@pytest.mark.parametrize("weights", [
+    "x",
+    ["tick_velocity"],
+    {"tick_velocity": "2"},
+    {"tick_velocity": True},
+    {"tick_velocity": None},
+    {"tick_velocity": float("nan")},
+    {"tick_velocity": float("inf")},
+    {"micro_cluster": 1.0},
+])
+def test_invalid_weights(weights):
+    with pytest.raises(ValueError):
+        EnginePipeline(["tick_velocity"], weights)
+
+
+@pytest.mark.parametrize("engine_names", ["tick_velocity", ["tick_velocity", 3], None, ["nope"]])
+def test_invalid_engine_names(engine_names):
+    with pytest.raises(ValueError):
+        EnginePipeline(engine_names)
+
+
+@pytest.mark.parametrize("params", [
+    "x",
+    {"micro_cluster": "x"},
+    {"micro_cluster": {"window_ms": []}},
+    {"micro_cluster": {"nope": 1}},
+    {"book_imbalance": {"depths": [0]}},
+])
+def test_invalid_params(params):
+    with pytest.raises(ValueError):
+        EnginePipeline(["micro_cluster", "book_imbalance"], None, params)
+
+
+def test_weights():
+    assert EnginePipeline(["tick_velocity", "spread_weight"]).weights == {"tick_velocity": 0.5, "spread_weight": 0.5}
+    pipeline = EnginePipeline(["tick_velocity", "spread_weight"], {"tick_velocity": 2})
+    assert pipeline.weights == {"tick_velocity": 2.0}
+    assert isinstance(pipeline.weights["tick_velocity"], float)
+
+
+def test_id_follows_configuration():
+    assert EnginePipeline(list(SCALPING), SCALPING).id == EnginePipeline(list(SCALPING), dict(SCALPING)).id
+    assert EnginePipeline(list(SCALPING), SCALPING).id != EnginePipeline(list(SCALPING)).id
+
+
+def test_shared_matches_private_orchestrators():
+    ticks = to_ticks(generate_trades("bursty", 3000, seed=13))
+    shared = SharedEngineOrchestrator()
+    pipelines = [EnginePipeline(list(SCALPING), SCALPING), EnginePipeline(list(BALANCED), BALANCED)]
+    for pipeline in pipelines:
+        shared.add_pipeline(pipeline)
+    # tick_velocity e micro_cluster rodam uma vez só para os dois pipelines
+    assert len(shared.engines) == 5
+
+    private = {pipeline.id: VolumeEngineOrchestrator(pipeline.engine_names, pipeline.weights) for pipeline in pipelines}
+    for tick in ticks:
+        results = shared.calculate_enhanced_volumes(tick)
+        for pipeline_id, orchestrator in private.items():
+            expected = orchestrator.calculate_enhanced_volume(Tick(tick.price, tick.timestamp, tick.volume_real,
+                                                                   tick.side_real))
+            result = results[pipeline_id]
+            assert result["volume"] == expected["volume"]
+            assert result["side"] == expected["side"]
+            assert result["engine_contributions"] == expected["engine_contributions"]
+
+
+def test_remove_pipeline_keeps_shared_engines():
+    orchestrator = SharedEngineOrchestrator()
+    scalping = EnginePipeline(list(SCALPING), SCALPING)
+    balanced = EnginePipeline(list(BALANCED), BALANCED)
+    orchestrator.add_pipeline(scalping)
+    orchestrator.add_pipeline(balanced)
+    orchestrator.remove_pipeline(balanced.id)
+    assert sorted(key[0] for key in orchestrator.engines) == sorted(SCALPING)
+    assert set(orchestrator.calculate_enhanced_volumes(Tick(100.0, 1, 10.0, "buy"))) == {scalping.id}
+
+
+def test_failed_add_leaves_orchestrator_unchanged(monkeypatch):
+    orchestrator = SharedEngineOrchestrator()
+    scalping = EnginePipeline(list(SCALPING), SCALPING)
+    orchestrator.add_pipeline(scalping)
+    engines, refs = dict(orchestrator.engines), dict(orchestrator._refs)
+
+    def fail(engines, pipelines):
+        raise RuntimeError("falha ao compilar")
+
+    monkeypatch.setattr(shared_engines, "_build_plan", fail)
+    with pytest.raises(RuntimeError):
+        orchestrator.add_pipeline(EnginePipeline(list(BALANCED), BALANCED))
+    monkeypatch.undo()
+
+    assert orchestrator.engines == engines
+    assert orchestrator._refs == refs
+    assert list(orchestrator.pipelines) == [scalping.id]
+    assert set(orchestrator.calculate_enhanced_volumes(Tick(100.0, 1, 10.0, "buy"))) == {scalping.id}
@@ -0,0 +1,145 @@
+"""
+ShmRing: fronteiras de cheio/vazio, volta do índice no fim do buffer e
+produtor e consumidor em processos diferentes.
+"""
+import multiprocessing as mp
+import numpy as np
+import pytest
+from shm_ring import ShmRing
+
+DTYPE = np.dtype([("seq", "<i8"), ("value", "<f8"), ("tag", "u1")])
+
+
+def _rows(start: int, n: int) -> np.ndarray:
+    rows = np.zeros(n, dtype=DTYPE)
+    rows["seq"] = np.arange(start, start + n)
+    rows["value"] = rows["seq"] * 0.5
+    rows["tag"] = rows["seq"] % 256
+    return rows
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing.create(DTYPE, 8)
+    yield ring
+    ring.close()
+
+
+def test_empty(ring):
+    popped = ring.pop()
+    assert len(popped) == 0 and popped.dtype == DTYPE
+    assert len(ring) == 0 and ring.free() == 8
+
+
+def test_full(ring):
+    assert ring.push(_rows(0, 5)) == 5
+    assert ring.push(_rows(5, 5)) == 3
+    assert len(ring) == 8 and ring.free() == 0
+    assert ring.push(_rows(8, 1)) == 0
+    assert ring.pop()["seq"].tolist() == list(range(8))
+    assert len(ring) == 0
+
+
+def test_wraparound(ring):
+    seq = 0
+    expected = 0
+    for n in (5, 6, 7, 3, 8, 1, 8):
+        seq += ring.push(_rows(seq, n))
+        popped = ring.pop(max_rows=6)
+        assert popped["seq"].tolist() == list(range(expected, expected + len(popped)))
+        assert popped["value"].tolist() == (popped["seq"] * 0.5).tolist()
+        expected += len(popped)
+    rest = ring.pop()
+    assert rest["seq"].tolist() == list(range(expected, seq))
+    # As posições só crescem: o índice deu várias voltas no buffer
+    assert seq > 3 * ring.capacity
+
+
+def test_pop_returns_a_copy(ring):
+    ring.push(_rows(0, 4))
+    popped = ring.pop()
+    ring.push(_rows(100, 8))
+    assert popped["seq"].tolist() == [0, 1, 2, 3]
+
+
+def test_attach_sees_same_records(ring):
+    other = ShmRing.attach(ring.name, DTYPE, ring.capacity)
+    try:
+        ring.push(_rows(0, 3))
+        assert len(other) == 3
+        assert other.pop(2)["seq"].tolist() == [0, 1]
+        assert ring.pop()["seq"].tolist() == [2]
+    finally:
+        other.close()
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        ShmRing.create(DTYPE, 0)
+
+
+def _produce(name: str, capacity: int, total: int):
+    ring = ShmRing.attach(name, DTYPE, capacity)
+    try:
+        seq = 0
+        while seq < total:
+            seq += ring.push(_rows(seq, min(37, total - seq)))
+    finally:
+        ring.close()
+
+
+def _consume(name: str, capacity: int, total: int, results):
+    ring = ShmRing.attach(name, DTYPE, capacity)
+    try:
+        expected = 0
+        ok = True
+        while expected < total:
+            rows = ring.pop(50)
+            ok = ok and rows["seq"].tolist() == list(range(expected, expected + len(rows))) \
+                and rows["tag"].tolist() == [seq % 256 for seq in rows["seq"].tolist()]
+            expected += len(rows)
+        results.put((expected, ok))
+    finally:
+        ring.close()
+
+
+def _child(target, *args):
+    process = mp.get_context("spawn").Process(target=target, args=args, daemon=True)
+    process.start()
+    return process
+
+
+def test_child_producer():
+    total = 20000
+    ring = ShmRing.create(DTYPE, 64)
+    try:
+        process = _child(_produce, ring.name, ring.capacity, total)
+        received = []
+        while sum(len(rows) for rows in received) < total:
+            rows = ring.pop(50)
+            if len(rows):
+                received.append(rows)
+            elif not process.is_alive() and not len(ring):
+                break
+        process.join(timeout=30)
+        seqs = np.concatenate(received)["seq"]
+        assert seqs.tolist() == list(range(total))
+        assert process.exitcode == 0
+    finally:
+        ring.close()
+
+
+def test_child_consumer():
+    total = 20000
+    ring = ShmRing.create(DTYPE, 64)
+    results = mp.get_context("spawn").Queue()
+    try:
+        process = _child(_consume, ring.name, ring.capacity, total, results)
+        seq = 0
+        while seq < total:
+            seq += ring.push(_rows(seq, min(29, total - seq)))
+        assert results.get(timeout=30) == (total, True)
+        process.join(timeout=30)
+        assert process.exitcode == 0
+    finally:
+        ring.close()
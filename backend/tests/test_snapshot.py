@@ -0,0 +1,74 @@
+"""
+SnapshotBuffer: janela por timestamp, trades limitados a sent_trades,
+barras e agregados da janela inteira e tamanho da mensagem codificada.
+"""
+import asyncio
+import json
+import random
+import pytest
+from snapshot import SNAPSHOT_MAX_TRADES, SnapshotBuffer
+
+# max_size padrão dos clientes websockets
+MAX_MESSAGE_SIZE = 2 ** 20
+
+
+def _trades(n, start=1_700_000_000_000, step_ms=10, seed=7):
+    rng = random.Random(seed)
+    price = 60000.0
+    for i in range(n):
+        price += rng.uniform(-5, 5)
+        volume = rng.uniform(100, 50000)
+        yield {
+            "type": "trade", "symbol": "btcusdt", "price": round(price, 2), "volume": volume,
+            "volume_raw": volume * 0.9, "side": rng.choice(("buy", "sell")), "side_real": "buy",
+            "timestamp": start + i * step_ms, "is_absorption": rng.random() < 0.05,
+            "engine_contributions": {}, "trade_count": 1,
+        }
+
+
+def _buffer(n, **kwargs):
+    buffer = SnapshotBuffer("btcusdt", **kwargs)
+    for payload in _trades(n):
+        buffer.add(payload)
+    return buffer
+
+
+def test_window_by_newest_timestamp():
+    buffer = _buffer(1000, window_ms=2000)
+    timestamps = buffer.columns()["timestamp"]
+    assert len(timestamps) == 201
+    assert timestamps[-1] - timestamps[0] == 2000
+
+
+def test_sent_trades_limit_keeps_window_aggregates():
+    buffer = _buffer(1000, sent_trades=100, bar_ms=1000)
+    message = buffer.build()
+    assert message["trades"]["timestamp"] == buffer.columns()["timestamp"][-100:].tolist()
+    assert message["aggregates"]["trade_count"] == 1000
+    assert sum(message["bars"]["trade_count"]) == 1000
+
+
+def test_encoded_matches_build():
+    buffer = _buffer(1000, sent_trades=300)
+    encoded = json.loads(asyncio.run(buffer.encoded()))
+    built = buffer.build()
+    assert encoded["aggregates"] == built["aggregates"]
+    assert encoded["trades"]["timestamp"] == built["trades"]["timestamp"]
+    assert encoded["trades"]["price"] == built["trades"]["price"]
+    assert encoded["bars"]["trade_count"] == built["bars"]["trade_count"]
+
+
+def test_full_buffer_fits_client_max_size():
+    buffer = _buffer(SNAPSHOT_MAX_TRADES)
+    encoded = asyncio.run(buffer.encoded())
+    assert len(encoded.encode()) < MAX_MESSAGE_SIZE
+
+
+def test_empty_buffer():
+    assert asyncio.run(SnapshotBuffer("btcusdt").encoded()) is None
+
+
+@pytest.mark.parametrize("kwargs", [{"max_trades": 0}, {"sent_trades": -1}])
+def test_invalid_sizes(kwargs):
+    with pytest.raises(ValueError):
+        SnapshotBuffer("btcusdt", **kwargs)
@@ -0,0 +1,86 @@
+"""
+StaticAssets: ETag e 304, negociação de gzip pelo Accept-Encoding, Vary e
+caminhos fora do diretório do frontend.
+"""
+import gzip
+import pytest
+from static_assets import StaticAssets, _accepts_gzip
+
+INDEX = b"<!doctype html><html><body>" + b"<div class='row'>trade</div>" * 100 + b"</body></html>"
+TINY = b"body{}"
+
+
+@pytest.fixture
+def assets(tmp_path):
+    frontend = tmp_path / "frontend"
+    (frontend / "css").mkdir(parents=True)
+    (frontend / "index.html").write_bytes(INDEX)
+    (frontend / "css" / "tiny.css").write_bytes(TINY)
+    (tmp_path / "secret.txt").write_bytes(b"api key")
+    return StaticAssets(str(frontend))
+
+
+def _headers(reply):
+    return dict(reply[1])
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("br, gzip;q=0.5", True),
+    ("*", True),
+    ("*;q=0, gzip", True),
+    ("GZIP ; Q=0.1", True),
+    ("gzip;q=0", False),
+    ("gzip;q=0, *", False),
+    ("*, gzip;q=0", False),
+    ("gzip;q=abc", False),
+    ("identity", False),
+    ("", False),
+])
+def test_accepts_gzip(accept_encoding, expected):
+    assert _accepts_gzip(accept_encoding) is expected
+
+
+def test_index_served_raw_or_gzip(assets):
+    status, headers, body = assets.response("/", {})
+    assert status == 200 and body == INDEX
+    assert "Content-Encoding" not in dict(headers)
+
+    status, headers, body = assets.response("/index.html?v=2", {"Accept-Encoding": "*;q=0, gzip"})
+    headers = dict(headers)
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Content-Length"] == str(len(body))
+    assert gzip.decompress(body) == INDEX
+    assert headers["Content-Type"] == "text/html; charset=utf-8"
+
+
+def test_vary_only_when_gzip_variant_exists(assets):
+    assert _headers(assets.response("/", {}))["Vary"] == "Accept-Encoding"
+    reply = assets.response("/css/tiny.css", {"Accept-Encoding": "gzip"})
+    assert reply[2] == TINY
+    assert "Vary" not in _headers(reply)
+    assert "Content-Encoding" not in _headers(reply)
+
+
+def test_etag_revalidation(assets):
+    raw = _headers(assets.response("/", {}))["ETag"]
+    gzipped = _headers(assets.response("/", {"Accept-Encoding": "gzip"}))["ETag"]
+    assert raw != gzipped
+
+    status, headers, body = assets.response("/", {"If-None-Match": raw})
+    assert (status, body) == (304, b"")
+    assert dict(headers)["ETag"] == raw
+    assert dict(headers)["Cache-Control"] == "no-cache"
+    assert assets.response("/", {"If-None-Match": f'"other", W/{gzipped}', "Accept-Encoding": "gzip"})[0] == 304
+    assert assets.response("/", {"If-None-Match": '"other"'})[0] == 200
+    assert assets.stats()["not_modified"] == 2
+
+
+@pytest.mark.parametrize("path", ["/../secret.txt", "/css/../../secret.txt", "/%2e%2e/secret.txt",
+                                  "//secret.txt", "/css/", "/missing.js"])
+def test_paths_outside_frontend_not_found(assets, path):
+    status, headers, body = assets.response(path, {})
+    assert status == 404
+    assert b"api key" not in body
@@ -0,0 +1,222 @@
+"""
+TickStore: consultas sobre linhas em disco, na fila da thread de escrita
+e pendentes, sem contar o mesmo lote duas vezes, cauda incompleta
+truncada ao reabrir, virada do dia, trades que chegam fora de ordem
+(preenchimento de buracos) e erros de escrita no meio de um lote.
+"""
+import os
+import threading
+import time
+import numpy as np
+import pytest
+import tick_store
+from tick_store import COLUMNS, DAY_MS, TickStore, column_file, day_name, partition_rows
+
+START = 1_700_000_000_000
+
+
+def _add(store, trade_ids, symbol="btcusdt", timestamp=None):
+    for trade_id in trade_ids:
+        ts = timestamp(trade_id) if timestamp else START + trade_id * 10
+        store.append(symbol, trade_id, ts, 60000.0 + trade_id, 0.001 * trade_id,
+                     "buy" if trade_id % 2 else "sell", "buy", 60.0 + trade_id, trade_id % 7 == 0)
+
+
+def _wait_written(store, rows, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while store.written_rows + store.dropped_rows < rows:
+        assert time.monotonic() < deadline, "thread de escrita parada"
+        time.sleep(0.001)
+
+
+def _everything(store, symbol="btcusdt"):
+    return store.query(symbol, 0, 2 ** 62)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TickStore(str(tmp_path), batch_size=100)
+    yield store
+    store.close()
+
+
+def test_first_batch_not_counted_twice(tmp_path, monkeypatch):
+    previous = TickStore(str(tmp_path), batch_size=100)
+    _add(previous, range(50))
+    previous.close()
+
+    store = TickStore(str(tmp_path), batch_size=100)
+    # O leitor pega o estado da partição antes da thread de escrita abri-la
+    # e só lê o disco depois que o primeiro lote já foi escrito
+    read_partition = tick_store.read_partition
+
+    def late_read(path, rows=None):
+        _wait_written(store, 100)
+        return read_partition(path, rows)
+
+    monkeypatch.setattr(tick_store, "read_partition", late_read)
+    opened = threading.Event()
+    release = threading.Event()
+    open_partition = store._open
+
+    def slow_open(part):
+        opened.set()
+        release.wait(10)
+        open_partition(part)
+
+    monkeypatch.setattr(store, "_open", slow_open)
+    try:
+        _add(store, range(50, 150))
+        assert opened.wait(10)
+        threading.Timer(0.05, release.set).start()
+        assert _everything(store)["trade_id"].tolist() == list(range(150))
+    finally:
+        release.set()
+        store.close()
+
+
+def test_out_of_order_rows(store):
+    # 50..54 chegam depois (cópia atrasada da outra conexão)
+    late = list(range(50, 55))
+    _add(store, [i for i in range(250) if i not in late])
+    _add(store, late)
+    _wait_written(store, 200)
+
+    window = store.query("btcusdt", START + 500, START + 550)
+    assert window["trade_id"].tolist() == late
+    result = _everything(store)
+    assert result["trade_id"].tolist() == list(range(250))
+    assert result["price"].tolist() == [60000.0 + i for i in range(250)]
+    bars = store.bars("btcusdt", START, START + 2500, 1000)
+    assert bars["trade_count"].tolist() == [100, 100, 50]
+    assert bars["open"].tolist() == [60000.0, 60100.0, 60200.0]
+
+
+def test_contiguous_disk_range_is_a_view(store):
+    _add(store, range(300))
+    store.flush()
+    _wait_written(store, 300)
+    result = store.query("btcusdt", START + 1000, START + 2000, ("price",))
+    assert isinstance(result["price"], np.memmap)
+    assert result["price"].tolist() == [60000.0 + i for i in range(100, 200)]
+
+
+class FailingFile:
+    """Arquivo de coluna cuja próxima escrita falha (disco cheio)."""
+
+    def __init__(self, f):
+        self.f = f
+        self.fail = True
+
+    def write(self, data):
+        if self.fail:
+            self.fail = False
+            raise OSError(28, "No space left on device")
+        return self.f.write(data)
+
+    def truncate(self, size):
+        return self.f.truncate(size)
+
+    def close(self):
+        self.f.close()
+
+
+def _aligned(result):
+    trade_ids = result["trade_id"]
+    return (result["price"] == 60000.0 + trade_ids).all() and (result["timestamp"] == START + trade_ids * 10).all()
+
+
+def test_write_error_keeps_columns_aligned(tmp_path):
+    store = TickStore(str(tmp_path), batch_size=100)
+    _add(store, range(100))
+    _wait_written(store, 100)
+    part = next(iter(store.partitions.values()))
+    # Falha na quarta coluna: as três primeiras já receberam o lote
+    part.files[3] = FailingFile(part.files[3])
+    _add(store, range(100, 300))
+    store.close()
+    assert store.dropped_rows == 100
+
+    reopened = TickStore(str(tmp_path))
+    try:
+        result = _everything(reopened)
+        assert result["trade_id"].tolist() == list(range(100)) + list(range(200, 300))
+        assert _aligned(result)
+    finally:
+        reopened.close()
+
+
+def test_query_spans_disk_in_flight_and_pending(store, monkeypatch):
+    _add(store, range(100))
+    _wait_written(store, 100)
+
+    # Segura a thread de escrita com o segundo lote na fila
+    release = threading.Event()
+    to_columns = tick_store._to_columns
+
+    def slow_to_columns(rows, yield_gil=False):
+        if yield_gil:
+            release.wait(10)
+        return to_columns(rows, yield_gil)
+
+    monkeypatch.setattr(tick_store, "_to_columns", slow_to_columns)
+    try:
+        _add(store, range(100, 250))
+        part = next(iter(store.partitions.values()))
+        assert part.disk_rows == 100 and len(part.in_flight) == 1 and len(part.pending) == 50
+
+        result = store.query("btcusdt", START + 50 * 10, START + 220 * 10)
+        assert result["trade_id"].tolist() == list(range(50, 220))
+        assert _aligned(result)
+        assert result["side"].tolist() == [1 if i % 2 else 2 for i in range(50, 220)]
+        assert result["is_absorption"].tolist() == [i % 7 == 0 for i in range(50, 220)]
+    finally:
+        release.set()
+    _wait_written(store, 200)
+    assert _everything(store)["trade_id"].tolist() == list(range(250))
+
+
+def test_torn_tail_truncated_on_reopen(tmp_path):
+    store = TickStore(str(tmp_path), batch_size=100)
+    _add(store, range(100))
+    store.close()
+
+    # Execução interrompida no meio de um lote: colunas com caudas diferentes
+    path = os.path.join(str(tmp_path), "BTCUSDT", day_name(START // DAY_MS))
+    for name, dtype, _ in COLUMNS[:3]:
+        with open(os.path.join(path, column_file(name, dtype)), "ab") as f:
+            f.write(b"\x01" * (np.dtype(dtype).itemsize + 3))
+    assert partition_rows(path) == 100
+
+    reopened = TickStore(str(tmp_path), batch_size=100)
+    try:
+        assert _everything(reopened)["trade_id"].tolist() == list(range(100))
+        _add(reopened, range(100, 150))
+        reopened.flush()
+        _wait_written(reopened, 50)
+        for name, dtype, _ in COLUMNS:
+            assert os.path.getsize(os.path.join(path, column_file(name, dtype))) == 150 * np.dtype(dtype).itemsize
+        result = _everything(reopened)
+        assert result["trade_id"].tolist() == list(range(150))
+        assert _aligned(result)
+    finally:
+        reopened.close()
+
+
+def test_day_rollover(store):
+    midnight = (START // DAY_MS + 1) * DAY_MS
+    _add(store, range(300), timestamp=lambda i: midnight - 1500 + i * 10)
+    assert store.days("BTCUSDT") == [day_name(midnight // DAY_MS - 1), day_name(midnight // DAY_MS)]
+
+    result = store.query("btcusdt", midnight - 1000, midnight + 1000)
+    assert result["trade_id"].tolist() == list(range(50, 250))
+    store.flush()
+    _wait_written(store, 300)
+    assert store.query("btcusdt", 0, midnight)["trade_id"].tolist() == list(range(150))
+    assert store.query("btcusdt", midnight, 2 ** 62)["trade_id"].tolist() == list(range(150, 300))
+    assert partition_rows(os.path.join(store.root, "BTCUSDT", day_name(midnight // DAY_MS - 1))) == 150
+
+
+def test_unknown_columns(store):
+    with pytest.raises(ValueError):
+        store.query("btcusdt", 0, 1, ("price", "spread"))
@@ -0,0 +1,83 @@
+"""
+TradeFilter: forma canônica (ordem, espaços, repetições), avaliação de E e
+OU de Es, campos de engine e especificações inválidas.
+"""
+import pytest
+from trade_filter import MAX_CONDITIONS, TradeFilter
+
+
+def _payload(**fields):
+    payload = {
+        "type": "trade", "symbol": "BTCUSDT", "price": 60000.0, "volume": 1200.0, "volume_raw": 1000.0,
+        "side": "buy", "side_real": "sell", "timestamp": 1_700_000_000_000, "is_absorption": False,
+        "engine_contributions": {"micro_cluster": 0.4, "book_imbalance@L5": 0.8}, "trade_count": 10,
+    }
+    payload.update(fields)
+    return payload
+
+
+def test_canonical_key():
+    a = TradeFilter(["volume >= 50000", "is_absorption == true"])
+    b = TradeFilter(["  is_absorption==true", "volume>=50000.0 ", "volume >= 50000"])
+    assert a.key == b.key == "is_absorption == true & volume >= 50000.0"
+
+
+def test_canonical_key_of_or_groups():
+    a = TradeFilter([["side == buy"], ["volume_raw >= 250000", "is_absorption == true"]])
+    b = TradeFilter([["is_absorption == true", "volume_raw >= 250000"], ["side == \"buy\""]])
+    assert a.key == b.key
+    assert " | " in a.key
+
+
+def test_single_condition_string():
+    assert TradeFilter("side == sell").key == TradeFilter(["side == sell"]).key
+
+
+def test_and():
+    trade_filter = TradeFilter(["is_absorption == true", "volume >= 50000"])
+    assert trade_filter.matches(_payload(is_absorption=True, volume=50000.0))
+    assert not trade_filter.matches(_payload(is_absorption=True, volume=49999.0))
+    assert not trade_filter.matches(_payload(is_absorption=False, volume=90000.0))
+
+
+def test_or_of_ands():
+    trade_filter = TradeFilter([["is_absorption == true"], ["volume_raw >= 250000", "side != sell"]])
+    assert trade_filter.matches(_payload(is_absorption=True))
+    assert trade_filter.matches(_payload(volume_raw=300000.0, side="buy"))
+    assert not trade_filter.matches(_payload(volume_raw=300000.0, side="sell"))
+    assert not trade_filter.matches(_payload())
+
+
+def test_engine_fields():
+    assert TradeFilter("engine.book_imbalance@L5 > 0.5").matches(_payload())
+    assert not TradeFilter("engine.micro_cluster > 0.5").matches(_payload())
+    # Engine fora do pipeline do cliente: a condição não passa (nem com !=)
+    assert not TradeFilter("engine.atr_normalize != 1").matches(_payload())
+
+
+@pytest.mark.parametrize("spec", [
+    None,
+    [],
+    "volume",
+    ["volume >= big"],
+    ["side >= buy"],
+    ["side == up"],
+    ["is_absorption == 1"],
+    ["is_absorption > false"],
+    ["price == true"],
+    ["color == red"],
+    ["engine. > 1"],
+    [["volume > 1"], "side == buy"],
+    [[]],
+    [1],
+    ["volume > 1"] * (MAX_CONDITIONS + 1),
+])
+def test_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        TradeFilter(spec)
+
+
+def test_condition_limit_counts_all_groups():
+    TradeFilter([["volume > 1"] * 8, ["price > 1"] * 8])
+    with pytest.raises(ValueError):
+        TradeFilter([["volume > 1"] * 8, ["price > 1"] * 9])
@@ -0,0 +1,80 @@
+"""
+TradeDedup (primeira cópia de cada trade_id, buracos preenchidos, perdidos
+e reinício da numeração), Backoff e distribuição das conexões.
+"""
+from upstream import GAP_GRACE_MS, MAX_OPEN_GAPS, RESET_DISTANCE, Backoff, TradeDedup, connection_urls
+
+
+def test_first_copy_wins():
+    dedup = TradeDedup()
+    assert [dedup.accept("BTCUSDT", i, 0) for i in (1, 2, 2, 3, 1, 3)] == [True, True, False, True, False, False]
+    assert (dedup.accepted, dedup.duplicates) == (3, 3)
+
+
+def test_symbols_are_independent():
+    dedup = TradeDedup()
+    assert dedup.accept("BTCUSDT", 10, 0)
+    assert dedup.accept("ETHUSDT", 10, 0)
+    assert not dedup.accept("BTCUSDT", 10, 0)
+
+
+def test_trades_without_id_pass():
+    dedup = TradeDedup()
+    assert dedup.accept("BTCUSDT", None, 0) and dedup.accept("BTCUSDT", None, 0)
+
+
+def test_late_copy_fills_gap():
+    dedup = TradeDedup()
+    for trade_id in (1, 2, 6):
+        dedup.accept("BTCUSDT", trade_id, 0)
+    assert dedup.stats()["open_gaps"] == 1
+    # A outra conexão entrega 3..5 depois, em qualquer ordem
+    assert [dedup.accept("BTCUSDT", i, 10) for i in (4, 3, 5, 4)] == [True, True, True, False]
+    assert dedup.filled == 3
+    assert dedup.stats()["open_gaps"] == 0
+    dedup.expire(GAP_GRACE_MS * 10)
+    assert dedup.gaps == 0
+
+
+def test_gap_reported_after_grace():
+    gaps = []
+    dedup = TradeDedup(on_gap=lambda symbol, first, last: gaps.append((symbol, first, last)))
+    for trade_id in (1, 5, 6):
+        dedup.accept("BTCUSDT", trade_id, 1000)
+    dedup.accept("BTCUSDT", 3, 1500)
+    dedup.expire(1000 + GAP_GRACE_MS - 1)
+    assert gaps == []
+    dedup.expire(1000 + GAP_GRACE_MS)
+    # O buraco 2..4 virou 2..2 e 4..4 quando o 3 chegou
+    assert gaps == [("BTCUSDT", 2, 2), ("BTCUSDT", 4, 4)]
+    assert (dedup.gaps, dedup.missed) == (2, 2)
+
+
+def test_open_gaps_are_bounded():
+    dedup = TradeDedup()
+    for trade_id in range(1, 2 * (MAX_OPEN_GAPS + 10), 2):
+        dedup.accept("BTCUSDT", trade_id, 0)
+    assert dedup.stats()["open_gaps"] == MAX_OPEN_GAPS
+    assert dedup.gaps == 9
+
+
+def test_numbering_reset():
+    dedup = TradeDedup()
+    dedup.accept("BTCUSDT", RESET_DISTANCE + 100, 0)
+    assert dedup.accept("BTCUSDT", 5, 0)
+    assert dedup.resets == 1
+    assert not dedup.accept("BTCUSDT", 5, 0)
+
+
+def test_backoff_is_bounded_and_resets():
+    backoff = Backoff(base=0.5, cap=4.0, reset_after=10.0, seed=1)
+    delays = [backoff.next_delay() for _ in range(20)]
+    assert all(0.0 <= delay <= 4.0 for delay in delays)
+    assert backoff.attempts == 20
+    backoff.next_delay(uptime=10.0)
+    assert backoff.attempts == 1
+
+
+def test_connection_urls_alternate():
+    assert connection_urls(["a", "b"], 3) == ["a", "b", "a"]
+    assert connection_urls(["a"], 0) == ["a"]
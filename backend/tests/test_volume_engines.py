@@ -0,0 +1,83 @@
+"""
+API vetorizada dos engines contra o caminho por tick: num fluxo sintético
+fixo, calculate_volume_weight_batch (em lotes de vários tamanhos) dá os
+mesmos fatores, bit a bit, e deixa o mesmo estado para o lote seguinte.
+"""
+import numpy as np
+import pytest
+from benchmarks.synthetic import REGIMES, generate_trades, to_columns, to_ticks
+from engine_orchestrator import ENGINE_REGISTRY
+from volume_engines.base import SIDE_CODES, decode_sides, encode_sides
+
+N_TRADES = 3000
+BATCH_SIZES = (1, 7, 64, 1000)
+
+
+def _stream(regime: str):
+    trades = generate_trades(regime, N_TRADES, seed=7)
+    return to_ticks(trades), to_columns(trades)
+
+
+def _per_tick(engine, ticks):
+    factors = []
+    sub_factors = {}
+    for tick in ticks:
+        factors.append(engine.calculate_volume_weight(tick, tick))
+        for key, value in engine.get_sub_factors().items():
+            sub_factors.setdefault(key, []).append(value)
+    return np.array(factors), {key: np.array(values) for key, values in sub_factors.items()}
+
+
+def _batched(engine, columns, batch_size: int):
+    factors = []
+    sub_factors = {}
+    for start in range(0, len(columns[0]), batch_size):
+        batch = [column[start:start + batch_size] for column in columns]
+        factors.append(engine.calculate_volume_weight_batch(*batch))
+        for key, values in engine.get_sub_factors_batch().items():
+            sub_factors.setdefault(key, []).append(values)
+    return np.concatenate(factors), {key: np.concatenate(values) for key, values in sub_factors.items()}
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+@pytest.mark.parametrize("regime", REGIMES)
+@pytest.mark.parametrize("name", sorted(ENGINE_REGISTRY))
+def test_batch_matches_per_tick(name, regime, batch_size):
+    ticks, columns = _stream(regime)
+    expected, expected_sub = _per_tick(ENGINE_REGISTRY[name](), ticks)
+    factors, sub_factors = _batched(ENGINE_REGISTRY[name](), columns, batch_size)
+
+    assert np.array_equal(factors, expected)
+    assert sub_factors.keys() == expected_sub.keys()
+    for key in expected_sub:
+        assert np.array_equal(sub_factors[key], expected_sub[key]), key
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_infer_side_batch_matches_per_tick(batch_size):
+    ticks, columns = _stream("bursty")
+    engine = ENGINE_REGISTRY["side_inference"]()
+    expected = [engine.infer_side(tick, tick) for tick in ticks]
+
+    engine = ENGINE_REGISTRY["side_inference"]()
+    sides = np.concatenate([
+        engine.infer_side_batch(*(column[start:start + batch_size] for column in columns))
+        for start in range(0, N_TRADES, batch_size)
+    ])
+    assert decode_sides(sides) == expected
+
+
+def test_batch_accepts_side_names():
+    _, (prices, volumes, timestamps, sides) = _stream("calm")
+    names = decode_sides(sides)
+    assert np.array_equal(encode_sides(names), sides)
+    assert [SIDE_CODES[name] for name in names] == sides.tolist()
+
+    by_code = ENGINE_REGISTRY["micro_cluster"]().calculate_volume_weight_batch(prices, volumes, timestamps, sides)
+    by_name = ENGINE_REGISTRY["micro_cluster"]().calculate_volume_weight_batch(prices, volumes, timestamps, names)
+    assert np.array_equal(by_code, by_name)
+
+
+def test_empty_batch():
+    for name, engine_class in ENGINE_REGISTRY.items():
+        assert len(engine_class().calculate_volume_weight_batch([], [], [], [])) == 0, name
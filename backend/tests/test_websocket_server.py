@@ -0,0 +1,251 @@
+"""
+Funções de estado do websocket_server chamadas pelo handler (inscrições,
+filtros, candles, snapshots), com um canal falso no lugar do socket.
+"""
+import asyncio
+import json
+import pytest
+import websocket_server as server
+from shared_engines import SharedEngineOrchestrator
+from snapshot import SnapshotBuffer
+
+
+class FakeChannel:
+    def __init__(self):
+        self.closed = False
+        self.sent = []
+
+    def send_control(self, message):
+        self.sent.append(message)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Cliente conectado, sem inscrições; o estado global volta ao fim do teste."""
+    for name in ("client_channels", "client_symbols", "symbol_subscribers", "client_filters", "trade_filters",
+                 "snapshot_buffers", "candle_clients"):
+        monkeypatch.setattr(server, name, {})
+    monkeypatch.setattr(server, "candle_only_clients", set())
+    monkeypatch.setattr(server, "SYMBOLS", ["btcusdt", "ethusdt"])
+    client = object()
+    server.client_channels[client] = FakeChannel()
+    return client
+
+
+def _sent_types(client):
+    return [json.loads(message)["type"] for message in server.client_channels[client].sent]
+
+
+def _fill_snapshot(symbol: str):
+    buffer = server.snapshot_buffers[(symbol, server.DEFAULT_PIPELINE.id)] = SnapshotBuffer(symbol)
+    for i in range(10):
+        buffer.add({"timestamp": 1_700_000_000_000 + i, "price": 60000.0 + i, "volume": 1.0,
+                    "volume_raw": 1.0, "side": "buy", "is_absorption": False})
+
+
+def test_snapshot_on_subscribe(client):
+    _fill_snapshot("ethusdt")
+    assert asyncio.run(server.subscribe_with_snapshot(client, ["ETHUSDT"])) == ["ethusdt"]
+    assert _sent_types(client) == ["snapshot"]
+
+
+def test_filtered_client_gets_no_snapshot(client):
+    _fill_snapshot("ethusdt")
+    server.set_filter(client, ["is_absorption == true"])
+    asyncio.run(server.subscribe_with_snapshot(client, ["ethusdt"]))
+    assert _sent_types(client) == []
+    assert server.client_symbols[client] == {"ethusdt"}
+
+
+def test_filters_shared_by_canonical_key(client):
+    other = object()
+    key = server.set_filter(client, ["volume >= 1", "side == buy"])
+    assert server.set_filter(other, ["side == buy", "volume>=1"]) == key
+    assert len(server.trade_filters) == 1
+    server.set_filter(client, None)
+    assert list(server.trade_filters) == [key]
+    server.set_filter(other, [])
+    assert server.trade_filters == {}
+
+
+@pytest.mark.parametrize("timeframes", ["1m", ["1m", 5], None, {"1m": True}])
+def test_set_candles_requires_list_of_strings(client, timeframes):
+    with pytest.raises(TypeError):
+        server.set_candles(client, timeframes)
+    assert client not in server.candle_clients
+
+
+def test_set_candles_rejects_unknown_timeframe(client):
+    with pytest.raises(ValueError):
+        server.set_candles(client, ["1m", "2m"])
+    assert client not in server.candle_clients
+
+
+@pytest.fixture
+def symbols(monkeypatch):
+    """Dois símbolos com o pipeline padrão ativo."""
+    orchestrators = {}
+    for symbol in ("btcusdt", "ethusdt"):
+        orchestrators[symbol] = SharedEngineOrchestrator()
+        orchestrators[symbol].add_pipeline(server.DEFAULT_PIPELINE)
+    monkeypatch.setattr(server, "orchestrators", orchestrators)
+    monkeypatch.setattr(server, "pipelines", {server.DEFAULT_PIPELINE.id: server.DEFAULT_PIPELINE})
+    monkeypatch.setattr(server, "pipeline_members", {})
+    monkeypatch.setattr(server, "client_pipelines", {})
+    return orchestrators
+
+
+def test_set_client_engines(client, symbols):
+    pipeline, swaps = server.set_client_engines(client, ["tick_velocity", "micro_cluster"], {"tick_velocity": 0.7})
+    assert [swap["symbol"] for swap in swaps] == ["btcusdt", "ethusdt"]
+    assert all(pipeline.id in orchestrator.pipelines for orchestrator in symbols.values())
+    assert server.client_pipelines[client] == pipeline.id
+
+
+def test_set_client_engines_rejects_bad_weights(client, symbols):
+    with pytest.raises(ValueError):
+        server.set_client_engines(client, ["tick_velocity"], {"tick_velocity": "2"})
+    assert client not in server.client_pipelines
+
+
+def test_set_client_engines_rolls_back_on_failure(client, symbols, monkeypatch):
+    def fail(pipeline, history=None):
+        raise RuntimeError("falha no aquecimento")
+
+    monkeypatch.setattr(symbols["ethusdt"], "add_pipeline", fail)
+    with pytest.raises(RuntimeError):
+        server.set_client_engines(client, ["tick_velocity", "spread_weight"])
+
+    assert list(symbols["btcusdt"].pipelines) == [server.DEFAULT_PIPELINE.id]
+    assert sorted(symbols["btcusdt"].engines) == sorted(symbols["ethusdt"].engines)
+    assert list(server.pipelines) == [server.DEFAULT_PIPELINE.id]
+    assert client not in server.client_pipelines
+
+
+def test_subscribe_replaces_symbols(client):
+    assert server.subscribe(client, ["BTCUSDT", "dogeusdt"]) == ["btcusdt"]
+    assert server.subscribe(client, ["ethusdt"]) == ["ethusdt"]
+    assert server.client_symbols[client] == {"ethusdt"}
+    assert client not in server.symbol_subscribers["btcusdt"]
+    server.unsubscribe(client, ["ETHUSDT"])
+    assert server.client_symbols[client] == set()
+
+
+@pytest.mark.parametrize("symbols", ["btcusdt", ["btcusdt", None], {"btcusdt": 1}, 5])
+def test_subscribe_requires_list_of_strings(client, symbols):
+    server.subscribe(client, ["ethusdt"])
+    with pytest.raises(TypeError):
+        server.subscribe(client, symbols)
+    with pytest.raises(TypeError):
+        asyncio.run(server.subscribe_with_snapshot(client, symbols))
+    with pytest.raises(TypeError):
+        server.unsubscribe(client, symbols)
+    # As inscrições continuam as de antes
+    assert server.client_symbols[client] == {"ethusdt"}
+    assert server.symbol_subscribers["ethusdt"] == {client}
+
+
+class UpdateChannel(FakeChannel):
+    def __init__(self):
+        super().__init__()
+        self.updates = []
+
+    def send_update(self, key, text, resync):
+        self.updates.append((key, json.loads(text)))
+
+    def offer(self, message, timestamp=None, kind="trade"):
+        return True
+
+
+@pytest.fixture
+def followers(client, monkeypatch):
+    """Cliente inscrito em btcusdt com o pipeline padrão, sem footprint nem candles."""
+    for name in ("footprints", "candles", "client_pipelines", "client_intervals"):
+        monkeypatch.setattr(server, name, {})
+    monkeypatch.setattr(server, "footprint_clients", set())
+    monkeypatch.setattr(server, "footprint_task", None)
+    monkeypatch.setattr(server, "candle_task", None)
+    monkeypatch.setattr(server, "FOOTPRINT_INTERVAL_MS", 10)
+    monkeypatch.setattr(server, "CANDLE_INTERVAL_MS", 10)
+    server.client_channels[client] = UpdateChannel()
+    server.client_pipelines[client] = server.DEFAULT_PIPELINE.id
+    server.subscribe(client, ["btcusdt"])
+    return client
+
+
+def _broadcast(count: int, start: int = 0):
+    for i in range(start, start + count):
+        asyncio.run(server.broadcast_trade({
+            "type": "trade", "symbol": "BTCUSDT", "timestamp": 1_700_000_000_000 + i * 1000,
+            "price": 60000.0 + i % 5, "volume": 10.0, "volume_raw": 10.0,
+            "side": "buy" if i % 2 else "sell", "is_absorption": False,
+        }))
+
+
+def test_aggregators_not_fed_without_followers(followers):
+    _broadcast(100)
+    key = ("btcusdt", server.DEFAULT_PIPELINE.id)
+    assert len(server.snapshot_buffers[key]) == 100
+    assert server.footprints == {}
+    assert server.candles == {}
+
+
+def test_followed_aggregators_start_from_snapshot_window(followers):
+    _broadcast(90)
+    key = ("btcusdt", server.DEFAULT_PIPELINE.id)
+
+    async def scenario():
+        server.set_footprint(followers, True)
+        server.set_candles(followers, ["1m"])
+        assert server.footprints[key].trade_count == 90
+        assert server.candles[key].trade_count == 90
+        await asyncio.sleep(0.03)
+        # O aquecimento foi no snapshot: sem trades novos, nenhum delta
+        assert [update[1]["type"] for update in server.client_channels[followers].updates] == [
+            "footprint", "candles"]
+        await server.broadcast_trade({
+            "type": "trade", "symbol": "BTCUSDT", "timestamp": 1_700_000_090_000, "price": 60001.0,
+            "volume": 5.0, "volume_raw": 5.0, "side": "buy", "is_absorption": False,
+        })
+        await asyncio.sleep(0.03)
+        assert server.footprints[key].trade_count == 91
+
+        server.set_footprint(followers, False)
+        server.set_candles(followers, [])
+        await asyncio.sleep(0.03)
+
+    asyncio.run(scenario())
+    types = [update[1]["type"] for update in server.client_channels[followers].updates]
+    assert types[2:] == ["footprint_delta", "candle_update"]
+    # Ninguém mais acompanha: agregadores e tarefas somem
+    assert server.footprints == {} and server.candles == {}
+    assert server.footprint_task is None and server.candle_task is None
+    _broadcast(10, start=91)
+    assert server.footprints == {} and server.candles == {}
+
+
+def test_get_footprint_without_following_keeps_nothing(followers):
+    _broadcast(20)
+    server.send_footprints(followers, ["btcusdt"])
+    server.send_candles(followers, ["btcusdt"])
+    assert [update[0][0] for update in server.client_channels[followers].updates] == ["footprint"]
+    assert server.footprints == {} and server.candles == {}
+
+
+def test_aggregators_dropped_when_followers_leave_symbol(followers):
+    async def scenario():
+        server.set_footprint(followers, True)
+        await server.broadcast_trade({
+            "type": "trade", "symbol": "ETHUSDT", "timestamp": 1_700_000_000_000, "price": 3000.0,
+            "volume": 5.0, "volume_raw": 5.0, "side": "buy", "is_absorption": False,
+        })
+        server.subscribe(followers, ["ethusdt"])
+        server.send_footprints(followers, ["ethusdt"])
+        assert set(server.footprints) == {("btcusdt", server.DEFAULT_PIPELINE.id),
+                                          ("ethusdt", server.DEFAULT_PIPELINE.id)}
+        await asyncio.sleep(0.03)
+        assert set(server.footprints) == {("ethusdt", server.DEFAULT_PIPELINE.id)}
+        server.set_footprint(followers, False)
+        await asyncio.sleep(0.03)
+
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+"""
+Protocolo binário: ida e volta com o WireDecoder de referência, tabela de
+chaves recomeçada quando enche e mensagens com chaves demais.
+"""
+import pytest
+from wire_format import MAX_TABLE_SIZE, WireDecoder, WireEncoder
+
+
+def _payload(contributions, **fields):
+    payload = {
+        "type": "trade", "symbol": "btcusdt", "price": 60000.5, "volume": 1200.0, "volume_raw": 1000.0,
+        "side": "buy", "side_real": "sell", "timestamp": 1_700_000_000_000, "is_absorption": True,
+        "engine_contributions": contributions, "trade_count": 10,
+    }
+    payload.update(fields)
+    return payload
+
+
+def _send(encoder, decoder, sent_version, data):
+    """Como o servidor: manda a TABLE antes dos dados se a versão mudou."""
+    if encoder.version != sent_version:
+        decoder.decode(encoder.table_message())
+    return decoder.decode(data), encoder.version
+
+
+def test_trade_round_trip():
+    encoder, decoder = WireEncoder(), WireDecoder()
+    payload = _payload({"micro_cluster": 0.25, "book_imbalance@L5": -0.5})
+    decoded, _ = _send(encoder, decoder, 0, encoder.encode_trade(payload))
+    assert decoded == {**payload, "symbol": "BTCUSDT"}
+
+
+def test_frame_round_trip_fills_missing_keys():
+    encoder, decoder = WireEncoder(), WireDecoder()
+    trades = [_payload({"a": 1.0}, timestamp=1), _payload({"b": 2.0}, timestamp=2, is_absorption=False)]
+    aggregates = {
+        "trade_count": 2, "buy_volume": 2400.0, "sell_volume": 0.0, "absorption_count": 1,
+        "open_price": 60000.5, "high_price": 60000.5, "low_price": 60000.5, "last_price": 60000.5,
+        "first_timestamp": 1, "last_timestamp": 2,
+    }
+    frame = {"type": "frame", "symbol": "btcusdt", "interval_ms": 100, "trades": trades, "aggregates": aggregates}
+    decoded, _ = _send(encoder, decoder, 0, encoder.encode_frame(frame))
+    assert decoded["aggregates"] == aggregates
+    assert [t["engine_contributions"] for t in decoded["trades"]] == [{"a": 1.0}, {"b": 2.0}]
+
+
+def test_full_table_restarts_with_message_keys():
+    encoder, decoder = WireEncoder(), WireDecoder()
+    version = 0
+    for i in range(MAX_TABLE_SIZE + 10):
+        payload = _payload({f"engine{i}": float(i), "shared": 1.0})
+        decoded, version = _send(encoder, decoder, version, encoder.encode_trade(payload))
+        assert decoded["engine_contributions"] == payload["engine_contributions"]
+        assert len(encoder.engine_keys) <= MAX_TABLE_SIZE
+    assert encoder.resets == 1
+
+
+def test_known_keys_do_not_change_version():
+    encoder = WireEncoder()
+    encoder.encode_trade(_payload({"a": 1.0, "b": 2.0}))
+    version = encoder.version
+    encoder.encode_trade(_payload({"b": 3.0, "a": 4.0}))
+    assert encoder.version == version
+
+
+def test_too_many_keys():
+    encoder = WireEncoder()
+    contributions = {f"engine{i}": 0.0 for i in range(MAX_TABLE_SIZE + 1)}
+    with pytest.raises(ValueError):
+        encoder.encode_trade(_payload(contributions))
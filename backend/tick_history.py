@@ -0,0 +1,57 @@
+from array import array
+from typing import Tuple
+import numpy as np
+from volume_engines.base import SIDE_CODES, SIDE_NEUTRAL
+
+
+class TickHistory:
+    """Ring buffer com os últimos `size` ticks brutos de um símbolo, em
+    colunas (preço, volume em USDT, timestamp em ms, código de side).
+
+    Serve para aquecer engines novos: columns() já está no formato da API
+    vetorizada do orquestrador (calculate_enhanced_volume_batch)."""
+
+    def __init__(self, size: int = 5000):
+        if size < 1:
+            raise ValueError(f"Tamanho de histórico inválido: {size}")
+        self.size = size
+        self.prices = array("d", bytes(8 * size))
+        self.volumes = array("d", bytes(8 * size))
+        self.timestamps = array("d", bytes(8 * size))
+        self.sides = array("b", bytes(size))
+        self.head = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def push(self, price: float, volume: float, timestamp: int, side: str):
+        head = self.head
+        self.prices[head] = price
+        self.volumes[head] = volume
+        self.timestamps[head] = timestamp
+        self.sides[head] = SIDE_CODES.get(side, SIDE_NEUTRAL)
+        self.head = (head + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def extend(self, prices, volumes, timestamps, sides):
+        for tick in zip(prices, volumes, timestamps, sides):
+            self.push(*tick)
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Ticks guardados, do mais antigo ao mais recente."""
+        start = (self.head - self.count) % self.size
+
+        def ordered(values, dtype):
+            column = np.frombuffer(values, dtype=dtype)
+            if self.count < self.size:
+                return column[:self.count].copy()
+            return np.concatenate((column[start:], column[:start]))
+
+        return (
+            ordered(self.prices, np.float64),
+            ordered(self.volumes, np.float64),
+            ordered(self.timestamps, np.float64).astype(np.int64),
+            ordered(self.sides, np.int8),
+        )
@@ -0,0 +1,466 @@
+"""
+Armazenamento colunar e append-only dos trades processados.
+
+Cada símbolo tem uma partição por dia UTC (pelo timestamp do trade), e
+cada coluna é um arquivo de largura fixa, little-endian, sem cabeçalho:
+
+    <raiz>/<SÍMBOLO>/<AAAA-MM-DD>/timestamp.i8   (ms, trade time T)
+                                  trade_id.i8
+                                  price.f8
+                                  qty.f8         (quantidade na moeda base)
+                                  side.i1        (side do pipeline, códigos de SIDE_NAMES)
+                                  side_real.i1   (side da Binance; entrada dos engines num reprocessamento)
+                                  volume.f8      (volume enriquecido do pipeline)
+                                  is_absorption.u1
+
+O número de linhas de uma partição é o menor entre as colunas (uma
+escrita interrompida no meio deixa no máximo uma cauda incompleta, que é
+ignorada na leitura e truncada quando a partição volta a receber trades).
+Um erro de escrita no meio de um lote trunca todas as colunas de volta
+para o fim do lote anterior.
+
+Escrita: append() só guarda uma tupla por trade numa lista (sem I/O,
+sem lock; oito append em arrays custavam ~3x mais por trade). A cada
+batch_size linhas (ou flush_ms de tempo de trade) o lote vai por uma fila
+para uma thread de escrita, que monta as colunas em pedaços de _CHUNK
+linhas (cada pedaço segura o GIL por pouco tempo) e anexa aos arquivos;
+o loop do asyncio nunca espera disco.
+Se o disco não acompanhar e a fila passar de max_queued lotes, os lotes
+novos são descartados (contados em dropped_rows) em vez de acumular
+memória ou travar o feed.
+
+Leitura: query() mapeia as colunas (np.memmap, sem cópia) e acha o
+intervalo com uma máscara no timestamp; linhas ainda não escritas
+(na fila ou pendentes) entram no fim. As linhas ficam na ordem de
+chegada, que não é a do timestamp: trades que preenchem um buraco de
+trade_id chegam pela outra conexão até GAP_GRACE_MS depois (upstream.py),
+então busca binária perderia linhas. O resultado sai ordenado por
+timestamp. Um intervalo contíguo dentro de um dia só com linhas já em
+disco (o caso comum) devolve views do memmap; vários dias, linhas em
+memória ou trades fora de ordem exigem cópia.
+"""
+import calendar
+import os
+import queue
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import numpy as np
+from snapshot import _bars
+from volume_engines.base import SIDE_CODES, SIDE_NAMES, SIDE_NEUTRAL
+
+DAY_MS = 86_400_000
+STORE_BATCH_SIZE = 16384
+STORE_FLUSH_MS = 5000
+STORE_MAX_QUEUED = 64
+
+# (coluna, dtype em disco, typecode do array em memória)
+COLUMNS: Tuple[Tuple[str, str, str], ...] = (
+    ("timestamp", "<i8", "q"),
+    ("trade_id", "<i8", "q"),
+    ("price", "<f8", "d"),
+    ("qty", "<f8", "d"),
+    ("side", "i1", "b"),
+    ("side_real", "i1", "b"),
+    ("volume", "<f8", "d"),
+    ("is_absorption", "u1", "B"),
+)
+COLUMN_NAMES = tuple(name for name, _, _ in COLUMNS)
+_DTYPES = {name: dtype for name, dtype, _ in COLUMNS}
+_EXTENSIONS = {"<i8": "i8", "<f8": "f8", "i1": "i1", "u1": "u1"}
+
+_SWAP = sys.byteorder != "little"
+# Linhas convertidas para colunas por vez (fora do loop, mas com o GIL)
+_CHUNK = 1024
+# Sides chegam como nome (append) ou código (extend, API vetorizada)
+_SIDE_LOOKUP = {**SIDE_CODES, **{code: code for code in range(len(SIDE_NAMES))}}
+
+
+def column_file(name: str, dtype: str) -> str:
+    return f"{name}.{_EXTENSIONS[dtype]}"
+
+
+def day_name(day: int) -> str:
+    """Dia desde a época (timestamp // DAY_MS) → "AAAA-MM-DD"."""
+    return time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+
+
+def _side_code(side) -> int:
+    return _SIDE_LOOKUP.get(side, SIDE_NEUTRAL)
+
+
+def _to_columns(rows: list, yield_gil: bool = False) -> List[array]:
+    """Linhas (tuplas na ordem de COLUMNS) → um array por coluna.
+    yield_gil: devolve o GIL entre pedaços (thread de escrita), senão o
+    loop do asyncio pode esperar o intervalo de troca inteiro (5ms)."""
+    columns = [array(typecode) for _, _, typecode in COLUMNS]
+    for start in range(0, len(rows), _CHUNK):
+        values = list(zip(*rows[start:start + _CHUNK]))
+        for i, column in enumerate(columns):
+            if COLUMNS[i][2] == "b":
+                column.extend(map(_side_code, values[i]))
+            else:
+                column.extend(values[i])
+        if yield_gil:
+            time.sleep(0)
+    return columns
+
+
+def partition_rows(path: str) -> int:
+    """Linhas completas de uma partição em disco (0 se não existe)."""
+    rows = None
+    for name, dtype, _ in COLUMNS:
+        file_path = os.path.join(path, column_file(name, dtype))
+        count = os.path.getsize(file_path) // np.dtype(dtype).itemsize if os.path.exists(file_path) else 0
+        rows = count if rows is None else min(rows, count)
+    return rows or 0
+
+
+def read_partition(path: str, rows: int = None) -> Dict[str, np.ndarray]:
+    """Colunas de uma partição via memmap (somente leitura, sem cópia)."""
+    if rows is None:
+        rows = partition_rows(path)
+    columns = {}
+    for name, dtype, _ in COLUMNS:
+        if rows:
+            columns[name] = np.memmap(os.path.join(path, column_file(name, dtype)), dtype=dtype,
+                                      mode="r", shape=(rows,))
+        else:
+            columns[name] = np.empty(0, dtype=dtype)
+    return columns
+
+
+class _Partition:
+    """Um dia de um símbolo: linhas pendentes (loop), lotes na fila da
+    thread de escrita e linhas já em disco."""
+
+    def __init__(self, path: str, day: int):
+        self.path = path
+        self.day = day
+        self.start_ms = day * DAY_MS
+        self.end_ms = self.start_ms + DAY_MS
+        self.pending: list = []
+        self.pending_since = None
+        self.in_flight = deque()
+        # Definido pela thread de escrita ao abrir os arquivos
+        self.disk_rows: Optional[int] = None
+        self.files = None
+
+
+class TickStore:
+    """Trades processados de um pipeline de engines, por símbolo e dia."""
+
+    def __init__(self, root: str, pipeline: str = None, batch_size: int = STORE_BATCH_SIZE,
+                 flush_ms: int = STORE_FLUSH_MS, max_queued: int = STORE_MAX_QUEUED):
+        if batch_size < 1:
+            raise ValueError(f"Tamanho de lote inválido: {batch_size}")
+        self.root = root
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_queued = max_queued
+
+        self.partitions: Dict[Tuple[str, int], _Partition] = {}
+        self._current: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._queued = 0
+        self._writer = threading.Thread(target=self._write_loop, name="tick-store", daemon=True)
+        self._writer.start()
+        self.closed = False
+
+        self.rows = 0
+        self.written_rows = 0
+        self.dropped_rows = 0
+        self.batches = 0
+        self.last_write_ms = 0.0
+
+    # ------------------------------------------------------------------
+    # Escrita (loop do asyncio)
+    # ------------------------------------------------------------------
+    def _partition(self, symbol: str, timestamp: int) -> _Partition:
+        part = self._current.get(symbol)
+        if part is not None and part.start_ms <= timestamp < part.end_ms:
+            return part
+        day = timestamp // DAY_MS
+        if part is not None:
+            # Virada do dia: o dia anterior vai inteiro para o disco
+            self._hand_off(part)
+        key = (symbol, day)
+        part = self.partitions.get(key)
+        if part is None:
+            part = _Partition(os.path.join(self.root, symbol.upper(), day_name(day)), day)
+            self.partitions[key] = part
+        self._current[symbol] = part
+        self._forget_written()
+        return part
+
+    def append(self, symbol: str, trade_id: int, timestamp: int, price: float, qty: float,
+               side: str, side_real: str, volume: float, is_absorption: bool):
+        """Acrescenta um trade (caminho quente: uma tupla numa lista)."""
+        part = self._current.get(symbol)
+        if part is None or not part.start_ms <= timestamp < part.end_ms:
+            part = self._partition(symbol, timestamp)
+        pending = part.pending
+        pending.append((timestamp, trade_id, price, qty, side, side_real, volume, is_absorption))
+        self.rows += 1
+        if part.pending_since is None:
+            part.pending_since = timestamp
+        elif len(pending) >= self.batch_size or timestamp - part.pending_since >= self.flush_ms:
+            self._hand_off(part)
+
+    def extend(self, symbol: str, trade_ids, timestamps, prices, qtys, sides, sides_real, volumes,
+               is_absorption):
+        """Acrescenta um lote já em colunas (sides em códigos, como a API
+        vetorizada do orquestrador devolve)."""
+        rows = list(zip(*(
+            values.tolist() if isinstance(values, np.ndarray) else values
+            for values in (timestamps, trade_ids, prices, qtys, sides, sides_real, volumes, is_absorption)
+        )))
+        if not rows:
+            return
+        part = self._partition(symbol, rows[0][0])
+        if not part.start_ms <= rows[-1][0] < part.end_ms:
+            # Lote atravessando a virada do dia: trade a trade
+            for row in rows:
+                self.append(symbol, row[1], row[0], *row[2:])
+            return
+        part.pending.extend(rows)
+        self.rows += len(rows)
+        if part.pending_since is None:
+            part.pending_since = rows[0][0]
+        if len(part.pending) >= self.batch_size or rows[-1][0] - part.pending_since >= self.flush_ms:
+            self._hand_off(part)
+
+    def flush(self):
+        """Manda para o disco tudo o que está pendente (sem esperar a escrita)."""
+        for part in list(self._current.values()):
+            self._hand_off(part)
+
+    def _hand_off(self, part: _Partition):
+        rows = len(part.pending)
+        if not rows:
+            return
+        if self._queued >= self.max_queued:
+            # Disco atrasado: descarta em vez de travar o feed ou crescer sem limite
+            self.dropped_rows += rows
+            part.pending = []
+            part.pending_since = None
+            return
+        with self._lock:
+            batch = part.pending
+            part.pending = []
+            part.pending_since = None
+            part.in_flight.append(batch)
+            self._queued += 1
+        self._queue.put((part, batch))
+
+    def _forget_written(self):
+        """Tira da memória dias anteriores já escritos (a leitura vai ao disco)."""
+        current = set(map(id, self._current.values()))
+        with self._lock:
+            for key, part in list(self.partitions.items()):
+                if id(part) not in current and not part.in_flight and not part.pending:
+                    del self.partitions[key]
+
+    def close(self, timeout: float = 10.0):
+        """Escreve o que falta e encerra a thread de escrita."""
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    # ------------------------------------------------------------------
+    # Thread de escrita
+    # ------------------------------------------------------------------
+    def _write_loop(self):
+        open_parts: Dict[int, _Partition] = {}
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            part, batch = item
+            started = time.perf_counter()
+            try:
+                if part.files is None:
+                    self._open(part)
+                    open_parts[id(part)] = part
+                for f, column in zip(part.files, _to_columns(batch, yield_gil=True)):
+                    if _SWAP:
+                        column.byteswap()
+                    f.write(column.tobytes())
+                rows = len(batch)
+                with self._lock:
+                    part.disk_rows += rows
+                    part.in_flight.popleft()
+                    self._queued -= 1
+                self.written_rows += rows
+                self.batches += 1
+                self.last_write_ms = (time.perf_counter() - started) * 1000
+            except OSError as e:
+                print(f"⚠️ Erro gravando {part.path}: {e}")
+                _rollback(part)
+                with self._lock:
+                    if part.in_flight and part.in_flight[0] is batch:
+                        part.in_flight.popleft()
+                    self._queued -= 1
+                self.dropped_rows += len(batch)
+
+            # Dias que saíram de uso não precisam de arquivos abertos
+            for key, open_part in list(open_parts.items()):
+                if open_part is not part and open_part.day < part.day and not open_part.in_flight:
+                    _close_files(open_part)
+                    del open_parts[key]
+
+        for open_part in open_parts.values():
+            _close_files(open_part)
+
+    def _open(self, part: _Partition):
+        os.makedirs(part.path, exist_ok=True)
+        rows = partition_rows(part.path)
+        files = []
+        for name, dtype, _ in COLUMNS:
+            f = open(os.path.join(part.path, column_file(name, dtype)), "ab", buffering=0)
+            # Cauda incompleta de uma execução interrompida desalinharia as colunas
+            f.truncate(rows * np.dtype(dtype).itemsize)
+            files.append(f)
+        part.files = files
+        with self._lock:
+            part.disk_rows = rows
+
+    # ------------------------------------------------------------------
+    # Leitura (qualquer thread)
+    # ------------------------------------------------------------------
+    def days(self, symbol: str) -> List[str]:
+        """Dias ("AAAA-MM-DD") com trades do símbolo, em disco ou em memória."""
+        return [day_name(day) for day in self._days(symbol.lower())]
+
+    def _days(self, symbol: str) -> List[int]:
+        directory = os.path.join(self.root, symbol.upper())
+        days = set()
+        for name in os.listdir(directory) if os.path.isdir(directory) else ():
+            try:
+                days.add(calendar.timegm(time.strptime(name, "%Y-%m-%d")) // 86400)
+            except ValueError:
+                continue
+        with self._lock:
+            days.update(day for (s, day) in self.partitions if s == symbol)
+        return sorted(days)
+
+    def query(self, symbol: str, start_ms: int, end_ms: int,
+              columns: Iterable[str] = None) -> Dict[str, np.ndarray]:
+        """Trades de symbol com start_ms <= timestamp < end_ms, em colunas."""
+        symbol = symbol.lower()
+        names = list(columns) if columns is not None else list(COLUMN_NAMES)
+        if "timestamp" not in names:
+            names.insert(0, "timestamp")
+        unknown = set(names) - set(COLUMN_NAMES)
+        if unknown:
+            raise ValueError(f"Colunas desconhecidas: {', '.join(sorted(unknown))}")
+
+        pieces = []
+        for day in self._days(symbol):
+            if start_ms < (day + 1) * DAY_MS and day * DAY_MS < end_ms:
+                pieces.extend(self._day_pieces(symbol, day, names))
+
+        selections = [(piece, _select(piece["timestamp"], start_ms, end_ms)) for piece in pieces]
+        selections = [(piece, rows) for piece, rows in selections if rows is not None]
+        result = {}
+        for name in names:
+            parts = [piece[name][rows] for piece, rows in selections]
+            if len(parts) == 1:
+                result[name] = parts[0]
+            elif parts:
+                result[name] = np.concatenate(parts)
+            else:
+                result[name] = np.empty(0, dtype=_DTYPES[name])
+
+        timestamps = result["timestamp"]
+        if len(timestamps) > 1 and (timestamps[1:] < timestamps[:-1]).any():
+            order = np.argsort(timestamps, kind="stable")
+            result = {name: values[order] for name, values in result.items()}
+        return result
+
+    def _day_pieces(self, symbol: str, day: int, names: List[str]) -> List[Dict[str, np.ndarray]]:
+        """Partes de um dia, em ordem: disco, lotes na fila, pendentes."""
+        path = os.path.join(self.root, symbol.upper(), day_name(day))
+        with self._lock:
+            part = self.partitions.get((symbol, day))
+            if part is None:
+                disk_rows, in_flight, pending = None, [], None
+            else:
+                disk_rows = part.disk_rows
+                if disk_rows is None:
+                    # A thread de escrita ainda não abriu a partição e não
+                    # escreve nela sem antes passar por este lock: o que há
+                    # em disco é de uma execução anterior, sem os lotes na fila
+                    disk_rows = partition_rows(path)
+                in_flight = list(part.in_flight)
+                # Cópia (atômica sob o GIL): o loop continua acrescentando
+                pending = part.pending[:]
+
+        pieces = []
+        disk = read_partition(path, disk_rows) if os.path.isdir(path) else None
+        if disk is not None and len(disk["timestamp"]):
+            pieces.append(disk)
+        for batch in in_flight + ([pending] if pending else []):
+            pieces.append({
+                name: np.frombuffer(column, dtype=column.typecode)
+                for (name, _, _), column in zip(COLUMNS, _to_columns(batch)) if name in names
+            })
+        return pieces
+
+    def bars(self, symbol: str, start_ms: int, end_ms: int, bar_ms: int) -> Dict[str, np.ndarray]:
+        """Barras OHLC com volume de compra/venda do intervalo (mesmas
+        colunas das barras do snapshot), para o histórico do gráfico."""
+        columns = self.query(symbol, start_ms, end_ms, ("timestamp", "price", "volume", "side", "is_absorption"))
+        return _bars(columns, bar_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "pipeline": self.pipeline,
+            "rows": self.rows,
+            "written_rows": self.written_rows,
+            "dropped_rows": self.dropped_rows,
+            "queued_batches": self._queued,
+            "batches": self.batches,
+            "last_write_ms": round(self.last_write_ms, 2),
+        }
+
+
+def _select(timestamps: np.ndarray, start_ms: int, end_ms: int):
+    """Linhas com start_ms <= timestamp < end_ms: uma fatia (view, sem
+    cópia) quando são contíguas, senão os índices; None se não há nenhuma."""
+    rows = np.flatnonzero((timestamps >= start_ms) & (timestamps < end_ms))
+    if not len(rows):
+        return None
+    first, last = int(rows[0]), int(rows[-1])
+    if last - first + 1 == len(rows):
+        return slice(first, last + 1)
+    return rows
+
+
+def _rollback(part: _Partition):
+    """Volta todas as colunas para disk_rows depois de um lote que falhou
+    no meio (algumas colunas já teriam crescido e as próximas escritas
+    ficariam desalinhadas). Se nem isso der, a partição é reaberta no
+    próximo lote e _open trunca na menor coluna."""
+    if part.files is None or part.disk_rows is None:
+        return
+    try:
+        for f, (_, dtype, _) in zip(part.files, COLUMNS):
+            f.truncate(part.disk_rows * np.dtype(dtype).itemsize)
+    except OSError:
+        _close_files(part)
+        part.files = None
+
+
+def _close_files(part: _Partition):
+    for f in part.files or ():
+        f.close()
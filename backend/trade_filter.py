@@ -0,0 +1,138 @@
+"""
+Filtros de trades por cliente (inscrição declarativa).
+
+Clientes que só agem sobre alguns eventos (bots de alerta de absorção ou
+de prints grandes) mandam as condições e o servidor só envia os trades
+que passam:
+
+    {"type": "set_filter", "filter": ["is_absorption == true", "volume >= 50000"]}
+    {"type": "set_filter", "filter": [["is_absorption == true"], ["volume_raw >= 250000"]]}
+    {"type": "set_filter", "filter": null}      (remove o filtro)
+
+Uma lista de condições é um E; uma lista de listas é um OU de Es.
+
+Condição: "<campo> <op> <valor>", com op em ==, !=, >=, <=, >, < e o valor
+em JSON (true, 50000, "buy") ou texto simples (buy). Campos:
+    price, volume, volume_raw, trade_count   números (todos os ops)
+    side, side_real                          "buy"/"sell" (== e !=)
+    is_absorption                            true/false (== e !=)
+    engine.<chave>                           contribuição de um engine no
+                                             payload (engine.micro_cluster,
+                                             engine.book_imbalance@L5); se o
+                                             engine não está no pipeline do
+                                             cliente, a condição não passa
+
+Dois filtros com as mesmas condições (em qualquer ordem, com qualquer
+espaçamento) têm a mesma forma canônica (TradeFilter.key): o servidor
+agrupa os clientes por ela e avalia cada filtro uma vez por trade.
+Trades que não passam em nenhum filtro nem são codificados. Com cadência
+(set_conflation), os frames do cliente só trazem os trades que passaram.
+Clientes com filtro não recebem o snapshot de late-join ao se inscrever
+num símbolo (o buffer do snapshot não guarda engine_contributions nem
+trade_count, então não dá para filtrá-lo); footprint e candles não são
+filtrados.
+"""
+import json
+import operator
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+NUMERIC_FIELDS = ("price", "volume", "volume_raw", "trade_count")
+CHOICE_FIELDS = {"side": ("buy", "sell"), "side_real": ("buy", "sell")}
+BOOLEAN_FIELDS = ("is_absorption",)
+ENGINE_PREFIX = "engine."
+
+# Limite de condições por filtro (somando todos os Es)
+MAX_CONDITIONS = 16
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+_EQUALITY = ("==", "!=")
+_CONDITION = re.compile(r"^\s*([\w.@]+)\s*(==|!=|>=|<=|>|<)\s*(.+?)\s*$")
+
+# (campo, op, valor) já validado
+Condition = Tuple[str, str, Any]
+
+
+class TradeFilter:
+    """Predicado sobre o payload de um trade: OU de Es de condições."""
+
+    def __init__(self, spec):
+        groups = {tuple(sorted(set(_parse(condition) for condition in group), key=_text))
+                  for group in _groups(spec)}
+        self.groups: List[Tuple[Condition, ...]] = sorted(groups, key=lambda group: [_text(c) for c in group])
+        self.key = " | ".join(" & ".join(_text(condition) for condition in group) for group in self.groups)
+        self._compiled = [[_compile(condition) for condition in group] for group in self.groups]
+
+    def matches(self, payload: Dict[str, Any]) -> bool:
+        for group in self._compiled:
+            for is_engine, field, compare, value in group:
+                actual = payload["engine_contributions"].get(field) if is_engine else payload.get(field)
+                if actual is None or not compare(actual, value):
+                    break
+            else:
+                return True
+        return False
+
+    def __repr__(self) -> str:
+        return f"TradeFilter({self.key!r})"
+
+
+def _groups(spec) -> List[List[str]]:
+    """Normaliza a especificação para uma lista de Es."""
+    if isinstance(spec, str):
+        spec = [spec]
+    if not isinstance(spec, list) or not spec:
+        raise ValueError("Filtro deve ser uma lista de condições (E) ou de listas de condições (OU de Es)")
+    groups = [spec] if all(isinstance(item, str) for item in spec) else spec
+    for group in groups:
+        if not isinstance(group, list) or not group or not all(isinstance(item, str) for item in group):
+            raise ValueError("Filtro deve ser uma lista de condições (E) ou de listas de condições (OU de Es)")
+    if sum(len(group) for group in groups) > MAX_CONDITIONS:
+        raise ValueError(f"Filtro com mais de {MAX_CONDITIONS} condições")
+    return groups
+
+
+def _parse(text: str) -> Condition:
+    match = _CONDITION.match(text)
+    if not match:
+        raise ValueError(f"Condição inválida: {text!r} (use \"<campo> <op> <valor>\", ex.: \"volume >= 50000\")")
+    field, op, raw = match.groups()
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        value = raw
+
+    if field in NUMERIC_FIELDS or (field.startswith(ENGINE_PREFIX) and len(field) > len(ENGINE_PREFIX)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{field} compara com números: {text!r}")
+        return field, op, float(value)
+    if field in CHOICE_FIELDS:
+        if op not in _EQUALITY or value not in CHOICE_FIELDS[field]:
+            raise ValueError(f"{field} aceita só == ou != com {' ou '.join(CHOICE_FIELDS[field])}: {text!r}")
+        return field, op, value
+    if field in BOOLEAN_FIELDS:
+        if op not in _EQUALITY or not isinstance(value, bool):
+            raise ValueError(f"{field} aceita só == ou != com true ou false: {text!r}")
+        return field, op, value
+    fields = ", ".join((*NUMERIC_FIELDS, *CHOICE_FIELDS, *BOOLEAN_FIELDS, ENGINE_PREFIX + "<engine>"))
+    raise ValueError(f"Campo desconhecido: {field} (use {fields})")
+
+
+def _compile(condition: Condition) -> Tuple[bool, str, Callable[[Any, Any], bool], Any]:
+    """(é engine, chave no payload ou em engine_contributions, comparação, valor)"""
+    field, op, value = condition
+    if field.startswith(ENGINE_PREFIX):
+        return True, field[len(ENGINE_PREFIX):], _OPERATORS[op], value
+    return False, field, _OPERATORS[op], value
+
+
+def _text(condition: Condition) -> str:
+    field, op, value = condition
+    return f"{field} {op} {json.dumps(value)}"
@@ -0,0 +1,127 @@
+"""
+Gravação compacta dos trades brutos da Binance.
+
+Formato do arquivo: cabeçalho fixo (magic, versão, símbolo) seguido de
+registros binários de tamanho fixo com os campos da mensagem @trade que
+o pipeline usa (t, T, E, p, q, m). Como os registros têm largura fixa, a
+leitura é um np.memmap direto, sem parse.
+"""
+import os
+import struct
+from typing import Tuple
+import numpy as np
+
+MAGIC = b"IETR"
+VERSION = 1
+HEADER = struct.Struct("<4sH16s")
+
+RECORD = struct.Struct("<qqqddB")
+RECORD_DTYPE = np.dtype([
+    ("trade_id", "<i8"),
+    ("trade_time", "<i8"),
+    ("event_time", "<i8"),
+    ("price", "<f8"),
+    ("quantity", "<f8"),
+    ("is_maker", "u1"),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+class TradeRecorder:
+    """Anexa mensagens de trade da Binance a um arquivo de gravação."""
+
+    def __init__(self, path: str, symbol: str, buffer_size: int = 1 << 20):
+        self.path = path
+        self.symbol = symbol.lower()
+        self.records = 0
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            header_symbol = read_header(path)
+            if header_symbol != self.symbol:
+                raise ValueError(f"Gravação {path} é de {header_symbol}, não de {self.symbol}")
+            # Registro final incompleto (gravação interrompida): sem cortá-lo,
+            # tudo o que fosse anexado ficaria desalinhado
+            torn = (os.path.getsize(path) - HEADER.size) % RECORD.size
+            if torn:
+                os.truncate(path, os.path.getsize(path) - torn)
+
+        self._file = open(path, "ab", buffering=buffer_size)
+        if not exists:
+            self._file.write(HEADER.pack(MAGIC, VERSION, self.symbol.encode()))
+
+    def write(self, data: dict):
+        """Grava uma mensagem @trade (dict vindo de json.loads)."""
+        self._file.write(RECORD.pack(
+            int(data["t"]),
+            int(data["T"]),
+            int(data.get("E", data["T"])),
+            float(data["p"]),
+            float(data["q"]),
+            1 if data["m"] else 0,
+        ))
+        self.records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(path: str) -> str:
+    """Valida o cabeçalho e devolve o símbolo da gravação."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError(f"Gravação inválida (cabeçalho incompleto): {path}")
+    magic, version, symbol = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"Arquivo não é uma gravação de trades: {path}")
+    if version != VERSION:
+        raise ValueError(f"Versão de gravação não suportada: {version}")
+    return symbol.rstrip(b"\0").decode()
+
+
+def read_recording(path: str) -> Tuple[str, np.ndarray]:
+    """Abre uma gravação via memmap (somente leitura, sem cópia).
+
+    Devolve (símbolo, registros). Um registro final incompleto (gravação
+    interrompida no meio de uma escrita) é ignorado."""
+    symbol = read_header(path)
+    count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+    if count == 0:
+        return symbol, np.empty(0, dtype=RECORD_DTYPE)
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+    return symbol, records
+
+
+def records_to_columns(records: np.ndarray):
+    """Colunas (preço, volume em USDT, timestamp, side) para a API vetorizada
+    do orquestrador, com a mesma conversão de BinanceDataFeed._process_trade."""
+    prices = records["price"].astype(np.float64)
+    volumes = prices * records["quantity"]
+    # is_maker=True → vendedor agressivo (SELL = 2), senão BUY = 1
+    sides = (records["is_maker"] + 1).astype(np.int8)
+    return prices, volumes, records["trade_time"].astype(np.int64), sides
+
+
+def record_to_message(record, symbol: str) -> dict:
+    """Reconstrói a mensagem @trade no formato que BinanceDataFeed espera."""
+    return {
+        "e": "trade",
+        "E": int(record["event_time"]),
+        "s": symbol.upper(),
+        "t": int(record["trade_id"]),
+        "p": float(record["price"]),
+        "q": float(record["quantity"]),
+        "T": int(record["trade_time"]),
+        "m": bool(record["is_maker"]),
+    }
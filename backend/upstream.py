@@ -0,0 +1,213 @@
+"""
+Conexões com a Binance: backoff de reconexão, deduplicação por trade_id
+e estado de cada conexão do modo redundante (hot standby).
+
+Com duas (ou mais) conexões ao mesmo stream, cada trade chega duas vezes;
+a IngestPipeline entrega ao feed só a cópia que chegou primeiro
+(TradeDedup) e cada conexão reconecta sozinha (UpstreamLink + Backoff),
+então a queda de uma delas não abre buraco nenhum e um atraso pontual de
+uma conexão é coberto pela outra.
+
+TradeDedup usa memória fixa por símbolo: os trade_ids da Binance são
+sequenciais por símbolo, então basta o maior id aceito e a lista de
+faixas de ids que ficaram para trás (no máximo MAX_OPEN_GAPS). Uma faixa
+é preenchida pela cópia atrasada da outra conexão; se continuar em
+aberto por GAP_GRACE_MS, os trades dela não chegaram por nenhuma conexão
+e o buraco é reportado (on_gap e stats()).
+"""
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+# Tempo para a outra conexão entregar os ids de um buraco antes de ele contar como perdido
+GAP_GRACE_MS = 2000
+# Faixas de ids em aberto por símbolo; além disso a mais antiga é dada como perdida
+MAX_OPEN_GAPS = 64
+# Um id tão abaixo do maior aceito só pode ser o stream recomeçando do zero
+RESET_DISTANCE = 1_000_000
+RECENT_GAPS = 20
+
+
+def connection_urls(urls: List[str], connections: int) -> List[str]:
+    """URL de cada uma das `connections` conexões, alternando entre os
+    endpoints (o principal e os espelhos)."""
+    return [urls[i % len(urls)] for i in range(max(connections, 1))]
+
+
+class Backoff:
+    """Espera entre reconexões: exponencial com jitter completo (uniforme
+    entre 0 e min(cap, base·2^tentativas)), para que conexões que caíram
+    juntas não voltem todas no mesmo instante. Uma conexão que ficou de pé
+    por reset_after segundos zera as tentativas."""
+
+    def __init__(self, base: float = 0.5, cap: float = 10.0, reset_after: float = 10.0, seed: int = None):
+        self.base = base
+        self.cap = cap
+        self.reset_after = reset_after
+        self.attempts = 0
+        self._random = random.Random(seed)
+
+    def next_delay(self, uptime: float = 0.0) -> float:
+        """Segundos até a próxima tentativa; `uptime` é quanto a conexão que caiu durou."""
+        if uptime >= self.reset_after:
+            self.attempts = 0
+        ceiling = min(self.cap, self.base * 2 ** min(self.attempts, 30))
+        self.attempts += 1
+        return self._random.uniform(0.0, ceiling)
+
+
+class UpstreamLink:
+    """Uma conexão com o stream: contadores e backoff próprios."""
+
+    def __init__(self, url: str = None, backoff: Backoff = None):
+        self.url = url
+        self.backoff = backoff or Backoff()
+        self.up = False
+        self.connects = 0
+        self.received = 0
+        # Trades entregues ao feed por esta conexão (a cópia dela chegou primeiro)
+        self.first = 0
+        self.last_error: Optional[str] = None
+        self._since = time.monotonic()
+
+    def connected(self):
+        self.up = True
+        self.connects += 1
+        self._since = time.monotonic()
+
+    def disconnected(self, error: Exception) -> float:
+        """Registra a queda e devolve quantos segundos esperar antes de reconectar."""
+        uptime = time.monotonic() - self._since if self.up else 0.0
+        self.up = False
+        self.last_error = str(error)
+        return self.backoff.next_delay(uptime)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "up": self.up,
+            "connects": self.connects,
+            "received": self.received,
+            "first": self.first,
+            "last_error": self.last_error,
+        }
+
+
+class _SymbolIds:
+    __slots__ = ("last_id", "gaps")
+
+    def __init__(self, last_id: int):
+        self.last_id = last_id
+        # [primeiro id, último id, instante em ms em que a faixa abriu], em ordem de id
+        self.gaps: List[list] = []
+
+
+class TradeDedup:
+    """Aceita a primeira cópia de cada trade_id (por símbolo) e acompanha
+    os buracos na sequência. on_gap(símbolo, primeiro_id, último_id) é
+    chamado para cada faixa que nenhuma conexão entregou."""
+
+    def __init__(self, grace_ms: float = GAP_GRACE_MS, max_open_gaps: int = MAX_OPEN_GAPS,
+                 on_gap: Callable[[str, int, int], None] = None):
+        self.grace_ms = grace_ms
+        self.max_open_gaps = max_open_gaps
+        self.on_gap = on_gap
+        self._symbols: Dict[str, _SymbolIds] = {}
+
+        self.accepted = 0
+        self.duplicates = 0
+        # Trades que preencheram um buraco (a cópia da outra conexão chegou depois)
+        self.filled = 0
+        self.gaps = 0
+        self.missed = 0
+        self.resets = 0
+        self.recent_gaps = deque(maxlen=RECENT_GAPS)
+
+    def accept(self, symbol: str, trade_id: Optional[int], now_ms: float) -> bool:
+        """True se o trade é novo (entrega ao feed), False se é cópia."""
+        if trade_id is None:
+            self.accepted += 1
+            return True
+        state = self._symbols.get(symbol)
+        if state is None:
+            self._symbols[symbol] = _SymbolIds(trade_id)
+            self.accepted += 1
+            return True
+
+        last_id = state.last_id
+        if trade_id > last_id:
+            if trade_id > last_id + 1:
+                self._open_gap(symbol, state, last_id + 1, trade_id - 1, now_ms)
+            state.last_id = trade_id
+            self.accepted += 1
+            return True
+        if state.gaps and self._fill(state, trade_id):
+            self.filled += 1
+            self.accepted += 1
+            return True
+        if last_id - trade_id > RESET_DISTANCE:
+            # Stream recomeçou a numeração: os buracos antigos não vão mais fechar
+            for gap in state.gaps:
+                self._report(symbol, gap[0], gap[1])
+            self._symbols[symbol] = _SymbolIds(trade_id)
+            self.resets += 1
+            self.accepted += 1
+            return True
+        self.duplicates += 1
+        return False
+
+    def _open_gap(self, symbol: str, state: _SymbolIds, first: int, last: int, now_ms: float):
+        state.gaps.append([first, last, now_ms])
+        if len(state.gaps) > self.max_open_gaps:
+            oldest = state.gaps.pop(0)
+            self._report(symbol, oldest[0], oldest[1])
+
+    @staticmethod
+    def _fill(state: _SymbolIds, trade_id: int) -> bool:
+        gaps = state.gaps
+        for i, gap in enumerate(gaps):
+            first, last, opened = gap
+            if trade_id < first:
+                return False
+            if trade_id > last:
+                continue
+            if first == last:
+                del gaps[i]
+            elif trade_id == first:
+                gap[0] = first + 1
+            elif trade_id == last:
+                gap[1] = last - 1
+            else:
+                gap[1] = trade_id - 1
+                gaps.insert(i + 1, [trade_id + 1, last, opened])
+            return True
+        return False
+
+    def expire(self, now_ms: float):
+        """Dá como perdidas as faixas abertas há mais de grace_ms."""
+        deadline = now_ms - self.grace_ms
+        for symbol, state in self._symbols.items():
+            gaps = state.gaps
+            while gaps and gaps[0][2] <= deadline:
+                first, last, _ = gaps.pop(0)
+                self._report(symbol, first, last)
+
+    def _report(self, symbol: str, first: int, last: int):
+        count = last - first + 1
+        self.gaps += 1
+        self.missed += count
+        self.recent_gaps.append({"symbol": symbol, "first_id": first, "last_id": last, "trades": count})
+        if self.on_gap:
+            self.on_gap(symbol, first, last)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "filled": self.filled,
+            "gaps": self.gaps,
+            "missed": self.missed,
+            "open_gaps": sum(len(state.gaps) for state in self._symbols.values()),
+            "resets": self.resets,
+            "recent_gaps": list(self.recent_gaps),
+        }
@@ -3,6 +3,7 @@ from .spread_weight import SpreadWeightEngine
 from .side_inference import SideInferenceEngine
 from .micro_cluster import MicroClusterEngine
 from .atr_normalize import ATRNormalizeEngine
+from .book_imbalance import BookImbalanceEngine
 
 __all__ = [
     "TickVelocityEngine",
@@ -10,4 +11,5 @@ __all__ = [
     "SideInferenceEngine",
     "MicroClusterEngine",
     "ATRNormalizeEngine",
+    "BookImbalanceEngine",
 ]
\ No newline at end of file
@@ -1,37 +1,64 @@
-from typing import Dict, Any
-from .base import VolumeEngine
+import numpy as np
+from .base import VolumeEngine, Tick, as_batch
+from .rolling import RollingWindow
 
 class ATRNormalizeEngine(VolumeEngine):
     name = "atr_normalize"
     description = "Normaliza volume pela volatilidade (ATR simplificado para BTC)"
     
-    def __init__(self):
-        self.price_history = []
-        self.max_history = 14
-        self.atr_baseline = 150.0
+    def __init__(self, max_history: int = 14, atr_baseline: float = 150.0):
+        self.max_history = max_history
+        self.atr_baseline = atr_baseline
+        self.last_price = None
+        self.tr_window = RollingWindow(max_history)
     
-    def calculate_volume_weight(self, tick: Dict[str, Any], context: Dict[str, Any]) -> float:
-        price = tick.get("price", 0.0)
-        self.price_history.append(price)
+    def calculate_volume_weight(self, tick: Tick, context: Tick) -> float:
+        price = tick.price
         
-        if len(self.price_history) > self.max_history + 1:
-            self.price_history.pop(0)
-        
-        if len(self.price_history) < self.max_history + 1:
+        if self.last_price is None:
+            self.last_price = price
             return 1.0
         
-        tr_values = []
-        for i in range(1, len(self.price_history)):
-            high = max(self.price_history[i], self.price_history[i-1])
-            low = min(self.price_history[i], self.price_history[i-1])
-            tr = high - low
-            tr_values.append(tr)
+        tr = max(price, self.last_price) - min(price, self.last_price)
+        self.last_price = price
+        self.tr_window.push(tr)
+        
+        if not self.tr_window.full:
+            return 1.0
         
-        atr = sum(tr_values[-self.max_history:]) / self.max_history
+        atr = self.tr_window.mean
         atr_ratio = atr / self.atr_baseline
         
         weight = 1.0 / max(atr_ratio, 0.5)
         return min(weight, 2.0)
     
-    def infer_side(self, tick: Dict[str, Any], context: Dict[str, Any]) -> str:
-        return context.get("real_side", "neutral")
\ No newline at end of file
+    def infer_side(self, tick: Tick, context: Tick) -> str:
+        return tick.side_real
+    
+    def calculate_volume_weight_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        prices = np.asarray(prices, dtype=np.float64)
+        out = np.ones(len(prices), dtype=np.float64)
+        if len(prices) == 0:
+            return out
+        
+        # O primeiro preço da vida do engine só inicializa last_price
+        first = 0
+        if self.last_price is None:
+            self.last_price = float(prices[0])
+            first = 1
+        
+        current = prices[first:]
+        if len(current) == 0:
+            return out
+        previous = np.concatenate(([self.last_price], current[:-1]))
+        tr_values = np.maximum(current, previous) - np.minimum(current, previous)
+        self.last_price = float(prices[-1])
+        
+        counts, atr, _ = self.tr_window.extend(tr_values)
+        atr_ratio = atr / self.atr_baseline
+        weight = np.minimum(1.0 / np.maximum(atr_ratio, 0.5), 2.0)
+        out[first:] = np.where(counts < self.max_history, 1.0, weight)
+        return out
+    
+    def infer_side_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        return as_batch(prices, volumes, timestamps, sides)[3].copy()
@@ -1,14 +1,153 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, List, Sequence, Tuple
+import numpy as np
+
+# Códigos de side usados no caminho vetorizado (arrays int8)
+SIDE_NEUTRAL = 0
+SIDE_BUY = 1
+SIDE_SELL = 2
+SIDE_NAMES = ("neutral", "buy", "sell")
+SIDE_CODES = {name: code for code, name in enumerate(SIDE_NAMES)}
+
+
+def encode_sides(sides: Sequence[str]) -> np.ndarray:
+    """Converte uma lista de sides ("buy"/"sell"/"neutral") em códigos int8."""
+    return np.fromiter(
+        (SIDE_CODES.get(side, SIDE_NEUTRAL) for side in sides),
+        dtype=np.int8,
+        count=len(sides),
+    )
+
+
+def decode_sides(codes: np.ndarray) -> List[str]:
+    """Converte códigos int8 de volta para os nomes de side."""
+    return [SIDE_NAMES[code] for code in np.asarray(codes).tolist()]
+
+
+def as_batch(prices, volumes, timestamps, sides) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Normaliza as colunas de um lote: float64 para preço/volume,
+    timestamps em ms (int64 ou float64) e sides como códigos int8."""
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    timestamps = np.asarray(timestamps)
+    if timestamps.dtype.kind not in "iuf":
+        timestamps = timestamps.astype(np.float64)
+    if len(sides) and isinstance(sides[0], str):
+        sides = encode_sides(sides)
+    else:
+        sides = np.asarray(sides, dtype=np.int8)
+    return prices, volumes, timestamps, sides
+
+
+# Chaves do antigo dict de contexto que Tick.get() ainda aceita
+_TICK_ALIASES = {"real_side": "side_real", "real_volume": "volume_real"}
+
+
+class Tick:
+    """Um trade no caminho por tick, do feed até os engines.
+
+    Objeto com __slots__ no lugar dos dicts de tick e de contexto: uma
+    alocação pequena por trade, atributos lidos por offset fixo. O
+    orquestrador preenche tick_count e last_price e passa o mesmo objeto
+    como `tick` e como `context` dos engines. get() aceita as chaves dos
+    dois dicts antigos (ex.: context.get("real_side")) para engines que
+    ainda leem o tick como dict.
+
+    `book` é o OrderBook do símbolo (order_book.py) quando o feed tem os
+    streams de book; sem ele, bid/ask são simulados."""
+
+    __slots__ = ("price", "timestamp", "volume_real", "side_real", "trade_id", "tick_count", "last_price", "book")
+
+    def __init__(self, price: float, timestamp, volume_real: float, side_real: str = "neutral",
+                 trade_id: int = 0, last_price: float = 0.0):
+        self.price = price
+        self.timestamp = timestamp
+        self.volume_real = volume_real
+        self.side_real = side_real
+        self.trade_id = trade_id
+        self.tick_count = 0
+        self.last_price = last_price
+        self.book = None
+
+    @classmethod
+    def from_dict(cls, tick: Dict[str, Any]) -> "Tick":
+        return cls(tick.get("price", 0.0), tick.get("timestamp", 0), tick.get("volume_real", 1.0),
+                   tick.get("side_real", "neutral"), tick.get("trade_id", 0))
+
+    # Topo real do book quando há um; senão spread simulado em volta do preço.
+    # last_bid/last_ask (do trade anterior) são sempre simulados: o book não guarda histórico
+    @property
+    def bid(self) -> float:
+        top = self.book.top() if self.book is not None else None
+        return top[0] if top else self.price - 0.05
+
+    @property
+    def ask(self) -> float:
+        top = self.book.top() if self.book is not None else None
+        return top[2] if top else self.price + 0.05
+
+    @property
+    def last_bid(self) -> float:
+        return (self.last_price or self.price) - 0.05
+
+    @property
+    def last_ask(self) -> float:
+        return (self.last_price or self.price) + 0.05
+
+    def get(self, key: str, default=None):
+        return getattr(self, _TICK_ALIASES.get(key, key), default)
+
 
 class VolumeEngine(ABC):
     name: str = "base"
     description: str = "Engine base"
-    
+    # Engines que leem o book L2: o orquestrador liga o OrderBook do símbolo em engine.book
+    uses_book: bool = False
+    # Máximo de sub-fatores que os parâmetros aceitos podem gerar (ver sharding.py)
+    max_sub_factors: int = 0
+
     @abstractmethod
-    def calculate_volume_weight(self, tick: Dict[str, Any], context: Dict[str, Any]) -> float:
+    def calculate_volume_weight(self, tick: Tick, context: Tick) -> float:
         pass
-    
+
     @abstractmethod
-    def infer_side(self, tick: Dict[str, Any], context: Dict[str, Any]) -> str:
-        pass
\ No newline at end of file
+    def infer_side(self, tick: Tick, context: Tick) -> str:
+        pass
+
+    def get_sub_factors(self) -> Dict[str, float]:
+        """Fatores parciais do último calculate_volume_weight (ex.: um por
+        resolução de janela). O orquestrador publica cada um em
+        engine_contributions como "<engine>@<chave>". Padrão: nenhum."""
+        return {}
+
+    def get_sub_factors_batch(self) -> Dict[str, np.ndarray]:
+        """Equivalente de get_sub_factors para o último lote processado."""
+        return {}
+
+    def calculate_volume_weight_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        """Versão vetorizada de calculate_volume_weight para um lote de ticks.
+
+        A implementação padrão apenas percorre o lote pelo caminho por tick;
+        engines concretos sobrescrevem com uma versão em NumPy que produz
+        exatamente o mesmo resultado (e o mesmo estado final)."""
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        out = np.empty(len(prices), dtype=np.float64)
+        for i, tick in enumerate(_iter_ticks(prices, volumes, timestamps, sides)):
+            out[i] = self.calculate_volume_weight(tick, tick)
+        return out
+
+    def infer_side_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        """Versão vetorizada de infer_side. Retorna códigos de side (int8)."""
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        out = np.empty(len(prices), dtype=np.int8)
+        for i, tick in enumerate(_iter_ticks(prices, volumes, timestamps, sides)):
+            out[i] = SIDE_CODES.get(self.infer_side(tick, tick), SIDE_NEUTRAL)
+        return out
+
+
+def _iter_ticks(prices, volumes, timestamps, sides):
+    """Reconstrói os ticks do caminho por tick a partir das colunas."""
+    for price, volume, timestamp, code in zip(
+        prices.tolist(), volumes.tolist(), timestamps.tolist(), sides.tolist()
+    ):
+        yield Tick(price, timestamp, volume, SIDE_NAMES[code])
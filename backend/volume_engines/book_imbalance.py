@@ -0,0 +1,75 @@
+from typing import Dict, Sequence, Union
+import numpy as np
+from .base import VolumeEngine, Tick, SIDE_BUY, SIDE_SELL, as_batch
+
+# Cada profundidade vira uma chave em engine_contributions (e na tabela do protocolo binário)
+MAX_DEPTHS = 8
+
+class BookImbalanceEngine(VolumeEngine):
+    name = "book_imbalance"
+    description = "Pondera volume pelo desequilíbrio do book L2 (bids vs asks nos N melhores níveis)"
+    uses_book = True
+    max_sub_factors = MAX_DEPTHS
+
+    def __init__(self, depths: Union[int, Sequence[int]] = (1, 5, 20), sensitivity: float = 0.5):
+        depths = [depths] if isinstance(depths, int) else list(depths)
+        if not depths or min(depths) < 1:
+            raise ValueError("BookImbalanceEngine precisa de profundidades >= 1")
+        if len(depths) > MAX_DEPTHS:
+            raise ValueError(f"BookImbalanceEngine aceita no máximo {MAX_DEPTHS} profundidades")
+
+        self.depths = depths
+        self.labels = [f"L{depth}" for depth in depths]
+        self.sensitivity = sensitivity
+        # OrderBook do símbolo (ligado pelo orquestrador); sem book o fator é neutro
+        self.book = None
+        self._sub_factors = {label: 1.0 for label in self.labels}
+        self._sub_factors_batch: Dict[str, np.ndarray] = {}
+
+    def _imbalances(self):
+        book = self.book
+        if book is None or not book.synced:
+            return None
+        return [book.imbalance(depth) for depth in self.depths]
+
+    def calculate_volume_weight(self, tick: Tick, context: Tick) -> float:
+        # Trade na direção da pressão do book (compra com bids mais pesados,
+        # venda com asks mais pesados) pesa mais; contra a pressão, menos
+        side = tick.side_real
+        direction = 1.0 if side == "buy" else -1.0 if side == "sell" else 0.0
+        imbalances = self._imbalances()
+
+        factor_sum = 0.0
+        for label, imbalance in zip(self.labels, imbalances or [None] * len(self.labels)):
+            sub_factor = 1.0 + self.sensitivity * direction * imbalance if imbalance is not None else 1.0
+            self._sub_factors[label] = sub_factor
+            factor_sum += sub_factor
+        return factor_sum / len(self.labels)
+
+    def infer_side(self, tick: Tick, context: Tick) -> str:
+        return tick.side_real
+
+    def get_sub_factors(self) -> Dict[str, float]:
+        return self._sub_factors
+
+    def get_sub_factors_batch(self) -> Dict[str, np.ndarray]:
+        return self._sub_factors_batch
+
+    def calculate_volume_weight_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        # O book é o do momento do lote: nenhum diff é aplicado no meio de um lote
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        direction = np.where(sides == SIDE_BUY, 1.0, np.where(sides == SIDE_SELL, -1.0, 0.0))
+        imbalances = self._imbalances()
+
+        out = np.zeros(len(prices), dtype=np.float64)
+        for label, imbalance in zip(self.labels, imbalances or [None] * len(self.labels)):
+            if imbalance is None:
+                sub_factors = np.ones(len(prices), dtype=np.float64)
+            else:
+                sub_factors = 1.0 + self.sensitivity * direction * imbalance
+            self._sub_factors_batch[label] = sub_factors
+            out += sub_factors
+        return out / len(self.labels)
+
+    def infer_side_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        return as_batch(prices, volumes, timestamps, sides)[3].copy()
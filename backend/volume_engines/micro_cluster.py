@@ -1,75 +1,199 @@
-from typing import Dict, Any, List
-from .base import VolumeEngine
-import time
+from typing import Dict, Any, Sequence, Union
+import numpy as np
+from .base import VolumeEngine, Tick, SIDE_BUY, SIDE_SELL, SIDE_NAMES, as_batch
+
+# Cada janela vira uma chave em engine_contributions (e na tabela do protocolo binário)
+MAX_WINDOWS = 8
 
 class MicroClusterEngine(VolumeEngine):
     name = "micro_cluster"
-    description = "Agrupa trades em janelas de 100ms para detectar micro-absorções"
-    
-    def __init__(self, window_ms: int = 100, absorption_threshold: float = 2.0):
-        self.window_ms = window_ms / 1000.0
+    description = "Agrupa trades em janelas de 100ms (ou várias resoluções, via window_ms) para detectar micro-absorções"
+    max_sub_factors = MAX_WINDOWS
+
+    # Uma janela de 100ms por padrão: o fator (e o limiar de is_absorption no
+    # orquestrador) foi calibrado para ela; com várias janelas o fator é o
+    # maior entre elas, e janelas longas fecham absorções mais vezes
+    def __init__(self, window_ms: Union[int, Sequence[int]] = 100, absorption_threshold: float = 2.0):
+        windows_ms = [window_ms] if isinstance(window_ms, (int, float)) else list(window_ms)
+        if not windows_ms:
+            raise ValueError("MicroClusterEngine precisa de pelo menos uma janela")
+        if len(windows_ms) > MAX_WINDOWS:
+            raise ValueError(f"MicroClusterEngine aceita no máximo {MAX_WINDOWS} janelas")
+
+        self.labels = [_window_label(ms) for ms in windows_ms]
+        self.window_ms = [ms / 1000.0 for ms in windows_ms]
         self.absorption_threshold = absorption_threshold
-        self.buffer: List[Dict[str, Any]] = []
-        self.window_start = 0.0
-        self.last_cluster = None
-    
-    def calculate_volume_weight(self, tick: Dict[str, Any], context: Dict[str, Any]) -> float:
-        timestamp = tick.get("timestamp", time.time() * 1000) / 1000.0
-        
-        if self.window_start == 0.0:
-            self.window_start = timestamp
-        
-        self.buffer.append({
-            "price": tick.get("price", 0.0),
-            "timestamp": timestamp,
-            "side": context.get("real_side", "neutral"),
-            "volume": tick.get("volume_real", 1.0),
-        })
-        
-        window_elapsed = timestamp - self.window_start
-        
-        if window_elapsed >= self.window_ms and len(self.buffer) > 0:
-            buy_vol = sum(t["volume"] for t in self.buffer if t["side"] == "buy")
-            sell_vol = sum(t["volume"] for t in self.buffer if t["side"] == "sell")
-            total_vol = buy_vol + sell_vol
-            
-            open_price = self.buffer[0]["price"]
-            close_price = self.buffer[-1]["price"]
-            price_change = close_price - open_price
-            
-            is_absorption = False
-            absorption_type = None
-            
-            if price_change > 0 and sell_vol > buy_vol * self.absorption_threshold:
-                is_absorption = True
-                absorption_type = "buy"
-            elif price_change < 0 and buy_vol > sell_vol * self.absorption_threshold:
-                is_absorption = True
-                absorption_type = "sell"
-            
-            base_factor = 1.8 if is_absorption else 1.0
-            
-            self.last_cluster = {
-                "buy_volume": buy_vol,
-                "sell_volume": sell_vol,
-                "is_absorption": is_absorption,
-                "absorption_type": absorption_type,
-                "price_change": price_change,
-                "timestamp": timestamp,
-            }
-            
-            self.buffer.clear()
-            self.window_start = timestamp
-            
-            return min(base_factor, 2.0)
-        
-        return 1.0
-    
-    def infer_side(self, tick: Dict[str, Any], context: Dict[str, Any]) -> str:
+
+        # Acumuladores por resolução (nada é alocado por trade)
+        n = len(windows_ms)
+        self.window_start = [0.0] * n
+        self.trade_count = [0] * n
+        self.buy_volume = [0.0] * n
+        self.sell_volume = [0.0] * n
+        self.open_price = [0.0] * n
+
+        self.last_clusters: Dict[str, Dict[str, Any]] = {label: None for label in self.labels}
+        self._sub_factors = {label: 1.0 for label in self.labels}
+        self._sub_factors_batch: Dict[str, np.ndarray] = {}
+
+    @property
+    def last_cluster(self):
+        """Último cluster da resolução principal (a primeira janela)."""
+        return self.last_clusters[self.labels[0]]
+
+    def calculate_volume_weight(self, tick: Tick, context: Tick) -> float:
+        timestamp = tick.timestamp / 1000.0
+        price = tick.price
+        volume = tick.volume_real
+        side = tick.side_real
+
+        factor = 1.0
+        for r, label in enumerate(self.labels):
+            if self.window_start[r] == 0.0:
+                self.window_start[r] = timestamp
+
+            if self.trade_count[r] == 0:
+                self.open_price[r] = price
+            self.trade_count[r] += 1
+
+            if side == "buy":
+                self.buy_volume[r] += volume
+            elif side == "sell":
+                self.sell_volume[r] += volume
+
+            if timestamp - self.window_start[r] >= self.window_ms[r]:
+                sub_factor = self._close_window(r, price, timestamp)
+                factor = max(factor, sub_factor)
+            else:
+                sub_factor = 1.0
+            self._sub_factors[label] = sub_factor
+
+        return factor
+
+    def infer_side(self, tick: Tick, context: Tick) -> str:
         if self.last_cluster and self.last_cluster["is_absorption"]:
             if self.last_cluster["absorption_type"] == "buy":
                 return "sell"
             elif self.last_cluster["absorption_type"] == "sell":
                 return "buy"
-        
-        return context.get("real_side", "neutral")
\ No newline at end of file
+
+        return tick.side_real
+
+    def get_sub_factors(self) -> Dict[str, float]:
+        return self._sub_factors
+
+    def get_sub_factors_batch(self) -> Dict[str, np.ndarray]:
+        return self._sub_factors_batch
+
+    def calculate_volume_weight_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        n = len(prices)
+        ts = timestamps / 1000.0
+
+        # Timestamp zero reinicia a janela a cada tick; fica no caminho por tick
+        if np.any(ts == 0.0):
+            return self._per_tick_batch(prices, volumes, timestamps, sides)
+
+        price_list = prices.tolist()
+        ts_list = ts.tolist()
+        buy_list = np.where(sides == SIDE_BUY, volumes, 0.0).tolist()
+        sell_list = np.where(sides == SIDE_SELL, volumes, 0.0).tolist()
+
+        out = np.ones(n, dtype=np.float64)
+        for r, label in enumerate(self.labels):
+            sub_factors = np.ones(n, dtype=np.float64)
+            if n and self.window_start[r] == 0.0:
+                self.window_start[r] = ts_list[0]
+
+            # O fechamento das janelas é sequencial por natureza; o laço roda
+            # sobre listas com os acumuladores em variáveis locais
+            window = self.window_ms[r]
+            window_start = self.window_start[r]
+            count = self.trade_count[r]
+            buy_vol = self.buy_volume[r]
+            sell_vol = self.sell_volume[r]
+            for i in range(n):
+                if count == 0:
+                    self.open_price[r] = price_list[i]
+                count += 1
+                buy_vol += buy_list[i]
+                sell_vol += sell_list[i]
+                timestamp = ts_list[i]
+                if timestamp - window_start >= window:
+                    self.buy_volume[r] = buy_vol
+                    self.sell_volume[r] = sell_vol
+                    sub_factors[i] = self._close_window(r, price_list[i], timestamp)
+                    window_start = timestamp
+                    count = 0
+                    buy_vol = 0.0
+                    sell_vol = 0.0
+
+            self.window_start[r] = window_start
+            self.trade_count[r] = count
+            self.buy_volume[r] = buy_vol
+            self.sell_volume[r] = sell_vol
+
+            np.maximum(out, sub_factors, out=out)
+            self._sub_factors_batch[label] = sub_factors
+
+        return out
+
+    def infer_side_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        if self.last_cluster and self.last_cluster["is_absorption"]:
+            if self.last_cluster["absorption_type"] == "buy":
+                return np.full(len(prices), SIDE_SELL, dtype=np.int8)
+            elif self.last_cluster["absorption_type"] == "sell":
+                return np.full(len(prices), SIDE_BUY, dtype=np.int8)
+
+        return sides.copy()
+
+    def _close_window(self, r: int, close_price: float, timestamp: float) -> float:
+        buy_vol = self.buy_volume[r]
+        sell_vol = self.sell_volume[r]
+        price_change = close_price - self.open_price[r]
+
+        is_absorption = False
+        absorption_type = None
+
+        if price_change > 0 and sell_vol > buy_vol * self.absorption_threshold:
+            is_absorption = True
+            absorption_type = "buy"
+        elif price_change < 0 and buy_vol > sell_vol * self.absorption_threshold:
+            is_absorption = True
+            absorption_type = "sell"
+
+        base_factor = 1.8 if is_absorption else 1.0
+
+        self.last_clusters[self.labels[r]] = {
+            "buy_volume": buy_vol,
+            "sell_volume": sell_vol,
+            "is_absorption": is_absorption,
+            "absorption_type": absorption_type,
+            "price_change": price_change,
+            "timestamp": timestamp,
+        }
+
+        self.trade_count[r] = 0
+        self.buy_volume[r] = 0.0
+        self.sell_volume[r] = 0.0
+        self.window_start[r] = timestamp
+
+        return min(base_factor, 2.0)
+
+    def _per_tick_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        out = np.empty(len(prices), dtype=np.float64)
+        sub_factors = {label: np.empty(len(prices), dtype=np.float64) for label in self.labels}
+        for i in range(len(prices)):
+            tick = Tick(float(prices[i]), timestamps[i].item(), float(volumes[i]), SIDE_NAMES[sides[i]])
+            out[i] = self.calculate_volume_weight(tick, tick)
+            for label, value in self._sub_factors.items():
+                sub_factors[label][i] = value
+        self._sub_factors_batch = sub_factors
+        return out
+
+
+def _window_label(window_ms) -> str:
+    if window_ms >= 1000 and window_ms % 1000 == 0:
+        return f"{int(window_ms // 1000)}s"
+    return f"{window_ms}ms"
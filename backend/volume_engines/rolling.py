@@ -0,0 +1,147 @@
+from array import array
+from typing import Tuple
+import numpy as np
+
+
+class RollingWindow:
+    """Janela deslizante em ring buffer com soma e variância incrementais.
+
+    Cada push() custa O(1): o valor que sai da janela é subtraído das somas
+    correntes em vez de recalcular tudo. As somas são guardadas deslocadas
+    por uma origem (um valor recente da série) para evitar cancelamento
+    numérico com preços altos, e a cada `resync_interval` valores (no mínimo
+    `size`) são recalculadas a partir do buffer (custo amortizado O(1)) para
+    não acumular erro.
+
+    extend() processa um lote em NumPy com exatamente as mesmas operações
+    de ponto flutuante de push(), então os dois caminhos dão o mesmo
+    resultado bit a bit.
+    """
+
+    def __init__(self, size: int, resync_interval: int = 4096):
+        if size < 1:
+            raise ValueError(f"Tamanho de janela inválido: {size}")
+        self.size = size
+        self.resync_interval = max(size, resync_interval)
+        self.values = array("d", bytes(8 * size))
+        self.count = 0
+        self.head = 0
+        self.origin = 0.0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self._pushes = 0
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.origin + self.total / self.count
+
+    @property
+    def variance(self) -> float:
+        """Variância populacional dos valores na janela."""
+        if self.count == 0:
+            return 0.0
+        shifted_mean = self.total / self.count
+        return max(self.total_sq / self.count - shifted_mean * shifted_mean, 0.0)
+
+    def push(self, value: float):
+        if self.count == 0:
+            self.origin = value
+
+        delta = value - self.origin
+        if self.count == self.size:
+            old = self.values[self.head] - self.origin
+            self.total = (self.total + delta) - old
+            self.total_sq = (self.total_sq + delta * delta) - old * old
+        else:
+            self.total = self.total + delta
+            self.total_sq = self.total_sq + delta * delta
+            self.count += 1
+
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.size
+
+        self._pushes += 1
+        if self._pushes >= self.resync_interval:
+            self._resync()
+
+    def extend(self, values) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Empurra um lote de valores. Devolve (count, mean, variance) da
+        janela logo após cada valor, como se push() fosse chamado um a um."""
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        counts = np.empty(n, dtype=np.int64)
+        means = np.empty(n, dtype=np.float64)
+        variances = np.empty(n, dtype=np.float64)
+        ring = np.frombuffer(self.values, dtype=np.float64)
+
+        pos = 0
+        while pos < n:
+            if self.count == 0:
+                self.origin = float(values[pos])
+
+            # Segmentos terminam nos pontos de recálculo, como no caminho por tick
+            m = min(n - pos, self.resync_interval - self._pushes)
+            segment = values[pos:pos + m]
+            steps_ahead = np.arange(m)
+            # Índice (na sequência janela + segmento) do valor que sai a cada passo
+            evicted = self.count + steps_ahead - self.size
+            evicts = evicted >= 0
+            from_ring = ring[(self.head + steps_ahead[:self.size]) % self.size]
+            if m > self.size:
+                leaving = np.concatenate((from_ring, segment[:m - self.size]))
+            else:
+                leaving = from_ring
+
+            delta = segment - self.origin
+            old = np.where(evicts, leaving - self.origin, 0.0)
+
+            # Intercala +delta/-old para que cumsum repita a ordem das somas de push()
+            steps = np.empty(2 * m + 1, dtype=np.float64)
+            steps[0] = self.total
+            steps[1::2] = delta
+            steps[2::2] = -old
+            totals = np.cumsum(steps)[2::2]
+
+            steps[0] = self.total_sq
+            steps[1::2] = delta * delta
+            steps[2::2] = -(old * old)
+            totals_sq = np.cumsum(steps)[2::2]
+
+            seg_counts = np.minimum(self.count + np.arange(1, m + 1), self.size)
+            shifted_means = totals / seg_counts
+            counts[pos:pos + m] = seg_counts
+            means[pos:pos + m] = self.origin + shifted_means
+            variances[pos:pos + m] = np.maximum(totals_sq / seg_counts - shifted_means * shifted_means, 0.0)
+
+            kept = min(m, self.size)
+            ring[(self.head + np.arange(m - kept, m)) % self.size] = segment[m - kept:]
+            self.head = (self.head + m) % self.size
+            self.count = int(seg_counts[-1])
+            self.total = float(totals[-1])
+            self.total_sq = float(totals_sq[-1])
+            self._pushes += m
+            if self._pushes >= self.resync_interval:
+                self._resync()
+                # push() lê as somas já recalculadas no último valor do segmento
+                means[pos + m - 1] = self.mean
+                variances[pos + m - 1] = self.variance
+            pos += m
+
+        return counts, means, variances
+
+    def _resync(self):
+        """Recalcula as somas do zero a partir do buffer, com origem no valor mais recente."""
+        self._pushes = 0
+        ring = np.frombuffer(self.values, dtype=np.float64)
+        start = (self.head - self.count) % self.size
+        ordered = np.concatenate((ring[start:], ring[:start]))[:self.count]
+        self.origin = float(ring[(self.head - 1) % self.size])
+        shifted = ordered - self.origin
+        self.total = float(shifted.sum())
+        self.total_sq = float(np.dot(shifted, shifted))
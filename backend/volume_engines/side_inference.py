@@ -1,5 +1,5 @@
-from typing import Dict, Any
-from .base import VolumeEngine
+import numpy as np
+from .base import VolumeEngine, Tick, SIDE_BUY, SIDE_SELL, as_batch
 
 class SideInferenceEngine(VolumeEngine):
     name = "side_inference"
@@ -8,12 +8,12 @@ class SideInferenceEngine(VolumeEngine):
     def __init__(self):
         self.last_price = 0.0
     
-    def calculate_volume_weight(self, tick: Dict[str, Any], context: Dict[str, Any]) -> float:
+    def calculate_volume_weight(self, tick: Tick, context: Tick) -> float:
         return 1.0
     
-    def infer_side(self, tick: Dict[str, Any], context: Dict[str, Any]) -> str:
-        price = tick.get("price", 0.0)
-        real_side = context.get("real_side", "neutral")
+    def infer_side(self, tick: Tick, context: Tick) -> str:
+        price = tick.price
+        real_side = tick.side_real
         
         if self.last_price == 0.0:
             self.last_price = price
@@ -28,4 +28,27 @@ class SideInferenceEngine(VolumeEngine):
                 real_side = inferred
         
         self.last_price = price
-        return real_side
\ No newline at end of file
+        return real_side
+    
+    def calculate_volume_weight_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        return np.ones(len(prices), dtype=np.float64)
+    
+    def infer_side_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        out = sides.copy()
+        if len(prices) == 0:
+            return out
+        
+        # last_price é sempre o preço do tick anterior (ou o estado do lote anterior)
+        previous = np.empty_like(prices)
+        previous[0] = self.last_price
+        previous[1:] = prices[:-1]
+        
+        price_change = prices - previous
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moved = (previous != 0.0) & (np.abs(price_change) / previous > 0.0005)
+        out[moved & (price_change > 0)] = SIDE_BUY
+        out[moved & ~(price_change > 0)] = SIDE_SELL
+        
+        self.last_price = float(prices[-1])
+        return out
@@ -1,31 +1,41 @@
-from typing import Dict, Any
-from .base import VolumeEngine
+import math
+import numpy as np
+from .base import VolumeEngine, Tick, as_batch
+from .rolling import RollingWindow
 
 class SpreadWeightEngine(VolumeEngine):
     name = "spread_weight"
     description = "Ajusta volume conforme volatilidade recente (simula spread)"
     
-    def __init__(self):
-        self.price_history = []
-        self.max_history = 20
+    def __init__(self, max_history: int = 20, min_history: int = 5):
+        self.max_history = max_history
+        self.min_history = min_history
+        self.price_window = RollingWindow(max_history)
     
-    def calculate_volume_weight(self, tick: Dict[str, Any], context: Dict[str, Any]) -> float:
-        price = tick.get("price", 0.0)
-        self.price_history.append(price)
+    def calculate_volume_weight(self, tick: Tick, context: Tick) -> float:
+        price = tick.price
+        self.price_window.push(price)
         
-        if len(self.price_history) > self.max_history:
-            self.price_history.pop(0)
-        
-        if len(self.price_history) < 5:
+        if self.price_window.count < self.min_history:
             return 1.0
         
-        avg = sum(self.price_history) / len(self.price_history)
-        variance = sum((p - avg) ** 2 for p in self.price_history) / len(self.price_history)
-        volatility = variance ** 0.5
+        volatility = math.sqrt(self.price_window.variance)
         
         normalized_vol = min(volatility / 100.0, 1.5)
         weight = 1.0 / max(normalized_vol, 0.5)
         return min(max(weight * 0.8 + 0.2, 0.3), 1.5)
     
-    def infer_side(self, tick: Dict[str, Any], context: Dict[str, Any]) -> str:
-        return context.get("real_side", "neutral")
\ No newline at end of file
+    def infer_side(self, tick: Tick, context: Tick) -> str:
+        return tick.side_real
+    
+    def calculate_volume_weight_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        counts, _, variances = self.price_window.extend(prices)
+        volatility = np.sqrt(variances)
+        
+        normalized_vol = np.minimum(volatility / 100.0, 1.5)
+        weight = 1.0 / np.maximum(normalized_vol, 0.5)
+        weight = np.minimum(np.maximum(weight * 0.8 + 0.2, 0.3), 1.5)
+        return np.where(counts < self.min_history, 1.0, weight)
+    
+    def infer_side_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        return as_batch(prices, volumes, timestamps, sides)[3].copy()
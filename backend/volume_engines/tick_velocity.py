@@ -1,23 +1,57 @@
-import time
-from typing import Dict, Any
-from .base import VolumeEngine
+import numpy as np
+from .base import VolumeEngine, Tick, as_batch
 
 class TickVelocityEngine(VolumeEngine):
     name = "tick_velocity"
     description = "Pondera volume pela velocidade dos trades (trades rápidos = mais volume)"
     
-    def __init__(self):
-        self.last_trade_time = time.time()
+    def __init__(self, max_velocity: float = 50.0, full_velocity: float = 25.0):
+        # Tempo do evento (timestamp do trade em segundos), não o relógio local
+        self.last_trade_time = None
         self.min_interval = 0.001
+        # Trades/s: teto da velocidade medida e velocidade que já dá peso 1.0
+        self.max_velocity = max_velocity
+        self.full_velocity = full_velocity
     
-    def calculate_volume_weight(self, tick: Dict[str, Any], context: Dict[str, Any]) -> float:
-        now = time.time()
+    def calculate_volume_weight(self, tick: Tick, context: Tick) -> float:
+        now = tick.timestamp / 1000.0
+        if self.last_trade_time is None:
+            self.last_trade_time = now
+            return 1.0
+        
         interval = max(now - self.last_trade_time, self.min_interval)
         self.last_trade_time = now
         
-        velocity = min(1.0 / interval, 50.0)
-        normalized = min(velocity / 25.0, 1.0)
+        velocity = min(1.0 / interval, self.max_velocity)
+        normalized = min(velocity / self.full_velocity, 1.0)
         return max(normalized, 0.1)
     
-    def infer_side(self, tick: Dict[str, Any], context: Dict[str, Any]) -> str:
-        return context.get("real_side", "neutral")
\ No newline at end of file
+    def infer_side(self, tick: Tick, context: Tick) -> str:
+        return tick.side_real
+    
+    def calculate_volume_weight_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        prices, volumes, timestamps, sides = as_batch(prices, volumes, timestamps, sides)
+        out = np.ones(len(prices), dtype=np.float64)
+        if len(prices) == 0:
+            return out
+        
+        now = timestamps / 1000.0
+        first = 0
+        if self.last_trade_time is None:
+            self.last_trade_time = float(now[0])
+            first = 1
+        
+        current = now[first:]
+        if len(current) == 0:
+            return out
+        previous = np.concatenate(([self.last_trade_time], current[:-1]))
+        intervals = np.maximum(current - previous, self.min_interval)
+        self.last_trade_time = float(now[-1])
+        
+        velocity = np.minimum(1.0 / intervals, self.max_velocity)
+        normalized = np.minimum(velocity / self.full_velocity, 1.0)
+        out[first:] = np.maximum(normalized, 0.1)
+        return out
+    
+    def infer_side_batch(self, prices, volumes, timestamps, sides) -> np.ndarray:
+        return as_batch(prices, volumes, timestamps, sides)[3].copy()
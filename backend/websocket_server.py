@@ -3,56 +3,571 @@ ImbalanceEngine - Servidor WebSocket + HTTP
 Versão corrigida: usa biblioteca 'websockets' (sem implementação manual)
 Compatível com Windows (asyncio fix aplicado)
 """
+import argparse
 import asyncio
 import websockets
 import json
 import time
-import threading
 import os
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from binance_ws import BinanceDataFeed
-from engine_orchestrator import VolumeEngineOrchestrator
+from urllib.parse import parse_qs
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import deque
+from binance_ws import BinanceMultiFeed, BINANCE_WS_BASE, HISTORY_SIZE
+from ingest import DECODERS
+from shared_engines import EnginePipeline, SharedEngineOrchestrator
+from sharding import ShardedFeed
+from trade_recorder import TradeRecorder
+from client_channel import ClientChannel, OVERFLOW_POLICIES
+from conflation import TradeConflator, CONFLATION_INTERVALS
+from trade_filter import TradeFilter
+from wire_format import WireEncoder, SUBPROTOCOL
+from snapshot import SnapshotBuffer, SNAPSHOT_WINDOW_MS
+from footprint import FootprintAggregator
+from candles import CandleAggregator, CANDLE_TIMEFRAMES
+from order_book import BookFeed
+from tick_store import TickStore
+from static_assets import StaticAssets, find_frontend_dir, http_response
+from metrics import REGISTRY, CONTENT_TYPE, ENCODE_SECONDS, BROADCAST_SECONDS, BINANCE_RECONNECTS, BINANCE_MISSED_TRADES
+from upstream import Backoff
 
 # ============================================
 # Estado global
 # ============================================
 connected_clients = set()
-current_orchestrator = None
+
+# Símbolos acompanhados (o primeiro é o padrão dos clientes que não se inscrevem)
+SYMBOLS: List[str] = ["btcusdt"]
+orchestrators: Dict[str, SharedEngineOrchestrator] = {}
+
+# Engines por cliente (ver shared_engines.py): cada cliente usa um pipeline
+# (engines + pesos); clientes com a mesma configuração dividem o pipeline e
+# engines iguais rodam uma vez por tick para todos os pipelines
+DEFAULT_PIPELINE = EnginePipeline(
+    engine_names=["tick_velocity", "side_inference", "micro_cluster"],
+    weights={"tick_velocity": 1.0, "side_inference": 1.0, "micro_cluster": 1.5}
+)
+pipelines: Dict[str, EnginePipeline] = {DEFAULT_PIPELINE.id: DEFAULT_PIPELINE}
+pipeline_members: Dict[str, Set] = {}
+client_pipelines: Dict[object, str] = {}
+
+# Feed da Binance em uso (para as métricas do pipeline de ingestão) e decodificador
+binance_feed = None
+INGEST_DECODER = "fast"
+
+# Workers de engines em processos separados (sharding.py); 0 = tudo neste processo
+WORKERS = 0
+
+# Conexões simultâneas com a Binance (2+ = hot standby: vale a cópia de cada
+# trade que chegar primeiro e a queda de uma conexão não perde trades),
+# alternando entre --binance-url e os espelhos
+UPSTREAM_CONNECTIONS = 1
+MIRROR_URLS: List[str] = []
+
+# Book L2 local (streams @depth e @bookTicker, ver order_book.py): bid/ask
+# reais nos ticks e o engine book_imbalance; com --workers, um por worker
+BOOK_ENABLED = False
+book_feed = None
+
+# Trocas de engines ao vivo: ticks usados no aquecimento e tempo de cada troca
+WARMUP_TICKS = HISTORY_SIZE
+swap_log = deque(maxlen=50)
+
+# Inscrições: símbolo → clientes e cliente → símbolos
+symbol_subscribers: Dict[str, Set] = {}
+client_symbols: Dict[object, Set[str]] = {}
+
+# Fila de saída de cada cliente (ver client_channel.py)
+CLIENT_QUEUE_SIZE = 1000
+OVERFLOW_POLICY = "drop_oldest"
+client_channels: Dict[object, ClientChannel] = {}
+
+# Conflação: cadência escolhida por cliente (0 = um trade por mensagem),
+# um acumulador por (símbolo, pipeline, cadência, filtro) e uma tarefa de flush por cadência
+client_intervals: Dict[object, int] = {}
+conflators: Dict[Tuple[str, str, int, Optional[str]], TradeConflator] = {}
+conflation_tasks: Dict[int, asyncio.Task] = {}
+
+# Filtros de trades (trade_filter.py): forma canônica do filtro de cada
+# cliente e um TradeFilter por forma, avaliado uma vez por trade para
+# todos os clientes que a usam
+client_filters: Dict[object, str] = {}
+trade_filters: Dict[str, TradeFilter] = {}
+
+# Snapshot de late-join (snapshot.py): últimos trades processados por
+# (símbolo, pipeline), enviados a quem conecta ou se inscreve num símbolo
+SNAPSHOT_SECONDS = SNAPSHOT_WINDOW_MS // 1000
+snapshot_buffers: Dict[Tuple[str, str], SnapshotBuffer] = {}
+
+# Footprint / perfil de volume (footprint.py): um agregador por (símbolo,
+# pipeline) acompanhado por algum cliente de footprint (criado sob demanda e
+# aquecido com a janela do snapshot); esses clientes recebem um delta a cada
+# FOOTPRINT_INTERVAL_MS
+FOOTPRINT_INTERVAL_MS = 250
+footprints: Dict[Tuple[str, str], FootprintAggregator] = {}
+footprint_clients: Set = set()
+footprint_task = None
+
+# Candles (candles.py): um agregador por (símbolo, pipeline) acompanhado por
+# algum cliente de candles (como os footprints), com todos os timeframes;
+# clientes inscritos recebem barras fechadas e a parcial de cada timeframe
+# pedido a cada CANDLE_INTERVAL_MS e podem dispensar os trades
+CANDLE_INTERVAL_MS = 250
+candles: Dict[Tuple[str, str], CandleAggregator] = {}
+candle_clients: Dict[object, Set[str]] = {}
+candle_only_clients: Set = set()
+candle_task = None
+
+# Histórico persistente (tick_store.py): trades do pipeline padrão por
+# símbolo e dia, servidos ao gráfico por GET /history (None = desligado)
+tick_store = None
+HISTORY_DEFAULT_MS = 60 * 60 * 1000
+HISTORY_BAR_MS = 60_000
+HISTORY_MAX_BARS = 10_000
+
+# Frontend em memória (static_assets.py), servido na porta do WebSocket
+PORT = 8765
+static_assets = StaticAssets()
+
+# Protocolo binário (wire_format.py): clientes que negociaram o subprotocolo
+# → versão da tabela de símbolos/engines que já receberam
+wire_encoder = WireEncoder()
+binary_clients: Dict[object, int] = {}
+
+# Métricas (GET /metrics, ver metrics.py)
+REGISTRY.gauge("imbalance_connected_clients", "Clientes WebSocket conectados.", lambda: len(connected_clients))
+encode_timers = {
+    (fmt, kind): ENCODE_SECONDS.labels(fmt, kind) for fmt in ("json", "binary") for kind in ("trade", "frame")
+}
+broadcast_timer = BROADCAST_SECONDS.labels()
 
 # Lista de engines disponíveis (enviada ao frontend)
 ENGINE_LIST = [
     {"id": "tick_velocity",  "name": "⚡ Velocidade dos Trades",       "description": "Trades rápidos = maior volume"},
     {"id": "side_inference", "name": "🎯 Inferência de Side",          "description": "Refina side usando padrões de preço"},
     {"id": "spread_weight",  "name": "📉 Ponderação por Volatilidade", "description": "Ajusta volume conforme volatilidade recente"},
-    {"id": "micro_cluster",  "name": "🧩 Micro-Agrupamento (100ms)",   "description": "Detecta micro-absorções de ordens"},
+    {"id": "micro_cluster",  "name": "🧩 Micro-Agrupamento (100ms)",   "description": "Detecta micro-absorções de ordens (outras janelas via params window_ms)"},
     {"id": "atr_normalize",  "name": "📊 Normalização por ATR",        "description": "Estabiliza volume em alta volatilidade"},
+    {"id": "book_imbalance", "name": "📚 Desequilíbrio do Book",       "description": "Pressão de bids vs asks no book L2 (requer --book)"},
 ]
 
 
 # ============================================
 # WebSocket: broadcast para todos os clientes
 # ============================================
+# Só enfileira: o envio de fato é feito pela tarefa de cada cliente, então
+# um cliente lento nunca segura os outros nem a leitura da Binance.
 async def broadcast(message: dict):
-    """Envia mensagem para todos os clientes conectados."""
+    """Envia mensagem de controle (nunca descartada) para todos os clientes."""
     if not connected_clients:
         return
     
     data = json.dumps(message)
-    
-    # Envia para todos, remove clientes mortos
-    disconnected = set()
     for client in connected_clients:
-        try:
-            await client.send(data)
-        except websockets.exceptions.ConnectionClosed:
-            disconnected.add(client)
-        except Exception as e:
-            print(f"⚠️ Erro ao enviar para cliente: {e}")
-            disconnected.add(client)
+        channel = client_channels.get(client)
+        if channel:
+            channel.send_control(data)
+
+
+async def broadcast_trade(payload: dict):
+    """Envia um trade só para os clientes inscritos no símbolo dele e que
+    usam o pipeline de engines que o calculou.
+    Clientes com filtro só recebem o trade se ele passa; cada filtro é
+    avaliado uma vez, e o trade só é codificado se alguém o recebe.
+    Clientes com cadência recebem o trade no próximo frame (conflation_loop).
+    Todo trade vai para o snapshot, mesmo sem clientes inscritos; footprint
+    e candles só existem enquanto alguém os acompanha."""
+    started = time.perf_counter()
+    symbol = payload["symbol"].lower()
+    pipeline = payload.get("pipeline", DEFAULT_PIPELINE.id)
+    buffer = snapshot_buffers.get((symbol, pipeline))
+    if buffer is None:
+        buffer = snapshot_buffers[(symbol, pipeline)] = SnapshotBuffer(
+            symbol, pipeline, window_ms=SNAPSHOT_SECONDS * 1000
+        )
+    buffer.add(payload)
+    footprint = footprints.get((symbol, pipeline))
+    if footprint is not None:
+        footprint.add_payload(payload)
+    aggregator = candles.get((symbol, pipeline))
+    if aggregator is not None:
+        aggregator.add_payload(payload)
+    
+    subscribers = symbol_subscribers.get(symbol)
+    if not subscribers:
+        return
+    
+    raw_clients = []
+    intervals = set()
+    matches = {}
+    for client in subscribers:
+        if client_pipelines.get(client, DEFAULT_PIPELINE.id) != pipeline or client in candle_only_clients:
+            continue
+        filter_key = client_filters.get(client)
+        if filter_key is not None:
+            matched = matches.get(filter_key)
+            if matched is None:
+                matched = matches[filter_key] = trade_filters[filter_key].matches(payload)
+            if not matched:
+                continue
+        interval = client_intervals.get(client, 0)
+        if interval:
+            intervals.add((interval, filter_key))
+        else:
+            raw_clients.append(client)
+    deliver(raw_clients, payload, wire_encoder.encode_trade)
+    
+    for interval, filter_key in intervals:
+        key = (symbol, pipeline, interval, filter_key)
+        if key not in conflators:
+            conflators[key] = TradeConflator(symbol, interval)
+        conflators[key].add(payload)
+    broadcast_timer.observe(time.perf_counter() - started)
+
+
+async def conflation_loop(interval_ms: int):
+    """A cada interval_ms envia um frame por símbolo aos clientes dessa cadência.
+    Termina sozinha quando nenhum cliente usa mais a cadência."""
+    loop = asyncio.get_running_loop()
+    next_flush = loop.time()
+    while interval_ms in client_intervals.values():
+        next_flush += interval_ms / 1000
+        await asyncio.sleep(max(next_flush - loop.time(), 0))
+        
+        for (symbol, pipeline, interval, filter_key), conflator in list(conflators.items()):
+            if interval != interval_ms:
+                continue
+            frame = conflator.flush()
+            if frame is None:
+                continue
+            clients = [client for client in symbol_subscribers.get(symbol, ())
+                       if client_intervals.get(client, 0) == interval_ms
+                       and client_pipelines.get(client, DEFAULT_PIPELINE.id) == pipeline
+                       and client_filters.get(client) == filter_key]
+            deliver(clients, frame, wire_encoder.encode_frame)
+    
+    for key in [key for key in conflators if key[2] == interval_ms]:
+        del conflators[key]
+    conflation_tasks.pop(interval_ms, None)
+
+
+async def footprint_loop():
+    """A cada FOOTPRINT_INTERVAL_MS envia o delta de cada footprint aos
+    clientes de footprint inscritos no símbolo e com o mesmo pipeline.
+    Footprints sem clientes deixam de existir (e de ser alimentados);
+    termina sozinha quando ninguém mais acompanha o footprint."""
+    global footprint_task
+    loop = asyncio.get_running_loop()
+    next_flush = loop.time()
+    while footprint_clients:
+        next_flush += FOOTPRINT_INTERVAL_MS / 1000
+        await asyncio.sleep(max(next_flush - loop.time(), 0))
+        
+        for (symbol, pipeline), footprint in list(footprints.items()):
+            clients = [client for client in footprint_clients
+                       if symbol in client_symbols.get(client, ())
+                       and client_pipelines.get(client) == pipeline]
+            if not clients:
+                del footprints[(symbol, pipeline)]
+                continue
+            delta = footprint.delta()
+            if delta is None:
+                continue
+            # Deltas não são descartáveis (um delta perdido deixaria níveis
+            # desatualizados): com um ainda pendente, o cliente lento recebe
+            # um snapshot no lugar dos dois
+            text = json.dumps(delta)
+            key = ("footprint", symbol, pipeline)
+            resync = lambda footprint=footprint: json.dumps(footprint.snapshot())
+            for client in clients:
+                channel = client_channels.get(client)
+                if channel:
+                    channel.send_update(key, text, resync)
+    footprints.clear()
+    footprint_task = None
+
+
+def set_footprint(client, enabled: bool):
+    """Liga/desliga os deltas de footprint do cliente (com snapshot ao ligar)."""
+    global footprint_task
+    if not enabled:
+        footprint_clients.discard(client)
+        return
+    footprint_clients.add(client)
+    send_footprints(client, client_symbols.get(client, ()))
+    if footprint_task is None:
+        footprint_task = asyncio.create_task(footprint_loop())
+
+
+def footprint_for(symbol: str, pipeline: str, follow: bool) -> FootprintAggregator:
+    """Footprint de (símbolo, pipeline). Um novo começa pelos trades da
+    janela do snapshot e só fica guardado (e alimentado por broadcast_trade)
+    com follow=True, ou seja, para um cliente de footprint."""
+    footprint = footprints.get((symbol, pipeline))
+    if footprint is None:
+        footprint = FootprintAggregator(symbol, pipeline)
+        buffer = snapshot_buffers.get((symbol, pipeline))
+        for timestamp, price, volume, _, side, _ in buffer.window_trades() if buffer else ():
+            footprint.add(price, volume, side, timestamp)
+        # O aquecimento vai no snapshot, não no primeiro delta
+        footprint.delta()
+        if follow:
+            footprints[(symbol, pipeline)] = footprint
+    return footprint
+
+
+def send_footprints(client, symbols: Iterable[str]):
+    """Snapshot completo do footprint de cada símbolo (pipeline do cliente)."""
+    channel = client_channels.get(client)
+    pipeline = client_pipelines.get(client, DEFAULT_PIPELINE.id)
+    for symbol in symbols:
+        footprint = footprint_for(symbol, pipeline, client in footprint_clients)
+        if footprint.trade_count and channel:
+            resync = lambda footprint=footprint: json.dumps(footprint.snapshot())
+            channel.send_update(("footprint", symbol, pipeline), resync(), resync)
+
+
+async def candle_loop():
+    """A cada CANDLE_INTERVAL_MS envia, por timeframe, as barras fechadas e
+    a parcial aos clientes de candles inscritos no símbolo e com o mesmo
+    pipeline. Agregadores sem clientes deixam de existir (e de ser
+    alimentados); termina sozinha quando ninguém mais acompanha candles."""
+    global candle_task
+    loop = asyncio.get_running_loop()
+    next_flush = loop.time()
+    while candle_clients:
+        next_flush += CANDLE_INTERVAL_MS / 1000
+        await asyncio.sleep(max(next_flush - loop.time(), 0))
+        
+        for (symbol, pipeline), aggregator in list(candles.items()):
+            followers: Dict[str, list] = {}
+            for client, timeframes in candle_clients.items():
+                if symbol in client_symbols.get(client, ()) and client_pipelines.get(client) == pipeline:
+                    for timeframe in timeframes:
+                        followers.setdefault(timeframe, []).append(client)
+            if not followers:
+                del candles[(symbol, pipeline)]
+                continue
+            for timeframe in aggregator.timeframes:
+                clients = followers.get(timeframe)
+                if not clients:
+                    aggregator.skip(timeframe)
+                    continue
+                update = aggregator.update(timeframe)
+                if update is None:
+                    continue
+                # Barras fechadas não são descartáveis (como os deltas de footprint)
+                text = json.dumps(update)
+                key = ("candles", symbol, pipeline, timeframe)
+                resync = lambda aggregator=aggregator, timeframe=timeframe: json.dumps(aggregator.snapshot(timeframe))
+                for client in clients:
+                    channel = client_channels.get(client)
+                    if channel:
+                        channel.send_update(key, text, resync)
+    candles.clear()
+    candle_task = None
+
+
+def string_list(value, field: str) -> List[str]:
+    """Lista de textos vinda de uma mensagem do cliente. Um texto solto não
+    vale (seria percorrido letra por letra)."""
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise TypeError(f"{field} deve ser uma lista de textos")
+    return value
+
+
+def set_candles(client, timeframes: List[str], trades: bool = True):
+    """Define os timeframes de candles do cliente (vazio = desliga), com
+    snapshot de cada um ao ligar. trades=False: o cliente para de receber
+    os trades individuais (e frames) e fica só com os candles."""
+    global candle_task
+    timeframes = set(string_list(timeframes, "timeframes"))
+    unknown = timeframes - set(CANDLE_TIMEFRAMES)
+    if unknown:
+        raise ValueError(f"Timeframe inválido: {', '.join(sorted(unknown))} (use {', '.join(CANDLE_TIMEFRAMES)})")
+    if not timeframes:
+        candle_clients.pop(client, None)
+        candle_only_clients.discard(client)
+        return
+    if candle_task is None:
+        candle_task = asyncio.create_task(candle_loop())
+    candle_clients[client] = timeframes
+    if trades:
+        candle_only_clients.discard(client)
+    else:
+        candle_only_clients.add(client)
+    send_candles(client, client_symbols.get(client, ()))
+
+
+def candles_for(symbol: str, pipeline: str, follow: bool) -> CandleAggregator:
+    """Candles de (símbolo, pipeline), criados como em footprint_for (só
+    guardados com follow=True, para um cliente de candles)."""
+    aggregator = candles.get((symbol, pipeline))
+    if aggregator is None:
+        aggregator = CandleAggregator(symbol, pipeline)
+        buffer = snapshot_buffers.get((symbol, pipeline))
+        for timestamp, price, volume, volume_raw, side, is_absorption in buffer.window_trades() if buffer else ():
+            aggregator.add(price, volume_raw, volume, side, is_absorption, timestamp)
+        # As barras do aquecimento vão nos snapshots, não no primeiro update
+        for timeframe in aggregator.timeframes:
+            aggregator.skip(timeframe)
+        if follow:
+            candles[(symbol, pipeline)] = aggregator
+    return aggregator
+
+
+def send_candles(client, symbols: Iterable[str]):
+    """Snapshot de cada timeframe do cliente nos símbolos (pipeline do cliente)."""
+    channel = client_channels.get(client)
+    pipeline = client_pipelines.get(client, DEFAULT_PIPELINE.id)
+    for symbol in symbols:
+        aggregator = candles_for(symbol, pipeline, client in candle_clients)
+        if not aggregator.trade_count or not channel:
+            continue
+        for timeframe in sorted(candle_clients.get(client, ()), key=CANDLE_TIMEFRAMES.get):
+            resync = lambda aggregator=aggregator, timeframe=timeframe: json.dumps(aggregator.snapshot(timeframe))
+            channel.send_update(("candles", symbol, pipeline, timeframe), resync(), resync)
+
+
+def set_conflation(client, interval_ms: int):
+    """Define a cadência do cliente (0 = tempo real) e garante a tarefa de flush."""
+    if interval_ms not in CONFLATION_INTERVALS:
+        raise ValueError(f"Cadência inválida: {interval_ms} (use {', '.join(map(str, CONFLATION_INTERVALS))})")
+    if interval_ms == 0:
+        client_intervals.pop(client, None)
+        return
+    client_intervals[client] = interval_ms
+    if interval_ms not in conflation_tasks:
+        conflation_tasks[interval_ms] = asyncio.create_task(conflation_loop(interval_ms))
+
+
+def set_filter(client, spec) -> Optional[str]:
+    """Troca o filtro de trades do cliente (None ou [] remove). Devolve a
+    forma canônica; clientes com a mesma forma compartilham o TradeFilter."""
+    trade_filter = TradeFilter(spec) if spec else None
+    previous = client_filters.pop(client, None)
+    if trade_filter is not None:
+        trade_filter = trade_filters.setdefault(trade_filter.key, trade_filter)
+        client_filters[client] = trade_filter.key
+    if previous is not None and previous not in client_filters.values():
+        del trade_filters[previous]
+        for key in [key for key in conflators if key[3] == previous]:
+            del conflators[key]
+    return trade_filter.key if trade_filter else None
+
+
+def filter_stats() -> List[dict]:
+    """Filtros em uso e quantos clientes usam cada um."""
+    counts = {}
+    for key in client_filters.values():
+        counts[key] = counts.get(key, 0) + 1
+    return [{"filter": key, "clients": count} for key, count in counts.items()]
+
+
+def deliver(clients: Iterable, message: dict, encode_binary: Callable[[dict], bytes]):
+    """Enfileira um trade/frame para os clientes, codificando no máximo uma
+    vez por formato (JSON ou binário).
     
-    for client in disconnected:
-        connected_clients.discard(client)
-        print(f"👋 Cliente removido ({len(connected_clients)} restantes)")
+    A latência ponta a ponta de um frame é medida pelo trade mais antigo
+    dele, então inclui a espera pela cadência."""
+    kind = message["type"]
+    timestamp = message["timestamp"] if kind == "trade" else message["aggregates"]["first_timestamp"]
+    text = binary = None
+    for client in clients:
+        channel = client_channels.get(client)
+        if not channel:
+            continue
+        if client in binary_clients and binary is not False:
+            if binary is None:
+                started = time.perf_counter()
+                try:
+                    binary = encode_binary(message)
+                except ValueError as e:
+                    # Não cabe no protocolo binário: este vai em JSON também para os clientes binários
+                    print(f"⚠️ {e}: enviando em JSON")
+                    binary = False
+                encode_timers[("binary", kind)].observe(time.perf_counter() - started)
+            if binary is not False:
+                # Tabela nova (símbolo ou engine inédito, ou tabela recomeçada) vai antes dos dados
+                if binary_clients[client] != wire_encoder.version:
+                    channel.send_control(wire_encoder.table_message())
+                    binary_clients[client] = wire_encoder.version
+                channel.offer(binary, timestamp, kind)
+                continue
+        if text is None:
+            started = time.perf_counter()
+            text = json.dumps(message)
+            encode_timers[("json", kind)].observe(time.perf_counter() - started)
+        channel.offer(text, timestamp, kind)
+
+
+def select_subprotocol(connection, subprotocols):
+    """Negociação do formato: binário se o cliente pedir, senão JSON (sem subprotocolo)."""
+    return SUBPROTOCOL if SUBPROTOCOL in subprotocols else None
+
+
+def client_stats() -> List[dict]:
+    """Profundidade de fila e mensagens descartadas de cada cliente."""
+    return [
+        {
+            "client": str(getattr(client, "remote_address", "?")),
+            "format": "binary" if client in binary_clients else "json",
+            **channel.stats()
+        }
+        for client, channel in client_channels.items()
+    ]
+
+
+# ============================================
+# Inscrições por símbolo
+# ============================================
+def subscribe(client, symbols: Iterable[str]) -> List[str]:
+    """Substitui as inscrições do cliente. Símbolos não acompanhados são ignorados."""
+    symbols = string_list(symbols, "symbols")
+    unsubscribe(client)
+    accepted = [s.lower() for s in symbols if s.lower() in SYMBOLS]
+    client_symbols[client] = set(accepted)
+    for symbol in accepted:
+        symbol_subscribers.setdefault(symbol, set()).add(client)
+    return accepted
+
+
+async def subscribe_with_snapshot(client, symbols: Iterable[str]) -> List[str]:
+    """Como subscribe(), mas antes envia o snapshot dos símbolos que o
+    cliente ainda não acompanhava. A inscrição só acontece depois, então
+    os trades ao vivo chegam sempre depois do snapshot (o snapshot pode
+    estar até SNAPSHOT_CACHE_MS atrasado)."""
+    symbols = [s.lower() for s in string_list(symbols, "symbols")]
+    current = client_symbols.get(client, set())
+    await send_snapshots(client, [s for s in symbols if s in SYMBOLS and s not in current])
+    return subscribe(client, symbols)
+
+
+async def send_snapshots(client, symbols: Iterable[str]):
+    # O snapshot não tem os campos de todos os filtros: cliente com filtro só recebe trades ao vivo
+    if client in client_filters:
+        return
+    channel = client_channels.get(client)
+    pipeline = client_pipelines.get(client, DEFAULT_PIPELINE.id)
+    for symbol in symbols:
+        buffer = snapshot_buffers.get((symbol, pipeline))
+        if buffer is None:
+            continue
+        text = await buffer.encoded()
+        if text and channel and not channel.closed:
+            channel.send_control(text)
+
+
+def unsubscribe(client, symbols: Iterable[str] = None):
+    """Remove as inscrições do cliente (todas, se symbols for None)."""
+    if symbols is not None:
+        string_list(symbols, "symbols")
+    current = client_symbols.get(client, set())
+    removed = set(current) if symbols is None else {s.lower() for s in symbols} & current
+    for symbol in removed:
+        symbol_subscribers.get(symbol, set()).discard(client)
+        current.discard(symbol)
+    if symbols is None:
+        client_symbols.pop(client, None)
 
 
 # ============================================
@@ -60,52 +575,163 @@ async def broadcast(message: dict):
 # ============================================
 async def ws_handler(websocket):
     """Gerencia uma conexão WebSocket individual."""
-    global current_orchestrator
     
-    # Registra cliente
+    # Registra cliente (inscrito no símbolo padrão e com os engines padrão até pedir outros)
+    channel = ClientChannel(websocket, maxsize=CLIENT_QUEUE_SIZE, policy=OVERFLOW_POLICY)
+    client_channels[websocket] = channel
+    if websocket.subprotocol == SUBPROTOCOL:
+        binary_clients[websocket] = -1
     connected_clients.add(websocket)
+    join_pipeline(websocket, DEFAULT_PIPELINE.id)
     print(f"🔌 Cliente conectado ({len(connected_clients)} total)")
     
-    # Envia lista de engines imediatamente
-    try:
-        await websocket.send(json.dumps({
-            "type": "engine_list",
-            "engines": ENGINE_LIST
-        }))
-    except Exception as e:
-        print(f"⚠️ Erro ao enviar engine_list: {e}")
+    # Envia lista de engines e de símbolos imediatamente
+    channel.send_control(json.dumps({
+        "type": "engine_list",
+        "engines": ENGINE_LIST
+    }))
+    channel.send_control(json.dumps({
+        "type": "symbol_list",
+        "symbols": SYMBOLS,
+        "subscribed": SYMBOLS[:1]
+    }))
     
     # Escuta mensagens do cliente
     try:
+        # Últimos minutos do símbolo padrão antes dos trades ao vivo
+        await subscribe_with_snapshot(websocket, SYMBOLS[:1])
+        
         async for message in websocket:
             try:
                 data = json.loads(message)
                 msg_type = data.get("type", "")
                 
                 if msg_type == "get_engine_list":
-                    await websocket.send(json.dumps({
+                    channel.send_control(json.dumps({
                         "type": "engine_list",
                         "engines": ENGINE_LIST
                     }))
                 
                 elif msg_type == "set_engines":
+                    # Só afeta este cliente: os outros continuam com os engines deles
                     try:
-                        current_orchestrator = VolumeEngineOrchestrator(
-                            engine_names=data["engines"],
-                            weights=data.get("weights", {})
+                        pipeline, swaps = set_client_engines(
+                            websocket, data["engines"], data.get("weights"), data.get("params")
                         )
-                        await broadcast({
+                        channel.send_control(json.dumps({
                             "type": "engines_updated",
-                            "engines": data["engines"],
-                            "weights": data.get("weights", {})
-                        })
-                        print(f"⚙️ Engines atualizados: {data['engines']}")
+                            "pipeline": pipeline.id,
+                            **pipeline.describe(),
+                            "swaps": swaps
+                        }))
+                        new_engines = sum(swap["new_engines"] for swap in swaps)
+                        print(f"⚙️ Engines do cliente: {data['engines']} (pipeline {pipeline.id}, "
+                              f"{new_engines} engines novos, {shared_engine_count()} compartilhados)")
+                        if websocket in footprint_clients:
+                            send_footprints(websocket, client_symbols.get(websocket, ()))
+                        if websocket in candle_clients:
+                            send_candles(websocket, client_symbols.get(websocket, ()))
                     except Exception as e:
-                        await websocket.send(json.dumps({
+                        channel.send_control(json.dumps({
                             "type": "error",
                             "message": str(e)
                         }))
                 
+                elif msg_type == "set_conflation":
+                    try:
+                        set_conflation(websocket, int(data.get("interval_ms", 0)))
+                        channel.send_control(json.dumps({
+                            "type": "conflation_updated",
+                            "interval_ms": client_intervals.get(websocket, 0)
+                        }))
+                    except (TypeError, ValueError) as e:
+                        channel.send_control(json.dumps({
+                            "type": "error",
+                            "message": str(e)
+                        }))
+                
+                elif msg_type == "set_filter":
+                    # {"filter": ["is_absorption == true", "volume >= 50000"]} (ver trade_filter.py); null remove
+                    try:
+                        channel.send_control(json.dumps({
+                            "type": "filter_updated",
+                            "filter": set_filter(websocket, data.get("filter"))
+                        }))
+                    except (TypeError, ValueError) as e:
+                        channel.send_control(json.dumps({
+                            "type": "error",
+                            "message": str(e)
+                        }))
+                
+                elif msg_type in ("subscribe", "unsubscribe"):
+                    try:
+                        symbols = data.get("symbols", [])
+                        if msg_type == "subscribe":
+                            before = set(client_symbols.get(websocket, ()))
+                            await subscribe_with_snapshot(websocket, symbols)
+                            if websocket in footprint_clients:
+                                send_footprints(websocket, client_symbols.get(websocket, set()) - before)
+                            if websocket in candle_clients:
+                                send_candles(websocket, client_symbols.get(websocket, set()) - before)
+                        else:
+                            unsubscribe(websocket, symbols)
+                        channel.send_control(json.dumps({
+                            "type": "subscribed",
+                            "symbols": sorted(client_symbols.get(websocket, set()))
+                        }))
+                    except TypeError as e:
+                        channel.send_control(json.dumps({
+                            "type": "error",
+                            "message": str(e)
+                        }))
+                
+                elif msg_type == "get_footprint":
+                    send_footprints(websocket, client_symbols.get(websocket, ()))
+                
+                elif msg_type == "subscribe_footprint":
+                    set_footprint(websocket, bool(data.get("enabled", True)))
+                    channel.send_control(json.dumps({
+                        "type": "footprint_subscribed",
+                        "enabled": websocket in footprint_clients,
+                        "interval_ms": FOOTPRINT_INTERVAL_MS
+                    }))
+                
+                elif msg_type == "subscribe_candles":
+                    # {"timeframes": ["1m", "5m"], "trades": false} = só candles, sem trades individuais
+                    try:
+                        timeframes = data.get("timeframes", ["1m"]) if data.get("enabled", True) else []
+                        set_candles(websocket, timeframes, bool(data.get("trades", True)))
+                        channel.send_control(json.dumps({
+                            "type": "candles_subscribed",
+                            "timeframes": sorted(candle_clients.get(websocket, ()), key=CANDLE_TIMEFRAMES.get),
+                            "trades": websocket not in candle_only_clients,
+                            "interval_ms": CANDLE_INTERVAL_MS
+                        }))
+                    except (TypeError, ValueError) as e:
+                        channel.send_control(json.dumps({
+                            "type": "error",
+                            "message": str(e)
+                        }))
+                
+                elif msg_type == "get_candles":
+                    send_candles(websocket, client_symbols.get(websocket, ()))
+                
+                elif msg_type == "get_stats":
+                    channel.send_control(json.dumps({
+                        "type": "stats",
+                        "clients": client_stats(),
+                        "ingest": binance_feed.pipeline.stats() if binance_feed else None,
+                        "swaps": list(swap_log),
+                        "pipelines": pipeline_stats(),
+                        "shared_engines": shared_engine_count(),
+                        "snapshots": [buffer.stats() for buffer in snapshot_buffers.values()],
+                        "footprints": [footprint.stats() for footprint in footprints.values()],
+                        "candles": [aggregator.stats() for aggregator in candles.values()],
+                        "filters": filter_stats(),
+                        "store": tick_store.stats() if tick_store else None,
+                        "book": book_feed.stats() if book_feed else None
+                    }))
+                
             except json.JSONDecodeError:
                 print(f"❌ JSON inválido: {message[:80]}")
     
@@ -115,96 +741,373 @@ async def ws_handler(websocket):
         print(f"⚠️ Erro na conexão: {e}")
     finally:
         connected_clients.discard(websocket)
+        unsubscribe(websocket)
+        leave_pipeline(websocket)
+        footprint_clients.discard(websocket)
+        candle_clients.pop(websocket, None)
+        candle_only_clients.discard(websocket)
+        client_intervals.pop(websocket, None)
+        set_filter(websocket, None)
+        binary_clients.pop(websocket, None)
+        client_channels.pop(websocket, None)
+        await channel.close()
+        if channel.dropped:
+            print(f"📉 Cliente descartou {channel.dropped} mensagens (fila máx. {channel.max_depth})")
         print(f"👋 Cliente desconectado ({len(connected_clients)} restantes)")
 
 
 # ============================================
-# Binance: coleta e retransmite trades
+# Engines por cliente (pipelines compartilhados)
 # ============================================
-async def binance_forwarder():
-    """Conecta à Binance e retransmite trades para clientes WebSocket."""
-    global current_orchestrator
-    
-    # Engines padrão
-    current_orchestrator = VolumeEngineOrchestrator(
-        engine_names=["tick_velocity", "side_inference", "micro_cluster"],
-        weights={"tick_velocity": 1.0, "side_inference": 1.0, "micro_cluster": 1.5}
-    )
-    
-    feed = BinanceDataFeed(symbol="btcusdt", orchestrator=current_orchestrator)
+def set_client_engines(client, engine_names: List[str], weights: Dict[str, float] = None,
+                       params: Dict[str, dict] = None) -> Tuple[EnginePipeline, List[dict]]:
+    """Troca os engines de um cliente. Se ninguém usa essa configuração
+    ainda, o pipeline é ativado em todos os símbolos; só engines que ainda
+    não rodam são criados, aquecidos com o histórico recente do feed."""
+    if not engine_names:
+        raise ValueError("Nenhum engine selecionado")
+    pipeline = EnginePipeline(engine_names, weights or None, params)
     
-    async def on_data(payload):
-        await broadcast(payload)
-    
-    # Loop de reconexão (sem recursão)
-    while True:
+    swaps = []
+    if pipeline.id not in pipelines:
+        added = []
         try:
-            await feed.connect(on_data)
-        except Exception as e:
-            print(f"⚠️ Erro Binance: {e}. Reconectando em 5s...")
-            await asyncio.sleep(5)
+            for symbol, orchestrator in orchestrators.items():
+                feed = binance_feed.feeds.get(symbol) if binance_feed else None
+                swap = orchestrator.add_pipeline(pipeline, history=feed.history if feed else None)
+                added.append(orchestrator)
+                swaps.append({"symbol": symbol, **swap})
+        except Exception:
+            # Tudo ou nada: os símbolos que já ativaram o pipeline voltam atrás
+            for orchestrator in added:
+                orchestrator.remove_pipeline(pipeline.id)
+            raise
+        pipelines[pipeline.id] = pipeline
+        swap_log.extend(swaps)
+    
+    leave_pipeline(client)
+    join_pipeline(client, pipeline.id)
+    return pipeline, swaps
+
+
+def join_pipeline(client, pipeline_id: str):
+    client_pipelines[client] = pipeline_id
+    pipeline_members.setdefault(pipeline_id, set()).add(client)
+
+
+def leave_pipeline(client):
+    """Tira o cliente do pipeline dele; pipeline sem clientes (exceto o
+    padrão) é desativado e seus engines exclusivos param de rodar."""
+    pipeline_id = client_pipelines.pop(client, None)
+    if pipeline_id is None:
+        return
+    members = pipeline_members.get(pipeline_id, set())
+    members.discard(client)
+    if members or pipeline_id == DEFAULT_PIPELINE.id:
+        return
+    pipeline_members.pop(pipeline_id, None)
+    pipelines.pop(pipeline_id, None)
+    for key in [key for key in snapshot_buffers if key[1] == pipeline_id]:
+        del snapshot_buffers[key]
+    for key in [key for key in footprints if key[1] == pipeline_id]:
+        del footprints[key]
+    for key in [key for key in candles if key[1] == pipeline_id]:
+        del candles[key]
+    for orchestrator in orchestrators.values():
+        orchestrator.remove_pipeline(pipeline_id)
+
+
+def shared_engine_count() -> int:
+    """Engines distintos rodando por tick (somados entre os símbolos)."""
+    return sum(len(orchestrator.engines) for orchestrator in orchestrators.values())
+
+
+def pipeline_stats() -> List[dict]:
+    return [
+        {
+            "pipeline": pipeline_id,
+            "clients": len(pipeline_members.get(pipeline_id, ())),
+            **pipeline.describe()
+        }
+        for pipeline_id, pipeline in pipelines.items()
+    ]
 
 
 # ============================================
-# HTTP: serve o frontend
+# Binance: coleta e retransmite trades
 # ============================================
-def start_http_server():
-    """Servidor HTTP simples para servir o index.html."""
-    frontend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend")
+def default_orchestrator(symbol: str = None) -> SharedEngineOrchestrator:
+    """Engines compartilhados de um símbolo, já com os pipelines ativos
+    (o padrão e os escolhidos pelos clientes conectados)."""
+    orchestrator = SharedEngineOrchestrator()
+    for pipeline in pipelines.values():
+        orchestrator.add_pipeline(pipeline)
+    return orchestrator
+
+
+def record_path_for(record_path: str, symbol: str) -> str:
+    """Um arquivo de gravação por símbolo: aceita "{symbol}" no caminho ou,
+    com vários símbolos, acrescenta o símbolo antes da extensão."""
+    if "{symbol}" in record_path:
+        return record_path.format(symbol=symbol)
+    if len(SYMBOLS) == 1:
+        return record_path
+    root, ext = os.path.splitext(record_path)
+    return f"{root}-{symbol}{ext}"
+
+
+async def binance_forwarder(record_path: str = None, base_url: str = BINANCE_WS_BASE):
+    """Conecta à Binance (combined stream com todos os SYMBOLS) e retransmite
+    os trades de cada símbolo para os clientes inscritos nele.
+    Com record_path, grava os trades brutos para replay (ver replay.py)."""
+    global binance_feed, book_feed
     
-    if not os.path.exists(frontend_dir):
-        # Tenta caminho alternativo (se backend e frontend estão no mesmo nível)
-        frontend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+    def make_orchestrator(symbol):
+        orchestrators[symbol] = default_orchestrator(symbol)
+        return orchestrators[symbol]
     
-    if not os.path.exists(frontend_dir):
-        print(f"⚠️ Diretório frontend não encontrado! Procurado em:")
-        print(f"   {frontend_dir}")
-        print(f"   Coloque o index.html na pasta 'frontend' ao lado da pasta 'backend'")
-        return
+    def make_recorder(symbol):
+        return TradeRecorder(record_path_for(record_path, symbol), symbol=symbol)
+    
+    if WORKERS:
+        feed = sharded_feed(record_path, base_url)
+    else:
+        feed = BinanceMultiFeed(
+            SYMBOLS,
+            orchestrator_factory=make_orchestrator,
+            recorder_factory=make_recorder if record_path else None,
+            base_url=base_url,
+            decoder=INGEST_DECODER,
+            history_size=WARMUP_TICKS,
+            store=tick_store,
+            connections=UPSTREAM_CONNECTIONS,
+            mirror_urls=MIRROR_URLS,
+            on_gap=report_gap,
+            on_reconnect=report_reconnect,
+        )
+    binance_feed = feed
     
-    os.chdir(frontend_dir)
+    # Book num socket próprio, sincronizado com o snapshot REST; cada feed de
+    # símbolo recebe o seu (no modo --workers os workers abrem os deles)
+    book_task = None
+    if BOOK_ENABLED and not WORKERS:
+        book_feed = BookFeed(SYMBOLS, base_url, on_reconnect=report_reconnect)
+        for symbol, symbol_feed in feed.feeds.items():
+            symbol_feed.attach_book(book_feed.books[symbol])
+        book_task = asyncio.create_task(book_feed.run())
     
-    # Suprime logs do HTTP server (muito verboso)
-    class QuietHandler(SimpleHTTPRequestHandler):
-        def log_message(self, format, *args):
-            pass  # Silencia GET /index.html logs
+    # Loop de reconexão (sem recursão). Com UPSTREAM_CONNECTIONS > 1 cada
+    # conexão já reconecta sozinha e connect() só sai por erro inesperado
+    backoff = Backoff()
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                await feed.connect(broadcast_trade)
+            except Exception as e:
+                delay = backoff.next_delay(time.monotonic() - started)
+                report_reconnect(f"{e} (nova tentativa em {delay:.1f}s)")
+                await asyncio.sleep(delay)
+    finally:
+        if book_task:
+            book_feed.stop()
+            book_task.cancel()
+        for symbol_feed in feed.feeds.values():
+            if symbol_feed.recorder:
+                symbol_feed.recorder.close()
+        if WORKERS:
+            await feed.shutdown()
+        if tick_store:
+            tick_store.close()
+
+
+def sharded_feed(record_path: str = None, base_url: str = BINANCE_WS_BASE) -> ShardedFeed:
+    """Ingestão e engines em processos filhos (--workers N). Os
+    orquestradores de cada símbolo viram proxies dos workers, então trocas
+    de engines por cliente funcionam igual ao modo de um processo."""
+    feed = ShardedFeed(
+        SYMBOLS,
+        WORKERS,
+        base_url=base_url,
+        decoder=INGEST_DECODER,
+        history_size=WARMUP_TICKS,
+        record_paths={symbol: record_path_for(record_path, symbol) for symbol in SYMBOLS} if record_path else None,
+        store=tick_store,
+        on_swap=swap_log.append,
+        on_reconnect=report_reconnect,
+        connections=UPSTREAM_CONNECTIONS,
+        mirror_urls=MIRROR_URLS,
+        on_gap=report_gap,
+        book=BOOK_ENABLED,
+    )
+    for symbol in SYMBOLS:
+        orchestrators[symbol] = feed.orchestrators[symbol]
+        for pipeline in pipelines.values():
+            orchestrators[symbol].add_pipeline(pipeline)
+    return feed
+
+
+def report_reconnect(message: str):
+    print(f"⚠️ Erro Binance: {message}. Reconectando...")
+    BINANCE_RECONNECTS.labels().inc()
+
+
+def report_gap(symbol: str, first_id: int, last_id: int):
+    """Trades que nenhuma conexão entregou (ver upstream.TradeDedup)."""
+    missed = last_id - first_id + 1
+    print(f"🕳️ {symbol.upper()}: {missed} trades perdidos (trade_id {first_id}–{last_id})")
+    BINANCE_MISSED_TRADES.labels(symbol.lower()).inc(missed)
+
+
+# ============================================
+# HTTP: frontend, /metrics e /history na porta do WebSocket
+# ============================================
+async def process_request(connection, request):
+    """Requisições HTTP comuns na porta do WebSocket; o upgrade segue para
+    o ws_handler. Tudo roda no loop, menos o /history (numpy e JSON numa
+    thread: barras de um dia cheio levam dezenas de ms)."""
+    if "Upgrade" in request.headers:
+        return None
+    path, _, query = request.path.partition("?")
+    if path == "/metrics":
+        body = REGISTRY.render().encode()
+        return http_response(200, [("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body)))], body)
+    if path == "/history":
+        status, body = await asyncio.to_thread(history_json, query)
+        return http_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))], body)
+    return http_response(*static_assets.response(path, request.headers))
+
+
+
+def history_response(query: str) -> Tuple[int, dict]:
+    """GET /history?symbol=btcusdt&start=<ms>&end=<ms>&bar_ms=60000
+    Barras do intervalo [start, end) lidas do tick_store (padrão: a
+    última hora, barras de 1 minuto)."""
+    if tick_store is None:
+        return 503, {"type": "error", "message": "Histórico desligado (inicie com --store)"}
+    params = {key: values[-1] for key, values in parse_qs(query).items()}
+    symbol = params.get("symbol", SYMBOLS[0]).lower()
+    if symbol not in SYMBOLS:
+        return 404, {"type": "error", "message": f"Símbolo não acompanhado: {symbol}"}
+    try:
+        end = int(params.get("end", time.time() * 1000))
+        start = int(params.get("start", end - HISTORY_DEFAULT_MS))
+        bar_ms = int(params.get("bar_ms", HISTORY_BAR_MS))
+    except ValueError as e:
+        return 400, {"type": "error", "message": str(e)}
+    if bar_ms <= 0 or end <= start:
+        return 400, {"type": "error", "message": "Intervalo inválido"}
+    if (end - start) // bar_ms > HISTORY_MAX_BARS:
+        return 400, {"type": "error", "message": f"Mais de {HISTORY_MAX_BARS} barras; aumente bar_ms"}
     
-    httpd = HTTPServer(("localhost", 8000), QuietHandler)
-    print("🌐 Frontend: http://localhost:8000")
-    httpd.serve_forever()
+    bars = tick_store.bars(symbol, start, end, bar_ms)
+    return 200, {
+        "type": "history",
+        "symbol": symbol.upper(),
+        "pipeline": tick_store.pipeline,
+        "start": start,
+        "end": end,
+        "bar_ms": bar_ms,
+        "bars": {
+            name: (values.round(2) if name.endswith("_volume") else values).tolist()
+            for name, values in bars.items()
+        }
+    }
+
+
+def history_json(query: str) -> Tuple[int, bytes]:
+    status, message = history_response(query)
+    return status, json.dumps(message).encode()
 
 
 # ============================================
 # Main: inicializa tudo
 # ============================================
-async def main():
-    # Servidor WebSocket (porta 8765)
-    server = await websockets.serve(ws_handler, "localhost", 8765)
-    print("📡 WebSocket: ws://localhost:8765")
+async def main(record_path: str = None, base_url: str = BINANCE_WS_BASE):
+    # Frontend lido uma vez para a memória
+    frontend_dir = find_frontend_dir()
+    if frontend_dir:
+        static_assets.load(frontend_dir)
+        print(f"🌐 Frontend: http://localhost:{PORT} ({len(static_assets.assets)} rotas em memória)")
+    else:
+        print("⚠️ Diretório frontend não encontrado!")
+        print("   Coloque o index.html na pasta 'frontend' ao lado da pasta 'backend'")
+    
+    # WebSocket e HTTP na mesma porta (8765)
+    server = await websockets.serve(ws_handler, "localhost", PORT, select_subprotocol=select_subprotocol,
+                                    process_request=process_request)
+    print(f"📡 WebSocket: ws://localhost:{PORT}")
     
     # Coleta Binance (roda em paralelo)
-    await binance_forwarder()
+    await binance_forwarder(record_path, base_url)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ImbalanceEngine - servidor WebSocket + HTTP")
+    parser.add_argument("--record", metavar="ARQUIVO", default=None,
+                        help="grava os trades brutos da Binance neste arquivo (replay com replay.py)")
+    parser.add_argument("--symbols", default="btcusdt",
+                        help="pares separados por vírgula (um único socket combined stream)")
+    parser.add_argument("--binance-url", default=BINANCE_WS_BASE,
+                        help="endereço base do stream (ex.: ws://localhost:9443 com fake_binance.py)")
+    parser.add_argument("--queue-size", type=int, default=CLIENT_QUEUE_SIZE,
+                        help="mensagens pendentes por cliente antes de aplicar a política de overflow")
+    parser.add_argument("--overflow-policy", choices=OVERFLOW_POLICIES, default=OVERFLOW_POLICY,
+                        help="o que fazer com clientes lentos quando a fila enche")
+    parser.add_argument("--decoder", choices=list(DECODERS), default=INGEST_DECODER,
+                        help="decodificador das mensagens da Binance (ver ingest.py)")
+    parser.add_argument("--connections", type=int, default=UPSTREAM_CONNECTIONS,
+                        help="conexões simultâneas com a Binance; 2 = hot standby com deduplicação "
+                             "por trade_id (ver upstream.py)")
+    parser.add_argument("--binance-mirror", action="append", default=[], metavar="URL",
+                        help="endpoint alternativo com os mesmos streams (ex.: wss://data-stream.binance.vision); "
+                             "as conexões alternam entre --binance-url e os espelhos")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="processos de engines (símbolos divididos entre eles; ingestão e "
+                             "fan-out em processos próprios); 0 = tudo num processo")
+    parser.add_argument("--store", metavar="DIR", default=None,
+                        help="guarda os trades processados (colunas por símbolo e dia) e serve GET /history")
+    parser.add_argument("--snapshot-seconds", type=int, default=SNAPSHOT_SECONDS,
+                        help="janela de trades recentes enviada a quem conecta (snapshot de late-join)")
+    parser.add_argument("--warmup-ticks", type=int, default=WARMUP_TICKS,
+                        help="ticks recentes por símbolo usados para aquecer engines trocados ao vivo")
+    parser.add_argument("--book", action="store_true",
+                        help="liga o book L2 (@depth e @bookTicker): bid/ask reais e o engine book_imbalance")
+    parser.add_argument("--port", type=int, default=PORT, help="porta do WebSocket e do HTTP")
+    args = parser.parse_args()
+    SYMBOLS[:] = [s.strip().lower() for s in args.symbols.split(",") if s.strip()]
+    INGEST_DECODER = args.decoder
+    WORKERS = args.workers
+    MIRROR_URLS[:] = args.binance_mirror
+    UPSTREAM_CONNECTIONS = max(args.connections, 1 + len(MIRROR_URLS))
+    WARMUP_TICKS = args.warmup_ticks
+    SNAPSHOT_SECONDS = args.snapshot_seconds
+    BOOK_ENABLED = args.book
+    PORT = args.port
+    CLIENT_QUEUE_SIZE = args.queue_size
+    OVERFLOW_POLICY = args.overflow_policy
+    if args.store:
+        tick_store = TickStore(args.store, pipeline=DEFAULT_PIPELINE.id)
+    
     print("=" * 60)
-    print("🚀 IMBALANCEENGINE - BTC/USDT Tempo Real")
+    print(f"🚀 IMBALANCEENGINE - {', '.join(s.upper() for s in SYMBOLS)} Tempo Real")
     print("=" * 60)
     
     # Fix para Windows: evita erro de event loop
     if hasattr(asyncio, 'WindowsSelectorEventLoopPolicy'):
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
     
-    # Thread separada para HTTP (não conflita com asyncio)
-    http_thread = threading.Thread(target=start_http_server, daemon=True)
-    http_thread.start()
-    
     print("\n✅ Engines: tick_velocity, side_inference, micro_cluster")
-    print("✅ Abra no navegador: http://localhost:8000")
+    print(f"✅ Abra no navegador: http://localhost:{PORT}")
+    print(f"📈 Métricas (Prometheus): http://localhost:{PORT}/metrics")
     print("⚠️  Dados públicos Binance - sem API key\n")
+    if args.record:
+        print(f"💾 Gravando trades em {args.record}\n")
+    if args.store:
+        print(f"🗄️  Histórico em {args.store} (http://localhost:{PORT}/history)\n")
     
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.record, args.binance_url))
     except KeyboardInterrupt:
         print("\n👋 Servidor encerrado")
     except Exception as e:
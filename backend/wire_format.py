@@ -0,0 +1,262 @@
+"""
+Protocolo binário colunar para trades e frames (opcional).
+
+O cliente negocia o formato na conexão pelo subprotocolo WebSocket:
+    new WebSocket("ws://localhost:8765", ["imbalance.bin.v1"])
+Sem subprotocolo a conexão continua em JSON (padrão). No protocolo
+binário só trades e frames viram mensagens binárias; mensagens de
+controle (engine_list, erros, stats...) continuam em JSON (texto).
+
+Todas as mensagens binárias são little-endian e começam com um cabeçalho
+de 8 bytes. Blocos de float64 ficam sempre em offsets múltiplos de 8 para
+que o navegador possa ler as colunas direto com Float64Array.
+
+TABLE (enviada antes do primeiro trade e sempre que a tabela muda):
+    <B kind=1> <B versão> <H n_símbolos> <H n_chaves> <2x>
+    depois, para cada símbolo e cada chave de engine_contributions:
+    <B tamanho> <utf-8>
+
+TRADES (kind=2, um ou mais trades de um símbolo) e FRAME (kind=3):
+    <B kind> <B versão> <B símbolo> <B n_chaves> <I n_trades>
+    [FRAME: 11 x float64 de agregados, na ordem de FRAME_AGGREGATES]
+    n_chaves x uint8 (índices na tabela), com padding até múltiplo de 8
+    float64[n] timestamp, price, volume, volume_raw
+    float64[n] por chave de engine (NaN quando o trade não tem a chave)
+    uint32[n] trade_count
+    uint8[n]  side, side_real, is_absorption (0 neutral, 1 buy, 2 sell)
+
+Os índices são um byte, então cada tabela tem no máximo MAX_TABLE_SIZE
+nomes. Quando a de chaves enche (pipelines com parâmetros diferentes
+criam chaves novas ao longo da sessão), ela recomeça só com as chaves da
+mensagem atual e a TABLE nova vai antes dos dados. Uma mensagem com mais
+chaves do que cabem levanta ValueError; o servidor a envia em JSON.
+"""
+import math
+import struct
+import sys
+from array import array
+from typing import Dict, Any, List
+from volume_engines.base import SIDE_CODES, SIDE_NAMES, SIDE_NEUTRAL
+
+SUBPROTOCOL = "imbalance.bin.v1"
+VERSION = 1
+
+KIND_TABLE = 1
+KIND_TRADES = 2
+KIND_FRAME = 3
+
+TABLE_HEADER = struct.Struct("<BBHH2x")
+BLOCK_HEADER = struct.Struct("<BBBBI")
+FRAME_AGGREGATES = (
+    "interval_ms", "trade_count", "buy_volume", "sell_volume", "absorption_count",
+    "open_price", "high_price", "low_price", "last_price", "first_timestamp", "last_timestamp",
+)
+AGGREGATES = struct.Struct(f"<{len(FRAME_AGGREGATES)}d")
+
+MAX_TABLE_SIZE = 255
+
+_SWAP = sys.byteorder != "little"
+_NAN = float("nan")
+
+
+def _column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if _SWAP:
+        column.byteswap()
+    return column.tobytes()
+
+
+def _pad8(data: bytes) -> bytes:
+    return data + bytes(-len(data) % 8)
+
+
+class WireEncoder:
+    """Codifica payloads de trade e frames no protocolo binário.
+
+    As tabelas de símbolos e de chaves de engine_contributions são do
+    servidor inteiro (um único encoder), e `version` aumenta a cada
+    mudança (chave nova ou tabela recomeçada): quem envia compara com a
+    versão que o cliente já recebeu e manda table_message() antes dos dados."""
+
+    def __init__(self):
+        self.symbols: Dict[str, int] = {}
+        self.engine_keys: Dict[str, int] = {}
+        self.version = 0
+        self.resets = 0
+        self._trade_layouts: Dict[int, struct.Struct] = {}
+
+    def _index(self, table: Dict[str, int], name: str) -> int:
+        index = table.get(name)
+        if index is None:
+            if len(table) >= MAX_TABLE_SIZE:
+                raise ValueError(f"Tabela do protocolo binário cheia ({MAX_TABLE_SIZE} entradas): {name}")
+            index = table[name] = len(table)
+            self.version += 1
+        return index
+
+    def _key_indexes(self, keys) -> bytes:
+        """Índices das chaves de engine_contributions (sem repetição em
+        `keys`); com a tabela cheia, ela recomeça só com estas chaves."""
+        table = self.engine_keys
+        try:
+            return bytes([table[key] for key in keys])
+        except KeyError:
+            pass
+        keys = list(keys)
+        if len(keys) > MAX_TABLE_SIZE:
+            raise ValueError(f"Mensagem com mais de {MAX_TABLE_SIZE} chaves de engine")
+        if len(table) + sum(key not in table for key in keys) > MAX_TABLE_SIZE:
+            table.clear()
+            self.resets += 1
+        for key in keys:
+            if key not in table:
+                table[key] = len(table)
+        self.version += 1
+        return bytes([table[key] for key in keys])
+
+    def table_message(self) -> bytes:
+        parts = [TABLE_HEADER.pack(KIND_TABLE, VERSION, len(self.symbols), len(self.engine_keys))]
+        for table in (self.symbols, self.engine_keys):
+            for name in table:
+                encoded = name.encode()
+                parts.append(bytes((len(encoded),)) + encoded)
+        return b"".join(parts)
+
+    def encode_trade(self, payload: Dict[str, Any]) -> bytes:
+        """Um trade: mesmo layout de _block, num único struct.pack."""
+        contributions = payload["engine_contributions"]
+        key_indexes = self._key_indexes(contributions)
+        layout = self._trade_layouts.get(len(key_indexes))
+        if layout is None:
+            n_keys = len(key_indexes)
+            layout = struct.Struct(f"<BBBBI{n_keys + (-n_keys % 8)}s4d{n_keys}dI3B")
+            self._trade_layouts[n_keys] = layout
+        codes = SIDE_CODES
+        return layout.pack(
+            KIND_TRADES, VERSION, self._index(self.symbols, payload["symbol"].upper()), len(key_indexes), 1,
+            key_indexes,
+            payload["timestamp"], payload["price"], payload["volume"], payload["volume_raw"],
+            *contributions.values(),
+            payload["trade_count"],
+            codes.get(payload["side"], SIDE_NEUTRAL),
+            codes.get(payload["side_real"], SIDE_NEUTRAL),
+            1 if payload["is_absorption"] else 0,
+        )
+
+    def encode_frame(self, frame: Dict[str, Any]) -> bytes:
+        aggregates = frame["aggregates"]
+        values = [frame["interval_ms"]] + [aggregates[name] for name in FRAME_AGGREGATES[1:]]
+        return self._block(KIND_FRAME, frame["symbol"], frame["trades"], AGGREGATES.pack(*values))
+
+    def _block(self, kind: int, symbol: str, trades: List[Dict[str, Any]], aggregates: bytes = b"") -> bytes:
+        symbol_index = self._index(self.symbols, symbol.upper())
+
+        keys = []
+        for trade in trades:
+            for key in trade["engine_contributions"]:
+                if key not in keys:
+                    keys.append(key)
+        key_indexes = self._key_indexes(keys)
+
+        codes = SIDE_CODES
+        parts = [
+            BLOCK_HEADER.pack(kind, VERSION, symbol_index, len(keys), len(trades)),
+            aggregates,
+            _pad8(key_indexes),
+            _column("d", [t["timestamp"] for t in trades]),
+            _column("d", [t["price"] for t in trades]),
+            _column("d", [t["volume"] for t in trades]),
+            _column("d", [t["volume_raw"] for t in trades]),
+        ]
+        for key in keys:
+            parts.append(_column("d", [t["engine_contributions"].get(key, _NAN) for t in trades]))
+        parts.append(_column("I", [t["trade_count"] for t in trades]))
+        parts.append(bytes(codes.get(t["side"], SIDE_NEUTRAL) for t in trades))
+        parts.append(bytes(codes.get(t["side_real"], SIDE_NEUTRAL) for t in trades))
+        parts.append(bytes(1 if t["is_absorption"] else 0 for t in trades))
+        return b"".join(parts)
+
+
+class WireDecoder:
+    """Decodificador de referência (clientes Python, testes e benchmark)."""
+
+    def __init__(self):
+        self.symbols: List[str] = []
+        self.engine_keys: List[str] = []
+
+    def decode(self, data: bytes):
+        """Devolve None para TABLE (só atualiza as tabelas), o payload de
+        trade para TRADES com um trade (lista se vários) e o frame para FRAME."""
+        kind = data[0]
+        if kind == KIND_TABLE:
+            self._decode_table(data)
+            return None
+
+        _, version, symbol_index, n_keys, n = BLOCK_HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"Versão do protocolo binário não suportada: {version}")
+        offset = BLOCK_HEADER.size
+        aggregates = None
+        if kind == KIND_FRAME:
+            aggregates = dict(zip(FRAME_AGGREGATES, AGGREGATES.unpack_from(data, offset)))
+            offset += AGGREGATES.size
+        elif kind != KIND_TRADES:
+            raise ValueError(f"Tipo de mensagem binária desconhecido: {kind}")
+
+        keys = [self.engine_keys[i] for i in data[offset:offset + n_keys]]
+        offset += n_keys + (-n_keys % 8)
+
+        def column(typecode: str, size: int):
+            nonlocal offset
+            values = array(typecode)
+            values.frombytes(data[offset:offset + size * n])
+            if _SWAP:
+                values.byteswap()
+            offset += size * n
+            return values
+
+        timestamps, prices, volumes, volumes_raw = (column("d", 8) for _ in range(4))
+        contributions = [column("d", 8) for _ in keys]
+        trade_counts = column("I", 4)
+        sides, sides_real, absorptions = (column("B", 1) for _ in range(3))
+
+        symbol = self.symbols[symbol_index]
+        trades = [
+            {
+                "type": "trade",
+                "symbol": symbol,
+                "price": prices[i],
+                "volume_raw": volumes_raw[i],
+                "volume": volumes[i],
+                "side": SIDE_NAMES[sides[i]],
+                "side_real": SIDE_NAMES[sides_real[i]],
+                "timestamp": int(timestamps[i]),
+                "is_absorption": bool(absorptions[i]),
+                "engine_contributions": {
+                    key: values[i] for key, values in zip(keys, contributions) if not math.isnan(values[i])
+                },
+                "trade_count": trade_counts[i],
+            }
+            for i in range(n)
+        ]
+
+        if kind == KIND_TRADES:
+            return trades[0] if n == 1 else trades
+        for name in ("interval_ms", "trade_count", "absorption_count", "first_timestamp", "last_timestamp"):
+            aggregates[name] = int(aggregates[name])
+        interval_ms = aggregates.pop("interval_ms")
+        return {"type": "frame", "symbol": symbol, "interval_ms": interval_ms, "trades": trades, "aggregates": aggregates}
+
+    def _decode_table(self, data: bytes):
+        _, version, n_symbols, n_keys = TABLE_HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"Versão do protocolo binário não suportada: {version}")
+        offset = TABLE_HEADER.size
+        names = []
+        for _ in range(n_symbols + n_keys):
+            size = data[offset]
+            names.append(data[offset + 1:offset + 1 + size].decode())
+            offset += 1 + size
+        self.symbols = names[:n_symbols]
+        self.engine_keys = names[n_symbols:]
+